@@ -13,10 +13,77 @@ class Config:
     # Database
     SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "agents.db")
     CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+    # Долгосрочная память комнат: auto (ChromaDB, если установлен, иначе NumPy) | chroma | numpy | off
+    VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "auto").lower()
+    # Каталог NumPy-индексов (пусто — индекс только в памяти процесса) и размерность эмбеддингов
+    VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "./vector_store")
+    VECTOR_EMBED_DIM = int(os.getenv("VECTOR_EMBED_DIM", "256"))
+    # Общий сервис эмбеддингов: auto (sentence-transformers, если установлен, иначе хэширование) | sentence-transformers | hashing
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "auto").lower()
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    # Окно микро-батча одновременных запросов, размер батча и LRU-кэш векторов по хэшу текста
+    EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+    # Пул потоков для операций векторной памяти (эмбеддинги, ChromaDB, memmap) — вне event loop
+    MEMORY_EXECUTOR_WORKERS = int(os.getenv("MEMORY_EXECUTOR_WORKERS", "2"))
+    # Память комнаты: предел элементов краткосрочной памяти и сообщений контекстного окна (старейшие вытесняются)
+    MEMORY_SHORT_TERM_MAX_ITEMS = int(os.getenv("MEMORY_SHORT_TERM_MAX_ITEMS", "500"))
+    MEMORY_CONTEXT_MAX_MESSAGES = int(os.getenv("MEMORY_CONTEXT_MAX_MESSAGES", "200"))
     
     # API usage limit (0 = без ограничений, защита от перерасхода)
     API_MESSAGE_LIMIT_PER_DAY = int(os.getenv("API_MESSAGE_LIMIT_PER_DAY", "100"))
 
+    # LLM: размер выделенного пула потоков для вызовов YandexGPT
+    LLM_EXECUTOR_WORKERS = int(os.getenv("LLM_EXECUTOR_WORKERS", "8"))
+
+    # LLM: лимиты параллельных вызовов (всего / на комнату) и длина очереди ожидания (при переполнении — 429)
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", os.getenv("LLM_EXECUTOR_WORKERS", "8")))
+    LLM_ROOM_CONCURRENCY = int(os.getenv("LLM_ROOM_CONCURRENCY", "2"))
+    LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "64"))
+
+    # LLM: история сессий клиента — сообщений на сессию, общий бюджет в байтах (LRU), SQLite (пусто — только память)
+    LLM_SESSION_MAX_MESSAGES = int(os.getenv("LLM_SESSION_MAX_MESSAGES", "20"))
+    LLM_SESSION_MAX_BYTES = int(os.getenv("LLM_SESSION_MAX_BYTES", str(8 * 1024 * 1024)))
+    LLM_SESSION_DB_PATH = os.getenv("LLM_SESSION_DB_PATH", "")
+    # Предел SQLite-истории: сессий на диске и возраст строк (часы); 0 — без предела
+    LLM_SESSION_DB_MAX_SESSIONS = int(os.getenv("LLM_SESSION_DB_MAX_SESSIONS", "1000"))
+    LLM_SESSION_DB_TTL_HOURS = float(os.getenv("LLM_SESSION_DB_TTL_HOURS", "168"))
+
+    # LLM: стриминг ответов агентов в WebSocket (message_delta)
+    LLM_STREAMING_ENABLED = os.getenv("LLM_STREAMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    # LLM: кэш ответов для детерминированных промптов (0 записей — выключен, пустой путь — без SQLite)
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+    LLM_CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH", "")
+
+    # LLM: повторы транзиентных ошибок (экспоненциальный backoff), circuit breaker, hedged-запросы выше p95
+    LLM_RETRY_MAX = int(os.getenv("LLM_RETRY_MAX", "2"))
+    LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+    LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+    LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+    # Оркестрация: fast-forward — обсуждение без искусственных пауз между раундами (бенчмарки)
+    ORCHESTRATION_FAST_FORWARD = os.getenv("ORCHESTRATION_FAST_FORWARD", "false").lower() in ("1", "true", "yes")
+    # Очередь входящих сообщений pipeline: cancel | queue | merge (объединение в окне debounce, включается явно)
+    PIPELINE_INPUT_POLICY = os.getenv("PIPELINE_INPUT_POLICY", "queue").lower()
+    PIPELINE_DEBOUNCE_SECONDS = float(os.getenv("PIPELINE_DEBOUNCE_SECONDS", "1.0"))
+    PIPELINE_QUEUE_MAX = int(os.getenv("PIPELINE_QUEUE_MAX", "20"))
+    # Ранняя остановка обсуждения: lexical, embedding, consensus через запятую; off — выключить
+    DISCUSS_CONVERGENCE = os.getenv("DISCUSS_CONVERGENCE", "lexical,consensus")
+    # Контрольные точки pipeline в SQLite: продолжение прерванного прогона с последнего этапа
+    PIPELINE_CHECKPOINTS = os.getenv("PIPELINE_CHECKPOINTS", "true").lower() in ("1", "true", "yes")
+    PIPELINE_RESUME_ON_STARTUP = os.getenv("PIPELINE_RESUME_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+    PIPELINE_CHECKPOINT_MAX_AGE_MINUTES = int(os.getenv("PIPELINE_CHECKPOINT_MAX_AGE_MINUTES", "60"))
+    # Запись сообщений pipeline: batched — broadcast сразу, строки пачками (не позже интервала);
+    # strict — сообщение записывается одной транзакцией до broadcast
+    MESSAGE_DURABILITY = os.getenv("MESSAGE_DURABILITY", "batched").lower()
+    MESSAGE_FLUSH_INTERVAL_MS = int(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", "250"))
+    MESSAGE_FLUSH_BATCH = int(os.getenv("MESSAGE_FLUSH_BATCH", "50"))
+
     # Agent settings
     MAX_MEMORIES_PER_AGENT = int(os.getenv("MAX_MEMORIES_PER_AGENT", "50"))
     MEMORY_SUMMARY_THRESHOLD = int(os.getenv("MEMORY_SUMMARY_THRESHOLD", "20"))
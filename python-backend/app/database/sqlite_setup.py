@@ -35,6 +35,28 @@ def _enable_sqlite_fk(dbapi_connection, _):
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+
+# Метрики /api/metrics: транзакции, коммиты и откаты сессий
+from app.services.metrics import DB_COMMITS, DB_ROLLBACKS, DB_TRANSACTIONS
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _count_transaction(session, transaction, connection):
+    DB_TRANSACTIONS.inc()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _count_commit(session):
+    # RELEASE SAVEPOINT (begin_nested) — не коммит: fsync только у внешней транзакции
+    if not session.in_nested_transaction():
+        DB_COMMITS.inc()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _count_rollback(session):
+    DB_ROLLBACKS.inc()
+
+
 Base = declarative_base()   # все модели наследуются от этого Base
 
 def get_db():
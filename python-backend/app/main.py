@@ -13,8 +13,14 @@ for _name in ("aigod.ws", "aigod.orchestration", "aigod.llm", "aigod.room_agents
     logging.getLogger(_name).setLevel(_log_level)
 from sqlalchemy.orm import Session
 
+from app.config import config
 from app.data.default_agents_data import agents_data
-from app.services.orchestration_background import registry
+from app.services.orchestration_background import (
+    registry,
+    reset_message_writer,
+    reset_pipeline_queue,
+    resume_interrupted_pipelines,
+)
 from app.database.sqlite_setup import Base, SessionLocal, engine, get_db
 from sqlalchemy import inspect
 
@@ -66,12 +72,29 @@ async def lifespan(app: FastAPI):
             init_default_agents(db)
     except Exception as e:
         print(f"Ошибка в lifespan: {e}")
+    if config.PIPELINE_CHECKPOINTS and config.PIPELINE_RESUME_ON_STARTUP:
+        try:
+            resumed = await resume_interrupted_pipelines()
+            if resumed:
+                print(f"→ Продолжены прерванные pipeline: {resumed}")
+        except Exception as e:
+            print(f"Ошибка продолжения pipeline: {e}")
     yield
     print("→ Завершение lifespan (shutdown)")
     try:
         await registry.stop_all()
+        await reset_pipeline_queue()
+        await reset_message_writer()
     except Exception as e:
         print(f"Ошибка при остановке оркестраций: {e}")
+    from app.services.context_memory.async_store import shutdown_memory_executor
+    from app.services.yandex_client.llm_executor import shutdown_llm_executor
+    from app.services.yandex_client.completion_cache import reset_completion_cache
+    from app.services.yandex_client.resilience import reset_llm_resilience
+    shutdown_llm_executor()
+    shutdown_memory_executor()
+    reset_completion_cache()
+    reset_llm_resilience()
 
 
 app = FastAPI(
@@ -4,6 +4,7 @@ from .default_agent import DefaultAgent
 from .event import Event
 from .memory import Memory
 from .message import Message
+from .pipeline_checkpoint import PipelineCheckpoint
 from .plan import Plan
 from .relationship import Relationship
 from .room import Room
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, JSON, String
+from sqlalchemy.sql import func
+
+from app.database.sqlite_setup import Base
+
+
+class PipelineCheckpoint(Base):
+    """Контрольная точка pipeline: результаты завершённых этапов для продолжения после сбоя/отмены."""
+
+    __tablename__ = "pipeline_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_message = Column(String, nullable=False)
+    sender = Column(String, nullable=False, default="user")
+    status = Column(String, nullable=False, default="running", index=True)  # running | cancelled | failed
+    completed_stages = Column(JSON, default=list)  # имена этапов PipelineStage
+    outputs = Column(JSON, default=dict)  # поля TaskState, произведённые этапами
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,12 +1,14 @@
 """Роуты для агентов в контексте комнаты."""
 import asyncio
 import logging
+import uuid
 
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
 
 logger = logging.getLogger("aigod.room_agents")
 from sqlalchemy.orm import Session
 
+from app.config import config
 from app.database.sqlite_setup import get_db, SessionLocal
 from app.dependencies import get_current_user, get_room_for_user
 from app.models.agent import Agent
@@ -39,8 +41,14 @@ from app.schemas.api import (
     SpeedUpdateIn,
     SuccessOut,
 )
-from app.services.llm_service import get_agent_response
-from app.services.orchestration_background import enqueue_room_run, registry
+from app.services.llm_service import get_agent_response_async
+from app.services.yandex_client.llm_scheduler import LLMQueueFullError, get_llm_scheduler
+from app.services.orchestration_background import (
+    apply_room_speed,
+    enqueue_room_run,
+    invalidate_pipeline_components,
+    registry,
+)
 from app.services.relationship_model_service import get_relationship_manager
 from app.services.room_services_registry import (
     get_emotional_integration,
@@ -48,7 +56,7 @@ from app.services.room_services_registry import (
     ensure_emotional_agents_registered,
 )
 from app.utils.mood import get_agent_mood
-from app.ws import broadcast_chat_event, broadcast_chat_message, broadcast_graph_edge
+from app.ws import broadcast_chat_delta, broadcast_chat_event, broadcast_chat_message, broadcast_graph_edge
 
 # Endpoint для управления агентами, их связями с комнатами и т.д.
 
@@ -251,6 +259,7 @@ def create_agent(
         room.agents.append(agent)
         db.commit()
         db.refresh(agent)
+        invalidate_pipeline_components(room.id)
         return _agent_summary(agent)
 
     # Создать нового
@@ -269,6 +278,7 @@ def create_agent(
     room.agents.append(agent)
     db.commit()
     db.refresh(agent)
+    invalidate_pipeline_components(room.id)
     return _agent_summary(agent)
 
 
@@ -298,6 +308,7 @@ def delete_agent(
     )
     db.delete(agent)
     db.commit()
+    invalidate_pipeline_components(room.id)
 
 
 @router.get("/agents/{agent_id}/memories", response_model=MemoriesListOut)
@@ -527,6 +538,25 @@ async def stop_orchestration(room: Room = Depends(get_room_for_user)):
     return {"status": "stopped", "roomId": room.id, "pipelineCancelled": cancelled}
 
 
+@router.post("/orchestration/resume")
+async def resume_orchestration(room: Room = Depends(get_room_for_user)):
+    """
+    Продолжить прерванный pipeline (отменённый, упавший или оборванный рестартом) с последнего
+    завершённого этапа — обсуждение не генерируется заново.
+    """
+    from app.services.orchestration_background import resume_pipeline
+
+    checkpoint = await resume_pipeline(room.id)
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail="Нет прерванного pipeline для продолжения")
+    return {
+        "status": "resumed",
+        "roomId": room.id,
+        "checkpointId": checkpoint["id"],
+        "completedStages": checkpoint["completed_stages"],
+    }
+
+
 @router.post("/events", response_model=EventOut)
 def create_event(
     data: EventCreateIn,
@@ -582,6 +612,9 @@ async def broadcast_event(
     db: Session = Depends(get_db),
 ):
     """Событие для всех агентов комнаты."""
+    if data.type in ("user_message", "chat") and room.agents:
+        # И single, и оркестрация: прогон — минимум по вызову на агента
+        _ensure_llm_capacity(len(room.agents))
     agent_ids = [str(a.id) for a in room.agents]
     event = Event(
         room_id=room.id,
@@ -621,12 +654,7 @@ async def broadcast_event(
         if enqueued:
             logger.info("events/broadcast user_message: оркестрация room_id=%s", room.id)
         else:
-            for agent in room.agents:
-                asyncio.create_task(
-                    _generate_agent_reply_async(
-                        room.id, agent.id, agent.name, data.description, "user"
-                    )
-                )
+            _spawn_agent_replies(room, data.description, "user")
             logger.info("events/broadcast user_message: триггер %d агентов room_id=%s", len(room.agents), room.id)
 
     return EventOut(
@@ -638,18 +666,48 @@ async def broadcast_event(
     )
 
 
+def _ensure_llm_capacity(count: int, reserve: bool = False) -> None:
+    """Проверить (и при reserve — занять) место в очереди LLM. При переполнении — сразу 429."""
+    scheduler = get_llm_scheduler()
+    try:
+        if reserve:
+            scheduler.reserve(count)
+        else:
+            scheduler.ensure_capacity(count)
+    except LLMQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+
+
+def _spawn_agent_replies(room: Room, text: str, sender: str) -> None:
+    """Запустить ответы всех агентов комнаты (single). Места в очереди LLM резервируются заранее."""
+    _ensure_llm_capacity(len(room.agents), reserve=True)
+    for agent in room.agents:
+        asyncio.create_task(
+            _generate_agent_reply_async(
+                room.id, agent.id, agent.name, text, sender, reserved=True
+            )
+        )
+
+
 async def _generate_agent_reply_async(
     room_id: int,
     agent_id: int,
     agent_name: str,
     user_text: str,
     user_sender: str,
+    reserved: bool = False,
 ) -> None:
     """
     Фоновая задача: сгенерировать ответ агента на сообщение в комнату.
     Вызывается для каждого агента при POST /messages (общий чат комнаты).
+    reserved — место в очереди LLM уже зарезервировано эндпоинтом.
     """
     logger.info("_generate_agent_reply START room_id=%s agent_id=%s agent_name=%s", room_id, agent_id, agent_name)
+    scheduler = get_llm_scheduler()
     db = SessionLocal()
     try:
         room = db.query(Room).filter(Room.id == room_id).first()
@@ -662,11 +720,21 @@ async def _generate_agent_reply_async(
             return
         session_id = f"room_{room_id}_agent_{agent_id}"
         logger.info("_generate_agent_reply LLM call room_id=%s agent=%s session=%s", room_id, agent_name, session_id)
-        loop = asyncio.get_event_loop()
-        agent_response = await loop.run_in_executor(
-            None,
-            lambda: get_agent_response(agent, session_id, user_text, room=room),
-        )
+        stream_id = uuid.uuid4().hex if config.LLM_STREAMING_ENABLED else None
+
+        async def on_delta(delta: str) -> None:
+            await broadcast_chat_delta(room_id, {
+                "streamId": stream_id,
+                "delta": delta,
+                "sender": agent_name,
+                "agentId": str(agent_id),
+            })
+
+        slot_reserved, reserved = reserved, False
+        async with scheduler.slot(f"room_{room_id}", reserved=slot_reserved):
+            agent_response = await get_agent_response_async(
+                agent, session_id, user_text, room=room, on_delta=on_delta if stream_id else None
+            )
         agent_msg = Message(
             room_id=room_id,
             agent_id=agent_id,
@@ -685,6 +753,8 @@ async def _generate_agent_reply_async(
             "timestamp": agent_msg.created_at.isoformat() if agent_msg.created_at else "",
             "agentResponse": None,
         }
+        if stream_id:
+            payload["streamId"] = stream_id
         await broadcast_chat_message(room_id, payload)
         logger.info("_generate_agent_reply DONE room_id=%s agent=%s broadcast OK", room_id, agent_name)
         # Обновление памяти/эмоций — sync, запускаем в executor чтобы не блокировать
@@ -698,6 +768,9 @@ async def _generate_agent_reply_async(
     except Exception as e:
         logger.exception("Ошибка _generate_agent_reply room_id=%s agent_id=%s: %s", room_id, agent_id, e)
     finally:
+        if reserved:
+            # Задача завершилась до вызова LLM (комната/агент не найдены) — вернуть место в очереди
+            scheduler.release_reservation()
         db.close()
 
 
@@ -722,6 +795,11 @@ async def send_room_message(
             detail="Добавьте агентов в комнату перед отправкой сообщений",
         )
 
+    orchestration_type = getattr(room, "orchestration_type", None) or "single"
+    # Очередь LLM переполнена — отклоняем до сохранения, а не копим задачи (прогон оркестрации
+    # тоже делает минимум по вызову на агента)
+    _ensure_llm_capacity(len(room.agents))
+
     # Сохраняем сообщение пользователя в комнату (agent_id=None — не конкретному агенту)
     msg = Message(
         room_id=room.id,
@@ -744,8 +822,6 @@ async def send_room_message(
     }
     await broadcast_chat_message(room.id, payload_user)
 
-    orchestration_type = getattr(room, "orchestration_type", None) or "single"
-
     if orchestration_type != "single":
         enqueued = await enqueue_room_run(room.id, data.text, data.sender, room=room)
         if enqueued:
@@ -761,16 +837,7 @@ async def send_room_message(
         logger.warning("Оркестрация не создана (Yandex?), fallback: триггер всех агентов")
 
     # Режим single (или fallback): триггерим ответ от каждого агента
-    for agent in room.agents:
-        asyncio.create_task(
-            _generate_agent_reply_async(
-                room.id,
-                agent.id,
-                agent.name,
-                data.text,
-                data.sender,
-            )
-        )
+    _spawn_agent_replies(room, data.text, data.sender)
     logger.info("Триггер ответов от %d агентов room_id=%s", len(room.agents), room.id)
 
     return MessageOut(
@@ -876,9 +943,10 @@ def update_speed(
     room: Room = Depends(get_room_for_user),
     db: Session = Depends(get_db),
 ):
-    """Изменить скорость симуляции комнаты."""
+    """Изменить скорость симуляции комнаты (применяется и к уже идущему обсуждению)."""
     room.speed = data.speed
     db.commit()
+    apply_room_speed(room.id, room.speed)
     return {"speed": room.speed}
 
 
@@ -899,6 +967,7 @@ async def send_message(
 
     orchestration_type = getattr(room, "orchestration_type", None) or "single"
     logger.info("orchestration_type=%s", orchestration_type)
+    _ensure_llm_capacity(1 if orchestration_type == "single" else len(room.agents))
 
     # Сохраняем сообщение пользователя
     msg = Message(
@@ -940,7 +1009,8 @@ async def send_message(
     # Режим single — ChatService (с обогащением промпта отношениями)
     session_id = f"room_{room.id}_agent_{agent_id}"
     logger.info("LLM запрос session_id=%s agent=%s", session_id, agent.name)
-    agent_response = get_agent_response(agent, session_id, data.text, room=room)
+    async with get_llm_scheduler().slot(f"room_{room.id}"):
+        agent_response = await get_agent_response_async(agent, session_id, data.text, room=room)
     logger.info("LLM ответ получен len=%d: %.80s...", len(agent_response), agent_response[:80] if agent_response else "")
 
     agent_msg = Message(
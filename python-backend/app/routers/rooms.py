@@ -15,7 +15,7 @@ from app.models.message import Message
 from app.models.relationship import Relationship
 from app.models.room import Room
 from app.models.user import User
-from app.services.orchestration_background import registry
+from app.services.orchestration_background import apply_room_speed, invalidate_pipeline_components, registry
 from app.schemas.api import (
     RoomCreateIn,
     RoomOut,
@@ -108,6 +108,9 @@ def update_room(
     room.updated_at = datetime.now(timezone.utc)
     db.commit()
     db.refresh(room)
+    invalidate_pipeline_components(room.id)
+    if data.speed is not None:
+        apply_room_speed(room.id, room.speed)
     return RoomOut.from_room(room)
 
 
@@ -120,6 +123,7 @@ async def delete_room(
     room_id = room.id
     # Остановить оркестрацию
     await registry.stop_room(room_id)
+    invalidate_pipeline_components(room_id)
     # Явно удалить сообщения и события чата (CASCADE может не сработать без PRAGMA foreign_keys)
     db.query(Message).filter(Message.room_id == room_id).delete(synchronize_session=False)
     db.query(Event).filter(Event.room_id == room_id).delete(synchronize_session=False)
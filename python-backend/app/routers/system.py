@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 
 from app.database.sqlite_setup import get_db
@@ -26,8 +27,31 @@ def get_api_usage():
     Лимит задаётся через API_MESSAGE_LIMIT_PER_DAY в .env.
     """
     from app.services.api_usage_limiter import get_usage_stats
+    from app.services.context_memory.async_store import get_memory_executor_stats
+    from app.services.context_memory.embedding_service import get_embedding_service
+    from app.services.orchestration_background import (
+        get_checkpoint_store,
+        get_message_writer,
+        get_pipeline_component_cache,
+        get_pipeline_queue,
+    )
+    from app.services.yandex_client.completion_cache import get_completion_cache
+    from app.services.yandex_client.llm_scheduler import get_llm_scheduler
+    from app.services.yandex_client.resilience import get_llm_resilience
+    from app.services.yandex_client.singleflight import get_llm_singleflight
 
-    return get_usage_stats()
+    stats = get_usage_stats()
+    stats["llmCache"] = get_completion_cache().get_stats()
+    stats["llmScheduler"] = get_llm_scheduler().get_stats()
+    stats["llmSingleFlight"] = get_llm_singleflight().get_stats()
+    stats["llmResilience"] = get_llm_resilience().get_stats()
+    stats["pipelineQueue"] = get_pipeline_queue().get_stats()
+    stats["pipelineComponents"] = get_pipeline_component_cache().get_stats()
+    stats["pipelineCheckpoints"] = get_checkpoint_store().get_stats()
+    stats["messageWriter"] = get_message_writer().get_stats()
+    stats["embeddings"] = get_embedding_service().get_stats()
+    stats["memoryExecutor"] = get_memory_executor_stats()
+    return stats
 
 
 @router.get("/test-chromadb", summary="Проверка ChromaDB")
@@ -77,3 +101,14 @@ def test_chromadb():
             result["hint"] = "NumPy 2.0 несовместим с chromadb<0.5.3. Варианты: pip install numpy==1.26.4 или pip install chromadb>=0.5.3"
 
     return result
+
+
+@router.get("/metrics", summary="Метрики Prometheus", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Метрики в текстовом формате Prometheus: этапы pipeline, вызовы LLM, транзакции БД,
+    рассылки WebSocket, выполняющиеся прогоны.
+    """
+    from app.services.metrics import get_metrics_registry
+
+    return PlainTextResponse(get_metrics_registry().render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,90 @@
+"""
+Стриминг ответов агентов в оркестрации.
+
+Стратегии вызывают chat_service(agent_name, session_id, prompt, context) и получают готовую строку —
+сигнатуру менять нельзя. Поэтому этап discuss включает стриминг через contextvar:
+адаптер видит активный StreamRouter, отдаёт в него фрагменты ответа, а executor
+при публикации итогового Message связывает его с потоком (streamId).
+"""
+import contextvars
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("aigod.orchestration.streaming")
+
+# (stream_id, agent_name, delta); delta=None — поток прерван (ошибка вызова), черновик нужно убрать
+DeltaCallback = Callable[[str, str, Optional[str]], Awaitable[None]]
+
+_current_router: contextvars.ContextVar[Optional["StreamRouter"]] = contextvars.ContextVar(
+    "aigod_stream_router", default=None
+)
+
+
+class StreamRouter:
+    """
+    Потоки ответов одного этапа discuss.
+    begin → push* → finish | abort; claim находит поток для опубликованного Message.
+    """
+
+    def __init__(self, on_delta: DeltaCallback):
+        self.on_delta = on_delta
+        # Завершённые, ещё не привязанные к Message потоки: (stream_id, agent_name, text)
+        self._finished: List[Tuple[str, str, str]] = []
+        self._open: Dict[str, str] = {}
+
+    def begin(self, agent_name: str) -> str:
+        stream_id = uuid.uuid4().hex
+        self._open[stream_id] = agent_name
+        return stream_id
+
+    async def push(self, stream_id: str, delta: str) -> None:
+        agent_name = self._open.get(stream_id)
+        if agent_name is None:
+            return
+        await self.on_delta(stream_id, agent_name, delta)
+
+    def finish(self, stream_id: str, text: str) -> None:
+        agent_name = self._open.pop(stream_id, None)
+        if agent_name is not None:
+            self._finished.append((stream_id, agent_name, (text or "").strip()))
+
+    async def abort(self, stream_id: str) -> None:
+        """Закрыть поток без итогового Message: клиенты получают delta=None и убирают черновик."""
+        agent_name = self._open.pop(stream_id, None)
+        if agent_name is None:
+            return
+        try:
+            await self.on_delta(stream_id, agent_name, None)
+        except Exception as e:
+            logger.warning("stream abort notify failed stream=%s: %s", stream_id, e)
+
+    def claim(self, sender: str, content: str) -> Optional[str]:
+        """
+        streamId для итогового сообщения: сначала по совпадению текста,
+        затем по имени агента (стратегия могла переоформить ответ).
+        """
+        content = (content or "").strip()
+        for i, (stream_id, _, text) in enumerate(self._finished):
+            if text and text == content:
+                del self._finished[i]
+                return stream_id
+        for i, (stream_id, agent_name, _) in enumerate(self._finished):
+            if agent_name == sender:
+                del self._finished[i]
+                return stream_id
+        return None
+
+
+def get_stream_router() -> Optional[StreamRouter]:
+    """Активный StreamRouter текущей задачи (None — стриминг выключен)."""
+    return _current_router.get()
+
+
+def activate_stream_router(router: Optional[StreamRouter]) -> contextvars.Token:
+    """Включить router для текущей задачи. Вернуть токен для deactivate_stream_router."""
+    return _current_router.set(router)
+
+
+def deactivate_stream_router(token: contextvars.Token) -> None:
+    _current_router.reset(token)
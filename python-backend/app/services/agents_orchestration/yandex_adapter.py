@@ -4,13 +4,14 @@ YandexAgentAdapter — адаптер для использования YandexAg
 Как в examples/usage.py: стратегии вызывают chat_service(agent_name, session_id, prompt, context).
 Адаптер усиливает промпт контекстом разговора и передаёт в YandexAgentClient.
 """
-import asyncio
 import logging
 from datetime import datetime
 from typing import Optional
 
 from app.services.agents_orchestration.context import ConversationContext
+from app.services.agents_orchestration.streaming import get_stream_router
 from app.services.prompts import get_system_prompt
+from app.services.yandex_client.llm_scheduler import get_llm_scheduler
 from app.services.yandex_client.yandex_agent_client import YandexAgentClient, Agent
 
 logger = logging.getLogger("aigod.orchestration.yandex_adapter")
@@ -22,10 +23,12 @@ class YandexAgentAdapter:
     Регистрирует агентов по имени и промпту; при вызове добавляет контекст из ConversationContext.
     """
 
-    def __init__(self, client: YandexAgentClient):
+    def __init__(self, client: YandexAgentClient, session_namespace: Optional[str] = None):
         self.client = client
         self.agents: dict[str, Agent] = {}
         self.session_counter = 0
+        # Клиент общий на процесс: namespace (напр. room_5) разводит истории сессий комнат
+        self.session_namespace = session_namespace
 
     def register_agent(self, name: str, prompt: str) -> None:
         """Регистрация агента. Промпт дополняется системными инструкциями."""
@@ -52,11 +55,19 @@ class YandexAgentAdapter:
         session_id: str,
         prompt: str,
         context: Optional[ConversationContext] = None,
+        cache: bool = False,
+        sections: Optional[dict] = None,
     ) -> str:
         """
         Отправка сообщения агенту через YandexAgentClient.
 
         Усиливает промпт контекстом разговора (последние сообщения), как в usage.py.
+        cache=True — детерминированный промпт, ответ может быть взят из кэша (см. completion_cache).
+        sections — секции промпта (memory, relationships, emotions); вместе с контекстом разговора
+        они собираются в клиенте PromptBuilder'ом с бюджетом токенов на секцию.
+
+        Если YandexGPT недоступен (повторы исчерпаны, открыт circuit breaker) — LLMUnavailableError:
+        заглушка «связь пропала» не попадает в обсуждение и синтез, pipeline завершается с ошибкой.
         """
         agent = self.agents.get(agent_name)
         if not agent:
@@ -65,23 +76,42 @@ class YandexAgentAdapter:
 
         ctx_len = len(context.history) if context and context.history else 0
         logger.info("YandexAgentAdapter call agent=%s session=%s prompt_len=%d context_msgs=%d", agent_name, session_id, len(prompt), ctx_len)
+        sections = dict(sections or {})
         if context and context.history:
             recent = context.get_recent_messages(5)
-            context_text = "\n".join([f"{m.sender}: {m.content}" for m in recent])
-            enhanced_prompt = f"""
-Контекст разговора (последние сообщения):
-{context_text}
-
-Текущая задача/запрос:
-{prompt}
-
-Продолжи разговор естественно, учитывая контекст и свою роль.
-"""
+            sections["history"] = "\n".join([f"{m.sender}: {m.content}" for m in recent])
+            enhanced_prompt = f"{prompt}\n\nПродолжи разговор естественно, учитывая контекст и свою роль."
         else:
             enhanced_prompt = prompt
 
         actual_session_id = session_id or self._create_session_id("unknown")
-        response = self.client.send_message(agent, actual_session_id, enhanced_prompt)
+        if self.session_namespace:
+            actual_session_id = f"{self.session_namespace}:{actual_session_id}"
+        router = None if cache else get_stream_router()
+        # Слот планировщика: лимит параллельных вызовов на комнату (namespace) и на процесс
+        async with get_llm_scheduler().slot(self.session_namespace):
+            if router is not None:
+                # Этап discuss со стримингом: фрагменты уходят в WS, пока агент «печатает»
+                stream_id = router.begin(agent_name)
+
+                async def on_delta(delta: str) -> None:
+                    await router.push(stream_id, delta)
+
+                finished = False
+                try:
+                    response = await self.client.send_message_async(
+                        agent, actual_session_id, enhanced_prompt, on_delta=on_delta, sections=sections, fallback=False
+                    )
+                    router.finish(stream_id, response)
+                    finished = True
+                finally:
+                    if not finished:
+                        # Ошибка или отмена: поток не должен висеть у клиентов без итогового message
+                        await router.abort(stream_id)
+            else:
+                response = await self.client.send_message_async(
+                    agent, actual_session_id, enhanced_prompt, cache=cache, sections=sections, fallback=False
+                )
+        # Темп разговора задаёт PacingController executor'а — здесь искусственной паузы нет
         logger.info("YandexAgentAdapter response agent=%s len=%d", agent_name, len(response) if response else 0)
-        await asyncio.sleep(0.5)
         return response
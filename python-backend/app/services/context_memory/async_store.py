@@ -0,0 +1,138 @@
+"""
+Асинхронный доступ к векторной памяти комнат.
+
+VectorMemoryStore / NumpyVectorStore синхронны: add_memory и search_memory считают
+эмбеддинги и ходят в ChromaDB или memmap. MemoryManager вызывал их прямо из корутин —
+на этапах RETRIEVE_MEMORY, STORE_MEMORY и в каждом вызове _RelationshipEnhancingAdapter
+event loop замирал на всё время эмбеддинга, вместе с WebSocket и pipeline других комнат.
+
+AsyncVectorStore выполняет операции хранилища в выделенном пуле потоков ограниченного
+размера (MEMORY_EXECUTOR_WORKERS) — отдельно от LLM-пула и дефолтного executor.
+Хранилища не потокобезопасны, поэтому операции над одним хранилищем сериализуются его
+замком; разные комнаты работают параллельно, а их эмбеддинги батчит общий EmbeddingService.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.config import config
+
+from .models import MemoryItem, MemoryType
+
+logger = logging.getLogger("aigod.memory")
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "inflight": 0, "errors": 0, "busySeconds": 0.0}
+
+
+def get_memory_executor() -> ThreadPoolExecutor:
+    """Пул потоков для операций векторной памяти (создаётся лениво, один на процесс)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = max(1, config.MEMORY_EXECUTOR_WORKERS)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="memory")
+                logger.info("memory_executor создан workers=%d", workers)
+    return _executor
+
+
+def shutdown_memory_executor(wait: bool = False) -> None:
+    """Остановить пул (при shutdown приложения)."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def get_memory_executor_stats() -> dict:
+    with _stats_lock:
+        return {
+            **_stats,
+            "busySeconds": round(_stats["busySeconds"], 3),
+            "workers": max(1, config.MEMORY_EXECUTOR_WORKERS),
+        }
+
+
+class AsyncVectorStore:
+    """Async-обёртка над синхронным векторным хранилищем (VectorMemoryStore, NumpyVectorStore)."""
+
+    def __init__(self, store: Any, executor: Optional[ThreadPoolExecutor] = None):
+        self.store = store
+        self._executor = executor
+        self._lock = threading.Lock()
+
+    def _call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with _stats_lock:
+            _stats["inflight"] += 1
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                return func(*args, **kwargs)
+        except Exception:
+            with _stats_lock:
+                _stats["errors"] += 1
+            raise
+        finally:
+            with _stats_lock:
+                _stats["calls"] += 1
+                _stats["inflight"] -= 1
+                _stats["busySeconds"] += time.perf_counter() - started
+
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        executor = self._executor or get_memory_executor()
+        return await loop.run_in_executor(executor, functools.partial(self._call, func, *args, **kwargs))
+
+    async def add_memory(self, memory: MemoryItem) -> str:
+        return await self._run(self.store.add_memory, memory)
+
+    async def add_memories(self, memories: List[MemoryItem]) -> List[str]:
+        return await self._run(self.store.add_memories, memories)
+
+    async def search_memory(self,
+                            query: str,
+                            n_results: int = 5,
+                            memory_type: Optional[MemoryType] = None,
+                            min_importance: Optional[str] = None,
+                            time_range: Optional[Tuple[datetime, datetime]] = None) -> List[Dict]:
+        return await self._run(
+            self.store.search_memory,
+            query=query,
+            n_results=n_results,
+            memory_type=memory_type,
+            min_importance=min_importance,
+            time_range=time_range,
+        )
+
+    async def get_relevant_context(self, query: str, **kwargs: Any) -> List[MemoryItem]:
+        return await self._run(self.store.get_relevant_context, query, **kwargs)
+
+    async def delete_memory(self, memory_id: str) -> None:
+        await self._run(self.store.delete_memory, memory_id)
+
+    async def delete_old_memories(self, days: int = 30) -> None:
+        await self._run(self.store.delete_old_memories, days)
+
+    async def count(self) -> int:
+        return await self._run(self.store.count)
+
+    async def add_and_count(self, memory: MemoryItem) -> int:
+        """Добавить и вернуть размер хранилища за один переход в пул."""
+        def add() -> int:
+            self.store.add_memory(memory)
+            return self.store.count()
+        return await self._run(add)
+
+    def get_stats(self) -> Dict:
+        return self.store.get_stats()
@@ -35,23 +35,21 @@ class ContextCompressor:
         scored_messages.sort(key=lambda x: x[0], reverse=True)
         
         # Оставляем только важные сообщения
-        important_messages = []
-        important_scores = []
+        important = set()
         tokens_used = 0
         
         for score, msg, tokens in scored_messages:
             if tokens_used + tokens <= context_window.max_tokens * 0.7:  # 70% для важных
-                important_messages.append(msg)
-                important_scores.append(score)
+                important.add(id(msg))
                 tokens_used += tokens
             else:
                 break
         
         # Остальное отправляем на суммаризацию
-        if len(important_messages) < len(context_window.messages):
+        if len(important) < len(context_window.messages):
             # Создаём чанк для суммаризации
             chunk = self._create_summary_chunk(
-                context_window.messages,
+                list(context_window.messages),
                 context_window
             )
             
@@ -60,8 +58,8 @@ class ContextCompressor:
                 import asyncio
                 asyncio.create_task(self._summarize_and_update(chunk, context_window))
         
-        # Обновляем окно
-        context_window.messages = important_messages
+        # Обновляем окно: важные сообщения в хронологическом порядке, токены пересчитаны
+        context_window.retain(lambda msg: id(msg) in important)
         
         return context_window
     
@@ -78,7 +76,7 @@ class ContextCompressor:
             # Недавние сообщения важнее
             time_factor = 1.0
             if 'timestamp' in msg:
-                age = (datetime.now() - msg['timestamp']).seconds
+                age = (datetime.now() - msg['timestamp']).total_seconds()
                 time_factor = max(0.5, 1.0 - (age / 3600))  # за час важность падает до 0.5
             
             # Сообщения с вопросами важнее
@@ -149,9 +147,11 @@ class ContextCompressor:
                            query: str,
                            recent_messages: List[Dict],
                            vector_memories: List[MemoryItem],
-                           max_tokens: int) -> str:
+                           max_tokens: int,
+                           summaries: Optional[List] = None) -> str:
         """
-        Получить оптимальный контекст для промпта
+        Получить оптимальный контекст для промпта.
+        summaries — сводки контекстного окна (ContextWindow.summaries).
         """
         parts = []
         tokens_used = 0
@@ -175,8 +175,8 @@ class ContextCompressor:
                 tokens_used += tokens
         
         # 3. Суммаризации если есть место
-        if hasattr(context_window, 'summaries') and tokens_used < max_tokens:
-            for summary in context_window.summaries[-2:]:  # последние 2
+        if summaries and tokens_used < max_tokens:
+            for summary in summaries[-2:]:  # последние 2
                 summary_tokens = summary.token_count
                 if tokens_used + summary_tokens <= max_tokens:
                     parts.append(f"[Сводка] {summary.content}")
@@ -0,0 +1,306 @@
+"""
+Общий на процесс сервис эмбеддингов.
+
+Раньше каждая VectorMemoryStore комнаты (room_memory_{id}), память агентов YandexAgentClient
+и детектор сходимости создавали свою SentenceTransformerEmbeddingFunction — модель грузилась
+в память столько раз, сколько комнат, и каждый текст считался отдельным вызовом.
+
+EmbeddingService:
+- модель загружается один раз (лениво, при первом эмбеддинге): sentence-transformers, если
+  установлен, иначе HashingEmbedder — без сети и тяжёлых зависимостей;
+- LRU-кэш векторов по хэшу содержимого: повторные тексты (теги, запросы памяти, одинаковые
+  реплики в разных комнатах) не пересчитываются;
+- микро-батчинг: промахи всех потоков складываются в общую очередь, модель за раз считает всё
+  накопленное (до max_batch). Пока идёт один батч, следующие запросы копятся и уходят следующим
+  одним вызовом; при нескольких одновременных вызывающих лидер ещё ждёт batch_window, чтобы
+  соседи успели дописаться. Одиночный вызов не ждёт ничего.
+Одинаковые тексты, уже стоящие в очереди или считающиеся, не дублируются.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .embeddings import HashingEmbedder
+
+logger = logging.getLogger("aigod.memory.embeddings")
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _content_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingService:
+    """Эмбеддинг текстов: embed(["текст", ...]) -> float32 матрица (len(texts), dim)."""
+
+    def __init__(
+        self,
+        backend: str = "auto",
+        model_name: str = DEFAULT_MODEL,
+        hashing_dim: int = 256,
+        batch_window: float = 0.005,
+        max_batch: int = 64,
+        cache_size: int = 4096,
+        encoder: Optional[Callable[[List[str]], np.ndarray]] = None,
+        dim: Optional[int] = None,
+    ):
+        """
+        backend: auto | sentence-transformers | hashing.
+        encoder/dim — готовая функция эмбеддинга вместо загрузки модели (тесты, бенчмарки).
+        """
+        self.requested_backend = backend
+        self.model_name = model_name
+        self.hashing_dim = hashing_dim
+        self.batch_window = max(0.0, batch_window)
+        self.max_batch = max(1, max_batch)
+        self.cache_size = max(0, cache_size)
+
+        self._encoder = encoder
+        self._dim = dim
+        self.backend = "custom" if encoder is not None else None
+        self._load_lock = threading.Lock()
+
+        # _lock — кэш, очередь и статистика; _model_lock — один батч модели за раз
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._pending: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._inflight: Dict[bytes, Future] = {}
+        self._active = 0
+        self.stats = {
+            "requests": 0,
+            "texts": 0,
+            "cacheHits": 0,
+            "coalesced": 0,
+            "encoded": 0,
+            "batches": 0,
+            "maxBatch": 0,
+            "errors": 0,
+        }
+
+    # --- модель ---
+
+    def _load(self) -> None:
+        if self._encoder is not None:
+            return
+        with self._load_lock:
+            if self._encoder is not None:
+                return
+            if self.requested_backend in ("auto", "sentence-transformers"):
+                try:
+                    from sentence_transformers import SentenceTransformer
+
+                    started = time.perf_counter()
+                    model = SentenceTransformer(self.model_name)
+                    self._dim = model.get_sentence_embedding_dimension()
+                    self.backend = "sentence-transformers"
+                    self._encoder = lambda texts: model.encode(texts, convert_to_numpy=True)
+                    logger.info(
+                        "embeddings: модель %s загружена за %.1f с (dim=%s)",
+                        self.model_name, time.perf_counter() - started, self._dim,
+                    )
+                    return
+                except Exception as e:
+                    logger.warning("embeddings: sentence-transformers недоступен (%s) — HashingEmbedder", e)
+            hashing = HashingEmbedder(self.hashing_dim)
+            self._dim = hashing.dim
+            self.backend = "hashing"
+            self._encoder = hashing
+
+    @property
+    def dim(self) -> int:
+        self._load()
+        if self._dim is None:
+            self._dim = int(np.asarray(self._encoder([""])).shape[-1])
+        return self._dim
+
+    @property
+    def semantic(self) -> bool:
+        """Настоящая смысловая модель, а не хэширование слов."""
+        self._load()
+        return self.backend != "hashing"
+
+    # --- эмбеддинг ---
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Векторы текстов (копия — вызывающий может её менять). Потокобезопасен."""
+        texts = [t or "" for t in texts]
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        keys = [_content_key(t) for t in texts]
+        rows: List[Optional[np.ndarray]] = [None] * len(texts)
+        waits: Dict[bytes, Future] = {}
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["texts"] += len(texts)
+            for i, (key, text) in enumerate(zip(keys, texts)):
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    self.stats["cacheHits"] += 1
+                    rows[i] = vector
+                    continue
+                if key in waits:
+                    continue
+                queued = self._pending.get(key)
+                future = queued[1] if queued else self._inflight.get(key)
+                if future is None:
+                    future = Future()
+                    self._pending[key] = (text, future)
+                else:
+                    self.stats["coalesced"] += 1
+                waits[key] = future
+            if waits:
+                self._active += 1
+        if waits:
+            try:
+                self._drain(waits.values())
+            finally:
+                with self._lock:
+                    self._active -= 1
+            for i, key in enumerate(keys):
+                if rows[i] is None:
+                    rows[i] = waits[key].result()
+        return np.stack(rows)
+
+    __call__ = embed
+
+    async def embed_async(self, texts: Sequence[str]) -> np.ndarray:
+        """embed в пуле потоков: не блокирует event loop, одновременные вызовы комнат батчатся."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed, list(texts))
+
+    def _drain(self, futures) -> None:
+        """Считать очередь батчами, пока не готовы все нужные вызывающему векторы."""
+        self._load()
+        while not all(f.done() for f in futures):
+            with self._model_lock:
+                if all(f.done() for f in futures):
+                    return
+                with self._lock:
+                    crowded = self._active > 1 and len(self._pending) < self.max_batch
+                if crowded and self.batch_window:
+                    time.sleep(self.batch_window)
+                with self._lock:
+                    batch = []
+                    while self._pending and len(batch) < self.max_batch:
+                        key, (text, future) = self._pending.popitem(last=False)
+                        self._inflight[key] = future
+                        batch.append((key, text, future))
+                self._encode_batch(batch)
+
+    def _encode_batch(self, batch: list) -> None:
+        if not batch:
+            return
+        try:
+            matrix = np.asarray(self._encoder([text for _, text, _ in batch]), dtype=np.float32)
+            matrix = matrix.reshape(len(batch), -1)
+        except Exception as e:
+            logger.warning("embeddings: батч из %s текстов не посчитан: %s", len(batch), e)
+            with self._lock:
+                self.stats["errors"] += 1
+                for key, _, future in batch:
+                    self._inflight.pop(key, None)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["encoded"] += len(batch)
+            self.stats["maxBatch"] = max(self.stats["maxBatch"], len(batch))
+            for row, (key, _, future) in enumerate(batch):
+                vector = matrix[row].copy()
+                vector.flags.writeable = False
+                self._inflight.pop(key, None)
+                if self.cache_size:
+                    self._cache[key] = vector
+                    self._cache.move_to_end(key)
+                future.set_result(vector)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- адаптеры ---
+
+    def chroma_function(self):
+        """
+        Функция эмбеддингов в формате ChromaDB (embedding_function коллекции).
+
+        Только для смысловой модели: её векторы совпадают с SentenceTransformerEmbeddingFunction
+        той же модели, поэтому адаптер представляется ChromaDB тем же именем — сохранённые
+        коллекции открываются (chromadb >= 0.5.3 сверяет имя функции). Хэширование слов даёт
+        векторы другой размерности — для ChromaDB его подставлять нельзя, здесь None.
+        """
+        if not self.semantic:
+            return None
+        return _ChromaEmbeddingFunction(self)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            texts = self.stats["texts"]
+            batches = self.stats["batches"]
+            return {
+                **self.stats,
+                "backend": self.backend,
+                "model": self.model_name if self.backend == "sentence-transformers" else None,
+                "dim": self._dim,
+                "cacheSize": len(self._cache),
+                "cacheHitRate": round(self.stats["cacheHits"] / texts, 3) if texts else 0.0,
+                "avgBatch": round(self.stats["encoded"] / batches, 2) if batches else 0.0,
+            }
+
+
+class _ChromaEmbeddingFunction:
+    """
+    EmbeddingFunction для ChromaDB поверх общего сервиса (сигнатура __call__(input)).
+    Имя и конфигурация — как у SentenceTransformerEmbeddingFunction: векторы те же.
+    """
+
+    def __init__(self, service: EmbeddingService):
+        self._service = service
+
+    def __call__(self, input):
+        return [vector.tolist() for vector in self._service.embed(list(input))]
+
+    @staticmethod
+    def name() -> str:
+        return "sentence_transformer"
+
+    def get_config(self) -> dict:
+        return {"model_name": self._service.model_name, "device": "cpu", "normalize_embeddings": False, "kwargs": {}}
+
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Сервис эмбеддингов на процесс (создаётся лениво из config; модель — при первом вызове)."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                from app.config import config
+
+                _service = EmbeddingService(
+                    backend=config.EMBEDDING_BACKEND,
+                    model_name=config.EMBEDDING_MODEL,
+                    hashing_dim=config.VECTOR_EMBED_DIM,
+                    batch_window=config.EMBEDDING_BATCH_WINDOW_MS / 1000,
+                    max_batch=config.EMBEDDING_MAX_BATCH,
+                    cache_size=config.EMBEDDING_CACHE_SIZE,
+                )
+    return _service
+
+
+def reset_embedding_service() -> None:
+    """Сбросить сервис (тесты, смена настроек)."""
+    global _service
+    with _service_lock:
+        _service = None
@@ -0,0 +1,47 @@
+"""
+Локальные эмбеддинги без внешних моделей.
+
+HashingEmbedder — feature hashing слов и символьных триграмм в вектор фиксированной
+размерности (float32, L2-нормированный). Не требует сети, sentence-transformers и chromadb;
+похожие по словам и их формам тексты дают близкие векторы — достаточно для поиска по
+памяти комнаты, когда ChromaDB недоступен. Хэш — crc32, а не hash(): векторы должны
+совпадать между процессами, иначе сохранённый индекс после рестарта не найдёт ничего.
+"""
+import re
+import zlib
+from typing import List, Sequence
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Вес триграмм относительно целого слова
+NGRAM_WEIGHT = 0.5
+
+
+class HashingEmbedder:
+    """Эмбеддинг текстов: embed(["текст", ...]) -> float32 матрица (len(texts), dim)."""
+
+    def __init__(self, dim: int = 256):
+        if dim <= 0:
+            raise ValueError("dim должен быть положительным")
+        self.dim = dim
+
+    def _features(self, text: str) -> List[tuple]:
+        features = []
+        for word in _WORD_RE.findall((text or "").lower()):
+            features.append((word, 1.0))
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                features.append((padded[i:i + 3], NGRAM_WEIGHT))
+        return features
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                # Старший бит — знак: коллизии хэшей в среднем гасят друг друга
+                matrix[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
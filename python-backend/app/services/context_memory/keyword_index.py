@@ -0,0 +1,91 @@
+"""
+Инкрементальный инвертированный индекс с ранжированием BM25.
+
+MemoryManager.search_memory на каждый запрос заново разбивал на слова все элементы
+краткосрочной памяти и считал «сырое» пересечение слов — O(элементов × слов), и так
+несколько раз за ход агента. Здесь текст токенизируется один раз при добавлении,
+постинги удаляются вместе с элементом, а поиск стоит O(слов запроса × постингов).
+"""
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Hashable, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова текста в нижнем регистре (без пунктуации)."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class KeywordIndex:
+    """
+    Индекс документов doc_id -> текст с поиском BM25.
+
+    k1 — насыщение частоты термина, b — нормировка по длине документа (стандартные 1.5 / 0.75).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = {}
+        self._terms: Dict[Hashable, Counter] = {}
+        self._lengths: Dict[Hashable, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._terms
+
+    def add(self, doc_id: Hashable, text: str) -> None:
+        """Проиндексировать документ (повторное добавление заменяет прежний текст)."""
+        if doc_id in self._terms:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        terms = Counter(tokens)
+        self._terms[doc_id] = terms
+        self._lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id: Hashable) -> None:
+        terms = self._terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self._postings[term]
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._terms.clear()
+        self._lengths.clear()
+        self._total_length = 0
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        """Документы с хотя бы одним словом запроса: [(doc_id, score)] по убыванию score."""
+        n_docs = len(self._terms)
+        if not n_docs:
+            return []
+        avg_length = self._total_length / n_docs or 1.0
+        scores: Dict[Hashable, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        if limit is not None:
+            return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
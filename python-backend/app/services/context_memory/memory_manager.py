@@ -2,7 +2,10 @@
 Менеджер памяти - координация между краткосрочной и долгосрочной памятью
 """
 import asyncio
-from typing import List, Dict, Optional, Any, Callable
+import heapq
+import itertools
+from collections import deque
+from typing import Deque, List, Dict, Optional, Any, Callable, Tuple
 from datetime import datetime, timedelta
 import uuid
 
@@ -22,7 +25,9 @@ try:
     from .vector_store import VectorMemoryStore
 except Exception:
     VectorMemoryStore = None  # type: ignore
+from .async_store import AsyncVectorStore
 from .compression import ContextCompressor
+from .keyword_index import KeywordIndex
 
 class MemoryManager:
     """
@@ -32,17 +37,31 @@ class MemoryManager:
     def __init__(self,
                  vector_store: Optional[Any] = None,
                  summarizer: Optional[Any] = None,
-                 conversation_id: str = "default"):
+                 conversation_id: str = "default",
+                 max_short_term: Optional[int] = None,
+                 max_context_messages: Optional[int] = None):
+        from app.config import config
         
         self.vector_store = vector_store
+        self._long_term: Optional[AsyncVectorStore] = None
         self.summarizer = summarizer
         self.conversation_id = conversation_id
         
-        # Краткосрочная память (текущий контекст)
-        self.short_term: List[MemoryItem] = []
+        # Краткосрочная память (текущий контекст): кольцевой буфер, старейшее вытесняется за O(1)
+        self.max_short_term = max_short_term or config.MEMORY_SHORT_TERM_MAX_ITEMS
+        self.short_term: Deque[MemoryItem] = deque()
+        # Инвертированный индекс краткосрочной памяти (BM25): id -> элемент и постинги слов
+        self._short_term_by_id: Dict[str, MemoryItem] = {}
+        self._keyword_index = KeywordIndex()
+        # Мин-куча сроков жизни (момент истечения, порядковый номер, id) — истечение без обхода всего буфера
+        self._expiry_heap: List[Tuple[datetime, int, str]] = []
+        self._expiry_seq = itertools.count()
         
         # Контекстное окно
-        self.context_window = ContextWindow(max_tokens=4000)  # 4K токенов
+        self.context_window = ContextWindow(
+            max_tokens=4000,  # 4K токенов
+            max_messages=max_context_messages or config.MEMORY_CONTEXT_MAX_MESSAGES,
+        )
         
         # Компрессор
         self.compressor = ContextCompressor(summarizer)
@@ -62,6 +81,15 @@ class MemoryManager:
         self._maintenance_task = None
         self._running = False
     
+    @property
+    def long_term(self) -> Optional[AsyncVectorStore]:
+        """Async-доступ к vector_store: операции уходят в пул памяти, а не в event loop"""
+        if not self.vector_store:
+            return None
+        if self._long_term is None or self._long_term.store is not self.vector_store:
+            self._long_term = AsyncVectorStore(self.vector_store)
+        return self._long_term
+
     def on_memory_update(self, callback: Callable[[MemoryItem], None]):
         """Подписаться на обновления памяти"""
         self.callbacks.append(callback)
@@ -104,7 +132,13 @@ class MemoryManager:
         )
         
         # Добавляем в краткосрочную память
+        self._prune_expired()
+        if len(self.short_term) >= self.max_short_term:
+            self._forget(self.short_term.popleft())
         self.short_term.append(memory)
+        self._short_term_by_id[memory.id] = memory
+        self._keyword_index.add(memory.id, content)
+        self._schedule_expiry(memory)
         self.stats["short_term_items"] = len(self.short_term)
         
         # Добавляем в контекстное окно
@@ -146,8 +180,7 @@ class MemoryManager:
         memory.ttl = None  # бессрочно
         
         # Сохраняем в векторное хранилище
-        self.vector_store.add_memory(memory)
-        self.stats["long_term_items"] = self.vector_store.collection.count()
+        self.stats["long_term_items"] = await self.long_term.add_and_count(memory)
     
     async def compress_context(self):
         """
@@ -158,9 +191,49 @@ class MemoryManager:
         self.stats["context_compressions"] += 1
         
         # Удаляем старые элементы из краткосрочной памяти
-        self.short_term = [m for m in self.short_term if not m.is_expired()]
-        self.stats["short_term_items"] = len(self.short_term)
+        self._prune_expired()
     
+    def _schedule_expiry(self, memory: MemoryItem):
+        deadline = memory.expires_at()
+        if deadline is not None:
+            heapq.heappush(self._expiry_heap, (deadline, next(self._expiry_seq), memory.id))
+
+    def _forget(self, memory: MemoryItem):
+        """Убрать элемент из индексов краткосрочной памяти (из буфера его убирает вызывающий)"""
+        self._short_term_by_id.pop(memory.id, None)
+        self._keyword_index.remove(memory.id)
+
+    def _prune_expired(self, now: Optional[datetime] = None):
+        """
+        Убрать истёкшие элементы краткосрочной памяти вместе с их постингами.
+        Просматривается только вершина кучи сроков: O(истёкших × log n), а не весь буфер.
+        """
+        now = now or datetime.now()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            _, _, memory_id = heapq.heappop(heap)
+            memory = self._short_term_by_id.get(memory_id)
+            if memory is None:
+                continue  # уже вытеснен из буфера
+            deadline = memory.expires_at()
+            if deadline is not None and deadline > now:
+                # Срок продлили (ttl/timestamp изменились) — переставляем
+                heapq.heappush(heap, (deadline, next(self._expiry_seq), memory_id))
+                continue
+            if deadline is None:
+                continue  # стал бессрочным
+            # Сроки в порядке добавления — истёкший почти всегда в начале буфера
+            if self.short_term and self.short_term[0] is memory:
+                self.short_term.popleft()
+            else:
+                self.short_term.remove(memory)
+            self._forget(memory)
+        # Записи вытесненных элементов копятся в куче до своего срока — перестраиваем
+        if len(heap) > 2 * len(self.short_term) + 64:
+            self._expiry_heap = [entry for entry in heap if entry[2] in self._short_term_by_id]
+            heapq.heapify(self._expiry_heap)
+        self.stats["short_term_items"] = len(self.short_term)
+
     async def search_memory(self, 
                            query: str,
                            include_short_term: bool = True,
@@ -173,19 +246,13 @@ class MemoryManager:
         
         # Поиск в краткосрочной
         if include_short_term:
-            # Простой поиск по ключевым словам
-            query_words = set(query.lower().split())
-            for mem in self.short_term:
-                mem_words = set(mem.content.lower().split())
-                overlap = len(query_words & mem_words)
-                if overlap > 0:
-                    results.append((overlap, mem))
-            
-            results.sort(key=lambda x: x[0], reverse=True)
+            # Поиск по ключевым словам: BM25 по инвертированному индексу
+            for memory_id, score in self._keyword_index.search(query, limit=n_results):
+                results.append((score, self._short_term_by_id[memory_id]))
         
         # Поиск в долгосрочной
         if include_long_term and self.vector_store:
-            vector_results = self.vector_store.search_memory(
+            vector_results = await self.long_term.search_memory(
                 query=query,
                 n_results=n_results
             )
@@ -234,9 +301,10 @@ class MemoryManager:
         memories = await self.search_memory(query=query, n_results=5)
         return self.compressor.get_optimal_context(
             query=query,
-            recent_messages=self.context_window.messages[-20:],
+            recent_messages=self.context_window.recent(20),
             vector_memories=memories,
             max_tokens=max_tokens,
+            summaries=self.context_window.summaries,
         )
     
     async def create_summary(self, chunk_size: int = 50) -> Optional[Summary]:
@@ -247,7 +315,7 @@ class MemoryManager:
             return None
         
         # Берём последние сообщения
-        messages = self.context_window.messages[-chunk_size:]
+        messages = self.context_window.recent(chunk_size)
         
         # Создаём чанк
         from .models import ConversationChunk
@@ -294,7 +362,7 @@ class MemoryManager:
             await asyncio.sleep(300)  # каждые 5 минут
             
             # Очищаем старые краткосрочные воспоминания
-            self.short_term = [m for m in self.short_term if not m.is_expired()]
+            self._prune_expired()
             
             # Проверяем, не пора ли создать сводку
             if len(self.context_window.messages) > 100:
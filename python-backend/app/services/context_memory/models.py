@@ -6,7 +6,9 @@ import math
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any, Union
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import deque
+from itertools import islice
 import uuid
 
 class MemoryType(str, Enum):
@@ -57,10 +59,17 @@ class MemoryItem:
             "participants": self.participants
         }
     
+    def expires_at(self) -> Optional[datetime]:
+        """Момент истечения срока жизни (None — бессрочно)"""
+        if self.ttl:
+            return self.timestamp + timedelta(seconds=self.ttl)
+        return None
+
     def is_expired(self) -> bool:
         """Проверить, истёк ли срок жизни"""
         if self.ttl:
-            age = (datetime.now() - self.timestamp).seconds
+            # total_seconds, а не .seconds: у timedelta это лишь остаток без дней
+            age = (datetime.now() - self.timestamp).total_seconds()
             return age > self.ttl
         return False
 
@@ -134,19 +143,47 @@ class MemoryStats:
 
 @dataclass
 class ContextWindow:
-    """Текущее окно контекста"""
+    """
+    Текущее окно контекста.
+
+    messages — кольцевой буфер: при max_messages самое старое сообщение вытесняется за O(1),
+    current_tokens — бегущая сумма токенов сообщений в окне (с учётом вытеснений и сжатия).
+    """
     max_tokens: int
     current_tokens: int = 0
-    messages: List[Dict] = field(default_factory=list)
+    messages: deque = field(default_factory=deque)
     summaries: List[Summary] = field(default_factory=list)
+    max_messages: Optional[int] = None
+    _token_counts: deque = field(default_factory=deque, repr=False)
+
+    def __post_init__(self):
+        self.messages = deque(self.messages)
+        if len(self._token_counts) != len(self.messages):
+            self._token_counts = deque(int(len(m.get('content', '').split()) * 1.3) for m in self.messages)
+            self.current_tokens = sum(self._token_counts)
     
     def add_message(self, message: Dict, tokens: int):
         """Добавить сообщение"""
+        if self.max_messages and len(self.messages) >= self.max_messages:
+            self.messages.popleft()
+            self.current_tokens -= self._token_counts.popleft()
         self.messages.append(message)
+        self._token_counts.append(tokens)
         self.current_tokens += tokens
         
         # Если превысили лимит, нужно сжимать
         return self.current_tokens > self.max_tokens
+
+    def recent(self, n: int) -> List[Dict]:
+        """Последние n сообщений (в хронологическом порядке)"""
+        return list(islice(self.messages, max(0, len(self.messages) - n), None))
+
+    def retain(self, keep) -> None:
+        """Оставить сообщения, для которых keep(message) истинно, сохранив порядок и токены"""
+        kept = [(m, t) for m, t in zip(self.messages, self._token_counts) if keep(m)]
+        self.messages = deque(m for m, _ in kept)
+        self._token_counts = deque(t for _, t in kept)
+        self.current_tokens = sum(self._token_counts)
     
     def get_context(self) -> str:
         """Получить контекст для промпта"""
@@ -162,7 +199,7 @@ class ContextWindow:
         # Потом последние сообщения
         if self.messages:
             parts.append("=== Текущий разговор ===")
-            for msg in self.messages[-10:]:  # последние 10 сообщений
+            for msg in self.recent(10):  # последние 10 сообщений
                 parts.append(f"{msg['sender']}: {msg['content']}")
         
         return "\n".join(parts)
@@ -0,0 +1,422 @@
+"""
+Векторное хранилище памяти на NumPy — замена ChromaDB там, где его нет.
+
+requirements-docker.txt не включает chromadb, и в контейнерах get_memory_integration
+работал с vector_store=None — долгосрочной памяти не было вовсе. NumpyVectorStore реализует
+интерфейс VectorMemoryStore (add_memory, add_memories, search_memory, delete_memory,
+get_relevant_context) в процессе:
+
+- векторы — float32 матрица (capacity × dim), файл vectors.f32 отображается в память (np.memmap);
+  при заполнении ёмкость удваивается;
+- метаданные — журнал records.jsonl: строка на добавление, надгробие на удаление; при загрузке
+  журнал проигрывается, а если удалённых больше половины — файлы уплотняются;
+- поиск — точный косинус: векторы нормированы при записи, запрос — одно умножение матрицы на
+  вектор; фильтры по типу, важности и времени — маски по параллельным массивам метаданных;
+- meta.json — чем построены векторы (dim, backend, model). Если при загрузке эмбеддер другой
+  (появился sentence-transformers, сменилась модель или размерность) или meta.json нет,
+  векторы пересчитываются из текстов журнала: чтение матрицы чужой размерности портило поиск.
+
+Без directory хранилище живёт только в памяти процесса (тесты, временные комнаты).
+"""
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .embeddings import HashingEmbedder
+from .models import ImportanceLevel, MemoryItem, MemoryType
+
+logger = logging.getLogger("aigod.memory.numpy_store")
+
+IMPORTANCE_ORDER = ["trivial", "low", "medium", "high", "critical"]
+_TYPE_CODES = {t.value: i for i, t in enumerate(MemoryType)}
+INITIAL_CAPACITY = 256
+
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.jsonl"
+META_FILE = "meta.json"
+REEMBED_BATCH = 256
+
+
+class NumpyVectorStore:
+    """Хранилище векторной памяти: float32 матрица в memmap-файле и точный косинусный поиск."""
+
+    def __init__(
+        self,
+        collection_name: str = "agent_memory",
+        directory: Optional[str] = None,
+        embed: Optional[Callable[[Sequence[str]], Any]] = None,
+        dim: int = 256,
+    ):
+        self.collection_name = collection_name
+        self.directory = directory
+        self.embed = embed or HashingEmbedder(dim)
+        self.dim = getattr(self.embed, "dim", dim)
+
+        self._records: List[Dict[str, Any]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._size = 0
+        self._capacity = 0
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        # Параллельные массивы для фильтров: живая строка, тип, ранг важности, время (unix)
+        self._alive = np.zeros(0, dtype=bool)
+        self._type = np.zeros(0, dtype=np.int8)
+        self._importance = np.zeros(0, dtype=np.int8)
+        self._ts = np.zeros(0, dtype=np.float64)
+
+        self.stats = {"total_vectors": 0, "queries": 0, "adds": 0, "deletes": 0, "reembedded": 0}
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+        else:
+            self._grow(INITIAL_CAPACITY)
+
+    # --- Хранение ---
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, VECTORS_FILE)
+
+    @property
+    def _records_path(self) -> str:
+        return os.path.join(self.directory, RECORDS_FILE)
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, META_FILE)
+
+    def _embedding_meta(self) -> Dict[str, Any]:
+        """Чем строятся векторы: размерность, бэкенд и модель эмбеддера."""
+        if isinstance(self.embed, HashingEmbedder):
+            backend = "hashing"
+        else:
+            backend = getattr(self.embed, "backend", None) or type(self.embed).__name__
+        model = getattr(self.embed, "model_name", None) if backend == "sentence-transformers" else None
+        return {"dim": self.dim, "backend": backend, "model": model}
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self._meta_path):
+            return None
+        try:
+            with open(self._meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("numpy_store %s: meta.json не читается: %s", self.collection_name, e)
+            return None
+
+    def _write_meta(self) -> None:
+        with open(self._meta_path, "w", encoding="utf-8") as f:
+            json.dump(self._embedding_meta(), f)
+
+    def _grow(self, capacity: int) -> None:
+        """Увеличить ёмкость матрицы и массивов метаданных до capacity строк."""
+        old = self._vectors[: self._size]
+        if self.directory:
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+                del self._vectors
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * self.dim * 4)
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        else:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            vectors[: self._size] = old
+            self._vectors = vectors
+        for name in ("_alive", "_type", "_importance", "_ts"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[: self._size] = array[: self._size]
+            setattr(self, name, grown)
+        self._capacity = capacity
+
+    def _load(self) -> None:
+        records: List[Dict[str, Any]] = []
+        deleted = set()
+        if os.path.exists(self._records_path):
+            with open(self._records_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry.get("op") == "delete":
+                        deleted.add(entry["row"])
+                    else:
+                        records.append(entry)
+        meta, expected = self._read_meta(), self._embedding_meta()
+        if records and meta != expected:
+            alive = [record for row, record in enumerate(records) if row not in deleted]
+            logger.warning(
+                "numpy_store %s: векторы построены %s, эмбеддер %s — пересчёт %d записей",
+                self.collection_name, meta or "неизвестно чем", expected, len(alive),
+            )
+            self._reembed(alive)
+            return
+        if meta != expected:
+            self._write_meta()
+        # Строка журнала — точка фиксации: векторы дальше последней записи не считаются
+        rows = len(records)
+        vector_rows = os.path.getsize(self._vectors_path) // (self.dim * 4) if os.path.exists(self._vectors_path) else 0
+        if vector_rows < rows:
+            logger.warning("numpy_store %s: векторов %d < записей %d — хвост журнала отброшен", self.collection_name, vector_rows, rows)
+            records = records[:vector_rows]
+            rows = vector_rows
+        self._grow(max(INITIAL_CAPACITY, _next_pow2(rows)))
+        for row, record in enumerate(records):
+            self._index_record(row, record, alive=row not in deleted)
+        self._size = rows
+        self.stats["total_vectors"] = self.count()
+        if deleted and len(deleted) * 2 > rows:
+            self._compact()
+
+    def _reembed(self, records: List[Dict[str, Any]]) -> None:
+        """Построить матрицу заново из текстов журнала текущим эмбеддером и переписать файлы."""
+        if os.path.exists(self._vectors_path):
+            os.remove(self._vectors_path)
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._records = []
+        self._row_by_id = {}
+        self._size = 0
+        self._grow(max(INITIAL_CAPACITY, _next_pow2(len(records))))
+        for start in range(0, len(records), REEMBED_BATCH):
+            chunk = records[start:start + REEMBED_BATCH]
+            self._vectors[start:start + len(chunk)] = self._embed([_memory_text(r["content"], r["tags"]) for r in chunk])
+        for row, record in enumerate(records):
+            self._index_record(row, record)
+        self._size = len(records)
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        with open(self._records_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._write_meta()
+        self.stats["reembedded"] += len(records)
+        self.stats["total_vectors"] = self.count()
+
+    def _index_record(self, row: int, record: Dict[str, Any], alive: bool = True) -> None:
+        if row < len(self._records):
+            self._records[row] = record
+        else:
+            self._records.append(record)
+        self._alive[row] = alive
+        self._type[row] = _TYPE_CODES.get(record["type"], -1)
+        self._importance[row] = IMPORTANCE_ORDER.index(record["importance"]) if record["importance"] in IMPORTANCE_ORDER else 0
+        self._ts[row] = datetime.fromisoformat(record["timestamp"]).timestamp()
+        if alive:
+            self._row_by_id[record["id"]] = row
+
+    def _append_journal(self, entries: List[Dict[str, Any]]) -> None:
+        if not self.directory:
+            return
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        with open(self._records_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _compact(self) -> None:
+        """Переписать матрицу и журнал без удалённых строк."""
+        keep = np.flatnonzero(self._alive[: self._size])
+        records = [self._records[i] for i in keep]
+        vectors = np.array(self._vectors[keep], dtype=np.float32)
+        self._records = []
+        self._row_by_id = {}
+        self._size = 0
+        if self.directory:
+            if isinstance(self._vectors, np.memmap):
+                del self._vectors
+            os.remove(self._vectors_path)
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            with open(self._records_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._grow(max(INITIAL_CAPACITY, _next_pow2(len(records))))
+        self._vectors[: len(records)] = vectors
+        for row, record in enumerate(records):
+            self._index_record(row, record)
+        self._size = len(records)
+        logger.info("numpy_store %s уплотнено: %d строк", self.collection_name, self._size)
+
+    # --- Интерфейс VectorMemoryStore ---
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.asarray(self.embed(texts), dtype=np.float32).reshape(len(texts), self.dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def add_memory(self, memory: MemoryItem) -> str:
+        """Добавить элемент памяти в векторное хранилище"""
+        return self.add_memories([memory])[0]
+
+    def add_memories(self, memories: List[MemoryItem]) -> List[str]:
+        """Добавить несколько элементов памяти (один вызов эмбеддинга на всю пачку)"""
+        if not memories:
+            return []
+        for memory in memories:
+            if memory.id in self._row_by_id:
+                self.delete_memory(memory.id)
+        vectors = self._embed([_memory_text(m.content, m.tags) for m in memories])
+        needed = self._size + len(memories)
+        if needed > self._capacity:
+            self._grow(_next_pow2(needed))
+        start = self._size
+        self._vectors[start:needed] = vectors
+        records = [_record(m) for m in memories]
+        for offset, record in enumerate(records):
+            self._index_record(start + offset, record)
+        self._size = needed
+        self._append_journal(records)
+        self.stats["adds"] += len(memories)
+        self.stats["total_vectors"] = self.count()
+        return [m.id for m in memories]
+
+    def search_memory(self,
+                      query: str,
+                      n_results: int = 5,
+                      memory_type: Optional[MemoryType] = None,
+                      min_importance: Optional[str] = None,
+                      time_range: Optional[Tuple[datetime, datetime]] = None) -> List[Dict]:
+        """
+        Поиск в памяти по запросу. Формат результата — как у VectorMemoryStore (ChromaDB):
+        id, content, metadata, distance (1 - косинус).
+        """
+        self.stats["queries"] += 1
+        n = self._size
+        if n == 0 or n_results <= 0:
+            return []
+        mask = self._alive[:n].copy()
+        if memory_type is not None:
+            mask &= self._type[:n] == _TYPE_CODES.get(MemoryType(memory_type).value, -1)
+        if min_importance:
+            value = min_importance.value if isinstance(min_importance, ImportanceLevel) else min_importance
+            mask &= self._importance[:n] >= IMPORTANCE_ORDER.index(value)
+        if time_range:
+            start, end = time_range
+            if start is not None:
+                mask &= self._ts[:n] >= start.timestamp()
+            if end is not None:
+                mask &= self._ts[:n] <= end.timestamp()
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return []
+
+        query_vector = self._embed([query])[0]
+        scores = self._vectors[candidates] @ query_vector
+        k = min(n_results, candidates.size)
+        top = np.argpartition(-scores, k - 1)[:k] if k < candidates.size else np.arange(candidates.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self._result(int(candidates[i]), float(scores[i])) for i in top]
+
+    def _result(self, row: int, score: float) -> Dict:
+        record = self._records[row]
+        return {
+            "id": record["id"],
+            "content": record["content"],
+            "metadata": {
+                "type": record["type"],
+                "importance": record["importance"],
+                "timestamp": record["timestamp"],
+                "participants": json.dumps(record["participants"], ensure_ascii=False),
+                "tags": json.dumps(record["tags"], ensure_ascii=False),
+                "has_embedding": "true",
+            },
+            "distance": round(1.0 - score, 6),
+        }
+
+    def get_relevant_context(self,
+                             query: str,
+                             max_tokens: int = 1000,
+                             importance_threshold: str = "medium") -> List[MemoryItem]:
+        """Получить релевантный контекст для промпта"""
+        memories = []
+        for r in self.search_memory(query=query, n_results=10, min_importance=importance_threshold):
+            record = self._records[self._row_by_id[r["id"]]]
+            memory = MemoryItem(
+                id=record["id"],
+                content=record["content"],
+                type=MemoryType(record["type"]),
+                importance=ImportanceLevel(record["importance"]),
+                timestamp=datetime.fromisoformat(record["timestamp"]),
+                tags=list(record["tags"]),
+                participants=list(record["participants"]),
+            )
+            memories.append(memory)
+            # Грубая оценка токенов (по словам)
+            max_tokens -= len(memory.content.split())
+            if max_tokens <= 0:
+                break
+        return memories
+
+    def delete_memory(self, memory_id: str):
+        """Удалить элемент памяти"""
+        row = self._row_by_id.pop(memory_id, None)
+        if row is None:
+            return
+        self._alive[row] = False
+        self._append_journal([{"op": "delete", "row": row}])
+        self.stats["deletes"] += 1
+        self.stats["total_vectors"] = self.count()
+
+    def delete_old_memories(self, days: int = 30):
+        """Удалить старые воспоминания"""
+        cutoff = datetime.now().timestamp() - days * 24 * 3600
+        rows = np.flatnonzero(self._alive[: self._size] & (self._ts[: self._size] < cutoff))
+        for row in rows:
+            self.delete_memory(self._records[row]["id"])
+
+    def count(self) -> int:
+        return len(self._row_by_id)
+
+    def get_stats(self) -> Dict:
+        """Получить статистику"""
+        return {
+            **self.stats,
+            "collection_size": self.count(),
+            "persist_directory": self.directory,
+            "backend": "numpy",
+            "dim": self.dim,
+            "capacity": self._capacity,
+        }
+
+    def clear(self):
+        """Очистить хранилище"""
+        self._records = []
+        self._row_by_id = {}
+        self._size = 0
+        if self.directory:
+            if isinstance(self._vectors, np.memmap):
+                del self._vectors
+            for path in (self._vectors_path, self._records_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._grow(INITIAL_CAPACITY)
+        self.stats = {k: 0 for k in self.stats}
+
+
+def _record(memory: MemoryItem) -> Dict[str, Any]:
+    return {
+        "id": memory.id,
+        "content": memory.content,
+        "type": MemoryType(memory.type).value,
+        "importance": ImportanceLevel(memory.importance).value,
+        "timestamp": memory.timestamp.isoformat(),
+        "tags": list(memory.tags),
+        "participants": list(memory.participants),
+    }
+
+
+def _memory_text(content: str, tags: Sequence[str]) -> str:
+    """Текст, который эмбеддится для элемента памяти (содержимое и теги)."""
+    return f"{content} {' '.join(tags)}"
+
+
+def _next_pow2(n: int) -> int:
+    capacity = INITIAL_CAPACITY
+    while capacity < n:
+        capacity *= 2
+    return capacity
@@ -19,9 +19,12 @@ class ContextSummarizer:
                  chat_service,
                  summarizer_agent_name: str = "context_summarizer",
                  max_tokens_per_summary: int = 500,
-                 compression_target: float = 0.3):  # сжимать до 30%
+                 compression_target: float = 0.3,  # сжимать до 30%
+                 use_cache: bool = False):
         
         self.chat_service = chat_service
+        # Суммаризация детерминирована по входу: chat_service с поддержкой cache отдаст ответ из кэша
+        self._call_kwargs = {"cache": True} if use_cache else {}
         self.summarizer_agent_name = summarizer_agent_name
         self.max_tokens_per_summary = max_tokens_per_summary
         self.compression_target = compression_target
@@ -98,7 +101,8 @@ class ContextSummarizer:
             response = await self.chat_service(
                 agent_name=self.summarizer_agent_name,
                 session_id=f"summarize_{chunk.conversation_id}",
-                prompt=prompt
+                prompt=prompt,
+                **self._call_kwargs
             )
             
             # Парсим результат
@@ -189,7 +193,8 @@ class ContextSummarizer:
                 response = await self.chat_service(
                     agent_name=self.summarizer_agent_name,
                     session_id=f"hierarchical_{chunks[0].conversation_id}",
-                    prompt=prompt
+                    prompt=prompt,
+                    **self._call_kwargs
                 )
                 
                 summary_data = self._parse_summary_response(response)
@@ -3,6 +3,7 @@
 """
 import os
 import json
+import logging
 from typing import List, Dict, Optional, Any, Tuple
 from datetime import datetime
 import uuid
@@ -18,6 +19,20 @@ except ImportError:
 
 from .models import MemoryItem, MemoryType
 
+logger = logging.getLogger("aigod.memory.vector_store")
+
+
+class EmbeddingMismatchError(RuntimeError):
+    """Сохранённая коллекция построена другой функцией эмбеддингов и не открывается."""
+
+
+def _collection_exists(client, name: str) -> bool:
+    try:
+        return any(getattr(c, "name", c) == name for c in client.list_collections())
+    except Exception:
+        return False
+
+
 class VectorMemoryStore:
     """
     Хранилище векторной памяти на базе ChromaDB
@@ -40,8 +55,12 @@ class VectorMemoryStore:
         else:
             self.client = chromadb.Client()
         
-        # Функция эмбеддингов
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+        # Функция эмбеддингов: общая модель процесса, если это та же sentence-transformers модель
+        # (векторы и имя функции совместимы с сохранёнными коллекциями), иначе — своя
+        from .embedding_service import get_embedding_service
+        service = get_embedding_service()
+        shared = service.chroma_function() if embedding_model == service.model_name else None
+        self.embedding_function = shared or embedding_functions.SentenceTransformerEmbeddingFunction(
             model_name=embedding_model
         )
         
@@ -51,11 +70,14 @@ class VectorMemoryStore:
                 name=collection_name,
                 embedding_function=self.embedding_function
             )
-        except:
-            self.collection = self.client.create_collection(
-                name=collection_name,
-                embedding_function=self.embedding_function
-            )
+        except Exception as e:
+            if not _collection_exists(self.client, collection_name):
+                self.collection = self.client.create_collection(
+                    name=collection_name,
+                    embedding_function=self.embedding_function
+                )
+            else:
+                self.collection = self._open_with_stored_function(collection_name, e)
         
         # Кэш для метаданных
         self.metadata_cache = {}
@@ -68,6 +90,26 @@ class VectorMemoryStore:
             "deletes": 0
         }
     
+    def _open_with_stored_function(self, collection_name: str, error: Exception):
+        """
+        Коллекция есть, но не открывается с нашей функцией эмбеддингов (chromadb сверяет имя
+        и размерность). Открываем с функцией, сохранённой в коллекции; не вышло — ошибка с причиной,
+        а не тихая подмена пустым хранилищем.
+        """
+        logger.warning(
+            "ChromaDB: коллекция %s не открывается с эмбеддингами %s (%s) — открываем с сохранённой функцией",
+            collection_name, type(self.embedding_function).__name__, error,
+        )
+        try:
+            collection = self.client.get_collection(name=collection_name)
+        except Exception as e:
+            logger.error("ChromaDB: коллекция %s несовместима с текущими эмбеддингами: %s", collection_name, e)
+            raise EmbeddingMismatchError(
+                f"Коллекция {collection_name} построена другой функцией эмбеддингов: {error}"
+            ) from e
+        self.embedding_function = getattr(collection, "_embedding_function", None) or self.embedding_function
+        return collection
+
     def add_memory(self, memory: MemoryItem) -> str:
         """
         Добавить элемент памяти в векторное хранилище
@@ -228,6 +270,10 @@ class VectorMemoryStore:
             self.stats["deletes"] += len(to_delete)
             self.stats["total_vectors"] = self.collection.count()
     
+    def count(self) -> int:
+        """Число векторов в коллекции"""
+        return self.collection.count()
+
     def get_stats(self) -> Dict:
         """Получить статистику"""
         return {
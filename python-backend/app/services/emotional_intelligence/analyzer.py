@@ -19,9 +19,15 @@ class EmotionAnalyzer:
                  chat_service=None,
                  analyzer_agent_name: str = "emotion_analyzer",
                  batch_size: int = 5,
-                 use_api: bool = True):
+                 use_api: bool = True,
+                 use_cache: bool = False,
+                 batch_prompts: bool = True):
         self.chat_service = chat_service
         self.use_api = use_api
+        # Батч из очереди анализируется одним запросом (JSON-массив), а не запросом на сообщение
+        self.batch_prompts = batch_prompts
+        # Анализ — чистая функция сообщения: chat_service с поддержкой cache может отдать ответ из кэша
+        self._call_kwargs = {"cache": True} if use_cache else {}
         self.analyzer_agent_name = analyzer_agent_name
         self.batch_size = batch_size
         
@@ -36,7 +42,10 @@ class EmotionAnalyzer:
             "total_analyzed": 0,
             "api_calls": 0,
             "errors": 0,
-            "avg_processing_time": 0
+            "avg_processing_time": 0,
+            "batch_calls": 0,
+            "batch_fallbacks": 0,
+            "batch_rejected": 0
         }
         
         # Колбэки
@@ -180,10 +189,34 @@ class EmotionAnalyzer:
                 self.stats["errors"] += 1
                 await asyncio.sleep(1)
     
+    def _deliver(self, item: Dict, result: EmotionAnalysisResult):
+        """Сохранить результат анализа, вызвать колбэки и отдать его ожидающему"""
+        self.analysis_history.append(result)
+        self.stats["total_analyzed"] += 1
+        for callback in self.callbacks:
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"Error in callback: {e}")
+        if not item["future"].done():
+            item["future"].set_result(result)
+
+    def _fallback(self, item: Dict) -> EmotionAnalysisResult:
+        return self._quick_analyze(item["message"], item["sender"], item["message_id"])
+
     async def _process_batch(self, batch: List[Dict]):
         """Обработать батч сообщений"""
         import time
-        
+
+        if self.batch_prompts and len(batch) > 1:
+            await self._process_batch_prompt(batch)
+            return
+        await self._process_items(batch)
+
+    async def _process_items(self, batch: List[Dict]):
+        """По одному запросу на сообщение"""
+        import time
+
         for item in batch:
             start_time = time.time()
             
@@ -199,41 +232,24 @@ class EmotionAnalyzer:
                 response = await self.chat_service(
                     agent_name=self.analyzer_agent_name,
                     session_id="emotion_analysis",
-                    prompt=prompt
+                    prompt=prompt,
+                    **self._call_kwargs
                 )
                 
                 # Парсим результат
                 result = self._parse_response(response, item)
                 
                 if result:
-                    self.analysis_history.append(result)
-                    self.stats["total_analyzed"] += 1
-                    
-                    for callback in self.callbacks:
-                        try:
-                            callback(result)
-                        except Exception as e:
-                            print(f"Error in callback: {e}")
-                    
-                    item["future"].set_result(result)
-                else:
+                    self._deliver(item, result)
+                elif not item["future"].done():
                     # Fallback на быстрый анализ
-                    fallback = self._quick_analyze(
-                        item["message"], 
-                        item["sender"], 
-                        item["message_id"]
-                    )
-                    item["future"].set_result(fallback)
+                    item["future"].set_result(self._fallback(item))
                 
             except Exception as e:
                 print(f"Error processing item: {e}")
                 self.stats["errors"] += 1
-                fallback = self._quick_analyze(
-                    item["message"], 
-                    item["sender"], 
-                    item["message_id"]
-                )
-                item["future"].set_result(fallback)
+                if not item["future"].done():
+                    item["future"].set_result(self._fallback(item))
             
             # Статистика времени
             process_time = time.time() - start_time
@@ -241,6 +257,97 @@ class EmotionAnalyzer:
                 self.stats["avg_processing_time"] * 0.9 + process_time * 0.1
             )
     
+    async def _process_batch_prompt(self, batch: List[Dict]):
+        """
+        Батч одним запросом: N сообщений в промпте, ответ — JSON-массив в том же порядке.
+        Элемент, который не удалось разобрать, получает быстрый анализ по ключевым словам.
+        """
+        import time
+
+        start_time = time.time()
+        results: List[Optional[EmotionAnalysisResult]] = [None] * len(batch)
+        try:
+            prompt = self._build_batch_prompt(batch)
+            self.stats["api_calls"] += 1
+            self.stats["batch_calls"] += 1
+            response = await self.chat_service(
+                agent_name=self.analyzer_agent_name,
+                session_id="emotion_analysis",
+                prompt=prompt,
+                **self._call_kwargs
+            )
+            results = self._parse_batch_response(response, batch)
+        except Exception as e:
+            print(f"Error processing batch: {e}")
+            self.stats["errors"] += 1
+
+        for item, result in zip(batch, results):
+            if result:
+                self._deliver(item, result)
+            else:
+                self.stats["batch_fallbacks"] += 1
+                if not item["future"].done():
+                    item["future"].set_result(self._fallback(item))
+
+        process_time = (time.time() - start_time) / len(batch)
+        self.stats["avg_processing_time"] = (
+            self.stats["avg_processing_time"] * 0.9 + process_time * 0.1
+        )
+
+    def _build_batch_prompt(self, batch: List[Dict]) -> str:
+        """Сформировать промпт для анализа эмоций нескольких сообщений сразу"""
+        messages = "\n".join(
+            f'{i}. Сообщение от {item["sender"]}: {json.dumps(item["message"], ensure_ascii=False)}'
+            for i, item in enumerate(batch)
+        )
+        return f"""
+Ты эмоциональный аналитик. Определи эмоции в каждом из {len(batch)} сообщений.
+
+Сообщения:
+{messages}
+
+Для каждого сообщения определи эмоции (joy, sadness, anger, fear, trust, disgust, anticipation, surprise)
+с интенсивностью от 0 до 1, основную эмоцию, тональность от -1 до 1 и краткое объяснение.
+
+Ответь ТОЛЬКО JSON-массивом из {len(batch)} объектов в порядке сообщений:
+[
+    {{
+        "emotions": {{"joy": число, "sadness": число, "anger": число, "fear": число,
+                      "trust": число, "disgust": число, "anticipation": число, "surprise": число}},
+        "primary_emotion": "название",
+        "intensity": число,
+        "sentiment": число,
+        "reason": "объяснение"
+    }}
+]
+"""
+
+    def _parse_batch_response(self, response: str, batch: List[Dict]) -> List[Optional[EmotionAnalysisResult]]:
+        """
+        Распарсить JSON-массив ответа по позиции: i-й элемент — i-е сообщение, поле index не учитывается.
+        Для неразобранных элементов — None; если длина массива не N, позициям верить нельзя — все None.
+        """
+        results: List[Optional[EmotionAnalysisResult]] = [None] * len(batch)
+        match = re.search(r'\[.*\]', response or "", re.DOTALL)
+        if not match:
+            return results
+        try:
+            data = json.loads(match.group())
+        except ValueError as e:
+            print(f"Error parsing emotion batch response: {e}")
+            return results
+        if not isinstance(data, list):
+            return results
+        if len(data) != len(batch):
+            self.stats["batch_rejected"] += 1
+            return results
+        for i, (entry, item) in enumerate(zip(data, batch)):
+            try:
+                results[i] = self._result_from_data(entry, item)
+            except Exception as e:
+                print(f"Error parsing emotion batch item {i}: {e}")
+        return results
+
     def _build_analysis_prompt(self, message: str, sender: str) -> str:
         """Сформировать промпт для анализа эмоций"""
         return f"""
@@ -283,36 +390,39 @@ class EmotionAnalyzer:
                 return None
             
             data = json.loads(json_match.group())
-            
-            # Преобразуем строки в EmotionType
-            emotions = {}
-            for e_str, value in data.get("emotions", {}).items():
-                try:
-                    emotion_type = EmotionType(e_str.lower())
-                    emotions[emotion_type] = float(value)
-                except ValueError:
-                    continue
-            
-            primary_str = data.get("primary_emotion", "").lower()
-            try:
-                primary = EmotionType(primary_str)
-            except ValueError:
-                primary = list(emotions.keys())[0] if emotions else EmotionType.TRUST
-            
-            return EmotionAnalysisResult(
-                message_id=item["message_id"],
-                sender=item["sender"],
-                content=item["message"],
-                timestamp=datetime.now(),
-                detected_emotions=emotions,
-                primary_emotion=primary,
-                intensity=float(data.get("intensity", 0.5)),
-                sentiment=float(data.get("sentiment", 0)),
-                reason=data.get("reason", "Анализ выполнен")
-            )
+            return self._result_from_data(data, item)
         except Exception as e:
             print(f"Error parsing emotion response: {e}")
             return None
+
+    def _result_from_data(self, data: Dict, item: Dict) -> EmotionAnalysisResult:
+        """Собрать результат из разобранного JSON-объекта анализа"""
+        # Преобразуем строки в EmotionType
+        emotions = {}
+        for e_str, value in data.get("emotions", {}).items():
+            try:
+                emotion_type = EmotionType(e_str.lower())
+                emotions[emotion_type] = float(value)
+            except ValueError:
+                continue
+        
+        primary_str = data.get("primary_emotion", "").lower()
+        try:
+            primary = EmotionType(primary_str)
+        except ValueError:
+            primary = list(emotions.keys())[0] if emotions else EmotionType.TRUST
+        
+        return EmotionAnalysisResult(
+            message_id=item["message_id"],
+            sender=item["sender"],
+            content=item["message"],
+            timestamp=datetime.now(),
+            detected_emotions=emotions,
+            primary_emotion=primary,
+            intensity=float(data.get("intensity", 0.5)),
+            sentiment=float(data.get("sentiment", 0)),
+            reason=data.get("reason", "Анализ выполнен")
+        )
     
     def get_recent_analyses(self, limit: int = 10) -> List[EmotionAnalysisResult]:
         """Получить последние анализы"""
@@ -106,11 +106,17 @@ class EmotionalOrchestrationIntegration:
         """
         Обогатить промпт информацией об эмоциональном состоянии
         """
+        return self.get_emotion_section(agent_name) + original_prompt
+    
+    def get_emotion_section(self, agent_name: str) -> str:
+        """
+        Текст об эмоциональном состоянии агента для секции промпта (пусто, если состояния нет)
+        """
         state = self.manager.get_state(agent_name)
         profile = self.manager.get_profile(agent_name)
         
         if not state:
-            return original_prompt
+            return ""
         
         # Формируем описание эмоционального состояния
         dominant = state.get_dominant_emotion()
@@ -131,7 +137,7 @@ class EmotionalOrchestrationIntegration:
         
         emotion_text.append("\nУчитывай своё состояние в ответе.\n")
         
-        return "\n".join(emotion_text) + original_prompt
+        return "\n".join(emotion_text)
     
     def get_emotional_intelligence_report(self, agent_name: str) -> str:
         """
@@ -5,12 +5,15 @@
 """
 
 import logging
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
 from app.config import config
 
 logger = logging.getLogger("aigod.llm")
 
+_NO_KEYS_MESSAGE = "Агент временно недоступен. Настройте YANDEX_CLOUD_FOLDER и YANDEX_CLOUD_API_KEY в .env."
+_ERROR_MESSAGE = "Ой-ой, связь пропала! Попробуй позже."
+
 
 class AgentPromptAdapter:
     """Адаптер: Agent (SQLAlchemy) -> объект с .name и .prompt для YandexAgentClient."""
@@ -20,6 +23,37 @@ class AgentPromptAdapter:
         self.prompt = agent.personality or ""
 
 
+def _keys_missing() -> bool:
+    if not config.YANDEX_CLOUD_FOLDER or not config.YANDEX_CLOUD_API_KEY:
+        logger.warning("LLM: Yandex ключи не настроены (YANDEX_CLOUD_FOLDER=%s YANDEX_CLOUD_API_KEY=%s)", bool(config.YANDEX_CLOUD_FOLDER), bool(config.YANDEX_CLOUD_API_KEY))
+        return True
+    return False
+
+
+def _build_prompt_adapter(agent, room=None) -> AgentPromptAdapter:
+    """Промпт агента: системные правила single + характер + контекст отношений комнаты."""
+    from app.services.prompt_enhancer import enhance_prompt_with_relationship
+    from app.services.prompts import get_system_prompt
+    from app.services.relationship_model_service import get_relationship_manager
+
+    adapter = AgentPromptAdapter(agent)
+    system = get_system_prompt(mode="single")
+    base_prompt = f"{system}\n\n---\n\n{adapter.prompt}"
+
+    # Обогащаем характер агента контекстом отношений
+    if room and room.agents:
+        try:
+            rel_manager = get_relationship_manager(room)
+            base_prompt = enhance_prompt_with_relationship(
+                rel_manager, agent.name, base_prompt
+            )
+        except Exception:
+            pass
+
+    adapter.prompt = base_prompt
+    return adapter
+
+
 def get_agent_response(
     agent,
     session_id: str,
@@ -30,6 +64,8 @@ def get_agent_response(
     """
     Получить ответ агента от LLM (режим single — один агент).
 
+    Блокирующий вызов: из async-кода используйте get_agent_response_async.
+
     Args:
         agent: SQLAlchemy Agent (personality = промпт персонажа)
         session_id: ID сессии для истории диалога
@@ -39,36 +75,50 @@ def get_agent_response(
     Returns:
         Текст ответа агента или fallback при ошибке.
     """
-    if not config.YANDEX_CLOUD_FOLDER or not config.YANDEX_CLOUD_API_KEY:
-        logger.warning("LLM: Yandex ключи не настроены (YANDEX_CLOUD_FOLDER=%s YANDEX_CLOUD_API_KEY=%s)", bool(config.YANDEX_CLOUD_FOLDER), bool(config.YANDEX_CLOUD_API_KEY))
-        return "Агент временно недоступен. Настройте YANDEX_CLOUD_FOLDER и YANDEX_CLOUD_API_KEY в .env."
+    if _keys_missing():
+        return _NO_KEYS_MESSAGE
 
     try:
         logger.info("LLM: запрос agent=%s session=%s text_len=%d room_id=%s", agent.name, session_id, len(text), getattr(room, "id", None) if room else None)
         from app.services.yandex_client.chat_service import ChatService
-        from app.services.prompt_enhancer import enhance_prompt_with_relationship
-        from app.services.prompts import get_system_prompt
-        from app.services.relationship_model_service import get_relationship_manager
-
-        adapter = AgentPromptAdapter(agent)
-        system = get_system_prompt(mode="single")
-        base_prompt = f"{system}\n\n---\n\n{adapter.prompt}"
-
-        # Обогащаем характер агента контекстом отношений
-        if room and room.agents:
-            try:
-                rel_manager = get_relationship_manager(room)
-                base_prompt = enhance_prompt_with_relationship(
-                    rel_manager, agent.name, base_prompt
-                )
-            except Exception:
-                pass
-
-        adapter.prompt = base_prompt
+
+        adapter = _build_prompt_adapter(agent, room)
         chat_service = ChatService()
         result = chat_service.process_message(adapter, session_id, text)
         logger.info("LLM: ответ получен agent=%s len=%d preview=%.50s...", agent.name, len(result) if result else 0, (result or "")[:50])
         return result
     except Exception as e:
         logger.exception("LLM error: %s", e)
-        return "Ой-ой, связь пропала! Попробуй позже."
+        return _ERROR_MESSAGE
+
+
+async def get_agent_response_async(
+    agent,
+    session_id: str,
+    text: str,
+    *,
+    room=None,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
+    """
+    Асинхронная версия get_agent_response.
+
+    Запрос к YandexGPT выполняется в выделенном LLM-пуле — event loop не блокируется,
+    ответы агентов разных комнат генерируются параллельно.
+    on_delta — стриминг: корутина получает фрагменты ответа по мере генерации.
+    """
+    if _keys_missing():
+        return _NO_KEYS_MESSAGE
+
+    try:
+        logger.info("LLM: async запрос agent=%s session=%s text_len=%d room_id=%s", agent.name, session_id, len(text), getattr(room, "id", None) if room else None)
+        from app.services.yandex_client.chat_service import ChatService
+
+        adapter = _build_prompt_adapter(agent, room)
+        chat_service = ChatService()
+        result = await chat_service.process_message_async(adapter, session_id, text, on_delta=on_delta)
+        logger.info("LLM: ответ получен agent=%s len=%d preview=%.50s...", agent.name, len(result) if result else 0, (result or "")[:50])
+        return result
+    except Exception as e:
+        logger.exception("LLM error: %s", e)
+        return _ERROR_MESSAGE
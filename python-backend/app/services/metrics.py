@@ -0,0 +1,221 @@
+"""
+Метрики в формате Prometheus (text exposition 0.0.4) — GET /api/metrics.
+
+Своя минимальная реализация без prometheus_client: счётчики, гистограммы и gauge с
+функцией-источником. Запись — поиск дочерней серии по кортежу меток в dict и сложение
+под lock (значения пишутся и из потоков LLM-пула), порядка 1 мкс — метрики включены всегда.
+Кумулятивные бакеты гистограммы считаются только при выдаче /api/metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Бакеты по умолчанию (секунды): от быстрых вызовов до долгого обсуждения
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонный счётчик. inc(*label_values, amount=1)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in items
+        ]
+
+
+class Histogram(_Metric):
+    """Гистограмма: observe(value, *label_values). Хранит некумулятивные счётчики бакетов."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count по бакетам (+Inf последним)..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *labels: str) -> "_Timer":
+        """with histogram.time("label"): ... — записать длительность блока."""
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        lines = self.header()
+        bounds = [_format_value(b) for b in self.buckets] + ["+Inf"]
+        for labels, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, series[:-2]):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {int(cumulative)}")
+            base = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{base} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{base} {int(series[-1])}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Gauge(_Metric):
+    """Gauge, значение которого читается функцией в момент выдачи (без затрат на горячем пути)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, source: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation)
+        self.source = source
+
+    def render(self) -> List[str]:
+        try:
+            value = float(self.source()) if self.source else 0.0
+        except Exception:
+            return []
+        return self.header() + [f"{self.name} {_format_value(value)}"]
+
+
+class MetricsRegistry:
+    """Набор метрик процесса; render() — тело ответа /api/metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Pipeline
+PIPELINE_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "aigod_pipeline_stage_seconds", "Длительность этапа pipeline", ("stage",),
+))
+PIPELINE_RUN_SECONDS = REGISTRY.register(Histogram(
+    "aigod_pipeline_run_seconds", "Длительность прогона pipeline целиком", ("outcome",),
+))
+PIPELINE_ACTIVE = REGISTRY.register(Gauge(
+    "aigod_pipeline_active", "Выполняющиеся прогоны pipeline",
+))
+
+# LLM (YandexAgentClient.send_message)
+LLM_CALLS = REGISTRY.register(Counter(
+    "aigod_llm_calls_total", "Вызовы YandexGPT", ("agent", "room", "mode"),
+))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "aigod_llm_errors_total", "Ошибки вызовов YandexGPT", ("agent", "room", "error"),
+))
+LLM_LATENCY_SECONDS = REGISTRY.register(Histogram(
+    "aigod_llm_latency_seconds", "Время ответа YandexGPT", ("agent", "room"),
+))
+
+# База данных
+DB_TRANSACTIONS = REGISTRY.register(Counter(
+    "aigod_db_transactions_total", "Транзакции сессий SQLAlchemy (сессии, обратившиеся к БД)",
+))
+DB_COMMITS = REGISTRY.register(Counter("aigod_db_commits_total", "Коммиты сессий SQLAlchemy"))
+DB_ROLLBACKS = REGISTRY.register(Counter("aigod_db_rollbacks_total", "Откаты сессий SQLAlchemy"))
+
+# WebSocket
+WS_BROADCAST_FANOUT = REGISTRY.register(Histogram(
+    "aigod_ws_broadcast_fanout", "Число получателей одной рассылки", ("manager",), buckets=SIZE_BUCKETS,
+))
+WS_SEND_SECONDS = REGISTRY.register(Histogram(
+    "aigod_ws_send_seconds", "Время отправки сообщения одному клиенту", ("manager",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+))
+WS_SEND_ERRORS = REGISTRY.register(Counter(
+    "aigod_ws_send_errors_total", "Ошибки отправки по WebSocket (клиент отключён)", ("manager",),
+))
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return REGISTRY
@@ -0,0 +1,191 @@
+"""
+Запись и воспроизведение вызовов LLM pipeline (кассеты).
+
+run_orchestration.py и playground.py ходят в YandexGPT, поэтому executor нельзя ни
+профилировать, ни прогонять регрессионно без ключей и сети. RecordingChatService оборачивает
+настоящий chat_service и сохраняет каждый промпт и ответ прогона в JSON-кассету;
+ReplayChatService отдаёт эти ответы обратно детерминированно (с синтетической задержкой
+по желанию) — через PipelineExecutor идут те же записи в БД, обновления графа и рассылки,
+но без сети. См. bench_pipeline_replay.py.
+
+Ответ при воспроизведении ищется так: неиспользованный вызов с тем же агентом и тем же
+промптом; иначе — следующий по порядку вызов этого агента (промпт мог измениться из-за
+времени или id в истории); иначе — CassetteExhaustedError.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger("aigod.orchestration.cassette")
+
+CASSETTE_VERSION = 1
+# Размер фрагмента при имитации стриминга (символов)
+REPLAY_CHUNK_CHARS = 40
+
+
+class CassetteExhaustedError(RuntimeError):
+    """В кассете не осталось ответа для вызова."""
+
+
+class Cassette:
+    """Кассета: метаданные прогона (комната, сообщение) и вызовы chat_service по порядку."""
+
+    def __init__(self, calls: Optional[List[Dict[str, Any]]] = None, meta: Optional[Dict[str, Any]] = None):
+        self.calls: List[Dict[str, Any]] = list(calls or [])
+        self.meta: Dict[str, Any] = dict(meta or {})
+
+    def record(
+        self,
+        agent: str,
+        session: str,
+        prompt: str,
+        response: str,
+        latency: float,
+        cache: bool = False,
+        sections: Optional[Dict[str, str]] = None,
+    ) -> None:
+        call = {
+            "agent": agent,
+            "session": session,
+            "prompt": prompt,
+            "cache": cache,
+            "response": response,
+            "latency": round(latency, 4),
+        }
+        if sections:
+            call["sections"] = dict(sections)
+        self.calls.append(call)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": CASSETTE_VERSION,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "meta": self.meta,
+            "calls": self.calls,
+        }
+
+    def save(self, path: Union[str, Path]) -> None:
+        Path(path).write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        logger.info("cassette saved path=%s calls=%d", path, len(self.calls))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Cassette":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Версия кассеты {data.get('version')!r} не поддерживается (ожидается {CASSETTE_VERSION})")
+        return cls(calls=data.get("calls"), meta=data.get("meta"))
+
+
+def _sections_key(sections: Optional[Dict[str, str]]) -> tuple:
+    """Секции вызова (например, обсуждение для синтеза) — часть ключа точного совпадения."""
+    return tuple(sorted((sections or {}).items()))
+
+
+class RecordingChatService:
+    """Обёртка chat_service: вызовы проходят в inner и записываются в кассету."""
+
+    def __init__(self, inner: Any, cassette: Optional[Cassette] = None):
+        self.inner = inner
+        self.cassette = cassette or Cassette()
+
+    def __getattr__(self, name: str) -> Any:
+        # room, calls и прочее — от настоящего chat_service
+        return getattr(self.inner, name)
+
+    async def __call__(
+        self, agent_name: str, session_id: str, prompt: str, context=None, cache: bool = False, sections=None
+    ) -> str:
+        started = time.perf_counter()
+        kwargs = {"sections": sections} if sections else {}
+        response = await self.inner(agent_name, session_id, prompt, context, cache=cache, **kwargs)
+        self.cassette.record(
+            agent_name, session_id, prompt, response, time.perf_counter() - started, cache=cache, sections=sections
+        )
+        return response
+
+
+class ReplayChatService:
+    """
+    chat_service из кассеты. latency — фиксированная задержка на вызов (секунды);
+    recorded_latency=True — задержка из записи, умноженная на latency_scale.
+    Если активен StreamRouter (этап discuss со стримингом), ответ отдаётся фрагментами.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        latency: Optional[float] = None,
+        recorded_latency: bool = False,
+        latency_scale: float = 1.0,
+    ):
+        self.cassette = cassette
+        self.latency = latency
+        self.recorded_latency = recorded_latency
+        self.latency_scale = latency_scale
+        self.calls = 0
+        self.stats = {"exact": 0, "sequential": 0}
+        self._by_prompt: Dict[Tuple[str, str, tuple], Deque[int]] = defaultdict(deque)
+        self._by_agent: Dict[str, Deque[int]] = defaultdict(deque)
+        self._used: set = set()
+        for index, call in enumerate(cassette.calls):
+            self._by_prompt[(call["agent"], call["prompt"], _sections_key(call.get("sections")))].append(index)
+            self._by_agent[call["agent"]].append(index)
+
+    def _take(self, agent_name: str, prompt: str, sections: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        exact = self._by_prompt.get((agent_name, prompt, _sections_key(sections)))
+        while exact:
+            index = exact.popleft()
+            if index not in self._used:
+                self._used.add(index)
+                self.stats["exact"] += 1
+                return self.cassette.calls[index]
+        queue = self._by_agent.get(agent_name)
+        while queue:
+            index = queue.popleft()
+            if index not in self._used:
+                self._used.add(index)
+                self.stats["sequential"] += 1
+                return self.cassette.calls[index]
+        raise CassetteExhaustedError(f"В кассете нет ответа для агента {agent_name!r}")
+
+    def remaining(self) -> int:
+        return len(self.cassette.calls) - len(self._used)
+
+    async def __call__(
+        self, agent_name: str, session_id: str, prompt: str, context=None, cache: bool = False, sections=None
+    ) -> str:
+        self.calls += 1
+        call = self._take(agent_name, prompt, sections)
+        delay = self.latency or 0.0
+        if self.recorded_latency:
+            delay = (call.get("latency") or 0.0) * self.latency_scale
+        response = call["response"]
+
+        from app.services.agents_orchestration.streaming import get_stream_router
+        router = None if cache else get_stream_router()
+        if router is None:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return response
+        # Как YandexAgentAdapter со стримингом: задержка распределяется по фрагментам
+        stream_id = router.begin(agent_name)
+        chunks = [response[i:i + REPLAY_CHUNK_CHARS] for i in range(0, len(response), REPLAY_CHUNK_CHARS)] or [""]
+        for chunk in chunks:
+            if delay > 0:
+                await asyncio.sleep(delay / len(chunks))
+            await router.push(stream_id, chunk)
+        router.finish(stream_id, response)
+        return response
+
+    def get_stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "exact": self.stats["exact"],
+            "sequential": self.stats["sequential"],
+            "remaining": self.remaining(),
+        }
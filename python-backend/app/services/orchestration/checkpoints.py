@@ -0,0 +1,220 @@
+"""
+Контрольные точки pipeline в SQLite.
+
+TaskState живёт только в памяти: рестарт процесса, деплой или отмена pipeline во время DISCUSS
+теряли все завершённые этапы, и следующий запуск начинал с RETRIEVE_MEMORY — дорогое обсуждение
+генерировалось заново. Теперь после каждого этапа его выходы (поля TaskState из STAGE_GRAPH)
+записываются в pipeline_checkpoints, а прерванный pipeline продолжается с последнего
+завершённого этапа: при старте приложения или по запросу (POST /orchestration/resume).
+
+Жизненный цикл записи: running → (успех: удаляется вместе с более старыми записями комнаты)
+| cancelled | failed. Запись в статусе running после рестарта — прерванный процесс.
+"""
+import logging
+from dataclasses import asdict, is_dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from .stages import PipelineStage, StageSpec, TaskState
+
+logger = logging.getLogger("aigod.orchestration.checkpoints")
+
+RESUMABLE_STATUSES = ("running", "cancelled", "failed")
+
+
+def _serialize(field_name: str, value: Any) -> Any:
+    if field_name == "discussion_messages":
+        return [m.to_dict() for m in value if hasattr(m, "to_dict")]
+    if field_name == "extracted_facts":
+        return [asdict(f) if is_dataclass(f) else f for f in value]
+    return value
+
+
+def _deserialize(field_name: str, value: Any) -> Any:
+    if field_name == "discussion_messages":
+        from app.services.agents_orchestration.message import Message
+        return [Message.from_dict(m) for m in value or []]
+    if field_name == "extracted_facts":
+        from .fact_extractor import Fact
+        return [Fact(**f) if isinstance(f, dict) else f for f in value or []]
+    return value
+
+
+class CheckpointStore:
+    """Запись и чтение контрольных точек. Ошибки БД не ломают pipeline — только логируются."""
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None):
+        if session_factory is None:
+            from app.database.sqlite_setup import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self.stats = {"created": 0, "stages_saved": 0, "resumed": 0, "stages_skipped": 0, "errors": 0}
+
+    def _write(self, action: str, fn: Callable[[Any], Any]) -> Any:
+        session = self.session_factory()
+        try:
+            result = fn(session)
+            session.commit()
+            return result
+        except Exception as e:
+            session.rollback()
+            self.stats["errors"] += 1
+            logger.warning("checkpoint %s failed: %s", action, e)
+            return None
+        finally:
+            session.close()
+
+    def start(self, state: TaskState) -> Optional[int]:
+        """Создать контрольную точку для нового прогона."""
+        from app.models.pipeline_checkpoint import PipelineCheckpoint
+
+        def create(session):
+            row = PipelineCheckpoint(
+                room_id=state.room_id,
+                user_message=state.user_message,
+                sender=state.sender,
+                status="running",
+                completed_stages=[],
+                outputs={},
+            )
+            session.add(row)
+            session.flush()
+            return row.id
+
+        checkpoint_id = self._write("start", create)
+        if checkpoint_id is not None:
+            self.stats["created"] += 1
+        return checkpoint_id
+
+    def save_stage(self, checkpoint_id: int, state: TaskState, spec: StageSpec) -> None:
+        """Этап завершён: дописать его выходы."""
+        from app.models.pipeline_checkpoint import PipelineCheckpoint
+
+        def update(session):
+            row = session.get(PipelineCheckpoint, checkpoint_id)
+            if row is None:
+                return
+            outputs = dict(row.outputs or {})
+            for name in spec.outputs:
+                outputs[name] = _serialize(name, getattr(state, name))
+            # JSON-колонки: новые объекты, чтобы SQLAlchemy увидел изменение
+            row.outputs = outputs
+            row.completed_stages = list(row.completed_stages or []) + [spec.stage.name]
+            return True
+
+        if self._write("save_stage", update):
+            self.stats["stages_saved"] += 1
+
+    def mark(self, checkpoint_id: int, status: str, error: Optional[str] = None) -> None:
+        from app.models.pipeline_checkpoint import PipelineCheckpoint
+
+        def update(session):
+            row = session.get(PipelineCheckpoint, checkpoint_id)
+            if row is not None:
+                row.status = status
+                row.error = error
+
+        self._write("mark", update)
+
+    def complete(self, checkpoint_id: int, room_id: int) -> None:
+        """Прогон завершён: его точка и все более старые точки комнаты больше не нужны."""
+        from app.models.pipeline_checkpoint import PipelineCheckpoint
+
+        self._write("complete", lambda session: session.query(PipelineCheckpoint).filter(
+            PipelineCheckpoint.room_id == room_id, PipelineCheckpoint.id <= checkpoint_id,
+        ).delete(synchronize_session=False))
+
+    def restore(self, checkpoint_id: int, state: TaskState) -> Optional[List[PipelineStage]]:
+        """
+        Заполнить state из контрольной точки. Возвращает завершённые этапы (их executor пропускает);
+        None, если точки нет.
+        """
+        from app.models.pipeline_checkpoint import PipelineCheckpoint
+
+        session = self.session_factory()
+        try:
+            row = session.get(PipelineCheckpoint, checkpoint_id)
+            if row is None:
+                return None
+            state.user_message = row.user_message
+            state.sender = row.sender
+            for name, value in (row.outputs or {}).items():
+                if hasattr(state, name):
+                    setattr(state, name, _deserialize(name, value))
+            stages = [PipelineStage[name] for name in row.completed_stages or [] if name in PipelineStage.__members__]
+        finally:
+            session.close()
+        self.mark(checkpoint_id, "running")
+        self.stats["resumed"] += 1
+        self.stats["stages_skipped"] += len(stages)
+        logger.info("checkpoint %s restored room_id=%s stages=%s", checkpoint_id, state.room_id, [s.name for s in stages])
+        return stages
+
+    def latest_resumable(self, room_id: int) -> Optional[Dict[str, Any]]:
+        """Последняя незавершённая точка комнаты: {id, room_id, user_message, sender, status}."""
+        from app.models.pipeline_checkpoint import PipelineCheckpoint
+
+        session = self.session_factory()
+        try:
+            row = (
+                session.query(PipelineCheckpoint)
+                .filter(PipelineCheckpoint.room_id == room_id, PipelineCheckpoint.status.in_(RESUMABLE_STATUSES))
+                .order_by(PipelineCheckpoint.id.desc())
+                .first()
+            )
+            return self._summary(row) if row else None
+        finally:
+            session.close()
+
+    def interrupted(self, max_age: timedelta) -> List[Dict[str, Any]]:
+        """
+        Точки, оставшиеся в running после рестарта (по последней на комнату). Слишком старые
+        удаляются: продолжать обсуждение, о котором пользователь давно забыл, бессмысленно.
+        """
+        from app.models.pipeline_checkpoint import PipelineCheckpoint
+
+        cutoff = datetime.now(timezone.utc) - max_age
+        session = self.session_factory()
+        try:
+            rows = (
+                session.query(PipelineCheckpoint)
+                .filter(PipelineCheckpoint.status == "running")
+                .order_by(PipelineCheckpoint.id.desc())
+                .all()
+            )
+            latest: Dict[int, Dict[str, Any]] = {}
+            stale = []
+            for row in rows:
+                updated = row.updated_at or row.created_at
+                if updated is not None and updated.tzinfo is None:
+                    updated = updated.replace(tzinfo=timezone.utc)
+                if updated is not None and updated < cutoff:
+                    stale.append(row.id)
+                elif row.room_id not in latest:
+                    latest[row.room_id] = self._summary(row)
+            if stale:
+                session.query(PipelineCheckpoint).filter(PipelineCheckpoint.id.in_(stale)).delete(synchronize_session=False)
+                session.commit()
+            return list(latest.values())
+        finally:
+            session.close()
+
+    @staticmethod
+    def _summary(row) -> Dict[str, Any]:
+        return {
+            "id": row.id,
+            "room_id": row.room_id,
+            "user_message": row.user_message,
+            "sender": row.sender,
+            "status": row.status,
+            "completed_stages": list(row.completed_stages or []),
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            "created": self.stats["created"],
+            "stagesSaved": self.stats["stages_saved"],
+            "resumed": self.stats["resumed"],
+            "stagesSkipped": self.stats["stages_skipped"],
+            "errors": self.stats["errors"],
+        }
@@ -0,0 +1,150 @@
+"""
+Кэш компонентов pipeline по комнатам.
+
+Раньше на каждое сообщение create_pipeline_components заново собирал YandexAgentAdapter,
+регистрировал промпты всех агентов, создавал ConversationContext и перечитывал историю
+комнаты из SQLite. Теперь adapter и context живут между прогонами: в context дописываются
+только новые сообщения (id больше последнего загруженного), а сообщения, сохранённые самим
+pipeline, уже лежат в context и повторно не добавляются.
+
+Запись комнаты сбрасывается явно (добавление/удаление агента, изменение комнаты, удаление
+комнаты — invalidate) и по сигнатуре: тип оркестрации, описание, id/имена/характеры агентов.
+Стратегия хранит состояние одного обсуждения и создаётся на каждый прогон.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("aigod.orchestration.components")
+
+# Сколько последних сообщений комнаты держать в context перед прогоном (как при холодной загрузке)
+HISTORY_LIMIT = 20
+# Сообщения pipeline ищутся в хвосте context — они добавляются туда прямо перед сохранением
+_OWN_LOOKBACK = 8
+
+
+def room_signature(room) -> Tuple:
+    """Всё, от чего зависят adapter и context: при изменении запись кэша пересобирается."""
+    return (
+        getattr(room, "orchestration_type", None) or "single",
+        getattr(room, "description", None) or "",
+        tuple((a.id, a.name, getattr(a, "personality", None) or "") for a in room.agents),
+    )
+
+
+@dataclass
+class RoomComponents:
+    """Тёплые компоненты комнаты: chat_service и ConversationContext."""
+    signature: Tuple
+    chat_service: Any
+    context: Any
+    agents: List[str]
+    last_message_id: Optional[int] = None
+    own_message_ids: Set[int] = field(default_factory=set)
+
+    def sync(self, rows: List[Tuple[int, Any]], history_limit: int = HISTORY_LIMIT) -> int:
+        """
+        Дописать в context новые сообщения из БД (id, Message) в порядке id.
+        Возвращает число добавленных сообщений.
+        """
+        added = 0
+        for message_id, message in rows:
+            if self.last_message_id is not None and message_id <= self.last_message_id:
+                continue
+            self.last_message_id = message_id
+            if message_id in self.own_message_ids:
+                self.own_message_ids.discard(message_id)
+                continue
+            self.context.add_message(message)
+            added += 1
+        overflow = len(self.context.history) - history_limit
+        if overflow > 0:
+            del self.context.history[:overflow]
+        return added
+
+    def record_saved(self, message_id: int, message: Any) -> None:
+        """
+        Pipeline сохранил сообщение в БД. Если его нет в context (например, итог synthesize),
+        оно дописывается сразу — так context совпадает с тем, что дала бы загрузка из БД.
+        """
+        self.own_message_ids.add(message_id)
+        history = self.context.history
+        if not any(m is message for m in history[-_OWN_LOOKBACK:]):
+            history.append(message)
+
+
+class PipelineComponentCache:
+    """Компоненты pipeline по room_id. Прогоны одной комнаты идут последовательно (очередь pipeline)."""
+
+    def __init__(
+        self,
+        build_adapter: Callable[[Any], Any],
+        build_context: Callable[[List[str]], Any],
+    ):
+        self.build_adapter = build_adapter
+        self.build_context = build_context
+        self._rooms: Dict[int, RoomComponents] = {}
+        self.stats = {"hits": 0, "builds": 0, "invalidations": 0, "messages_loaded": 0}
+
+    def acquire(self, room) -> Optional[RoomComponents]:
+        """Компоненты комнаты: из кэша или собранные заново, если кэша нет или комната изменилась."""
+        signature = room_signature(room)
+        entry = self._rooms.get(room.id)
+        if entry is not None and entry.signature == signature:
+            self.stats["hits"] += 1
+            # Свежий объект комнаты (скорость, связи) — для сервисов, которые адаптер создаёт лениво
+            entry.chat_service.room = room
+            return entry
+        if entry is not None:
+            logger.info("pipeline_components room_id=%s комната изменилась — пересборка", room.id)
+            self.stats["invalidations"] += 1
+
+        adapter = self.build_adapter(room)
+        if adapter is None:
+            self._rooms.pop(room.id, None)
+            return None
+        orchestration_type = signature[0]
+        agent_names = [a.name for a in room.agents]
+        from app.constants import SUMMARIZER_AGENT_NAME
+        participants = (agent_names + [SUMMARIZER_AGENT_NAME]) if orchestration_type == "circular" else agent_names
+        entry = RoomComponents(
+            signature=signature,
+            chat_service=adapter,
+            context=self.build_context(participants.copy()),
+            agents=participants,
+        )
+        self._rooms[room.id] = entry
+        self.stats["builds"] += 1
+        logger.info("pipeline_components room_id=%s собраны agents=%s", room.id, participants)
+        return entry
+
+    def sync(self, entry: RoomComponents, rows: List[Tuple[int, Any]]) -> int:
+        """Дописать новые сообщения комнаты в тёплый context (см. RoomComponents.sync)."""
+        added = entry.sync(rows)
+        self.stats["messages_loaded"] += added
+        return added
+
+    def get(self, room_id: int) -> Optional[RoomComponents]:
+        return self._rooms.get(room_id)
+
+    def invalidate(self, room_id: int) -> bool:
+        """Сбросить компоненты комнаты (агенты, настройки или сама комната изменились)."""
+        removed = self._rooms.pop(room_id, None) is not None
+        if removed:
+            self.stats["invalidations"] += 1
+            logger.info("pipeline_components room_id=%s invalidated", room_id)
+        return removed
+
+    def clear(self) -> None:
+        self._rooms.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["builds"]
+        return {
+            "rooms": len(self._rooms),
+            "hits": self.stats["hits"],
+            "builds": self.stats["builds"],
+            "invalidations": self.stats["invalidations"],
+            "messagesLoaded": self.stats["messages_loaded"],
+            "hitRate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,242 @@
+"""
+Детекция сходимости обсуждения (этап DISCUSS).
+
+Раунды обсуждения идут до max_discuss_rounds (50) или до остановки стратегии, а каждый
+раунд — вызов YandexGPT. Агенты часто начинают повторять друг друга задолго до лимита.
+Детектор наблюдает реплики агентов после каждого раунда и сообщает, что обсуждение
+сошлось, — executor завершает DISCUSS и переходит к синтезу.
+
+Детекторы (DISCUSS_CONVERGENCE, через запятую):
+- lexical   — повтор лексики: реплика почти совпадает по словам с недавними;
+- embedding — смысловой повтор: косинусная близость эмбеддингов соседних реплик;
+- consensus — все участники подряд выражают явное согласие без оговорок.
+"""
+import logging
+import math
+import re
+from typing import Callable, List, Optional, Sequence
+
+logger = logging.getLogger("aigod.orchestration.convergence")
+
+Embed = Callable[[List[str]], List[List[float]]]
+
+_WORD_RE = re.compile(r"\w{3,}", re.UNICODE)
+
+# Явное согласие. Вежливые «хорошо», «интересно», «спасибо» (POSITIVE_PATTERNS анализатора
+# отношений) согласием с решением не считаются — с них часто начинается возражение.
+AGREEMENT_PATTERNS = [
+    r"\bсоглас(ен|на|ны)\b",
+    r"\bподдерживаю\b",
+    r"\bда\s*,?\s*(именно|верно)\b",
+]
+# Оговорка или возражение отменяют согласие: «согласен, но…», «однако», «я против».
+OBJECTION_PATTERNS = [
+    r"\bне\s+соглас",
+    r"\bнесоглас",
+    r"\bно\b",
+    r"\bоднако\b",
+    r"\bпротив\b",
+    r"\bхотя\b",
+    r"\bспорно\b",
+    r"\bневерно\b",
+    r"\bнеправильно\b",
+    r"\bабсурд\b",
+]
+
+
+def _tokens(text: str) -> set:
+    return set(_WORD_RE.findall((text or "").lower()))
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ConvergenceDetector:
+    """Базовый детектор: observe() получает реплики агентов раунда, возвращает причину остановки или None."""
+
+    name = "base"
+    # observe() блокирует (модель эмбеддингов) — executor выносит его в поток
+    blocking = False
+
+    def __init__(self, min_messages: int = 2):
+        # Не останавливаться, пока каждый участник не высказался хотя бы раз
+        self._base_min_messages = min_messages
+        self.min_messages = min_messages
+        self._seen = 0
+
+    def reset(self, participants: int = 0) -> None:
+        self._seen = 0
+        self.min_messages = max(self._base_min_messages, participants)
+
+    def observe(self, texts: List[str]) -> Optional[str]:
+        texts = [t for t in texts if t and t.strip()]
+        if not texts:
+            return None
+        self._seen += len(texts)
+        converged = self._observe(texts)
+        if converged and self._seen >= self.min_messages:
+            return self.name
+        return None
+
+    def _observe(self, texts: List[str]) -> bool:
+        raise NotImplementedError
+
+
+class LexicalRepetitionDetector(ConvergenceDetector):
+    """Реплика повторяет по словам одну из последних window реплик (Жаккар ≥ threshold) patience раз подряд."""
+
+    name = "lexical"
+
+    def __init__(self, threshold: float = 0.6, window: int = 3, patience: int = 2, min_messages: int = 2):
+        super().__init__(min_messages)
+        self.threshold = threshold
+        self.window = window
+        self.patience = patience
+        self._recent: List[set] = []
+        self._streak = 0
+
+    def reset(self, participants: int = 0) -> None:
+        super().reset(participants)
+        self._recent = []
+        self._streak = 0
+
+    def _observe(self, texts: List[str]) -> bool:
+        for text in texts:
+            words = _tokens(text)
+            score = max((_jaccard(words, prev) for prev in self._recent), default=0.0)
+            self._streak = self._streak + 1 if score >= self.threshold else 0
+            self._recent = (self._recent + [words])[-self.window:]
+        return self._streak >= self.patience
+
+
+class EmbeddingSimilarityDetector(ConvergenceDetector):
+    """Соседние реплики близки по смыслу (косинус эмбеддингов ≥ threshold) patience раз подряд."""
+
+    name = "embedding"
+    blocking = True
+
+    def __init__(self, embed: Embed, threshold: float = 0.92, patience: int = 2, min_messages: int = 2):
+        super().__init__(min_messages)
+        self.embed = embed
+        self.threshold = threshold
+        self.patience = patience
+        self._previous: Optional[List[float]] = None
+        self._streak = 0
+
+    def reset(self, participants: int = 0) -> None:
+        super().reset(participants)
+        self._previous = None
+        self._streak = 0
+
+    def _observe(self, texts: List[str]) -> bool:
+        try:
+            vectors = self.embed(texts)
+        except Exception as e:
+            logger.debug("convergence embedding failed: %s", e)
+            return False
+        for vector in vectors:
+            if self._previous is not None and _cosine(vector, self._previous) >= self.threshold:
+                self._streak += 1
+            else:
+                self._streak = 0
+            self._previous = list(vector)
+        return self._streak >= self.patience
+
+
+class ConsensusDetector(ConvergenceDetector):
+    """Последние реплики участников (по одной на каждого) — согласие без возражений."""
+
+    name = "consensus"
+
+    def __init__(self, min_messages: int = 2):
+        super().__init__(min_messages)
+        self._agree = [re.compile(p, re.IGNORECASE) for p in AGREEMENT_PATTERNS]
+        self._disagree = [re.compile(p, re.IGNORECASE) for p in OBJECTION_PATTERNS]
+        self._streak = 0
+
+    def reset(self, participants: int = 0) -> None:
+        super().reset(participants)
+        self._streak = 0
+
+    def is_agreement(self, text: str) -> bool:
+        text = text.lower()
+        if any(p.search(text) for p in self._disagree):
+            return False
+        return any(p.search(text) for p in self._agree)
+
+    def _observe(self, texts: List[str]) -> bool:
+        for text in texts:
+            self._streak = self._streak + 1 if self.is_agreement(text) else 0
+        return self._streak >= self.min_messages
+
+
+class CompositeConvergenceDetector(ConvergenceDetector):
+    """Несколько детекторов: обсуждение сошлось, если сработал любой."""
+
+    name = "composite"
+
+    def __init__(self, detectors: List[ConvergenceDetector]):
+        super().__init__(min_messages=0)
+        self.detectors = detectors
+        self.blocking = any(d.blocking for d in detectors)
+
+    def reset(self, participants: int = 0) -> None:
+        for detector in self.detectors:
+            detector.reset(participants)
+
+    def observe(self, texts: List[str]) -> Optional[str]:
+        reason = None
+        for detector in self.detectors:
+            # Наблюдают все — у каждого своё состояние по раундам
+            fired = detector.observe(texts)
+            reason = reason or fired
+        return reason
+
+
+def _default_embed() -> Optional[Embed]:
+    """
+    Эмбеддинги общего сервиса процесса — только смысловая модель (sentence-transformers):
+    хэширование слов ловит лишь лексические повторы, а для них есть lexical.
+    """
+    from app.services.context_memory.embedding_service import get_embedding_service
+
+    service = get_embedding_service()
+    if not service.semantic:
+        return None
+    return lambda texts: [list(v) for v in service.embed(texts)]
+
+
+def create_convergence_detector(spec: str, embed: Optional[Embed] = None) -> Optional[ConvergenceDetector]:
+    """
+    Собрать детектор по списку имён ("lexical,consensus"). "" / "off" — без детекции.
+    embedding без доступной модели эмбеддингов пропускается.
+    """
+    names = [n.strip().lower() for n in (spec or "").split(",") if n.strip()]
+    if not names or names == ["off"]:
+        return None
+    detectors: List[ConvergenceDetector] = []
+    for name in names:
+        if name == "lexical":
+            detectors.append(LexicalRepetitionDetector())
+        elif name == "consensus":
+            detectors.append(ConsensusDetector())
+        elif name == "embedding":
+            embed_fn = embed or _default_embed()
+            if embed_fn is None:
+                logger.warning("convergence: embedding недоступен (нет chromadb/sentence-transformers) — пропущен")
+                continue
+            detectors.append(EmbeddingSimilarityDetector(embed_fn))
+        else:
+            logger.warning("convergence: неизвестный детектор %s", name)
+    if not detectors:
+        return None
+    return detectors[0] if len(detectors) == 1 else CompositeConvergenceDetector(detectors)
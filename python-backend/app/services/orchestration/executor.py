@@ -1,25 +1,54 @@
 """
 Единый orchestration pipeline executor.
 
-Каждый запрос ОБЯЗАТЕЛЬНО проходит фиксированные стадии:
-NEW_TASK → RETRIEVE_MEMORY → PLAN → DISCUSS → SYNTHESIZE → STORE_MEMORY → FACT_EXTRACTION → UPDATE_GRAPH → DONE
+Каждый запрос ОБЯЗАТЕЛЬНО проходит фиксированные стадии. Порядок задаёт граф зависимостей
+(STAGE_GRAPH в stages.py), независимые стадии выполняются параллельно:
+
+    RETRIEVE_MEMORY ┐                ┌ SYNTHESIZE → STORE_MEMORY
+                    ├→ DISCUSS ──────┤
+    PLAN ───────────┘                └ FACT_EXTRACTION → UPDATE_GRAPH
 
 SolutionSynthesizer — FINAL DECISION MAKER, ВСЕГДА после discussion.
 """
 import asyncio
 import logging
+import time
 from typing import Callable, Awaitable, Optional, Any
 
-from .stages import PipelineStage, TaskState
+from app.services.agents_orchestration.streaming import (
+    DeltaCallback,
+    StreamRouter,
+    activate_stream_router,
+    deactivate_stream_router,
+)
+
+from app.services.metrics import PIPELINE_RUN_SECONDS, PIPELINE_STAGE_SECONDS
+
+from .checkpoints import CheckpointStore
+from .convergence import ConvergenceDetector, create_convergence_detector
+from .pacing import PacingController
+from .stages import STAGE_GRAPH, PipelineStage, StageSpec, TaskState, stage_dependencies
 from .solution_synthesizer import SolutionSynthesizer
 from .fact_extractor import FactExtractor
 
 logger = logging.getLogger("aigod.orchestration.executor")
 
+# Обработчики этапов графа (методы PipelineExecutor)
+_STAGE_HANDLERS = {
+    PipelineStage.RETRIEVE_MEMORY: "_stage_retrieve_memory",
+    PipelineStage.PLAN: "_stage_plan",
+    PipelineStage.DISCUSS: "_stage_discuss",
+    PipelineStage.SYNTHESIZE: "_stage_synthesize",
+    PipelineStage.STORE_MEMORY: "_stage_store_memory",
+    PipelineStage.FACT_EXTRACTION: "_stage_extract_facts",
+    PipelineStage.UPDATE_GRAPH: "_stage_update_graph",
+}
+_STAGE_DEPENDENCIES = stage_dependencies(STAGE_GRAPH)
+
 
 class PipelineExecutor:
     """
-    Движок выполнения: каждый этап — обязательный шаг.
+    Движок выполнения: каждый этап — обязательный шаг, независимые этапы идут параллельно.
     """
     def __init__(
         self,
@@ -29,6 +58,10 @@ class PipelineExecutor:
         agents: list[str],
         on_message: Optional[Callable[[Any], Awaitable[None]]] = None,
         max_discuss_rounds: int = 5,
+        on_delta: Optional[DeltaCallback] = None,
+        fast_forward: Optional[bool] = None,
+        convergence: Optional[ConvergenceDetector] = None,
+        checkpoints: Optional[CheckpointStore] = None,
     ):
         self.room = room
         self.chat_service = chat_service
@@ -36,10 +69,39 @@ class PipelineExecutor:
         self.agents = agents
         self.on_message = on_message
         self.max_discuss_rounds = max_discuss_rounds
-
-    async def run(self, user_message: str, sender: str = "user") -> TaskState:
+        # Стриминг ответов агентов на этапе discuss: (stream_id, agent_name, delta)
+        self.on_delta = on_delta
+        self._stream_router: Optional[StreamRouter] = None
+        # Темп обсуждения: скорость комнаты (меняется на лету через PATCH /speed), fast-forward без пауз
+        if fast_forward is None:
+            from app.config import config
+            fast_forward = config.ORCHESTRATION_FAST_FORWARD
+        self.pacing = PacingController(speed=getattr(room, "speed", None) or 1.0, fast_forward=fast_forward)
+        # Ранняя остановка обсуждения, когда агенты начали повторяться или пришли к согласию
+        if convergence is None:
+            from app.config import config
+            convergence = create_convergence_detector(config.DISCUSS_CONVERGENCE)
+        self.convergence = convergence
+        # Выходы этапов пишутся в SQLite — прерванный прогон продолжается с последнего этапа
+        self.checkpoints = checkpoints
+        # chat_service может пережить executor — считаем только вызовы этого прогона
+        self._calls_base = self._chat_calls()
+
+    @property
+    def llm_calls(self) -> int:
+        """Вызовы LLM, сделанные chat_service (если он их считает), — для метрик очереди pipeline."""
+        return self._chat_calls() - self._calls_base
+
+    def _chat_calls(self) -> int:
+        calls = getattr(self.chat_service, "calls", 0)
+        return calls if isinstance(calls, int) else 0
+
+    async def run(self, user_message: str, sender: str = "user", resume_from: Optional[int] = None) -> TaskState:
         """
         Выполнить полный pipeline. Каждый этап — обязательный.
+
+        resume_from — id контрольной точки: завершённые в ней этапы не выполняются повторно,
+        их выходы восстанавливаются в TaskState.
         """
         state = TaskState(
             user_message=user_message,
@@ -48,52 +110,89 @@ class PipelineExecutor:
             room=self.room,
             sender=sender,
         )
-        logger.info("pipeline_executor RUN room_id=%s user_len=%d", state.room_id, len(user_message))
+        if self.checkpoints is not None:
+            restored = self.checkpoints.restore(resume_from, state) if resume_from is not None else None
+            if restored is not None:
+                state.resumed_stages = restored
+                state.checkpoint_id = resume_from
+            else:
+                state.checkpoint_id = self.checkpoints.start(state)
+        logger.info(
+            "pipeline_executor RUN room_id=%s user_len=%d resumed=%s",
+            state.room_id, len(state.user_message), [s.name for s in state.resumed_stages],
+        )
+        started = time.monotonic()
 
         try:
-            # 1. RETRIEVE_MEMORY — обязательно
-            state.transition_to(PipelineStage.RETRIEVE_MEMORY)
-            await self._stage_retrieve_memory(state)
-            logger.info("pipeline_executor stage=RETRIEVE_MEMORY done room_id=%s", state.room_id)
-
-            # 2. PLAN — обязательно
-            state.transition_to(PipelineStage.PLAN)
-            await self._stage_plan(state)
-            logger.info("pipeline_executor stage=PLAN done room_id=%s", state.room_id)
-
-            # 3. DISCUSS — обязательно (стратегия)
-            state.transition_to(PipelineStage.DISCUSS)
-            await self._stage_discuss(state)
-            logger.info("pipeline_executor stage=DISCUSS done room_id=%s msgs=%d", state.room_id, len(state.discussion_messages))
-
-            # 4. SYNTHESIZE — обязательно (SolutionSynthesizer: FINAL DECISION MAKER)
-            state.transition_to(PipelineStage.SYNTHESIZE)
-            await self._stage_synthesize(state)
-            logger.info("pipeline_executor stage=SYNTHESIZE done room_id=%s", state.room_id)
-
-            # 5. STORE_MEMORY — обязательно
-            state.transition_to(PipelineStage.STORE_MEMORY)
-            await self._stage_store_memory(state)
-            logger.info("pipeline_executor stage=STORE_MEMORY done room_id=%s", state.room_id)
-
-            # 6. FACT_EXTRACTION — обязательно (триплеты для графа)
-            state.transition_to(PipelineStage.FACT_EXTRACTION)
-            await self._stage_extract_facts(state)
-            logger.info("pipeline_executor stage=FACT_EXTRACTION done room_id=%s facts=%d", state.room_id, len(state.extracted_facts))
-
-            # 7. UPDATE_GRAPH — обязательно (включая facts)
-            state.transition_to(PipelineStage.UPDATE_GRAPH)
-            await self._stage_update_graph(state)
-            logger.info("pipeline_executor stage=UPDATE_GRAPH done room_id=%s", state.room_id)
-
+            await self._run_stage_graph(state)
+        except asyncio.CancelledError:
+            self._checkpoint_status(state, "cancelled")
+            PIPELINE_RUN_SECONDS.observe(time.monotonic() - started, "cancelled")
+            raise
         except Exception as e:
             logger.exception("pipeline_executor ERROR room_id=%s stage=%s: %s", state.room_id, state.stage, e)
             state.error = str(e)
 
+        state.total_duration = time.monotonic() - started
+        state.llm_calls = self.llm_calls
         state.transition_to(PipelineStage.DONE)
-        logger.info("pipeline_executor DONE room_id=%s", state.room_id)
+        PIPELINE_RUN_SECONDS.observe(state.total_duration, "error" if state.error else "ok")
+        if state.error:
+            self._checkpoint_status(state, "failed", state.error)
+        elif self.checkpoints is not None and state.checkpoint_id is not None:
+            self.checkpoints.complete(state.checkpoint_id, state.room_id)
+        logger.info(
+            "pipeline_executor DONE room_id=%s total=%.0fms stages=%s",
+            state.room_id, state.total_duration * 1000,
+            {name: round(sec * 1000) for name, sec in state.stage_durations.items()},
+        )
         return state
 
+    def _checkpoint_status(self, state: TaskState, status: str, error: Optional[str] = None) -> None:
+        if self.checkpoints is not None and state.checkpoint_id is not None:
+            self.checkpoints.mark(state.checkpoint_id, status, error)
+
+    async def _run_stage_graph(self, state: TaskState) -> None:
+        """
+        Выполнить этапы по графу зависимостей: этап стартует, как только завершены все этапы,
+        производящие его входы. Ошибка этапа останавливает pipeline — новые этапы не запускаются,
+        выполняющиеся отменяются, исключение пробрасывается.
+        """
+        done: set = set(state.resumed_stages)
+        pending = [spec for spec in STAGE_GRAPH if spec.stage not in done]
+        running: dict = {}
+        try:
+            while pending or running:
+                for spec in [s for s in pending if _STAGE_DEPENDENCIES[s.stage] <= done]:
+                    pending.remove(spec)
+                    running[asyncio.ensure_future(self._run_stage(spec, state))] = spec
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    spec = running.pop(task)
+                    task.result()
+                    done.add(spec.stage)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def _run_stage(self, spec: StageSpec, state: TaskState) -> None:
+        state.transition_to(spec.stage)
+        started = time.monotonic()
+        try:
+            await getattr(self, _STAGE_HANDLERS[spec.stage])(state)
+        finally:
+            state.stage_durations[spec.stage.name] = time.monotonic() - started
+            PIPELINE_STAGE_SECONDS.observe(state.stage_durations[spec.stage.name], spec.stage.name)
+        state.completed_stages.append(spec.stage)
+        if self.checkpoints is not None and state.checkpoint_id is not None:
+            self.checkpoints.save_stage(state.checkpoint_id, state, spec)
+        logger.info(
+            "pipeline_executor stage=%s done room_id=%s %.0fms",
+            spec.stage.name, state.room_id, state.stage_durations[spec.stage.name] * 1000,
+        )
+
     async def _stage_retrieve_memory(self, state: TaskState) -> None:
         """Обязательный этап: загрузить память."""
         try:
@@ -116,7 +215,27 @@ class PipelineExecutor:
         # Опционально: LLM-планировщик при необходимости
 
     async def _stage_discuss(self, state: TaskState) -> None:
-        """Обязательный этап: обсуждение агентов через стратегию."""
+        """Обязательный этап: обсуждение агентов через стратегию (со стримингом, если задан on_delta)."""
+        if not self.on_delta:
+            await self._run_discussion(state)
+            return
+        self._stream_router = StreamRouter(self.on_delta)
+        token = activate_stream_router(self._stream_router)
+        try:
+            await self._run_discussion(state)
+        finally:
+            deactivate_stream_router(token)
+            self._stream_router = None
+
+    def _attach_stream_id(self, msg: Any) -> None:
+        """Связать итоговое сообщение с потоком фрагментов, если ответ стримился."""
+        if self._stream_router is None or not hasattr(msg, "metadata"):
+            return
+        stream_id = self._stream_router.claim(getattr(msg, "sender", ""), getattr(msg, "content", ""))
+        if stream_id:
+            msg.metadata["stream_id"] = stream_id
+
+    async def _run_discussion(self, state: TaskState) -> None:
         # Настраиваем context для стратегии
         self.strategy.context.current_user_message = state.user_message
         self.strategy.context.update_memory("_user_message", state.user_message)
@@ -131,22 +250,25 @@ class PipelineExecutor:
             if self.on_message and hasattr(msg, "type"):
                 from app.services.agents_orchestration.message_type import MessageType
                 if msg.type in (MessageType.AGENT, MessageType.NARRATOR, MessageType.SUMMARIZED):
+                    self._attach_stream_id(msg)
                     await self.on_message(msg)
 
-        # При speed=1 задержка 2 с; при speed=2 — 1 с; при 0.5 — 4 с
-        base_delay = 2.0
-        speed = max(0.1, float(getattr(self.room, "speed", None) or 1.0))
-        tick_delay = base_delay / speed
-
+        if self.convergence is not None:
+            self.convergence.reset(participants=len(state.agent_names))
+        calls_before = self.llm_calls
         round_count = 0
+        state.stop_reason = "max_rounds"
         while round_count < self.max_discuss_rounds:
             if self.strategy.should_stop():
+                state.stop_reason = "strategy"
                 break
 
+            # Интервал между началами раундов — 2.0 / speed; время самого раунда (LLM) вычитается из паузы
+            self.pacing.start_round()
             messages = await self.strategy.tick(self.agents)
             if not messages:
                 round_count += 1
-                await asyncio.sleep(tick_delay)
+                await self._pace(round_count)
                 continue
 
             for msg in messages:
@@ -154,6 +276,7 @@ class PipelineExecutor:
                 if hasattr(msg, "sender") and hasattr(msg, "content"):
                     self.strategy.context.add_message(msg)
                     if self.on_message:
+                        self._attach_stream_id(msg)
                         await self.on_message(msg)
                     try:
                         from app.services.agents_orchestration.message_type import MessageType
@@ -169,12 +292,44 @@ class PipelineExecutor:
                         pass
 
             round_count += 1
-            await asyncio.sleep(tick_delay)
+            converged = await self._check_convergence(messages)
+            if converged:
+                state.stop_reason = f"converged:{converged}"
+                break
+            await self._pace(round_count)
+
+        state.discuss_rounds = round_count
+        if state.stop_reason.startswith("converged:"):
+            # Оценка: оставшиеся раунды по среднему числу вызовов LLM за раунд (или по репликам)
+            spent = self.llm_calls - calls_before or sum(1 for m in state.discussion_messages if hasattr(m, "content"))
+            state.calls_saved = round((self.max_discuss_rounds - round_count) * spent / max(1, round_count))
+            logger.info(
+                "pipeline_executor discuss converged room_id=%s reason=%s rounds=%d calls_saved~%d",
+                state.room_id, state.stop_reason, round_count, state.calls_saved,
+            )
+        logger.info("pipeline_executor discuss pacing room_id=%s %s", state.room_id, self.pacing.get_stats())
+
+    async def _check_convergence(self, messages: list) -> Optional[str]:
+        """Передать реплики агентов раунда детектору сходимости. Причина остановки или None."""
+        if self.convergence is None:
+            return None
+        from app.services.agents_orchestration.message_type import MessageType
+        texts = [m.content for m in messages if getattr(m, "type", None) == MessageType.AGENT]
+        if not texts:
+            return None
+        if self.convergence.blocking:
+            return await asyncio.to_thread(self.convergence.observe, texts)
+        return self.convergence.observe(texts)
+
+    async def _pace(self, round_count: int) -> None:
+        """Пауза до следующего раунда; после последнего раунда не ждём."""
+        if round_count < self.max_discuss_rounds:
+            await self.pacing.wait()
 
     async def _stage_synthesize(self, state: TaskState) -> None:
         """Обязательный этап: SolutionSynthesizer — FINAL DECISION MAKER. ВСЕГДА выполняется."""
         synth_agent = self.agents[-1] if self.agents else "System"
-        synthesizer = SolutionSynthesizer(chat_service=self.chat_service, agent_name=synth_agent)
+        synthesizer = SolutionSynthesizer(chat_service=self.chat_service, agent_name=synth_agent, use_cache=True)
         state.synthesized_answer = await synthesizer.synthesize(state)
 
         if state.synthesized_answer and self.on_message:
@@ -211,7 +366,7 @@ class PipelineExecutor:
 
     async def _stage_extract_facts(self, state: TaskState) -> None:
         """Обязательный этап: извлечь структурированные факты (триплеты) для графа."""
-        extractor = FactExtractor(chat_service=self.chat_service)
+        extractor = FactExtractor(chat_service=self.chat_service, use_cache=True)
         state.extracted_facts = await extractor.extract(state)
 
     async def _stage_update_graph(self, state: TaskState) -> None:
@@ -225,16 +380,15 @@ class PipelineExecutor:
             manager = get_relationship_manager(self.room)
             if state.extracted_facts:
                 manager.update_from_facts(state.extracted_facts, state.agent_names)
-            prev_texts: list[str] = []
-            for msg in state.discussion_messages:
-                if hasattr(msg, "sender") and hasattr(msg, "content"):
-                    await manager.process_message(
-                        message=msg.content,
-                        sender=msg.sender,
-                        participants=state.agent_names,
-                        context=prev_texts.copy() if prev_texts else None,
-                    )
-                    prev_texts.append(f"{msg.sender}: {msg.content}")
+            # Обсуждение целиком за один проход: влияния копятся и применяются одним обновлением графа
+            await manager.process_discussion(
+                [
+                    (msg.sender, msg.content)
+                    for msg in state.discussion_messages
+                    if hasattr(msg, "sender") and hasattr(msg, "content")
+                ],
+                state.agent_names,
+            )
             await sync_graph_to_db_and_broadcast(self.room, manager)
             state.graph_updated = True
         except Exception as e:
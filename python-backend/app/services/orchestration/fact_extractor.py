@@ -28,8 +28,10 @@ class FactExtractor:
     """
     Извлекает факты из диалога для обновления графа.
     """
-    def __init__(self, chat_service=None):
+    def __init__(self, chat_service=None, use_cache: bool = False):
         self.chat_service = chat_service
+        # Извлечение фактов детерминировано по обсуждению — chat_service может отдать ответ из кэша
+        self._call_kwargs = {"cache": True} if use_cache else {}
 
     async def extract(self, state: Any) -> List[Fact]:
         """
@@ -63,14 +65,12 @@ class FactExtractor:
     async def _extract_via_llm(self, state: Any, discussion_text: str) -> List[Fact]:
         """Извлечь факты через LLM."""
         agent_name = state.agent_names[0] if state.agent_names else "System"
+        # Обсуждение — секция history (обрезается с начала), инструкции остаются в конце промпта
         prompt = f"""
-Extract structured facts from this discussion as SUBJECT -> PREDICATE -> OBJECT triplets.
+Extract structured facts from the discussion above as SUBJECT -> PREDICATE -> OBJECT triplets.
 
 USER REQUEST: {state.user_message}
 
-DISCUSSION:
-{discussion_text}
-
 Output ONLY triplets, one per line:
 Subject | predicate | Object
 
@@ -86,6 +86,8 @@ Output (one triplet per line):
             "fact_extraction_session",
             prompt,
             context=None,
+            sections={"history": discussion_text},
+            **self._call_kwargs,
         )
         return self._parse_triplets(response)
 
@@ -0,0 +1,261 @@
+"""
+Очередь входящих сообщений pipeline по комнатам.
+
+Раньше каждое новое сообщение отменяло идущий pipeline комнаты: все уже потраченные на него
+вызовы LLM выбрасывались, а три быстрых сообщения подряд сжигали три незавершённых прогона.
+Теперь у комнаты есть очередь и политика (PIPELINE_INPUT_POLICY):
+
+- cancel — как раньше: новое сообщение отменяет текущий прогон и запускает свой;
+- queue  — прогоны идут по очереди, каждое сообщение обрабатывается отдельно (по умолчанию);
+- merge  — сообщения, пришедшие в пределах окна PIPELINE_DEBOUNCE_SECONDS (и во время
+  текущего прогона), объединяются в один прогон; текущий прогон не отменяется. Включается
+  явно: пользователь получает один ответ на несколько сообщений.
+
+Если прогон не удалось собрать (комната без агентов, YandexGPT недоступен, ошибка сборки),
+воркер пишет предупреждение и вызывает on_unavailable — сообщение не пропадает молча.
+
+Продолжение прерванного прогона (resume_from — id контрольной точки) идёт отдельным прогоном
+и с другими сообщениями не объединяется.
+
+Метрики: сколько прогонов и вызовов LLM сэкономлено объединением, сколько потеряно отменами.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("aigod.orchestration.queue")
+
+POLICIES = ("cancel", "queue", "merge")
+
+# (room_id, text, sender) -> executor с .run(text, sender) и .llm_calls, либо None (запуск невозможен)
+ExecutorFactory = Callable[[int, str, str], Awaitable[Optional[Any]]]
+# (room_id, text, sender) — прогон не собран: сообщить в комнату, что ответа не будет
+UnavailableCallback = Callable[[int, str, str], Awaitable[None]]
+# Сообщение в очереди: (text, sender, resume_from)
+_Item = Tuple[str, str, Optional[int]]
+
+
+@dataclass
+class _RoomQueue:
+    pending: List[_Item] = field(default_factory=list)
+    last_arrival: float = 0.0
+    worker: Optional[asyncio.Task] = None
+    run_task: Optional[asyncio.Task] = None
+    executor: Any = None
+    arrived: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+def merge_inputs(items: List[Tuple]) -> Tuple[str, str]:
+    """Объединить сообщения в один вход pipeline: тексты по строкам, отправитель — последний."""
+    if len(items) == 1:
+        return items[0][0], items[0][1]
+    return "\n".join(item[0] for item in items), items[-1][1]
+
+
+class PipelineInputQueue:
+    """
+    Входная очередь pipeline: на комнату — один воркер, который запускает прогоны по политике.
+    Работает в одном event loop.
+    """
+
+    def __init__(
+        self,
+        create_executor: ExecutorFactory,
+        policy: str = "queue",
+        debounce_seconds: float = 1.0,
+        max_pending: int = 20,
+        on_unavailable: Optional[UnavailableCallback] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика очереди pipeline: {policy} (ожидается {', '.join(POLICIES)})")
+        self.create_executor = create_executor
+        self.policy = policy
+        self.debounce_seconds = max(0.0, debounce_seconds)
+        self.max_pending = max(1, max_pending)
+        self.on_unavailable = on_unavailable
+        self._rooms: Dict[int, _RoomQueue] = {}
+        # Event loop воркеров: sync-эндпоинты (пул потоков) передают в него изменения идущих прогонов
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {
+            "submitted": 0,
+            "runs_started": 0,
+            "runs_completed": 0,
+            "runs_cancelled": 0,
+            "messages_merged": 0,
+            "runs_saved": 0,
+            "dropped": 0,
+            "unavailable": 0,
+            "llm_calls": 0,
+            "llm_calls_completed": 0,
+            "llm_calls_wasted": 0,
+        }
+
+    async def submit(self, room_id: int, text: str, sender: str = "user", resume_from: Optional[int] = None) -> bool:
+        """
+        Поставить сообщение в очередь комнаты. Прогон стартует по политике (сразу или после окна).
+        resume_from — продолжить прерванный прогон с контрольной точки.
+        """
+        self.loop = asyncio.get_running_loop()
+        room = self._rooms.setdefault(room_id, _RoomQueue())
+        self.stats["submitted"] += 1
+        if self.policy == "cancel":
+            # Ожидающие вытесняются новым сообщением, идущий прогон отменяется
+            self.stats["dropped"] += len(room.pending)
+            room.pending.clear()
+            if room.run_task and not room.run_task.done():
+                room.run_task.cancel()
+        elif len(room.pending) >= self.max_pending:
+            room.pending.pop(0)
+            self.stats["dropped"] += 1
+            logger.warning("pipeline_queue room_id=%s переполнена, старое сообщение отброшено", room_id)
+        room.pending.append((text, sender, resume_from))
+        room.last_arrival = time.monotonic()
+        room.arrived.set()
+        if room.worker is None or room.worker.done():
+            room.worker = asyncio.create_task(self._worker(room_id, room))
+        logger.info(
+            "pipeline_queue room_id=%s policy=%s pending=%d running=%s",
+            room_id, self.policy, len(room.pending), bool(room.run_task and not room.run_task.done()),
+        )
+        return True
+
+    async def cancel(self, room_id: int) -> bool:
+        """Отменить прогон и очередь комнаты. True, если что-то выполнялось или ждало."""
+        room = self._rooms.pop(room_id, None)
+        if room is None:
+            return False
+        was_active = bool(room.pending) or bool(room.run_task and not room.run_task.done())
+        room.pending.clear()
+        if room.worker and not room.worker.done():
+            room.worker.cancel()
+            try:
+                await room.worker
+            except asyncio.CancelledError:
+                pass
+        return was_active
+
+    def running_executor(self, room_id: int) -> Any:
+        """Executor выполняющегося прогона комнаты (или None)."""
+        room = self._rooms.get(room_id)
+        if room is None or room.run_task is None or room.run_task.done():
+            return None
+        return room.executor
+
+    def active_runs(self) -> int:
+        """Число выполняющихся прогонов (по комнатам)."""
+        return sum(1 for room in self._rooms.values() if room.run_task is not None and not room.run_task.done())
+
+    async def shutdown(self) -> None:
+        for room_id in list(self._rooms):
+            await self.cancel(room_id)
+
+    async def _wait_debounce(self, room: _RoomQueue) -> None:
+        """merge: ждать, пока с последнего сообщения не пройдёт окно (новые сообщения продлевают его)."""
+        while True:
+            remaining = self.debounce_seconds - (time.monotonic() - room.last_arrival)
+            if remaining <= 0:
+                return
+            room.arrived.clear()
+            try:
+                await asyncio.wait_for(room.arrived.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return
+
+    def _take(self, room: _RoomQueue) -> List[_Item]:
+        if self.policy != "merge" or room.pending[0][2] is not None:
+            return [room.pending.pop(0)]
+        # Объединяются подряд идущие новые сообщения — до первого продолжения прогона
+        count = 1
+        while count < len(room.pending) and room.pending[count][2] is None:
+            count += 1
+        batch, room.pending = room.pending[:count], room.pending[count:]
+        return batch
+
+    async def _worker(self, room_id: int, room: _RoomQueue) -> None:
+        try:
+            while room.pending:
+                if self.policy == "merge":
+                    await self._wait_debounce(room)
+                batch = self._take(room)
+                if len(batch) > 1:
+                    self.stats["messages_merged"] += len(batch)
+                    self.stats["runs_saved"] += len(batch) - 1
+                    logger.info("pipeline_queue room_id=%s объединено сообщений: %d", room_id, len(batch))
+                text, sender = merge_inputs(batch)
+                try:
+                    executor = await self.create_executor(room_id, text, sender)
+                except Exception as e:
+                    logger.exception("pipeline_queue room_id=%s сборка прогона упала: %s", room_id, e)
+                    executor = None
+                if executor is None:
+                    await self._report_unavailable(room_id, text, sender)
+                    continue
+                await self._run(room_id, room, executor, text, sender, batch[0][2])
+        finally:
+            if room.run_task and not room.run_task.done():
+                room.run_task.cancel()
+                await asyncio.wait([room.run_task])
+            room.run_task = None
+            room.executor = None
+            if self._rooms.get(room_id) is room and not room.pending:
+                del self._rooms[room_id]
+
+    async def _report_unavailable(self, room_id: int, text: str, sender: str) -> None:
+        self.stats["unavailable"] += 1
+        logger.warning("pipeline_queue room_id=%s прогон не собран, сообщение без ответа text_len=%d", room_id, len(text))
+        if self.on_unavailable is None:
+            return
+        try:
+            await self.on_unavailable(room_id, text, sender)
+        except Exception as e:
+            logger.warning("pipeline_queue room_id=%s уведомление о сбое не отправлено: %s", room_id, e)
+
+    async def _run(
+        self, room_id: int, room: _RoomQueue, executor: Any, text: str, sender: str, resume_from: Optional[int],
+    ) -> None:
+        room.executor = executor
+        run = executor.run(text, sender) if resume_from is None else executor.run(text, sender, resume_from=resume_from)
+        room.run_task = asyncio.create_task(run)
+        self.stats["runs_started"] += 1
+        logger.info("pipeline_queue room_id=%s RUN text_len=%d sender=%s", room_id, len(text), sender)
+        # asyncio.wait не пробрасывает отмену прогона — отменённый прогон не останавливает воркер
+        await asyncio.wait([room.run_task])
+        calls = getattr(executor, "llm_calls", 0)
+        calls = calls if isinstance(calls, int) else 0
+        self.stats["llm_calls"] += calls
+        if room.run_task.cancelled():
+            self.stats["runs_cancelled"] += 1
+            self.stats["llm_calls_wasted"] += calls
+            logger.info("pipeline_queue room_id=%s CANCELLED, потеряно вызовов LLM: %d", room_id, calls)
+        else:
+            self.stats["runs_completed"] += 1
+            self.stats["llm_calls_completed"] += calls
+            if room.run_task.exception() is not None:
+                logger.error("pipeline_queue room_id=%s прогон упал: %s", room_id, room.run_task.exception())
+        room.run_task = None
+        room.executor = None
+
+    def get_stats(self) -> dict:
+        completed = self.stats["runs_completed"]
+        avg_calls = self.stats["llm_calls_completed"] / completed if completed else 0.0
+        return {
+            "policy": self.policy,
+            "debounceSeconds": self.debounce_seconds,
+            "rooms": len(self._rooms),
+            "pending": sum(len(r.pending) for r in self._rooms.values()),
+            "submitted": self.stats["submitted"],
+            "runsStarted": self.stats["runs_started"],
+            "runsCompleted": completed,
+            "runsCancelled": self.stats["runs_cancelled"],
+            "messagesMerged": self.stats["messages_merged"],
+            "runsSaved": self.stats["runs_saved"],
+            "dropped": self.stats["dropped"],
+            "unavailable": self.stats["unavailable"],
+            "llmCalls": self.stats["llm_calls"],
+            "llmCallsWasted": self.stats["llm_calls_wasted"],
+            "avgLlmCallsPerRun": round(avg_calls, 2),
+            # Оценка: каждый сэкономленный прогон стоил бы в среднем столько же вызовов, сколько завершённый
+            "llmCallsSavedEstimate": round(self.stats["runs_saved"] * avg_calls, 1),
+        }
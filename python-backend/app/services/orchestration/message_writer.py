@@ -0,0 +1,272 @@
+"""
+Отложенная (write-behind) запись сообщений pipeline в SQLite.
+
+Раньше колбэк on_message на каждое сообщение агента открывал сессию, коммитил Message,
+делал refresh ради id и created_at, затем добавлял Memory и Plan и коммитил ещё раз —
+два fsync под единственным writer-lock SQLite на каждую реплику. Теперь:
+
+- id сообщения выдаёт MessageIdAllocator из памяти (максимум id читается из БД один раз),
+  created_at задаётся в Python — broadcast уходит сразу, без обращения к БД;
+- строки Message/Memory/Plan копятся в буфере комнаты и пишутся одной транзакцией:
+  по таймеру (MESSAGE_FLUSH_INTERVAL_MS), при MESSAGE_FLUSH_BATCH строках, перед сборкой
+  следующего прогона комнаты и при остановке приложения. Memory/Plan пишутся в savepoint:
+  их сбой откатывает только их (memoryErrors), сообщения всё равно коммитятся.
+
+Чтобы id из памяти не пересекались с сообщениями, которые вставляют роутеры (POST /messages),
+аллокатор подключается к before_insert модели Message и выдаёт id всем вставкам процесса.
+Расчёт на один процесс-writer (uvicorn с одним worker, как и для SQLite в целом).
+
+Гарантии (MESSAGE_DURABILITY):
+- batched — broadcast до записи; при падении процесса теряется не больше последнего окна;
+- strict — строки сообщения пишутся одной транзакцией до broadcast (один fsync вместо двух).
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("aigod.orchestration.message_writer")
+
+DURABILITY_MODES = ("batched", "strict")
+# Сколько раз повторять запись пачки (БД занята), прежде чем отбросить её
+MAX_WRITE_ATTEMPTS = 3
+
+
+class MessageIdAllocator:
+    """Выдача id таблицы messages из памяти. Потокобезопасно: роутеры вставляют из threadpool."""
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None):
+        if session_factory is None:
+            from app.database.sqlite_setup import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self._next: Optional[int] = None
+        self._lock = threading.Lock()
+        self._installed = False
+
+    @staticmethod
+    def _max_id(connection) -> int:
+        from sqlalchemy import func, select
+        from app.models.message import Message as DBMessage
+        return connection.execute(select(func.max(DBMessage.id))).scalar() or 0
+
+    def allocate(self, connection=None) -> int:
+        with self._lock:
+            if self._next is None:
+                if connection is not None:
+                    self._next = self._max_id(connection) + 1
+                else:
+                    session = self.session_factory()
+                    try:
+                        self._next = self._max_id(session) + 1
+                    finally:
+                        session.close()
+            allocated = self._next
+            self._next += 1
+            return allocated
+
+    def _before_insert(self, mapper, connection, target) -> None:
+        if target.id is None:
+            target.id = self.allocate(connection)
+
+    def install(self) -> None:
+        """Выдавать id и обычным вставкам Message (роутеры), чтобы они не заняли выданные id."""
+        if not self._installed:
+            from sqlalchemy import event
+            from app.models.message import Message as DBMessage
+            event.listen(DBMessage, "before_insert", self._before_insert)
+            self._installed = True
+
+    def uninstall(self) -> None:
+        if self._installed:
+            from sqlalchemy import event
+            from app.models.message import Message as DBMessage
+            event.remove(DBMessage, "before_insert", self._before_insert)
+            self._installed = False
+
+
+@dataclass
+class PendingMessage:
+    """Сообщение с уже выданными id и created_at, ожидающее записи."""
+    id: int
+    room_id: int
+    agent_id: Optional[int]
+    text: str
+    sender: str
+    created_at: datetime
+    # Мост для API keyMemories/plans: Memory и Plan агента пишутся вместе с сообщением
+    with_memory: bool = False
+    attempts: int = 0
+
+
+class MessageWriteBehind:
+    """Буферы сообщений по комнатам и их пакетная запись."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Any]] = None,
+        durability: str = "batched",
+        flush_interval: float = 0.25,
+        max_batch: int = 50,
+        allocator: Optional[MessageIdAllocator] = None,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Неизвестный режим записи {durability!r}: ожидается один из {DURABILITY_MODES}")
+        if session_factory is None:
+            from app.database.sqlite_setup import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self.durability = durability
+        self.flush_interval = max(0.0, flush_interval)
+        self.max_batch = max(1, max_batch)
+        self.allocator = allocator or MessageIdAllocator(session_factory)
+        self.allocator.install()
+        self._buffers: Dict[int, List[PendingMessage]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+        self.stats = {"submitted": 0, "flushes": 0, "written": 0, "errors": 0, "dropped": 0, "memory_errors": 0}
+
+    def submit(
+        self, room_id: int, agent_id: Optional[int], text: str, sender: str, with_memory: bool = False,
+    ) -> PendingMessage:
+        """Выдать id и created_at и поставить сообщение в буфер комнаты (strict — сразу записать)."""
+        pending = PendingMessage(
+            id=self.allocator.allocate(),
+            room_id=room_id,
+            agent_id=agent_id,
+            text=text,
+            sender=sender,
+            # UTC без tzinfo — как server_default func.now() в SQLite
+            created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            with_memory=with_memory,
+        )
+        self.stats["submitted"] += 1
+        buffer = self._buffers.setdefault(room_id, [])
+        buffer.append(pending)
+        if self.durability == "strict" or len(buffer) >= self.max_batch:
+            self.flush(room_id)
+        else:
+            self._schedule(room_id)
+        return pending
+
+    def pending(self, room_id: Optional[int] = None) -> int:
+        if room_id is not None:
+            return len(self._buffers.get(room_id, ()))
+        return sum(len(b) for b in self._buffers.values())
+
+    def _schedule(self, room_id: int, flush_without_loop: bool = True) -> None:
+        if room_id in self._timers:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне event loop таймер не поставить: пишем сразу (повтор — при следующем flush)
+            if flush_without_loop:
+                self.flush(room_id)
+            return
+        self._timers[room_id] = loop.create_task(self._flush_later(room_id))
+
+    async def _flush_later(self, room_id: int) -> None:
+        await asyncio.sleep(self.flush_interval)
+        # Отменённый таймер сюда не доходит: flush() уже снял его и, возможно, поставил новый
+        if self._timers.get(room_id) is asyncio.current_task():
+            del self._timers[room_id]
+        self.flush(room_id)
+
+    def flush(self, room_id: Optional[int] = None) -> int:
+        """Записать буфер комнаты (или всех комнат). Возвращает число записанных сообщений."""
+        room_ids = [room_id] if room_id is not None else list(self._buffers)
+        written = 0
+        for rid in room_ids:
+            timer = self._timers.pop(rid, None)
+            if timer is not None:
+                timer.cancel()
+            batch = self._buffers.pop(rid, None)
+            if batch:
+                written += self._write(rid, batch)
+        return written
+
+    def _write(self, room_id: int, batch: List[PendingMessage]) -> int:
+        from app.models.memory import Memory
+        from app.models.message import Message as DBMessage
+        from app.models.plan import Plan
+
+        session = self.session_factory()
+        try:
+            for p in batch:
+                session.add(DBMessage(
+                    id=p.id, room_id=p.room_id, agent_id=p.agent_id, text=p.text, sender=p.sender,
+                    created_at=p.created_at,
+                ))
+            session.flush()
+            with_memory = [p for p in batch if p.with_memory and p.agent_id]
+            if with_memory:
+                # Memory/Plan — в savepoint: их сбой не должен откатить уже разосланные сообщения
+                try:
+                    with session.begin_nested():
+                        for p in with_memory:
+                            session.add(Memory(
+                                agent_id=p.agent_id,
+                                room_id=p.room_id,
+                                content=p.text[:2000],
+                                importance=0.6,
+                            ))
+                            desc = p.text[:150] + "..." if len(p.text) > 150 else p.text
+                            session.add(Plan(
+                                agent_id=p.agent_id,
+                                description=desc.strip() or "Участие в обсуждении",
+                                status="done",
+                            ))
+                except Exception as e:
+                    self.stats["memory_errors"] += 1
+                    logger.warning("message_writer room_id=%s запись Memory/Plan не удалась: %s", room_id, e)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.stats["errors"] += 1
+            retry = [p for p in batch if p.attempts + 1 < MAX_WRITE_ATTEMPTS]
+            for p in retry:
+                p.attempts += 1
+            dropped = len(batch) - len(retry)
+            if dropped:
+                self.stats["dropped"] += dropped
+                logger.error("message_writer room_id=%s отброшено %d сообщений: %s", room_id, dropped, e)
+            else:
+                logger.warning("message_writer room_id=%s запись пачки не удалась, повтор: %s", room_id, e)
+            if retry:
+                self._buffers[room_id] = retry + self._buffers.get(room_id, [])
+                self._schedule(room_id, flush_without_loop=False)
+            return 0
+        finally:
+            session.close()
+        self.stats["flushes"] += 1
+        self.stats["written"] += len(batch)
+        logger.debug("message_writer room_id=%s записано %d сообщений", room_id, len(batch))
+        return len(batch)
+
+    async def aclose(self) -> None:
+        """Остановка: отменить таймеры и записать всё накопленное."""
+        timers = list(self._timers.values())
+        self._timers.clear()
+        for timer in timers:
+            timer.cancel()
+        if timers:
+            await asyncio.gather(*timers, return_exceptions=True)
+        self.flush()
+        self.allocator.uninstall()
+
+    def get_stats(self) -> dict:
+        flushes = self.stats["flushes"]
+        return {
+            "durability": self.durability,
+            "pending": self.pending(),
+            "submitted": self.stats["submitted"],
+            "written": self.stats["written"],
+            "flushes": flushes,
+            "avgBatch": round(self.stats["written"] / flushes, 2) if flushes else 0.0,
+            "errors": self.stats["errors"],
+            "dropped": self.stats["dropped"],
+            "memoryErrors": self.stats["memory_errors"],
+        }
+
@@ -0,0 +1,97 @@
+"""
+Темп обсуждения (этап DISCUSS).
+
+Раньше после каждого раунда executor спал 2.0 / room.speed независимо от того, сколько занял
+сам раунд (вызов LLM — секунды), а адаптер добавлял ещё 0.5 с на вызов: комната шла заметно
+медленнее заданной скорости. PacingController выдерживает целевой интервал между началами
+раундов — время, уже потраченное в раунде, вычитается из паузы.
+
+Скорость можно менять на лету (PATCH /speed): текущая пауза пересчитывается сразу.
+fast_forward — режим без искусственных пауз (бенчмарки, тесты).
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger("aigod.orchestration.pacing")
+
+# При speed=1 интервал 2 с; при speed=2 — 1 с; при 0.5 — 4 с
+BASE_TICK_INTERVAL = 2.0
+MIN_SPEED = 0.1
+
+
+class PacingController:
+    """Целевой интервал между раундами с учётом времени, затраченного на сам раунд."""
+
+    def __init__(
+        self,
+        speed: float = 1.0,
+        base_interval: float = BASE_TICK_INTERVAL,
+        fast_forward: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.base_interval = base_interval
+        self.fast_forward = fast_forward
+        self._speed = max(MIN_SPEED, float(speed or 1.0))
+        self._clock = clock
+        self._round_started: Optional[float] = None
+        self._changed: Optional[asyncio.Event] = None
+        self.stats = {"rounds": 0, "slept": 0.0, "saved": 0.0}
+
+    @property
+    def speed(self) -> float:
+        return self._speed
+
+    @property
+    def interval(self) -> float:
+        """Целевой интервал между началами раундов (0 в fast-forward)."""
+        return 0.0 if self.fast_forward else self.base_interval / self._speed
+
+    def set_speed(self, speed: float) -> None:
+        """Сменить скорость; ожидающий wait() пересчитает паузу немедленно."""
+        self._speed = max(MIN_SPEED, float(speed or 1.0))
+        logger.info("pacing: speed=%.2f interval=%.2fs", self._speed, self.interval)
+        if self._changed is not None:
+            self._changed.set()
+
+    def start_round(self) -> None:
+        self._round_started = self._clock()
+
+    def remaining(self) -> float:
+        """Сколько ещё ждать до начала следующего раунда."""
+        if self._round_started is None:
+            return self.interval
+        return max(0.0, self.interval - (self._clock() - self._round_started))
+
+    async def wait(self) -> float:
+        """Дождаться начала следующего раунда. Возвращает фактическую паузу (секунды)."""
+        self.stats["rounds"] += 1
+        elapsed_round = self._clock() - self._round_started if self._round_started is not None else 0.0
+        self.stats["saved"] += min(self.interval, elapsed_round)
+        started = self._clock()
+        self._changed = asyncio.Event()
+        try:
+            while True:
+                remaining = self.remaining()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                self._changed.clear()
+        finally:
+            self._changed = None
+        slept = self._clock() - started
+        self.stats["slept"] += slept
+        return slept
+
+    def get_stats(self) -> dict:
+        return {
+            "speed": self._speed,
+            "fastForward": self.fast_forward,
+            "rounds": self.stats["rounds"],
+            "sleptSeconds": round(self.stats["slept"], 3),
+            "savedSeconds": round(self.stats["saved"], 3),
+        }
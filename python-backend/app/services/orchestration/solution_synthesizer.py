@@ -17,9 +17,16 @@ class SolutionSynthesizer:
     Принимает решение о завершении задачи и формирует финальный ответ пользователю.
     """
 
-    def __init__(self, chat_service: Callable[..., Awaitable[str]], agent_name: str = "synthesizer"):
+    def __init__(
+        self,
+        chat_service: Callable[..., Awaitable[str]],
+        agent_name: str = "synthesizer",
+        use_cache: bool = False,
+    ):
         self.chat_service = chat_service
         self.agent_name = agent_name
+        # Промпт — функция запроса, плана и обсуждения: повторный прогон берёт ответ из кэша
+        self._call_kwargs = {"cache": True} if use_cache else {}
 
     async def synthesize(self, state: Any) -> str:
         """
@@ -35,6 +42,7 @@ class SolutionSynthesizer:
         if not agent_messages.strip():
             return state.user_message or ""
 
+        # Обсуждение — секция history: при превышении бюджета теряется его начало, а не инструкции
         prompt = f"""
 You are the FINAL DECISION MAKER.
 
@@ -44,8 +52,7 @@ USER REQUEST:
 PLAN:
 {state.plan or "(no plan)"}
 
-AGENT DISCUSSION:
-{agent_messages}
+AGENT DISCUSSION: see the current dialog above.
 
 Your task:
 1. Decide if the task is solved
@@ -60,6 +67,8 @@ This is the FINAL message.
                 "synthesizer_session",
                 prompt,
                 context=None,
+                sections={"history": agent_messages},
+                **self._call_kwargs,
             )
             return result.strip() if result else agent_messages
         except Exception as e:
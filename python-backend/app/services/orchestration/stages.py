@@ -3,15 +3,19 @@
 
 Каждый запрос ОБЯЗАТЕЛЬНО проходит все стадии.
 Без фиксированных этапов и переходов система зацикливается.
+
+Этапы объявляют входы и выходы (поля TaskState) в STAGE_GRAPH. Этап зависит от этапов,
+производящих его входы, — независимые (SYNTHESIZE и FACT_EXTRACTION, STORE_MEMORY и
+UPDATE_GRAPH) executor выполняет параллельно.
 """
 from enum import Enum, auto
 from dataclasses import dataclass, field
-from typing import List, Optional, Any
+from typing import Dict, FrozenSet, List, Optional, Any, Tuple
 
 
 class PipelineStage(Enum):
     """
-    Жизненный цикл задачи. Переходы: строго по порядку.
+    Жизненный цикл задачи. Порядок перечисления — топологический порядок STAGE_GRAPH.
     """
     NEW_TASK = auto()
     RETRIEVE_MEMORY = auto()
@@ -56,6 +60,86 @@ class TaskState:
     sender: str = "user"
     error: Optional[str] = None
 
+    # Время выполнения: секунды по этапам (имя этапа -> wall time) и всего pipeline
+    stage_durations: Dict[str, float] = field(default_factory=dict)
+    completed_stages: List[PipelineStage] = field(default_factory=list)
+    total_duration: Optional[float] = None
+    llm_calls: int = 0
+
+    # Обсуждение: число раундов, причина остановки (max_rounds | strategy | converged:<детектор>)
+    # и оценка вызовов LLM, сэкономленных ранней остановкой
+    discuss_rounds: int = 0
+    stop_reason: Optional[str] = None
+    calls_saved: int = 0
+
+    # Контрольная точка в SQLite и этапы, восстановленные из неё (не выполнялись в этом прогоне)
+    checkpoint_id: Optional[int] = None
+    resumed_stages: List[PipelineStage] = field(default_factory=list)
+
     def transition_to(self, stage: PipelineStage) -> None:
-        """Явный переход между этапами."""
+        """Явный переход между этапами (при параллельных этапах — последний начатый)."""
         self.stage = stage
+
+
+@dataclass(frozen=True)
+class StageSpec:
+    """Этап pipeline: какие поля TaskState читает (inputs) и заполняет (outputs)."""
+    stage: PipelineStage
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+
+
+# user_message, agent_names, room — исходные данные задачи, их не производит ни один этап
+STAGE_GRAPH: Tuple[StageSpec, ...] = (
+    StageSpec(PipelineStage.RETRIEVE_MEMORY, inputs=("user_message",), outputs=("memory_context",)),
+    StageSpec(PipelineStage.PLAN, inputs=("user_message",), outputs=("plan",)),
+    StageSpec(
+        PipelineStage.DISCUSS,
+        inputs=("user_message", "memory_context", "plan"),
+        outputs=("discussion_messages", "discuss_rounds", "stop_reason", "calls_saved"),
+    ),
+    StageSpec(
+        PipelineStage.SYNTHESIZE,
+        inputs=("user_message", "plan", "discussion_messages"),
+        outputs=("synthesized_answer",),
+    ),
+    StageSpec(PipelineStage.STORE_MEMORY, inputs=("user_message", "synthesized_answer"), outputs=("memory_stored",)),
+    StageSpec(
+        PipelineStage.FACT_EXTRACTION,
+        inputs=("user_message", "discussion_messages"),
+        outputs=("extracted_facts",),
+    ),
+    StageSpec(
+        PipelineStage.UPDATE_GRAPH,
+        inputs=("discussion_messages", "extracted_facts"),
+        outputs=("graph_updated",),
+    ),
+)
+
+
+def stage_dependencies(graph: Tuple[StageSpec, ...] = STAGE_GRAPH) -> Dict[PipelineStage, FrozenSet[PipelineStage]]:
+    """
+    Зависимости этапов: этап ждёт все этапы, которые производят его входы.
+    ValueError, если у поля несколько производителей или граф содержит цикл.
+    """
+    producers: Dict[str, PipelineStage] = {}
+    for spec in graph:
+        for name in spec.outputs:
+            if name in producers:
+                raise ValueError(f"Поле {name} производят этапы {producers[name].name} и {spec.stage.name}")
+            producers[name] = spec.stage
+    deps = {
+        spec.stage: frozenset(producers[name] for name in spec.inputs if name in producers)
+        for spec in graph
+    }
+    # Проверка ацикличности (Kahn)
+    resolved: set = set()
+    remaining = dict(deps)
+    while remaining:
+        ready = [stage for stage, needs in remaining.items() if needs <= resolved]
+        if not ready:
+            raise ValueError(f"Цикл в графе этапов: {sorted(s.name for s in remaining)}")
+        for stage in ready:
+            resolved.add(stage)
+            del remaining[stage]
+    return deps
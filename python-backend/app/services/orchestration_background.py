@@ -4,59 +4,70 @@
 Каждый запрос ОБЯЗАТЕЛЬНО проходит:
 RETRIEVE_MEMORY → PLAN → DISCUSS → SYNTHESIZE → STORE_MEMORY → UPDATE_GRAPH → DONE
 
-Pipeline: User → POST /messages → run_pipeline_executor → этапы → broadcast
+Pipeline: User → POST /messages → run_pipeline_executor → очередь комнаты → этапы → broadcast
 """
 import asyncio
 import logging
 from datetime import datetime
-from typing import Optional
-
-from sqlalchemy.orm import Session
+from typing import Callable, Optional
 
+from app.config import config
 from app.database.sqlite_setup import SessionLocal
 from app.models.agent import Agent
 from app.models.message import Message as DBMessage
 from app.services.agents_orchestration import OrchestrationClient
 from app.services.agents_orchestration.message import Message
 from app.services.agents_orchestration.message_type import MessageType
+from app.services.metrics import PIPELINE_ACTIVE
 from app.services.orchestration_service import create_orchestration_client
+from app.services.orchestration.checkpoints import CheckpointStore
+from app.services.orchestration.component_cache import HISTORY_LIMIT, PipelineComponentCache
 from app.services.orchestration.executor import PipelineExecutor
-from app.ws import broadcast_chat_message
+from app.services.orchestration.input_queue import PipelineInputQueue
+from app.services.orchestration.message_writer import MessageWriteBehind
+from app.ws import broadcast_chat_delta, broadcast_chat_message
 
 logger = logging.getLogger("aigod.orchestration")
 
+PIPELINE_UNAVAILABLE_TEXT = "Не удалось запустить обсуждение агентов. Попробуйте отправить сообщение позже."
+
 
-def _load_room_history(room_id: int, agents: list[Agent], limit: int = 20) -> list[Message]:
+def _load_room_history(room_id: int, agents: list[Agent], limit: int = HISTORY_LIMIT) -> list[Message]:
     """
-    Загрузить историю сообщений комнаты из БД в формат оркестрации.
+    Загрузить историю сообщений комнаты из БД в формат оркестрации — последние limit сообщений.
     Orchestration получает контекст чата комнаты для корректного ответа.
     """
+    result = [msg for _, msg in _load_new_room_messages(room_id, None, limit)]
+    logger.info("orchestration: load_room_history room_id=%s загружено %d сообщений", room_id, len(result))
+    return result
+
+
+def _load_new_room_messages(room_id: int, after_id: Optional[int], limit: int = HISTORY_LIMIT) -> list[tuple[int, Message]]:
+    """
+    Сообщения комнаты для тёплого context: последние limit с id больше after_id (все, если after_id=None).
+    Возвращает пары (id, Message) в порядке id.
+    """
     session = SessionLocal()
     try:
-        rows = (
-            session.query(DBMessage)
-            .filter(DBMessage.room_id == room_id)
-            .order_by(DBMessage.created_at.asc())
-            .limit(limit)
-            .all()
-        )
-        result = []
-        for m in rows:
-            msg_type = MessageType.USER if m.sender == "user" or m.agent_id is None else MessageType.AGENT
-            result.append(
-                Message(
-                    content=m.text,
-                    type=msg_type,
-                    sender=m.sender,
-                    timestamp=m.created_at or datetime.now(),
-                )
-            )
-        logger.info("orchestration: load_room_history room_id=%s загружено %d сообщений", room_id, len(result))
-        return result
+        query = session.query(DBMessage).filter(DBMessage.room_id == room_id)
+        if after_id is not None:
+            query = query.filter(DBMessage.id > after_id)
+        rows = query.order_by(DBMessage.id.desc()).limit(limit).all()
+        return [(m.id, _to_orchestration_message(m)) for m in reversed(rows)]
     finally:
         session.close()
 
 
+def _to_orchestration_message(m: DBMessage) -> Message:
+    msg_type = MessageType.USER if m.sender == "user" or m.agent_id is None else MessageType.AGENT
+    return Message(
+        content=m.text,
+        type=msg_type,
+        sender=m.sender,
+        timestamp=m.created_at or datetime.now(),
+    )
+
+
 def _agent_id_by_name(agents: list[Agent], name: str) -> Optional[int]:
     """Найти agent_id по имени."""
     for a in agents:
@@ -65,8 +76,16 @@ def _agent_id_by_name(agents: list[Agent], name: str) -> Optional[int]:
     return None
 
 
-def _make_message_callback(room_id: int, agents: list[Agent]):
-    """Колбэк: сохранить в БД и broadcast. Память и граф — в этапах pipeline."""
+def _make_message_callback(
+    room_id: int,
+    agents: list[Agent],
+    on_saved: Optional[Callable[[int, Message], None]] = None,
+):
+    """
+    Колбэк: сохранить в БД (write-behind, см. MessageWriteBehind) и broadcast.
+    Память и граф — в этапах pipeline.
+    on_saved(id, msg) — сообщению выдан id (кэш компонентов не перечитывает его из БД).
+    """
     async def on_message(msg: Message) -> None:
         if msg.type not in (MessageType.AGENT, MessageType.NARRATOR, MessageType.SUMMARIZED, MessageType.SYSTEM):
             logger.debug("orchestration on_message room_id=%s skip type=%s", room_id, msg.type)
@@ -74,61 +93,54 @@ def _make_message_callback(room_id: int, agents: list[Agent]):
 
         agent_id = _agent_id_by_name(agents, msg.sender)
         logger.info("orchestration on_message room_id=%s type=%s sender=%s agent_id=%s", room_id, msg.type, msg.sender, agent_id)
-        session: Session = SessionLocal()
         try:
-            db_msg = DBMessage(
-                room_id=room_id,
-                agent_id=agent_id,
-                text=msg.content,
-                sender=msg.sender,
+            # SQL Memory и Plan — мост для API keyMemories и plans (только для агентов комнаты)
+            saved = get_message_writer().submit(
+                room_id,
+                agent_id,
+                msg.content,
+                msg.sender,
+                with_memory=bool(agent_id and msg.content and msg.type == MessageType.AGENT),
             )
-            session.add(db_msg)
-            session.commit()
-            session.refresh(db_msg)
-
-            # SQL Memory — мост для API keyMemories (только для агентов комнаты)
-            if agent_id and msg.content and msg.type == MessageType.AGENT:
-                try:
-                    from app.models.memory import Memory
-                    m = Memory(
-                        agent_id=agent_id,
-                        room_id=room_id,
-                        content=msg.content[:2000] if len(msg.content) > 2000 else msg.content,
-                        importance=0.6,
-                    )
-                    session.add(m)
-                    # Plan — мост для API plans (планы агента во фронтенде)
-                    from app.models.plan import Plan
-                    desc = msg.content[:150] + "..." if len(msg.content) > 150 else msg.content
-                    session.add(Plan(
-                        agent_id=agent_id,
-                        description=desc.strip() or "Участие в обсуждении",
-                        status="done",
-                    ))
-                    session.commit()
-                except Exception as e:
-                    logger.warning("orchestration SQL Memory/Plan write failed: %s", e)
-                    session.rollback()
+            if on_saved is not None:
+                on_saved(saved.id, msg)
 
             payload = {
-                "id": str(db_msg.id),
-                "text": db_msg.text,
-                "sender": db_msg.sender,
+                "id": str(saved.id),
+                "text": saved.text,
+                "sender": saved.sender,
                 "agentId": str(agent_id) if agent_id else None,
-                "timestamp": db_msg.created_at.isoformat() if db_msg.created_at else "",
+                "timestamp": saved.created_at.isoformat(),
             }
+            stream_id = (msg.metadata or {}).get("stream_id")
+            if stream_id:
+                payload["streamId"] = stream_id
             await broadcast_chat_message(room_id, payload)
-            logger.info("orchestration on_message room_id=%s сохранено msg_id=%s broadcast OK", room_id, db_msg.id)
+            logger.info("orchestration on_message room_id=%s msg_id=%s broadcast OK", room_id, saved.id)
         except Exception as e:
             logger.exception("orchestration on_message room_id=%s ошибка: %s", room_id, e)
-            session.rollback()
             raise
-        finally:
-            session.close()
 
     return on_message
 
 
+def _make_delta_callback(room_id: int, agents: list[Agent]):
+    """Колбэк стриминга: фрагменты ответа агента → WS message_delta (delta=None — поток прерван)."""
+    async def on_delta(stream_id: str, agent_name: str, delta: Optional[str]) -> None:
+        agent_id = _agent_id_by_name(agents, agent_name)
+        payload = {
+            "streamId": stream_id,
+            "delta": delta or "",
+            "sender": agent_name,
+            "agentId": str(agent_id) if agent_id else None,
+        }
+        if delta is None:
+            payload["aborted"] = True
+        await broadcast_chat_delta(room_id, payload)
+
+    return on_delta
+
+
 class OrchestrationRegistry:
     """Реестр фоновых оркестраций по room_id."""
 
@@ -211,35 +223,166 @@ class OrchestrationRegistry:
 # Глобальный реестр
 registry = OrchestrationRegistry()
 
-# Задачи pipeline по room_id (для stop)
-_pipeline_tasks: dict[int, asyncio.Task] = {}
-_pipeline_lock: asyncio.Lock | None = None
+_pipeline_queue: Optional[PipelineInputQueue] = None
+
+
+def get_pipeline_queue() -> PipelineInputQueue:
+    """Очередь входящих сообщений pipeline (политика из PIPELINE_INPUT_POLICY)."""
+    global _pipeline_queue
+    if _pipeline_queue is None:
+        _pipeline_queue = PipelineInputQueue(
+            _create_pipeline_executor,
+            policy=config.PIPELINE_INPUT_POLICY,
+            debounce_seconds=config.PIPELINE_DEBOUNCE_SECONDS,
+            max_pending=config.PIPELINE_QUEUE_MAX,
+            on_unavailable=_notify_pipeline_unavailable,
+        )
+    return _pipeline_queue
+
+
+def _active_pipeline_runs() -> int:
+    return _pipeline_queue.active_runs() if _pipeline_queue is not None else 0
+
+
+PIPELINE_ACTIVE.source = _active_pipeline_runs
 
 
-def _get_pipeline_lock() -> asyncio.Lock:
-    global _pipeline_lock
-    if _pipeline_lock is None:
-        _pipeline_lock = asyncio.Lock()
-    return _pipeline_lock
+async def reset_pipeline_queue() -> None:
+    """Остановить все прогоны и сбросить очередь (shutdown, тесты)."""
+    global _pipeline_queue
+    if _pipeline_queue is not None:
+        await _pipeline_queue.shutdown()
+    _pipeline_queue = None
+
+
+_component_cache: Optional[PipelineComponentCache] = None
+
+
+def get_pipeline_component_cache() -> PipelineComponentCache:
+    """Кэш компонентов pipeline (adapter + тёплый ConversationContext) по комнатам."""
+    global _component_cache
+    if _component_cache is None:
+        from app.services.agents_orchestration.context import ConversationContext
+        from app.services.orchestration_service import create_pipeline_adapter
+        _component_cache = PipelineComponentCache(
+            build_adapter=create_pipeline_adapter,
+            build_context=lambda participants: ConversationContext(participants=participants),
+        )
+    return _component_cache
+
+
+def invalidate_pipeline_components(room_id: int) -> None:
+    """Сбросить кэш компонентов комнаты: агенты добавлены/удалены, комната изменена или удалена."""
+    get_pipeline_component_cache().invalidate(room_id)
+
+
+_checkpoint_store: Optional[CheckpointStore] = None
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """Контрольные точки pipeline (таблица pipeline_checkpoints)."""
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        _checkpoint_store = CheckpointStore()
+    return _checkpoint_store
+
+
+_message_writer: Optional[MessageWriteBehind] = None
+
+
+def get_message_writer() -> MessageWriteBehind:
+    """Отложенная пакетная запись сообщений pipeline (MESSAGE_DURABILITY, MESSAGE_FLUSH_*)."""
+    global _message_writer
+    if _message_writer is None:
+        _message_writer = MessageWriteBehind(
+            durability=config.MESSAGE_DURABILITY,
+            flush_interval=config.MESSAGE_FLUSH_INTERVAL_MS / 1000,
+            max_batch=config.MESSAGE_FLUSH_BATCH,
+        )
+    return _message_writer
+
+
+async def reset_message_writer() -> None:
+    """Записать накопленные сообщения и сбросить writer (shutdown, тесты)."""
+    global _message_writer
+    if _message_writer is not None:
+        await _message_writer.aclose()
+    _message_writer = None
+
+
+def _load_room(room_id: int):
+    from app.models.room import Room
+    session = SessionLocal()
+    try:
+        return session.query(Room).filter(Room.id == room_id).first()
+    finally:
+        session.close()
+
+
+async def _create_pipeline_executor(room_id: int, text: str, sender: str) -> Optional[PipelineExecutor]:
+    """
+    Собрать executor для прогона из очереди. Комната перечитывается из БД: между сообщением
+    и стартом прогона могли смениться агенты, скорость или тип оркестрации.
+    """
+    room = _load_room(room_id)
+    if not room or not getattr(room, "agents", None) or not room.agents:
+        return None
+    if (getattr(room, "orchestration_type", None) or "single") == "single":
+        return None
+
+    from app.services.orchestration_service import create_pipeline_strategy
+    cache = get_pipeline_component_cache()
+    components = cache.acquire(room)
+    if not components:
+        logger.warning("run_pipeline_executor room_id=%s components=None", room_id)
+        return None
+    # Тёплый context: дописываются только сообщения, появившиеся после прошлого прогона.
+    # Сначала — записать отложенные сообщения комнаты, иначе чтение из БД их не увидит
+    if _message_writer is not None:
+        _message_writer.flush(room_id)
+    cache.sync(components, _load_new_room_messages(room_id, components.last_message_id))
+    strategy = create_pipeline_strategy(room, components.context, components.chat_service)
+    if strategy is None:
+        return None
+
+    agents = list(room.agents)
+    callback = _make_message_callback(room_id, agents, on_saved=components.record_saved)
+
+    return PipelineExecutor(
+        room=room,
+        chat_service=components.chat_service,
+        strategy=strategy,
+        agents=components.agents,
+        on_message=callback,
+        max_discuss_rounds=50,
+        on_delta=_make_delta_callback(room_id, agents) if config.LLM_STREAMING_ENABLED else None,
+        checkpoints=get_checkpoint_store() if config.PIPELINE_CHECKPOINTS else None,
+    )
+
+
+async def _notify_pipeline_unavailable(room_id: int, text: str, sender: str) -> None:
+    """Прогон из очереди не собран — системное сообщение в комнату, чтобы пользователь не ждал ответа."""
+    if _load_room(room_id) is None:
+        return
+    notice = Message(content=PIPELINE_UNAVAILABLE_TEXT, type=MessageType.SYSTEM, sender="system")
+    await _make_message_callback(room_id, [])(notice)
 
 
 async def run_pipeline_executor(room_id: int, text: str, sender: str = "user", room=None) -> bool:
     """
-    Единая точка входа: запустить pipeline executor.
+    Единая точка входа: поставить сообщение в очередь pipeline комнаты.
 
     Каждый запрос ОБЯЗАТЕЛЬНО проходит: RETRIEVE_MEMORY → PLAN → DISCUSS → SYNTHESIZE → STORE_MEMORY → UPDATE_GRAPH.
+    Что делать с сообщением, пришедшим во время прогона (отменить, поставить в очередь,
+    объединить с соседними), решает PIPELINE_INPUT_POLICY.
 
     Returns:
-        True если pipeline запущен, False иначе (single mode).
+        True если сообщение принято в pipeline, False иначе (single mode или компоненты
+        оркестрации не собираются, например YandexGPT недоступен) — тогда вызывающий
+        отвечает в режиме single.
     """
     if room is None:
-        from app.database.sqlite_setup import SessionLocal
-        from app.models.room import Room
-        session = SessionLocal()
-        try:
-            room = session.query(Room).filter(Room.id == room_id).first()
-        finally:
-            session.close()
+        room = _load_room(room_id)
 
     if not room or not getattr(room, "agents", None) or not room.agents:
         return False
@@ -249,67 +392,81 @@ async def run_pipeline_executor(room_id: int, text: str, sender: str = "user", r
         logger.debug("run_pipeline_executor room_id=%s skip (single)", room_id)
         return False
 
-    from app.services.orchestration_service import create_pipeline_components
-    components = create_pipeline_components(room)
-    if not components:
-        logger.warning("run_pipeline_executor room_id=%s components=None", room_id)
+    # Проверка до постановки в очередь: иначе сбой сборки всплыл бы в воркере, когда fallback уже невозможен
+    if get_pipeline_component_cache().acquire(room) is None:
+        logger.warning("run_pipeline_executor room_id=%s компоненты не собраны — fallback на single", room_id)
         return False
 
-    agents = list(room.agents)
-    callback = _make_message_callback(room_id, agents)
+    await get_pipeline_queue().submit(room_id, text, sender)
+    logger.info("run_pipeline_executor room_id=%s QUEUED text_len=%d sender=%s", room_id, len(text), sender)
+    return True
 
-    # Загрузить историю в context
-    history = _load_room_history(room_id, agents)
-    for msg in history:
-        components["context"].add_message(msg)
 
-    executor = PipelineExecutor(
-        room=room,
-        chat_service=components["chat_service"],
-        strategy=components["strategy"],
-        agents=components["agents"],
-        on_message=callback,
-        max_discuss_rounds=50,
+async def resume_pipeline(room_id: int) -> Optional[dict]:
+    """
+    Продолжить последний прерванный (отменённый, упавший, оборванный рестартом) pipeline комнаты
+    с контрольной точки. Возвращает описание точки или None, если продолжать нечего.
+    """
+    if get_pipeline_queue().running_executor(room_id) is not None:
+        return None
+    checkpoint = get_checkpoint_store().latest_resumable(room_id)
+    if checkpoint is None:
+        return None
+    await get_pipeline_queue().submit(
+        room_id, checkpoint["user_message"], checkpoint["sender"], resume_from=checkpoint["id"],
+    )
+    logger.info(
+        "resume_pipeline room_id=%s checkpoint=%s stages_done=%s",
+        room_id, checkpoint["id"], checkpoint["completed_stages"],
     )
+    return checkpoint
+
+
+async def resume_interrupted_pipelines() -> int:
+    """При старте: продолжить pipeline, оборванные рестартом процесса. Возвращает число комнат."""
+    from datetime import timedelta
+
+    interrupted = get_checkpoint_store().interrupted(timedelta(minutes=config.PIPELINE_CHECKPOINT_MAX_AGE_MINUTES))
+    for checkpoint in interrupted:
+        await get_pipeline_queue().submit(
+            checkpoint["room_id"], checkpoint["user_message"], checkpoint["sender"], resume_from=checkpoint["id"],
+        )
+    if interrupted:
+        logger.info("resume_interrupted_pipelines rooms=%s", [c["room_id"] for c in interrupted])
+    return len(interrupted)
 
-    task = asyncio.create_task(_run_and_cleanup(room_id, executor, text, sender))
-    async with _get_pipeline_lock():
-        old = _pipeline_tasks.pop(room_id, None)
-        if old and not old.done():
-            old.cancel()
-            try:
-                await old
-            except asyncio.CancelledError:
-                pass
-        _pipeline_tasks[room_id] = task
-    logger.info("run_pipeline_executor room_id=%s STARTED text_len=%d sender=%s", room_id, len(text), sender)
-    return True
 
+def apply_room_speed(room_id: int, speed: float) -> bool:
+    """
+    Применить новую скорость комнаты к выполняющемуся pipeline (PATCH /speed).
+    Текущая пауза между раундами пересчитывается сразу. True, если pipeline был запущен.
 
-async def _run_and_cleanup(room_id: int, executor, text: str, sender: str) -> None:
-    """Запуск executor и удаление задачи из _pipeline_tasks по завершении."""
+    Вызывается из sync-эндпоинтов (пул потоков): asyncio.Event паузы не потокобезопасен,
+    поэтому смена скорости передаётся в event loop очереди через call_soon_threadsafe.
+    """
+    queue = get_pipeline_queue()
+    executor = queue.running_executor(room_id)
+    if executor is None:
+        return False
+    loop = queue.loop
     try:
-        await executor.run(text, sender)
-    except asyncio.CancelledError:
-        logger.info("run_pipeline_executor room_id=%s CANCELLED", room_id)
-    finally:
-        async with _get_pipeline_lock():
-            _pipeline_tasks.pop(room_id, None)
+        on_loop = asyncio.get_running_loop() is loop
+    except RuntimeError:
+        on_loop = False
+    if loop is None or on_loop:
+        executor.pacing.set_speed(speed)
+    else:
+        loop.call_soon_threadsafe(executor.pacing.set_speed, speed)
+    logger.info("apply_room_speed room_id=%s speed=%.2f", room_id, speed)
+    return True
 
 
 async def cancel_pipeline_task(room_id: int) -> bool:
-    """Отменить выполняющийся pipeline для комнаты. Возвращает True если задача была отменена."""
-    async with _get_pipeline_lock():
-        task = _pipeline_tasks.pop(room_id, None)
-    if task and not task.done():
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+    """Отменить выполняющийся pipeline и ожидающие сообщения комнаты. True если было что отменять."""
+    cancelled = await get_pipeline_queue().cancel(room_id)
+    if cancelled:
         logger.info("cancel_pipeline_task room_id=%s cancelled", room_id)
-        return True
-    return False
+    return cancelled
 
 
 async def enqueue_room_run(room_id: int, text: str, sender: str = "user", room=None) -> bool:
@@ -22,10 +22,10 @@ from app.constants import (
     SUMMARIZER_PERSONALITY,
 )
 from app.services.agents_orchestration.yandex_adapter import YandexAgentAdapter
-from app.services.prompt_enhancer import enhance_prompt_with_relationship, enhance_prompt_with_emotional_state
+from app.services.prompt_enhancer import emotional_state_section, relationship_section
 from app.services.relationship_model_service import get_relationship_manager
 from app.services.room_services_registry import get_emotional_integration
-from app.services.yandex_client.yandex_agent_client import YandexAgentClient
+from app.services.yandex_client.client_pool import get_yandex_client
 
 
 class _RelationshipEnhancingAdapter:
@@ -36,6 +36,8 @@ class _RelationshipEnhancingAdapter:
         self.room = room
         self._rel_manager = None
         self._memory_integration = None
+        # Число вызовов LLM через адаптер (метрики очереди pipeline)
+        self.calls = 0
 
     def _get_rel_manager(self):
         if self._rel_manager is None:
@@ -54,34 +56,38 @@ class _RelationshipEnhancingAdapter:
                 pass
         return self._memory_integration
 
-    async def __call__(self, agent_name: str, session_id: str, prompt: str, context=None) -> str:
-        # 1. Память: обогатить промпт контекстом из ChromaDB
+    async def __call__(
+        self, agent_name: str, session_id: str, prompt: str, context=None, cache: bool = False, sections=None
+    ) -> str:
+        self.calls += 1
+        # Секции промпта собираются отдельно — бюджет токенов применяет PromptBuilder в клиенте.
+        # sections вызывающего (например, history синтеза) дополняются памятью, отношениями и эмоциями.
+        sections: dict[str, str] = dict(sections or {})
+        # 1. Память: контекст из ChromaDB (один поиск и для промпта, и для context)
         user_msg = None
         if context:
             user_msg = getattr(context, "current_user_message", None) or context.get_memory("_user_message")
         mem_integration = self._get_memory_integration()
         if mem_integration and (user_msg or prompt):
             try:
-                prompt = await mem_integration.enhance_prompt_with_context_async(
-                    agent_name, prompt, query=user_msg or prompt
+                ctx = await mem_integration.memory_manager.get_relevant_context_async(
+                    user_msg or prompt, max_tokens=800
                 )
-                if context and user_msg:
-                    ctx = await mem_integration.memory_manager.get_relevant_context_async(
-                        user_msg or prompt, max_tokens=500
-                    )
-                    if ctx:
+                if ctx:
+                    sections["memory"] = ctx
+                    if context and user_msg:
                         context.update_memory("_memory_context", ctx)
             except Exception as e:
                 logger.debug("memory enhance failed: %s", e)
         # 2. Отношения
         rel_manager = self._get_rel_manager()
         if rel_manager:
-            prompt = enhance_prompt_with_relationship(rel_manager, agent_name, prompt)
+            sections["relationships"] = relationship_section(rel_manager, agent_name)
         # 3. Эмоции
         emo = get_emotional_integration(self.room) if hasattr(self, "room") else None
         if emo:
-            prompt = enhance_prompt_with_emotional_state(emo, agent_name, prompt)
-        return await self.inner(agent_name, session_id, prompt, context)
+            sections["emotions"] = emotional_state_section(emo, agent_name)
+        return await self.inner(agent_name, session_id, prompt, context, cache=cache, sections=sections)
 
 
 def create_orchestration_client(room) -> Optional[OrchestrationClient]:
@@ -101,13 +107,13 @@ def create_orchestration_client(room) -> Optional[OrchestrationClient]:
         return None
 
     try:
-        yandex_client = YandexAgentClient()
+        yandex_client = get_yandex_client()
         logger.info("create_orchestration_client room_id=%s YandexAgentClient OK", room.id)
     except Exception as e:
         logger.warning("create_orchestration_client room_id=%s YandexAgentClient fail: %s", room.id, e)
         return None
 
-    base_adapter = YandexAgentAdapter(yandex_client)
+    base_adapter = YandexAgentAdapter(yandex_client, session_namespace=f"room_{room.id}")
     base_adapter.register_agents_from_room(room.agents)
     # circular: ghost Суммаризатор для синтеза. narrator: Рассказчик — реальный агент в room.agents.
     if orchestration_type == "circular":
@@ -152,6 +158,7 @@ def create_pipeline_components(room):
     Создать компоненты для PipelineExecutor: chat_service, strategy, context.
 
     Используется как единая точка входа для pipeline — без long-running client.
+    Между сообщениями компоненты кэширует PipelineComponentCache (orchestration/component_cache.py).
     """
     orchestration_type = getattr(room, "orchestration_type", None) or "single"
     if orchestration_type == "single":
@@ -161,26 +168,52 @@ def create_pipeline_components(room):
     if not agent_names:
         return None
 
+    adapter = create_pipeline_adapter(room)
+    if adapter is None:
+        return None
+
+    from app.services.agents_orchestration.context import ConversationContext
+
+    all_agent_names = (agent_names + [SUMMARIZER_AGENT_NAME]) if orchestration_type == "circular" else agent_names
+    context = ConversationContext(participants=all_agent_names.copy())
+    agents_for_strategy = all_agent_names if orchestration_type == "circular" else agent_names
+
+    strategy = create_pipeline_strategy(room, context, adapter)
+    if strategy is None:
+        return None
+    return {
+        "chat_service": adapter,
+        "strategy": strategy,
+        "context": context,
+        "agents": agents_for_strategy,
+    }
+
+
+def create_pipeline_adapter(room) -> Optional[_RelationshipEnhancingAdapter]:
+    """chat_service для pipeline: YandexAgentAdapter с зарегистрированными промптами агентов комнаты."""
+    orchestration_type = getattr(room, "orchestration_type", None) or "single"
     try:
-        yandex_client = YandexAgentClient()
+        yandex_client = get_yandex_client()
     except Exception as e:
         logger.warning("create_pipeline_components YandexAgentClient fail: %s", e)
         return None
 
-    base_adapter = YandexAgentAdapter(yandex_client)
+    base_adapter = YandexAgentAdapter(yandex_client, session_namespace=f"room_{room.id}")
     base_adapter.register_agents_from_room(room.agents)
     if orchestration_type == "circular":
         base_adapter.register_agent(SUMMARIZER_AGENT_NAME, SUMMARIZER_PERSONALITY)
     elif orchestration_type == "full_context":
         base_adapter.register_agent(SUMMARIZER_AGENT_NAME, SUMMARIZER_PERSONALITY)
-    adapter = _RelationshipEnhancingAdapter(base_adapter, room)
+    return _RelationshipEnhancingAdapter(base_adapter, room)
 
-    from app.services.agents_orchestration.context import ConversationContext
-
-    all_agent_names = (agent_names + [SUMMARIZER_AGENT_NAME]) if orchestration_type == "circular" else agent_names
-    context = ConversationContext(participants=all_agent_names.copy())
-    agents_for_strategy = all_agent_names if orchestration_type == "circular" else agent_names
 
+def create_pipeline_strategy(room, context, adapter):
+    """
+    Стратегия pipeline поверх готового context и chat_service.
+    Стратегия хранит состояние одного обсуждения (раунды, счётчики) — создаётся на каждый прогон.
+    """
+    orchestration_type = getattr(room, "orchestration_type", None) or "single"
+    agent_names = [a.name for a in room.agents]
     if orchestration_type == "circular":
         strategy = CircularStrategy(
             context,
@@ -206,9 +239,4 @@ def create_pipeline_components(room):
 
     strategy.context = context
     strategy.chat_service = adapter
-    return {
-        "chat_service": adapter,
-        "strategy": strategy,
-        "context": context,
-        "agents": agents_for_strategy,
-    }
+    return strategy
@@ -4,18 +4,14 @@
 """
 
 
-def enhance_prompt_with_relationship(
-    relationship_manager,
-    agent_name: str,
-    prompt: str,
-) -> str:
-    """Добавить в промпт информацию об отношениях агента с другими."""
+def relationship_section(relationship_manager, agent_name: str) -> str:
+    """Секция промпта «отношения агента с другими» (пустая строка, если данных нет)."""
     if not relationship_manager:
-        return prompt
+        return ""
     try:
         rels = relationship_manager.get_entity_relationships(agent_name)
         if not rels:
-            return prompt
+            return ""
         lines = ["\n[Твои отношения с другими:]"]
         for other, value in rels.items():
             if other != agent_name:
@@ -23,9 +19,18 @@ def enhance_prompt_with_relationship(
                 emoji = _emoji_for_value(value)
                 lines.append(f"  {emoji} {other}: {rel_type} ({value:.2f})")
         lines.append("Учитывай эти отношения в ответе.\n")
-        return "\n".join(lines) + prompt
+        return "\n".join(lines)
     except Exception:
-        return prompt
+        return ""
+
+
+def enhance_prompt_with_relationship(
+    relationship_manager,
+    agent_name: str,
+    prompt: str,
+) -> str:
+    """Добавить в промпт информацию об отношениях агента с другими."""
+    return relationship_section(relationship_manager, agent_name) + prompt
 
 
 def _emoji_for_value(value: float) -> str:
@@ -44,6 +49,16 @@ def _emoji_for_value(value: float) -> str:
     return "💔"
 
 
+def emotional_state_section(emotional_integration, agent_name: str) -> str:
+    """Секция промпта «эмоциональное состояние агента» (пустая строка, если данных нет)."""
+    if not emotional_integration:
+        return ""
+    try:
+        return emotional_integration.get_emotion_section(agent_name)
+    except Exception:
+        return ""
+
+
 def enhance_prompt_with_emotional_state(emotional_integration, agent_name: str, prompt: str) -> str:
     """Добавить эмоциональное состояние агента в промпт."""
     if not emotional_integration:
@@ -0,0 +1,180 @@
+"""
+Сборка промпта с бюджетом токенов по секциям.
+
+Раньше промпт собирался конкатенацией в трёх слоях (клиент, адаптер, обогащение отношениями/
+памятью/эмоциями) и рос вместе с комнатой. PromptBuilder получает секции отдельно, обрезает
+каждую до своего бюджета детерминированно и сообщает итоговое число токенов.
+
+Секции (в порядке вывода): system, personality, relationships, emotions, memory, history, task.
+Правила обрезки:
+- history — сохраняются последние строки (старые отбрасываются целиком);
+- task — не обрезается: это запрос и инструкции к ответу, их конец важнее всего
+  (длинные вставки вроде обсуждения агентов передаются секцией history);
+- остальные — сохраняется начало (память уже отсортирована по релевантности).
+Строка, не влезающая целиком, режется по словам с маркером «…».
+"""
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+SECTION_ORDER = ("system", "personality", "relationships", "emotions", "memory", "history", "task")
+
+# Бюджеты по умолчанию (токены). Переопределяются PROMPT_TOKEN_BUDGETS="history=600,memory=300"
+DEFAULT_BUDGETS: Dict[str, int] = {
+    "system": 600,
+    "personality": 500,
+    "relationships": 150,
+    "emotions": 100,
+    "memory": 500,
+    "history": 800,
+}
+
+_KEEP_TAIL = {"history"}
+_UNBUDGETED = {"task"}
+_ELLIPSIS = "…"
+
+_SECTION_HEADERS = {
+    "relationships": "",
+    "emotions": "",
+    "memory": "Контекст из памяти:",
+    "history": "Текущий диалог:",
+}
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Число токенов: tiktoken (cl100k), без него — оценка как в памяти (слова × 1.3)."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text.split()) * 1.3)
+
+
+def load_budgets(raw: Optional[str] = None) -> Dict[str, int]:
+    """Бюджеты секций с учётом переопределений из env PROMPT_TOKEN_BUDGETS."""
+    budgets = dict(DEFAULT_BUDGETS)
+    raw = os.getenv("PROMPT_TOKEN_BUDGETS", "") if raw is None else raw
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name in budgets and value.strip().isdigit():
+            budgets[name] = int(value.strip())
+    return budgets
+
+
+def _truncate_words(line: str, budget: int, keep_tail: bool) -> str:
+    """Оставить максимум слов (с начала или с конца строки), влезающих в budget вместе с «…»."""
+    words = line.split()
+
+    def render(n: int) -> str:
+        if keep_tail:
+            return f"{_ELLIPSIS} " + " ".join(words[len(words) - n:])
+        return " ".join(words[:n]) + f" {_ELLIPSIS}"
+
+    lo, hi = 0, len(words)
+    while lo < hi:  # бинарный поиск по числу слов
+        mid = (lo + hi + 1) // 2
+        if count_tokens(render(mid)) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return render(lo) if lo else ""
+
+
+def truncate_to_budget(text: str, budget: int, keep_tail: bool = False) -> str:
+    """Обрезать текст до budget токенов: целыми строками, последняя — по словам."""
+    if budget <= 0 or not text:
+        return ""
+    if count_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    if keep_tail:
+        lines = list(reversed(lines))
+    kept: List[str] = []
+    used = 0
+    for line in lines:
+        cost = count_tokens(line) + (1 if kept else 0)
+        if used + cost <= budget:
+            kept.append(line)
+            used += cost
+            continue
+        rest = budget - used - (1 if kept else 0)
+        if rest > 0:
+            partial = _truncate_words(line, rest, keep_tail)
+            if partial:
+                kept.append(partial)
+        break
+    if keep_tail:
+        kept.reverse()
+    return "\n".join(kept)
+
+
+@dataclass
+class BuiltPrompt:
+    """Собранный промпт и отчёт по токенам."""
+    text: str
+    total_tokens: int
+    section_tokens: Dict[str, int] = field(default_factory=dict)
+    truncated: List[str] = field(default_factory=list)
+
+
+class PromptBuilder:
+    """
+    Сборщик промпта по секциям с бюджетами токенов.
+
+    builder = PromptBuilder()
+    builder.add("system", system).add("history", lines).add("task", text)
+    built = builder.build()
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self.budgets = {**load_budgets(), **(budgets or {})}
+        self._sections: Dict[str, List[str]] = {name: [] for name in SECTION_ORDER}
+
+    def add(self, section: str, text: Optional[str]) -> "PromptBuilder":
+        """Добавить текст в секцию (несколько вызовов склеиваются через перевод строки)."""
+        if section not in self._sections:
+            raise ValueError(f"Неизвестная секция промпта: {section}")
+        if text and text.strip():
+            self._sections[section].append(text.strip())
+        return self
+
+    def add_lines(self, section: str, lines: Iterable[str]) -> "PromptBuilder":
+        for line in lines:
+            self.add(section, line)
+        return self
+
+    def build(self) -> BuiltPrompt:
+        parts: List[str] = []
+        section_tokens: Dict[str, int] = {}
+        truncated: List[str] = []
+        for name in SECTION_ORDER:
+            raw = "\n".join(self._sections[name])
+            if not raw:
+                continue
+            if name in _UNBUDGETED:
+                text = raw
+            else:
+                text = truncate_to_budget(raw, self.budgets.get(name, 0), keep_tail=name in _KEEP_TAIL)
+            if text != raw:
+                truncated.append(name)
+            if not text:
+                continue
+            section_tokens[name] = count_tokens(text)
+            header = _SECTION_HEADERS.get(name)
+            parts.append(f"{header}\n{text}" if header else text)
+        prompt = "\n\n".join(parts)
+        return BuiltPrompt(
+            text=prompt,
+            total_tokens=count_tokens(prompt),
+            section_tokens=section_tokens,
+            truncated=truncated,
+        )
@@ -8,6 +8,7 @@ from typing import Dict, List, Optional, Callable, Any
 from datetime import datetime
 from collections import deque
 
+from .heuristic_analyzer import HeuristicRelationshipAnalyzer
 from .models import AnalysisResult
 
 class RelationshipAnalyzer:
@@ -19,12 +20,16 @@ class RelationshipAnalyzer:
                  chat_service,  # любой chat_service с интерфейсом __call__
                  analyzer_agent_name: str = "relationship_analyzer",
                  influence_coefficient: float = 0.3,
-                 batch_size: int = 5):
+                 batch_size: int = 5,
+                 batch_prompts: bool = True):
         
         self.chat_service = chat_service
         self.analyzer_agent_name = analyzer_agent_name
         self.influence_coefficient = influence_coefficient
         self.batch_size = batch_size
+        # Батч из очереди — один запрос с JSON-массивом; неразобранные элементы — эвристика
+        self.batch_prompts = batch_prompts
+        self._heuristic = HeuristicRelationshipAnalyzer(influence_coefficient=influence_coefficient)
         
         # Очередь сообщений на анализ
         self.analysis_queue = asyncio.Queue()
@@ -37,7 +42,10 @@ class RelationshipAnalyzer:
             "total_analyzed": 0,
             "api_calls": 0,
             "errors": 0,
-            "avg_processing_time": 0
+            "avg_processing_time": 0,
+            "batch_calls": 0,
+            "batch_fallbacks": 0,
+            "batch_rejected": 0
         }
         
         # Колбэки при получении результата
@@ -131,10 +139,42 @@ class RelationshipAnalyzer:
                 self.stats["errors"] += 1
                 await asyncio.sleep(1)
     
+    def _deliver(self, item: Dict, result: Optional[AnalysisResult]):
+        """Сохранить результат, вызвать колбэки и вернуть его ожидающему"""
+        if result:
+            self.analysis_history.append(result)
+            self.stats["total_analyzed"] += 1
+            for callback in self.callbacks:
+                try:
+                    callback(result)
+                except Exception as e:
+                    print(f"Error in callback: {e}")
+        if not item["future"].done():
+            item["future"].set_result(result)
+
+    async def _quick_analyze(self, item: Dict) -> Optional[AnalysisResult]:
+        """Быстрая оценка без LLM (эвристика по ключевым словам и участию)"""
+        return await self._heuristic.analyze_message(
+            item["message"],
+            item["sender"],
+            item["participants"],
+            context=item["context"],
+            message_id=item["message_id"],
+        )
+
     async def _process_batch(self, batch: List[Dict]):
         """Обработать батч сообщений"""
         import time
-        
+
+        if self.batch_prompts and len(batch) > 1:
+            await self._process_batch_prompt(batch)
+            return
+        await self._process_items(batch)
+
+    async def _process_items(self, batch: List[Dict]):
+        """По одному запросу на сообщение"""
+        import time
+
         for item in batch:
             start_time = time.time()
             
@@ -158,27 +198,13 @@ class RelationshipAnalyzer:
                 # Парсим результат
                 result = self._parse_response(response, item)
                 
-                if result:
-                    # Сохраняем
-                    self.analysis_history.append(result)
-                    self.stats["total_analyzed"] += 1
-                    
-                    # Вызываем колбэки
-                    for callback in self.callbacks:
-                        try:
-                            callback(result)
-                        except Exception as e:
-                            print(f"Error in callback: {e}")
-                    
-                    # Возвращаем результат
-                    item["future"].set_result(result)
-                else:
-                    item["future"].set_result(None)
+                # Сохраняем, вызываем колбэки, возвращаем результат
+                self._deliver(item, result)
                 
             except Exception as e:
                 print(f"Error processing item: {e}")
                 self.stats["errors"] += 1
-                item["future"].set_result(None)
+                self._deliver(item, None)
             
             # Обновляем статистику времени
             process_time = time.time() - start_time
@@ -186,6 +212,95 @@ class RelationshipAnalyzer:
                 self.stats["avg_processing_time"] * 0.9 + process_time * 0.1
             )
     
+    async def _process_batch_prompt(self, batch: List[Dict]):
+        """
+        N сообщений — один запрос: ответ JSON-массивом в порядке сообщений.
+        Элементы, которые не удалось разобрать, оцениваются эвристикой (_quick_analyze).
+        """
+        import time
+
+        start_time = time.time()
+        results: List[Optional[AnalysisResult]] = [None] * len(batch)
+        try:
+            prompt = self._build_batch_prompt(batch)
+            self.stats["api_calls"] += 1
+            self.stats["batch_calls"] += 1
+            response = await self.chat_service(
+                agent_name=self.analyzer_agent_name,
+                session_id="relationship_analysis",
+                prompt=prompt
+            )
+            results = self._parse_batch_response(response, batch)
+        except Exception as e:
+            print(f"Error processing batch: {e}")
+            self.stats["errors"] += 1
+
+        for item, result in zip(batch, results):
+            if result is None:
+                self.stats["batch_fallbacks"] += 1
+                result = await self._quick_analyze(item)
+            self._deliver(item, result)
+
+        process_time = (time.time() - start_time) / len(batch)
+        self.stats["avg_processing_time"] = (
+            self.stats["avg_processing_time"] * 0.9 + process_time * 0.1
+        )
+
+    def _build_batch_prompt(self, batch: List[Dict]) -> str:
+        """Сформировать промпт для анализа нескольких сообщений"""
+        blocks = []
+        for i, item in enumerate(batch):
+            lines = [f"{i}. Сообщение от {item['sender']}: {json.dumps(item['message'], ensure_ascii=False)}",
+                     f"   Участники: {', '.join(item['participants'])}"]
+            if item["context"]:
+                lines.append(f"   Предыдущее сообщение: {item['context'][-1]}")
+            blocks.append("\n".join(lines))
+        messages = "\n".join(blocks)
+
+        return f"""
+Ты аналитик отношений. Проанализируй {len(batch)} сообщений и определи, как каждое повлияет на отношения.
+
+{messages}
+
+Для каждого сообщения оцени влияние на отношения отправителя с каждым участником
+по шкале от -1 (сильно портит) до 1 (сильно улучшает).
+
+Ответь ТОЛЬКО JSON-массивом из {len(batch)} объектов в порядке сообщений:
+[
+    {{
+        "impacts": {{"имя_участника": число}},
+        "sentiment": число (общая тональность -1 до 1),
+        "emotions": {{"anger": 0-1, "joy": 0-1, "sadness": 0-1, "trust": 0-1}},
+        "reason": "краткое объяснение"
+    }}
+]
+"""
+
+    def _parse_batch_response(self, response: str, batch: List[Dict]) -> List[Optional[AnalysisResult]]:
+        """Распарсить JSON-массив по позиции (index не учитывается); если длина не N — все None"""
+        results: List[Optional[AnalysisResult]] = [None] * len(batch)
+        match = re.search(r'\[.*\]', response or "", re.DOTALL)
+        if not match:
+            return results
+        try:
+            data = json.loads(match.group())
+        except ValueError as e:
+            print(f"Error parsing batch response: {e}")
+            return results
+        if not isinstance(data, list):
+            return results
+        if len(data) != len(batch):
+            self.stats["batch_rejected"] += 1
+            return results
+        for i, (entry, item) in enumerate(zip(data, batch)):
+            if not isinstance(entry, dict) or not isinstance(entry.get("impacts"), dict):
+                continue
+            try:
+                results[i] = self._result_from_data(entry, item)
+            except Exception as e:
+                print(f"Error parsing batch item {i}: {e}")
+        return results
+
     def _build_analysis_prompt(self, message: str, sender: str, 
                                participants: List[str], context: List[str]) -> str:
         """Сформировать промпт для анализа"""
@@ -236,24 +351,27 @@ class RelationshipAnalyzer:
                 return None
             
             data = json.loads(json_match.group())
-            
-            return AnalysisResult(
-                message_id=item["message_id"],
-                sender=item["sender"],
-                content=item["message"],
-                timestamp=datetime.now(),
-                impacts=data.get("impacts", {}),
-                sentiment=data.get("sentiment", 0),
-                emotions=data.get("emotions", {}),
-                reason=data.get("reason", "Анализ не удался"),
-                metadata={
-                    "participants": item["participants"],
-                    "context_size": len(item["context"])
-                }
-            )
+            return self._result_from_data(data, item)
         except Exception as e:
             print(f"Error parsing response: {e}")
             return None
+
+    def _result_from_data(self, data: Dict, item: Dict) -> AnalysisResult:
+        """Собрать результат из разобранного JSON-объекта"""
+        return AnalysisResult(
+            message_id=item["message_id"],
+            sender=item["sender"],
+            content=item["message"],
+            timestamp=datetime.now(),
+            impacts=data.get("impacts", {}),
+            sentiment=data.get("sentiment", 0),
+            emotions=data.get("emotions", {}),
+            reason=data.get("reason", "Анализ не удался"),
+            metadata={
+                "participants": item["participants"],
+                "context_size": len(item["context"])
+            }
+        )
     
     def get_recent_analyses(self, limit: int = 10) -> List[AnalysisResult]:
         """Получить последние анализы"""
@@ -5,7 +5,7 @@
 """
 import re
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from .models import AnalysisResult
 from datetime import datetime
@@ -40,6 +40,9 @@ NEGATIVE_PATTERNS = [
     (r"\bабсурд\b", -0.15),
 ]
 
+_POSITIVE = [(re.compile(p, re.IGNORECASE), w) for p, w in POSITIVE_PATTERNS]
+_NEGATIVE = [(re.compile(p, re.IGNORECASE), w) for p, w in NEGATIVE_PATTERNS]
+
 
 class HeuristicRelationshipAnalyzer:
     """Анализатор без LLM: правило-based оценка влияния на отношения."""
@@ -61,19 +64,69 @@ class HeuristicRelationshipAnalyzer:
         message_id: str | None = None,
     ) -> AnalysisResult | None:
         """Оценить влияние сообщения на отношения. Всегда возвращает результат при любом сообщении."""
+        last = str(context[-1]) if context and isinstance(context, list) else None
+        impacts, delta, reason = self._score(message, sender, participants, last)
+
+        if not impacts:
+            return None
+
+        logger.debug(
+            "heuristic_analyzer sender=%s impacts=%s reason=%s",
+            sender, impacts, reason,
+        )
+        return AnalysisResult(
+            message_id=message_id or f"{sender}_{datetime.now().timestamp()}",
+            sender=sender,
+            content=message,
+            timestamp=datetime.now(),
+            impacts=impacts,
+            sentiment=1.0 if delta > 0 else (-1.0 if delta < 0 else 0.5),
+            emotions={},
+            reason=reason,
+            metadata={"source": "heuristic", "participants": participants},
+        )
+
+    async def analyze_discussion(
+        self,
+        messages: Sequence[Tuple[str, str]],
+        participants: List[str],
+    ) -> Dict[Tuple[str, str], float]:
+        """
+        Оценить обсуждение целиком за один проход: [(sender, text), ...] -> {(от, к): сумма влияний}.
+
+        Те же правила, что analyze_message с контекстом из предыдущей реплики, но без
+        AnalysisResult на каждое сообщение и без копирования растущего контекста — линейно
+        по длине обсуждения.
+        """
+        deltas: Dict[Tuple[str, str], float] = {}
+        members = set(participants)
+        previous: Optional[str] = None
+        for sender, text in messages:
+            impacts, _, _ = self._score(text, sender, participants, previous)
+            for target, impact in impacts.items():
+                if target in members:
+                    key = (sender, target)
+                    deltas[key] = deltas.get(key, 0.0) + impact
+            previous = f"{sender}: {text}"
+        return deltas
+
+    def _score(
+        self, message: str, sender: str, participants: List[str], last: Optional[str],
+    ) -> Tuple[Dict[str, float], float, str]:
+        """Влияние сообщения на участников: (impacts, суммарный вес ключевых слов, причина)."""
         text = (message or "").lower()
         impacts: Dict[str, float] = {}
         delta = 0.0
         reason = "участие в диалоге"
 
         # 1. Ключевые слова согласия/несогласия
-        for pattern, weight in POSITIVE_PATTERNS:
-            if re.search(pattern, text, re.IGNORECASE):
+        for pattern, weight in _POSITIVE:
+            if pattern.search(text):
                 delta += weight
                 reason = "согласие"
                 break
-        for pattern, weight in NEGATIVE_PATTERNS:
-            if re.search(pattern, text, re.IGNORECASE):
+        for pattern, weight in _NEGATIVE:
+            if pattern.search(text):
                 delta += weight
                 reason = "несогласие"
                 break
@@ -98,28 +151,11 @@ class HeuristicRelationshipAnalyzer:
                     impacts[p] = participation
 
         # 4. Контекст: последнее сообщение — кто говорил до этого (ответ на него)
-        if context and isinstance(context, list) and len(context) >= 1:
-            last = str(context[-1]) if context else ""
+        if last:
+            last_lower = last.lower()
             for p in participants:
-                if p != sender and (p in last or p.lower() in last.lower()):
+                if p != sender and (p in last or p.lower() in last_lower):
                     impacts[p] = impacts.get(p, 0) + RESPONSE_TO_PREVIOUS_DELTA * self.influence_coefficient
                     break
 
-        if not impacts:
-            return None
-
-        logger.debug(
-            "heuristic_analyzer sender=%s impacts=%s reason=%s",
-            sender, impacts, reason,
-        )
-        return AnalysisResult(
-            message_id=message_id or f"{sender}_{datetime.now().timestamp()}",
-            sender=sender,
-            content=message,
-            timestamp=datetime.now(),
-            impacts=impacts,
-            sentiment=1.0 if delta > 0 else (-1.0 if delta < 0 else 0.5),
-            emotions={},
-            reason=reason,
-            metadata={"source": "heuristic", "participants": participants},
-        )
+        return impacts, delta, reason
@@ -1,7 +1,7 @@
 """
 Менеджер отношений - основной класс для работы с отношениями
 """
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Sequence, Tuple
 from datetime import datetime
 import asyncio
 
@@ -178,6 +178,53 @@ class RelationshipManager:
         
         return result
     
+    async def process_discussion(self,
+                                 messages: Sequence[Tuple[str, str]],
+                                 participants: List[str]) -> Dict[Tuple[str, str], float]:
+        """
+        Обработать обсуждение целиком: [(sender, text), ...] в порядке реплик.
+
+        Влияния копятся в памяти по парам (от, к) и применяются одним обновлением графа —
+        по одному update_relationship на пару, а не на каждую реплику. Анализатор без
+        analyze_discussion вызывается по сообщениям с предыдущей репликой в качестве контекста.
+        Возвращает применённые суммарные влияния.
+        """
+        if not self.analyzer or not messages:
+            return {}
+
+        analyze_discussion = getattr(self.analyzer, "analyze_discussion", None)
+        if analyze_discussion is not None:
+            deltas = await analyze_discussion(messages, participants)
+        else:
+            deltas: Dict[Tuple[str, str], float] = {}
+            previous: Optional[str] = None
+            for sender, text in messages:
+                result = await self.analyzer.analyze_message(
+                    message=text,
+                    sender=sender,
+                    participants=participants,
+                    context=[previous] if previous else None,
+                )
+                if result:
+                    for target, impact in result.impacts.items():
+                        if target in participants:
+                            deltas[(sender, target)] = deltas.get((sender, target), 0.0) + impact
+                previous = f"{sender}: {text}"
+
+        self.apply_deltas(deltas, reason=f"обсуждение ({len(messages)} сообщ.)", source="analysis")
+        return deltas
+
+    def apply_deltas(self, deltas: Dict[Tuple[str, str], float],
+                     reason: str = "", source: str = "system") -> int:
+        """Применить накопленные влияния {(от, к): delta}. Возвращает число обновлённых пар."""
+        updated = 0
+        for (from_entity, to_entity), delta in deltas.items():
+            if from_entity == to_entity or abs(delta) < 1e-9:
+                continue
+            self.update_relationship(from_entity, to_entity, delta, reason=reason, source=source)
+            updated += 1
+        return updated
+
     def _on_analysis_result(self, result: AnalysisResult):
         """Обработчик результатов анализа"""
         # Применяем влияния автоматически
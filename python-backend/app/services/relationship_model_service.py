@@ -81,30 +81,33 @@ async def sync_graph_to_db_and_broadcast(room, manager: RelationshipManager) ->
     name_to_id = {a.name: a.id for a in agents}
     agent_ids = list(name_to_id.values())
     session: Session = SessionLocal()
-    seen_pairs: set[tuple[int, int]] = set()
+    edges: list[tuple[int, int, float]] = []
     try:
-        # 1. Сначала создаём/обновляем все пары агентов (чтобы фронтенд видел отношения даже без сообщений)
+        # Все строки комнаты одним запросом — дальше поиск пары в dict, без запроса на пару
+        existing = {
+            (r.agent1_id, r.agent2_id): r
+            for r in session.query(DBRelationship).filter(DBRelationship.room_id == room_id)
+        }
+
+        def row_for(a_lo: int, a_hi: int) -> DBRelationship:
+            db_rel = existing.get((a_lo, a_hi))
+            if db_rel is None:
+                db_rel = DBRelationship(
+                    room_id=room_id,
+                    agent1_id=a_lo,
+                    agent2_id=a_hi,
+                    sympathy_value=0.0,
+                    interaction_count=0,
+                )
+                session.add(db_rel)
+                existing[(a_lo, a_hi)] = db_rel
+            return db_rel
+
+        # 1. Сначала создаём все пары агентов (чтобы фронтенд видел отношения даже без сообщений)
         for i, a1 in enumerate(agent_ids):
             for a2 in agent_ids[i + 1 :]:
-                if a1 == a2:
-                    continue
-                a_lo, a_hi = min(a1, a2), max(a1, a2)
-                if (a_lo, a_hi) in seen_pairs:
-                    continue
-                seen_pairs.add((a_lo, a_hi))
-                db_rel = session.query(DBRelationship).filter(
-                    DBRelationship.room_id == room_id,
-                    DBRelationship.agent1_id == a_lo,
-                    DBRelationship.agent2_id == a_hi,
-                ).first()
-                if not db_rel:
-                    session.add(DBRelationship(
-                        room_id=room_id,
-                        agent1_id=a_lo,
-                        agent2_id=a_hi,
-                        sympathy_value=0.0,
-                        interaction_count=0,
-                    ))
+                if a1 != a2:
+                    row_for(min(a1, a2), max(a1, a2))
 
         # 2. Обновляем значения из графа (анализ сообщений)
         graph_seen: set[tuple[int, int]] = set()
@@ -120,27 +123,18 @@ async def sync_graph_to_db_and_broadcast(room, manager: RelationshipManager) ->
                 if (a1, a2) in graph_seen:
                     continue
                 graph_seen.add((a1, a2))
-                val = (manager.get_relationship_value(from_name, to_name) + manager.get_relationship_value(to_name, from_name)) / 2.0
-                db_rel = session.query(DBRelationship).filter(
-                    DBRelationship.room_id == room_id,
-                    DBRelationship.agent1_id == a1,
-                    DBRelationship.agent2_id == a2,
-                ).first()
-                if db_rel:
-                    db_rel.sympathy_value = round(val, 4)
-                    db_rel.interaction_count = (db_rel.interaction_count or 0) + 1
-                else:
-                    session.add(DBRelationship(
-                        room_id=room_id,
-                        agent1_id=a1,
-                        agent2_id=a2,
-                        sympathy_value=round(val, 4),
-                        interaction_count=1,
-                    ))
-                await broadcast_graph_edge(room_id, str(a1), str(a2), round(val, 4))
+                val = round((manager.get_relationship_value(from_name, to_name) + manager.get_relationship_value(to_name, from_name)) / 2.0, 4)
+                db_rel = row_for(a1, a2)
+                db_rel.sympathy_value = val
+                db_rel.interaction_count = (db_rel.interaction_count or 0) + 1
+                edges.append((a1, a2, val))
         session.commit()
     except Exception as e:
         session.rollback()
         logger.warning("sync_graph_to_db_and_broadcast: %s", e)
+        return
     finally:
         session.close()
+    # Рассылка после коммита: клиенты получают уже сохранённый граф
+    for a1, a2, val in edges:
+        await broadcast_graph_edge(room_id, str(a1), str(a2), val)
@@ -17,8 +17,8 @@ def get_memory_integration(room) -> Optional["MemoryOrchestrationIntegration"]:
     """
     Получить интеграцию памяти для комнаты.
 
-    При доступном ChromaDB (CHROMA_PERSIST_DIR) использует векторное хранилище
-    для долгосрочной памяти комнаты. Иначе — только short-term.
+    Долгосрочная память комнаты — векторное хранилище из _create_vector_store:
+    ChromaDB (CHROMA_PERSIST_DIR), если установлен, иначе NumPy-индекс (VECTOR_STORE_DIR).
     """
     room_id = room.id
     if room_id in _memory_integrations:
@@ -28,25 +28,7 @@ def get_memory_integration(room) -> Optional["MemoryOrchestrationIntegration"]:
         from app.services.context_memory.integration import MemoryOrchestrationIntegration
         from app.services.context_memory.models import ImportanceLevel
 
-        vector_store = None
-        try:
-            from app.config import config
-            persist_dir = config.CHROMA_PERSIST_DIR
-        except Exception:
-            persist_dir = __import__("os").environ.get("CHROMA_PERSIST_DIR", "./chroma_db")
-        try:
-            from app.services.context_memory.vector_store import (
-                VectorMemoryStore,
-                CHROMA_AVAILABLE,
-            )
-            if CHROMA_AVAILABLE and persist_dir:
-                vector_store = VectorMemoryStore(
-                    collection_name=f"room_memory_{room_id}",
-                    persist_directory=persist_dir,
-                )
-        except Exception as e:
-            vector_store = None
-            # ChromaDB может падать из-за np.float_ в NumPy 2.0 — работаем без vector_store
+        vector_store = _create_vector_store(room_id)
 
         manager = MemoryManager(
             vector_store=vector_store,
@@ -66,6 +48,45 @@ def get_memory_integration(room) -> Optional["MemoryOrchestrationIntegration"]:
         return None
 
 
+def _create_vector_store(room_id: int):
+    """
+    Векторное хранилище комнаты по VECTOR_STORE_BACKEND: auto — ChromaDB, если он установлен
+    и запускается (0.4.x падает на np.float_ в NumPy 2.0), иначе NumpyVectorStore; off — без
+    долгосрочной памяти.
+    """
+    import os
+    from app.config import config
+
+    backend = config.VECTOR_STORE_BACKEND
+    if backend == "off":
+        return None
+    if backend in ("auto", "chroma"):
+        try:
+            from app.services.context_memory.vector_store import VectorMemoryStore, CHROMA_AVAILABLE, EmbeddingMismatchError
+            if CHROMA_AVAILABLE and config.CHROMA_PERSIST_DIR:
+                return VectorMemoryStore(
+                    collection_name=f"room_memory_{room_id}",
+                    persist_directory=config.CHROMA_PERSIST_DIR,
+                )
+        except EmbeddingMismatchError as e:
+            # Память комнаты в ChromaDB есть, но не читается: пустой NumPy-индекс скрыл бы её потерю
+            print(f"ChromaDB vector store for room {room_id} is incompatible, long-term memory disabled: {e}")
+            return None
+        except Exception as e:
+            print(f"ChromaDB vector store init failed for room {room_id}: {e}")
+        if backend == "chroma":
+            return None
+    from app.services.context_memory.embedding_service import get_embedding_service
+    from app.services.context_memory.numpy_store import NumpyVectorStore
+
+    name = f"room_memory_{room_id}"
+    return NumpyVectorStore(
+        collection_name=name,
+        directory=os.path.join(config.VECTOR_STORE_DIR, name) if config.VECTOR_STORE_DIR else None,
+        embed=get_embedding_service(),
+    )
+
+
 def get_emotional_integration(room) -> Optional["EmotionalOrchestrationIntegration"]:
     """Получить интеграцию эмоций для комнаты (без LLM-анализа, только состояние)."""
     room_id = room.id
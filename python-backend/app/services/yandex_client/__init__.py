@@ -1,4 +1,5 @@
 from app.services.yandex_client.yandex_agent_client import YandexAgentClient, Agent
+from app.services.yandex_client.client_pool import get_yandex_client
 from app.services.yandex_client.chat_service import ChatService
 
-__all__ = ["YandexAgentClient", "Agent", "ChatService"]
+__all__ = ["YandexAgentClient", "Agent", "ChatService", "get_yandex_client"]
@@ -14,3 +14,10 @@ class CharacterAgent:
             text=user_input,
         )
 
+    async def respond_async(self, session_id: str, user_input: str, on_delta=None) -> str:
+        return await self.agent_client.send_message_async(
+            agent=self.agent,
+            session_id=session_id,
+            text=user_input,
+            on_delta=on_delta,
+        )
@@ -1,15 +1,21 @@
+from typing import Optional
+
 from app.services.yandex_client.yandex_agent_client import YandexAgentClient
 from app.services.yandex_client.agent_factory import AgentFactory
+from app.services.yandex_client.client_pool import get_yandex_client
 
 
 class ChatService:
     """Сервис для общения с одним агентом через YandexGPT (режим single)."""
 
-    def __init__(self):
-        self.agent_client = YandexAgentClient()
+    def __init__(self, agent_client: Optional[YandexAgentClient] = None):
+        self.agent_client = agent_client or get_yandex_client()
         self.agent_factory = AgentFactory(self.agent_client)
 
     def process_message(self, agent, session_id: str, message: str) -> str:
         character_agent = self.agent_factory.get_agent(agent)
         return character_agent.respond(session_id, message)
 
+    async def process_message_async(self, agent, session_id: str, message: str, on_delta=None) -> str:
+        character_agent = self.agent_factory.get_agent(agent)
+        return await character_agent.respond_async(session_id, message, on_delta=on_delta)
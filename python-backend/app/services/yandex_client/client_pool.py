@@ -0,0 +1,52 @@
+"""
+Пул YandexAgentClient на процесс.
+
+Раньше ChatService, create_pipeline_components и create_orchestration_client создавали
+новый клиент на каждое сообщение: заново собирался AIStudio (и его соединения),
+а память грузила SentenceTransformer. Теперь клиент создаётся один раз на набор
+учётных данных и переиспользуется — соединения остаются «тёплыми».
+"""
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from app.services.yandex_client.yandex_agent_client import (
+    YANDEX_CLOUD_API_KEY,
+    YANDEX_CLOUD_FOLDER,
+    YandexAgentClient,
+)
+
+logger = logging.getLogger("aigod.yandex")
+
+_clients: Dict[Tuple[str, str, str], YandexAgentClient] = {}
+_lock = threading.Lock()
+
+
+def get_yandex_client(folder_id: Optional[str] = None, api_key: Optional[str] = None) -> YandexAgentClient:
+    """
+    Получить общий YandexAgentClient для учётных данных.
+
+    Ошибки конфигурации (нет ключей) пробрасываются как ValueError и не кэшируются.
+    """
+    key = (
+        folder_id or YANDEX_CLOUD_FOLDER or "",
+        api_key or YANDEX_CLOUD_API_KEY or "",
+        os.getenv("YANDEX_IAM_TOKEN", "").strip(),
+    )
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = YandexAgentClient(folder_id=folder_id, api_key=api_key)
+            _clients[key] = client
+            logger.info("client_pool: создан YandexAgentClient folder=%s", client.folder_id)
+    return client
+
+
+def reset_client_pool() -> None:
+    """Сбросить пул (тесты, смена ключей)."""
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,205 @@
+"""
+Кэш ответов YandexGPT для детерминированных промптов.
+
+Synthesizer, FactExtractor, суммаризация и анализ эмоций — чистые функции входа:
+при повторном прогоне (например, после отменённого pipeline) промпт совпадает байт в байт.
+Такие вызовы помечаются cache=True и берут ответ отсюда, не расходуя лимит api_usage_limiter.
+
+Ключ — sha256 от (model, temperature, полный промпт). Два уровня:
+- LRU в памяти (LLM_CACHE_MAX_ENTRIES, 0 — кэш выключен);
+- SQLite (LLM_CACHE_DB_PATH, пусто — без персистентности), переживает рестарт.
+Оба уровня соблюдают TTL (LLM_CACHE_TTL_SECONDS).
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.config import config
+
+logger = logging.getLogger("aigod.yandex")
+
+
+def make_cache_key(model: str, temperature: float, prompt: str) -> str:
+    """Ключ кэша: хэш модели, температуры и полного текста промпта."""
+    h = hashlib.sha256()
+    h.update(f"{model}\x00{temperature!r}\x00".encode("utf-8"))
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+class CompletionCache:
+    """
+    Двухуровневый кэш ответов LLM: LRU в памяти + опциональный SQLite с TTL.
+    Потокобезопасен — вызывается из потоков LLM-пула.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400, db_path: Optional[str] = None):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path or None
+        self._lru: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {"hits": 0, "misses": 0, "memory_hits": 0, "sqlite_hits": 0, "stores": 0, "evictions": 0}
+        if self.db_path:
+            self._open_db()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self._db is not None
+
+    def _open_db(self) -> None:
+        try:
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_completion_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.commit()
+            self._db = db
+        except sqlite3.Error as e:
+            logger.warning("completion_cache: SQLite %s недоступен, только память: %s", self.db_path, e)
+            self._db = None
+
+    def _expires_at(self) -> float:
+        return time.time() + self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+
+    def get(self, key: str) -> Optional[str]:
+        """Ответ из кэша или None. Просроченные записи удаляются."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            item = self._lru.get(key)
+            if item is not None:
+                response, expires_at = item
+                if expires_at > now:
+                    self._lru.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return response
+                del self._lru[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT response, expires_at FROM llm_completion_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        response, expires_at = row
+                        if expires_at > now:
+                            self._remember(key, response, expires_at)
+                            self.stats["hits"] += 1
+                            self.stats["sqlite_hits"] += 1
+                            return response
+                        self._db.execute("DELETE FROM llm_completion_cache WHERE key = ?", (key,))
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning("completion_cache get failed: %s", e)
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, response: str) -> None:
+        """Сохранить ответ в оба уровня."""
+        if not self.enabled or not response:
+            return
+        expires_at = self._expires_at()
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self.stats["stores"] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_completion_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                        (key, response, expires_at if expires_at != float("inf") else 1e18),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning("completion_cache put failed: %s", e)
+
+    def _remember(self, key: str, response: str, expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._lru[key] = (response, expires_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def purge_expired(self) -> int:
+        """Удалить просроченные записи. Возвращает число удалённых."""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            for key in [k for k, (_, exp) in self._lru.items() if exp <= now]:
+                del self._lru[key]
+                removed += 1
+            if self._db is not None:
+                try:
+                    cur = self._db.execute("DELETE FROM llm_completion_cache WHERE expires_at <= ?", (now,))
+                    self._db.commit()
+                    removed += cur.rowcount or 0
+                except sqlite3.Error as e:
+                    logger.warning("completion_cache purge failed: %s", e)
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM llm_completion_cache")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning("completion_cache clear failed: %s", e)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_stats(self) -> dict:
+        """Счётчики для /usage."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._lru),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "persistent": self._db is not None,
+                "hitRate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+
+_cache: Optional[CompletionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_completion_cache() -> CompletionCache:
+    """Кэш ответов на процесс (создаётся лениво из config)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CompletionCache(
+                    max_entries=config.LLM_CACHE_MAX_ENTRIES,
+                    ttl_seconds=config.LLM_CACHE_TTL_SECONDS,
+                    db_path=config.LLM_CACHE_DB_PATH,
+                )
+    return _cache
+
+
+def reset_completion_cache() -> None:
+    """Закрыть и сбросить кэш (тесты, смена настроек)."""
+    global _cache
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache is not None:
+        cache.close()
@@ -0,0 +1,50 @@
+"""
+Выделенный пул потоков для блокирующих вызовов YandexGPT.
+
+SDK (model.run) работает синхронно: вызов прямо из корутины блокирует event loop
+на всё время ответа модели — замирают WebSocket и pipeline остальных комнат.
+Все синхронные LLM-вызовы уходят сюда; размер пула ограничен LLM_EXECUTOR_WORKERS,
+чтобы не исчерпать потоки дефолтного executor и не упереться в 429 Yandex.
+"""
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from app.config import config
+
+logger = logging.getLogger("aigod.yandex")
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    """Пул потоков для LLM (создаётся лениво, один на процесс)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = max(1, config.LLM_EXECUTOR_WORKERS)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+                logger.info("llm_executor создан workers=%d", workers)
+    return _executor
+
+
+async def run_in_llm_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Выполнить блокирующую функцию в LLM-пуле, не блокируя event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_llm_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_llm_executor(wait: bool = False) -> None:
+    """Остановить пул (при shutdown приложения)."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
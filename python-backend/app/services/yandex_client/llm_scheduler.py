@@ -0,0 +1,191 @@
+"""
+Планировщик LLM-вызовов: глобальный и по-комнатный лимит параллельности + ограниченная очередь.
+
+Раньше POST /messages и /events/broadcast запускали по задаче на каждого агента без ограничений:
+комната с 20 агентами или всплеск комнат забивали пул потоков и ловили 429 от Yandex.
+Теперь каждый вызов берёт слот (slot), а эндпоинты заранее резервируют место в очереди
+(reserve) и при переполнении сразу отвечают 429, не копя задачи.
+
+Ключ комнаты — строка (room_5); вызовы без комнаты идут под ключом "global".
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+from app.config import config
+
+logger = logging.getLogger("aigod.yandex")
+
+
+class LLMQueueFullError(Exception):
+    """Очередь LLM-вызовов переполнена — запрос нужно отклонить (429)."""
+    def __init__(self, message: str, depth: int, limit: int):
+        super().__init__(message)
+        self.depth = depth
+        self.limit = limit
+
+
+class LLMScheduler:
+    """
+    Ограничивает число одновременных LLM-вызовов (всего и на комнату).
+    Работает в одном event loop; ожидающие пробуждаются по порядку прихода.
+    """
+
+    def __init__(self, max_concurrency: int = 8, per_room_concurrency: int = 2, max_queue: int = 64):
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_room_concurrency = max(1, per_room_concurrency)
+        self.max_queue = max(0, max_queue)
+        self._running = 0
+        self._room_running: Dict[str, int] = defaultdict(int)
+        self._waiters: Deque[list] = deque()  # [key, future] в порядке прихода
+        self._reserved = 0
+        self._wait_samples: Deque[float] = deque(maxlen=512)
+        self.stats = {"admitted": 0, "rejected": 0, "completed": 0, "max_wait_ms": 0.0}
+
+    @property
+    def queue_depth(self) -> int:
+        """Ожидающие слота вызовы + зарезервированные, но ещё не начавшие."""
+        return len(self._waiters) + self._reserved
+
+    def ensure_capacity(self, count: int = 1) -> None:
+        """
+        Проверить, что ещё count вызовов поместятся: выполняющиеся + ожидающие + зарезервированные
+        не больше max_concurrency + max_queue. Иначе LLMQueueFullError.
+        """
+        pending = self._running + self.queue_depth
+        capacity = self.max_concurrency + self.max_queue
+        if pending + count > capacity:
+            self.stats["rejected"] += count
+            logger.warning(
+                "llm_scheduler: очередь переполнена pending=%d need=%d capacity=%d",
+                pending, count, capacity,
+            )
+            raise LLMQueueFullError(
+                f"Очередь запросов к AI переполнена ({pending}/{capacity})",
+                depth=self.queue_depth,
+                limit=self.max_queue,
+            )
+
+    def reserve(self, count: int = 1) -> None:
+        """Зарезервировать место под count будущих вызовов slot(reserved=True)."""
+        self.ensure_capacity(count)
+        self._reserved += count
+        self.stats["admitted"] += count
+
+    def release_reservation(self, count: int = 1) -> None:
+        """Вернуть неиспользованную резервацию (задача завершилась до вызова LLM)."""
+        self._reserved = max(0, self._reserved - count)
+
+    def _can_run(self, key: str) -> bool:
+        return self._running < self.max_concurrency and self._room_running.get(key, 0) < self.per_room_concurrency
+
+    def _wake_next(self) -> None:
+        """Разбудить ожидающих, которым хватает слотов (по порядку прихода)."""
+        running = self._running
+        room_running = dict(self._room_running)
+        for key, fut in list(self._waiters):
+            if fut.done():
+                # Уже разбужен, но ещё не занял слот — учитываем как занятый
+                running += 1
+                room_running[key] = room_running.get(key, 0) + 1
+                continue
+            if running >= self.max_concurrency:
+                break
+            if room_running.get(key, 0) >= self.per_room_concurrency:
+                continue
+            fut.set_result(None)
+            running += 1
+            room_running[key] = room_running.get(key, 0) + 1
+
+    @asynccontextmanager
+    async def slot(self, key: Optional[str] = None, reserved: bool = False) -> AsyncIterator[None]:
+        """
+        Слот на один LLM-вызов. Ждёт, пока освободятся глобальный и комнатный лимиты.
+
+        reserved=True — место было зарезервировано через reserve() на эндпоинте.
+        """
+        key = key or "global"
+        if reserved:
+            self.release_reservation()
+        started = time.monotonic()
+        if self._waiters or not self._can_run(key):
+            loop = asyncio.get_running_loop()
+            entry = [key, loop.create_future()]
+            self._waiters.append(entry)
+            self._wake_next()
+            try:
+                while True:
+                    await entry[1]
+                    if self._can_run(key):
+                        break
+                    entry[1] = loop.create_future()
+            except BaseException:
+                self._waiters.remove(entry)
+                self._wake_next()
+                raise
+            self._waiters.remove(entry)
+
+        wait_ms = (time.monotonic() - started) * 1000
+        self._wait_samples.append(wait_ms)
+        self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+        self._running += 1
+        self._room_running[key] += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._room_running[key] -= 1
+            if self._room_running[key] <= 0:
+                del self._room_running[key]
+            self.stats["completed"] += 1
+            self._wake_next()
+
+    def get_stats(self) -> dict:
+        """Состояние очереди для /usage."""
+        samples: List[float] = sorted(self._wait_samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+        return {
+            "running": self._running,
+            "waiting": len(self._waiters),
+            "reserved": self._reserved,
+            "queueDepth": self.queue_depth,
+            "maxQueue": self.max_queue,
+            "maxConcurrency": self.max_concurrency,
+            "perRoomConcurrency": self.per_room_concurrency,
+            "rooms": dict(self._room_running),
+            "admitted": self.stats["admitted"],
+            "rejected": self.stats["rejected"],
+            "completed": self.stats["completed"],
+            "avgWaitMs": round(sum(samples) / len(samples), 1) if samples else 0.0,
+            "p95WaitMs": round(p95, 1),
+            "maxWaitMs": round(self.stats["max_wait_ms"], 1),
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Планировщик на процесс (лимиты из config)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    max_concurrency=config.LLM_MAX_CONCURRENCY,
+                    per_room_concurrency=config.LLM_ROOM_CONCURRENCY,
+                    max_queue=config.LLM_QUEUE_MAX,
+                )
+    return _scheduler
+
+
+def reset_llm_scheduler() -> None:
+    """Сбросить планировщик (тесты, смена настроек)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
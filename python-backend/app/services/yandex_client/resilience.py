@@ -0,0 +1,313 @@
+"""
+Устойчивость вызовов YandexGPT: повторы с экспоненциальной задержкой, hedged-запросы и circuit breaker.
+
+Раньше любое исключение в send_message сразу превращалось в «Ой-ой, связь пропала!», а при
+падении upstream каждый агент каждой комнаты ждал собственный таймаут. Теперь:
+- транзиентные ошибки (UNAVAILABLE, DEADLINE_EXCEEDED, сеть, 5xx) повторяются с backoff + jitter;
+- если вызов дольше наблюдаемого p95, опционально отправляется дубль (hedge), побеждает первый ответ;
+- после LLM_BREAKER_FAILURES подряд неудач breaker открывается: все комнаты получают отказ
+  мгновенно, через LLM_BREAKER_RESET_SECONDS пропускается один пробный вызов (half-open).
+
+Вызовы синхронные — выполняются в потоках LLM-пула (см. llm_executor).
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Optional, TypeVar
+
+from app.config import config
+
+logger = logging.getLogger("aigod.yandex")
+
+T = TypeVar("T")
+
+# gRPC-коды, при которых повтор имеет смысл (остальные — ошибка запроса/авторизации)
+_TRANSIENT_GRPC_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "INTERNAL", "ABORTED", "UNKNOWN"}
+_TRANSIENT_NAME_MARKERS = ("Timeout", "Connect", "Unavailable", "RemoteProtocol", "ReadError")
+
+
+class LLMUnavailableError(Exception):
+    """YandexGPT недоступен: повторы исчерпаны или открыт circuit breaker."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Circuit breaker открыт — вызов отклонён без обращения к upstream."""
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Стоит ли повторять вызов после такой ошибки."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(exc, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    code_name = getattr(code, "name", None)
+    if code_name:
+        return code_name in _TRANSIENT_GRPC_CODES
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    name = type(exc).__name__
+    return any(marker in name for marker in _TRANSIENT_NAME_MARKERS)
+
+
+class CircuitBreaker:
+    """
+    Классический breaker: closed → open (после failure_threshold неудач подряд)
+    → half_open (через reset_timeout, один пробный вызов) → closed/open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = max(0.0, reset_timeout)
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "short_circuited": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def before_call(self) -> None:
+        """Разрешить вызов или сразу отказать (CircuitOpenError)."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.stats["short_circuited"] += 1
+            retry_after = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+        raise CircuitOpenError("YandexGPT временно недоступен (circuit breaker открыт)", retry_after)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("circuit_breaker: upstream восстановлен, breaker закрыт")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.stats["opened"] += 1
+                    logger.warning("circuit_breaker: открыт после %d неудач подряд", self._failures)
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutiveFailures": self._failures,
+                "opened": self.stats["opened"],
+                "shortCircuited": self.stats["short_circuited"],
+            }
+
+
+class ResilientCaller:
+    """
+    Обёртка вызова upstream: breaker → попытка (с hedge) → повтор транзиентных ошибок.
+
+    caller.call(lambda: model.run(prompt), hedge=True)
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_enabled: bool = False,
+        hedge_min_samples: int = 20,
+        hedge_workers: int = 4,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_retries = max(0, max_retries)
+        self.base_delay = max(0.0, base_delay)
+        self.max_delay = max(self.base_delay, max_delay)
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = max(1, hedge_min_samples)
+        self._hedge_workers = max(2, hedge_workers)
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._sleep = sleep
+        self._latencies: Deque[float] = deque(maxlen=256)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "hedges": 0, "hedge_wins": 0, "hedges_denied": 0}
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def latency_p95(self) -> Optional[float]:
+        """p95 длительности успешных вызовов (секунды) или None, пока мало данных."""
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            samples = sorted(self._latencies)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Задержка перед повтором attempt (0, 1, …): экспонента с «полным» jitter в [d/2, d]."""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def call(self, fn: Callable[[], T], hedge: bool = False,
+             can_retry: Optional[Callable[[], bool]] = None,
+             before_hedge: Optional[Callable[[], bool]] = None) -> T:
+        """
+        Выполнить fn с повторами. Нетранзиентные ошибки пробрасываются как есть,
+        исчерпанные повторы и открытый breaker — LLMUnavailableError.
+
+        can_retry — дополнительное условие повтора (например, стрим ещё ничего не отдал).
+        before_hedge — вызывается перед отправкой дубля: дубль — отдельный платный вызов,
+        False (лимит API исчерпан) — дубль не отправляется, ждём основной вызов.
+        """
+        self._bump("calls")
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            started = time.monotonic()
+            try:
+                result = self._attempt(fn, hedge, before_hedge)
+            except Exception as e:
+                if not is_transient_error(e):
+                    # Upstream ответил — ошибка в запросе; пробный вызов half-open не должен зависнуть
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                retryable = attempt < self.max_retries and (can_retry is None or can_retry())
+                if not retryable or self.breaker.state == CircuitBreaker.OPEN:
+                    self._bump("failures")
+                    raise LLMUnavailableError(f"YandexGPT недоступен после {attempt + 1} попыток: {e}") from e
+                delay = self.backoff_delay(attempt)
+                self._bump("retries")
+                logger.warning("YandexGPT транзиентная ошибка (%s), повтор %d через %.2f с", type(e).__name__, attempt + 1, delay)
+                self._sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+            return result
+
+    def _attempt(self, fn: Callable[[], T], hedge: bool,
+                 before_hedge: Optional[Callable[[], bool]] = None) -> T:
+        threshold = self.latency_p95() if hedge and self.hedge_enabled else None
+        if threshold is None:
+            return fn()
+
+        pool = self._get_hedge_pool()
+        primary = pool.submit(fn)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+
+        if before_hedge is not None and not before_hedge():
+            self._bump("hedges_denied")
+            logger.info("YandexGPT hedge: вызов дольше p95=%.2f с, дубль не разрешён лимитом", threshold)
+            return primary.result()
+        self._bump("hedges")
+        logger.info("YandexGPT hedge: вызов дольше p95=%.2f с, отправлен дубль", threshold)
+        backup = pool.submit(fn)
+        done, pending = wait([primary, backup], return_when=FIRST_COMPLETED)
+        first = done.pop()
+        if first.exception() is not None and pending:
+            # Первый завершился ошибкой — ждём второй
+            first = pending.pop()
+        if first is backup:
+            self._bump("hedge_wins")
+        return first.result()
+
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=self._hedge_workers, thread_name_prefix="llm-hedge"
+                )
+            return self._hedge_pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._hedge_pool = self._hedge_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def get_stats(self) -> dict:
+        p95 = self.latency_p95()
+        with self._lock:
+            stats = {
+                "calls": self.stats["calls"],
+                "retries": self.stats["retries"],
+                "failures": self.stats["failures"],
+                "hedges": self.stats["hedges"],
+                "hedgeWins": self.stats["hedge_wins"],
+                "hedgesDenied": self.stats["hedges_denied"],
+                "hedgeEnabled": self.hedge_enabled,
+            }
+        stats["latencyP95Ms"] = round(p95 * 1000, 1) if p95 is not None else None
+        stats["breaker"] = self.breaker.get_stats()
+        return stats
+
+
+_caller: Optional[ResilientCaller] = None
+_caller_lock = threading.Lock()
+
+
+def get_llm_resilience() -> ResilientCaller:
+    """Обёртка устойчивости на процесс (общий breaker для всех комнат)."""
+    global _caller
+    if _caller is None:
+        with _caller_lock:
+            if _caller is None:
+                _caller = ResilientCaller(
+                    max_retries=config.LLM_RETRY_MAX,
+                    base_delay=config.LLM_RETRY_BASE_DELAY,
+                    max_delay=config.LLM_RETRY_MAX_DELAY,
+                    breaker=CircuitBreaker(
+                        failure_threshold=config.LLM_BREAKER_FAILURES,
+                        reset_timeout=config.LLM_BREAKER_RESET_SECONDS,
+                    ),
+                    hedge_enabled=config.LLM_HEDGE_ENABLED,
+                )
+    return _caller
+
+
+def reset_llm_resilience() -> None:
+    """Сбросить состояние (тесты, смена настроек)."""
+    global _caller
+    with _caller_lock:
+        if _caller is not None:
+            _caller.shutdown()
+        _caller = None
@@ -0,0 +1,235 @@
+"""
+Хранилище истории сессий YandexAgentClient.
+
+Раньше sessions был обычным dict без вытеснения: адаптер оркестрации создаёт сессии
+с timestamp в id, и долгоживущий процесс рос без ограничений. Теперь:
+- на сессию — deque(maxlen=LLM_SESSION_MAX_MESSAGES), без копирования списка при обрезке;
+- общий бюджет LLM_SESSION_MAX_BYTES на все сессии, вытеснение по LRU;
+- опционально SQLite (LLM_SESSION_DB_PATH): запись сквозная, вытесненные из памяти
+  и пережившие рестарт сессии подгружаются при обращении. На диске тоже есть предел:
+  периодическая чистка удаляет строки старше LLM_SESSION_DB_TTL_HOURS и все сессии,
+  кроме LLM_SESSION_DB_MAX_SESSIONS последних записанных, — иначе одноразовые сессии
+  оркестрации (room_N:<uuid>) копились бы в файле бесконечно.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("aigod.yandex")
+
+Entry = Tuple[str, str]  # (роль, текст)
+
+
+def _entry_bytes(entry: Entry) -> int:
+    return len(entry[0].encode("utf-8")) + len(entry[1].encode("utf-8"))
+
+
+class SessionStore:
+    """
+    История диалогов по session_id с ограничением по числу сообщений и общему объёму.
+    Потокобезопасно: send_message вызывается из потоков LLM-пула.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = 20,
+        max_bytes: int = 8 * 1024 * 1024,
+        db_path: Optional[str] = None,
+        db_max_sessions: int = 1000,
+        db_ttl_seconds: float = 7 * 24 * 3600,
+        sweep_every: int = 100,
+    ):
+        self.max_messages = max(1, max_messages)
+        self.max_bytes = max(0, max_bytes)
+        # Предел SQLite: сессий на диске (0 — без предела), возраст строк (0 — бессрочно), чистка раз в sweep_every записей
+        self.db_max_sessions = max(0, db_max_sessions)
+        self.db_ttl_seconds = max(0.0, db_ttl_seconds)
+        self.sweep_every = max(1, sweep_every)
+        self._writes_since_sweep = 0
+        self._sessions: "OrderedDict[str, Deque[Entry]]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {"evicted_sessions": 0, "loaded_from_db": 0, "swept_rows": 0}
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> None:
+        try:
+            db = sqlite3.connect(db_path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_session_history ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                "role TEXT NOT NULL, message TEXT NOT NULL)"
+            )
+            columns = {row[1] for row in db.execute("PRAGMA table_info(llm_session_history)")}
+            if "created_at" not in columns:
+                # Файлы до появления чистки: старые строки получают 0 и уходят с первой чисткой по TTL
+                db.execute("ALTER TABLE llm_session_history ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+            db.execute("CREATE INDEX IF NOT EXISTS ix_llm_session_history_sid ON llm_session_history (session_id, id)")
+            db.execute("CREATE INDEX IF NOT EXISTS ix_llm_session_history_created ON llm_session_history (created_at)")
+            db.commit()
+            self._db = db
+            self._sweep()
+        except sqlite3.Error as e:
+            logger.warning("session_store: SQLite %s недоступен, история только в памяти: %s", db_path, e)
+            self._db = None
+
+    # --- dict-подобный доступ (совместимость с прежним client.sessions) ---
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return self._load(session_id) is not None
+
+    def __getitem__(self, session_id: str) -> List[Entry]:
+        history = self.get(session_id)
+        if not history and session_id not in self:
+            raise KeyError(session_id)
+        return history
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def get(self, session_id: str) -> List[Entry]:
+        """Копия истории сессии (пустой список, если сессии нет)."""
+        with self._lock:
+            history = self._load(session_id)
+            return list(history) if history is not None else []
+
+    def append(self, session_id: str, entries: Iterable[Entry]) -> None:
+        """Добавить сообщения в сессию; лишние старые вытесняются deque и бюджетом байт."""
+        entries = list(entries)
+        with self._lock:
+            history = self._load(session_id)
+            if history is None:
+                history = deque(maxlen=self.max_messages)
+                self._sessions[session_id] = history
+                self._bytes[session_id] = 0
+            for entry in entries:
+                if len(history) == history.maxlen:
+                    dropped = history[0]
+                    self._bytes[session_id] -= _entry_bytes(dropped)
+                    self._total_bytes -= _entry_bytes(dropped)
+                history.append(entry)
+                self._bytes[session_id] += _entry_bytes(entry)
+                self._total_bytes += _entry_bytes(entry)
+            self._persist(session_id, entries)
+            self._enforce_budget(keep=session_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._bytes.clear()
+            self._total_bytes = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "sessions": len(self._sessions),
+                "bytes": self._total_bytes,
+                "maxBytes": self.max_bytes,
+                "maxMessages": self.max_messages,
+                "persistent": self._db is not None,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # --- внутреннее (под self._lock) ---
+
+    def _load(self, session_id: str) -> Optional[Deque[Entry]]:
+        history = self._sessions.get(session_id)
+        if history is not None:
+            self._sessions.move_to_end(session_id)
+            return history
+        if self._db is None:
+            return None
+        try:
+            rows = self._db.execute(
+                "SELECT role, message FROM llm_session_history WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, self.max_messages),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("session_store load failed: %s", e)
+            return None
+        if not rows:
+            return None
+        history = deque(reversed([(r[0], r[1]) for r in rows]), maxlen=self.max_messages)
+        self._sessions[session_id] = history
+        self._bytes[session_id] = sum(_entry_bytes(e) for e in history)
+        self._total_bytes += self._bytes[session_id]
+        self.stats["loaded_from_db"] += 1
+        self._enforce_budget(keep=session_id)
+        return history
+
+    def _persist(self, session_id: str, entries: List[Entry]) -> None:
+        if self._db is None or not entries:
+            return
+        try:
+            now = time.time()
+            self._db.executemany(
+                "INSERT INTO llm_session_history (session_id, role, message, created_at) VALUES (?, ?, ?, ?)",
+                [(session_id, role, message, now) for role, message in entries],
+            )
+            # На диске держим столько же, сколько в памяти
+            self._db.execute(
+                "DELETE FROM llm_session_history WHERE session_id = ? AND id NOT IN ("
+                "SELECT id FROM llm_session_history WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_messages),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning("session_store persist failed: %s", e)
+            return
+        self._writes_since_sweep += 1
+        if self._writes_since_sweep >= self.sweep_every:
+            self._sweep()
+
+    def _sweep(self) -> None:
+        """Удалить с диска устаревшие строки и сессии сверх db_max_sessions последних записанных."""
+        self._writes_since_sweep = 0
+        if self._db is None:
+            return
+        try:
+            deleted = 0
+            if self.db_ttl_seconds:
+                deleted += self._db.execute(
+                    "DELETE FROM llm_session_history WHERE created_at < ?",
+                    (time.time() - self.db_ttl_seconds,),
+                ).rowcount
+            if self.db_max_sessions:
+                deleted += self._db.execute(
+                    "DELETE FROM llm_session_history WHERE session_id NOT IN ("
+                    "SELECT session_id FROM llm_session_history GROUP BY session_id "
+                    "ORDER BY MAX(id) DESC LIMIT ?)",
+                    (self.db_max_sessions,),
+                ).rowcount
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning("session_store sweep failed: %s", e)
+            return
+        if deleted:
+            self.stats["swept_rows"] += deleted
+            logger.info("session_store: чистка SQLite удалила %d строк", deleted)
+
+    def _enforce_budget(self, keep: str) -> None:
+        """Вытеснять наименее недавно использованные сессии, пока не уложимся в бюджет."""
+        if self.max_bytes <= 0:
+            return
+        while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                self._sessions.move_to_end(oldest)
+                continue
+            self._sessions.pop(oldest)
+            self._total_bytes -= self._bytes.pop(oldest, 0)
+            self.stats["evicted_sessions"] += 1
@@ -0,0 +1,76 @@
+"""
+Single-flight для LLM-запросов.
+
+Один и тот же вход комнаты может породить дубликаты: /events/broadcast (chat) и POST /messages
+оба вызывают enqueue_room_run, фронтенд повторяет запрос по таймауту. Одновременные вызовы
+с одинаковым ключом (агент, сессия, промпт) ждут один upstream-запрос — и один record_api_call.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger("aigod.yandex")
+
+T = TypeVar("T")
+
+
+def make_flight_key(*parts: object) -> str:
+    """Ключ single-flight: хэш частей (агент, промпт агента, сессия, текст…)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class SingleFlight:
+    """
+    Группа in-flight запросов. Первый вызов с ключом выполняет работу,
+    остальные, пришедшие до её завершения, получают тот же результат (или исключение).
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"calls": 0, "executed": 0, "deduplicated": 0}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        self.stats["calls"] += 1
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            self.stats["deduplicated"] += 1
+            logger.info("singleflight: дубликат запроса присоединён к выполняющемуся key=%s", key[:12])
+            # shield: отмена одного ожидающего не отменяет запрос для остальных
+            return await asyncio.shield(task)
+
+        self.stats["executed"] += 1
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # исключение получат ожидающие; здесь — чтобы не было "never retrieved"
+
+    def get_stats(self) -> dict:
+        calls = self.stats["calls"]
+        return {
+            **self.stats,
+            "inflight": len(self._inflight),
+            "dedupRate": round(self.stats["deduplicated"] / calls, 3) if calls else 0.0,
+        }
+
+
+_group: Optional[SingleFlight] = None
+
+
+def get_llm_singleflight() -> SingleFlight:
+    """Группа single-flight для LLM-запросов процесса."""
+    global _group
+    if _group is None:
+        _group = SingleFlight()
+    return _group
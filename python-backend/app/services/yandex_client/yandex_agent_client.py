@@ -1,16 +1,106 @@
+import asyncio
 import logging
 import os
-from typing import Dict, List, Tuple
+import re
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
 from dotenv import load_dotenv
 from yandex_ai_studio_sdk import AIStudio
 
+from app.config import config
+from app.services.metrics import LLM_CALLS, LLM_ERRORS, LLM_LATENCY_SECONDS
+from app.services.prompts.builder import BuiltPrompt, PromptBuilder
+from app.services.yandex_client.resilience import LLMUnavailableError, get_llm_resilience
+from app.services.yandex_client.session_store import SessionStore
+
 load_dotenv()
 
 logger = logging.getLogger("aigod.yandex")
 
+_ROOM_RE = re.compile(r"room_(\d+)")
+
+
+def _room_label(session_id: str) -> str:
+    """Метка room для метрик: сессии оркестрации имеют вид room_{id}:..."""
+    match = _ROOM_RE.match(session_id or "")
+    return match.group(1) if match else ""
+
+
+def _memory_scope(session_id: str) -> str:
+    """Пространство памяти агента: room_N для сессий room_N:<uuid>, иначе сама сессия."""
+    return (session_id or "").split(":", 1)[0]
+
+
+def _record_llm_call(agent, session_id: str, mode: str, started: float) -> None:
+    name = getattr(agent, "name", str(agent))
+    room = _room_label(session_id)
+    LLM_CALLS.inc(name, room, mode)
+    LLM_LATENCY_SECONDS.observe(time.perf_counter() - started, name, room)
+
+
+def _reserve_hedge_call() -> bool:
+    """Дубль hedge — ещё один платный вызов: отправляется, только если лимит API позволяет, и учитывается в нём."""
+    from app.services.api_usage_limiter import ApiLimitExceededError, check_can_call_api, record_api_call
+
+    try:
+        check_can_call_api()
+    except ApiLimitExceededError:
+        return False
+    record_api_call()
+    return True
+
+
 YANDEX_CLOUD_FOLDER = os.getenv("YANDEX_CLOUD_FOLDER")
 YANDEX_CLOUD_API_KEY = os.getenv("YANDEX_CLOUD_API_KEY")
+MODEL_NAME = "yandexgpt"
 TEMPERATURE = 0.5
+# Разделитель системного промпта и персоны (см. YandexAgentAdapter.get_or_create_agent)
+PERSONA_SEPARATOR = "\n\n---\n\n"
+UNAVAILABLE_REPLY = "Ой-ой, связь пропала! Попробуй позже."
+
+# Общая на процесс память агентов: ChromaDB один раз, эмбеддинги — общий EmbeddingService
+_memory_lock = threading.Lock()
+_memory_collection = None
+_memory_init_attempted = False
+
+
+def get_agent_memory_collection():
+    """
+    Коллекция ChromaDB с памятью агентов, общая для всех клиентов процесса.
+
+    Эмбеддинги — общий сервис процесса (get_embedding_service), если это модель
+    sentence-transformers; иначе, как раньше, SentenceTransformerEmbeddingFunction. При ошибке
+    (chromadb или sentence-transformers не установлен и т.п.) возвращает None, повторных попыток не делает.
+    """
+    global _memory_collection, _memory_init_attempted
+    if _memory_init_attempted:
+        return _memory_collection
+    with _memory_lock:
+        if _memory_init_attempted:
+            return _memory_collection
+        try:
+            import chromadb
+            from app.services.context_memory.embedding_service import get_embedding_service
+
+            service = get_embedding_service()
+            embedding_function = service.chroma_function()
+            if embedding_function is None:
+                from chromadb.utils import embedding_functions
+                embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+                    model_name=service.model_name
+                )
+            chroma_client = chromadb.Client()
+            _memory_collection = chroma_client.get_or_create_collection(
+                name="agents_memory",
+                embedding_function=embedding_function
+            )
+        except Exception as e:
+            logger.warning("ChromaDB недоступен, память отключена: %s", e)
+            _memory_collection = None
+        _memory_init_attempted = True
+    return _memory_collection
 
 
 class YandexAgentClient:
@@ -36,30 +126,40 @@ class YandexAgentClient:
             auth=auth_value
         )
 
-        self.sessions: Dict[str, List[Tuple[str, str]]] = {}
+        self._model = None
+        # История сессий: deque на сессию + общий бюджет байт с LRU (опционально SQLite)
+        self.sessions = SessionStore(
+            max_messages=config.LLM_SESSION_MAX_MESSAGES,
+            max_bytes=config.LLM_SESSION_MAX_BYTES,
+            db_path=config.LLM_SESSION_DB_PATH,
+            db_max_sessions=config.LLM_SESSION_DB_MAX_SESSIONS,
+            db_ttl_seconds=config.LLM_SESSION_DB_TTL_HOURS * 3600,
+        )
+        # Память подключается лениво — при первом обращении, а не при создании клиента
         self._memory_collection = None
-        self._init_memory()
+        self._memory_initialized = False
+        # Статистика размеров промптов (PromptBuilder): для /usage и отладки бюджетов
+        self.prompt_stats = {"calls": 0, "total_tokens": 0, "truncated": {}}
+        self._prompt_stats_lock = threading.Lock()
 
     def _init_memory(self):
-        """Инициализация ChromaDB для памяти агента. Опционально — при ошибке память отключается."""
-        try:
-            import chromadb
-            from chromadb.utils import embedding_functions
-
-            self.chroma_client = chromadb.Client()
-            self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name="sentence-transformers/all-MiniLM-L6-v2"
-            )
-            self._memory_collection = self.chroma_client.get_or_create_collection(
-                name="agents_memory",
-                embedding_function=self.embedding_function
+        """Подключить общую память агентов (ChromaDB). Модель эмбеддингов грузится один раз на процесс."""
+        if not self._memory_initialized:
+            self._memory_collection = get_agent_memory_collection()
+            self._memory_initialized = True
+        return self._memory_collection
+
+    def _get_model(self):
+        """Сконфигурированная модель YandexGPT (создаётся один раз на клиент)."""
+        if self._model is None:
+            self._model = self.sdk.models.completions(MODEL_NAME).configure(
+                temperature=TEMPERATURE
             )
-        except Exception as e:
-            logger.warning("ChromaDB недоступен, память отключена: %s", e)
-            self._memory_collection = None
+        return self._model
 
     def _store_agent_memory(self, agent, session_id: str, user_text: str, answer: str):
-        if self._memory_collection is None:
+        collection = self._init_memory()
+        if collection is None:
             return
 
         try:
@@ -68,13 +168,14 @@ class YandexAgentClient:
         Агент ответил: {answer}
         """
 
-            memory_id = f"{agent.name}_{session_id}_{len(self.sessions.get(session_id, []))}"
+            memory_id = f"{agent.name}_{session_id}_{uuid.uuid4().hex[:12]}"
 
-            self._memory_collection.add(
+            collection.add(
                 documents=[memory_text],
                 metadatas=[{
                     "agent": agent.name,
-                    "session_id": session_id
+                    "session_id": session_id,
+                    "scope": _memory_scope(session_id)
                 }],
                 ids=[memory_id]
             )
@@ -82,14 +183,17 @@ class YandexAgentClient:
             print("Memory storage error:", e)
 
     def _get_agent_memory(self, agent, session_id: str, query: str, k: int = 5) -> str:
-        if self._memory_collection is None:
+        collection = self._init_memory()
+        if collection is None:
             return ""
 
         try:
-            results = self._memory_collection.query(
+            # Коллекция общая на процесс — ограничиваем поиск агентом и комнатой: сессии
+            # оркестрации одноразовые (room_N:<uuid>), поэтому фильтр по session_id не нашёл бы ничего
+            results = collection.query(
                 query_texts=[query],
                 n_results=k,
-                where={"agent": agent.name}
+                where={"$and": [{"agent": agent.name}, {"scope": _memory_scope(session_id)}]}
             )
 
             memories = results.get("documents", [[]])[0]
@@ -97,70 +201,261 @@ class YandexAgentClient:
             if not memories:
                 return ""
 
-            formatted = "\n".join(memories)
-            return f"\nВоспоминания агента:\n{formatted}\n"
+            return "\n".join(m.strip() for m in memories)
 
         except Exception as e:
             print("Memory retrieval error:", e)
             return ""  
 
-    def _build_prompt(self, agent, session_id: str, user_text: str) -> str:
-        history = self.sessions.get(session_id, [])
+    def _builder_for(self, agent, sections: Optional[Dict[str, str]]) -> PromptBuilder:
+        """Общие секции промпта: системный промпт/персона агента, отношения, эмоции, память комнаты."""
+        builder = PromptBuilder()
+        system, sep, personality = (agent.prompt or "").partition(PERSONA_SEPARATOR)
+        if sep:
+            builder.add("system", system).add("personality", personality)
+        else:
+            builder.add("personality", system)
+        sections = sections or {}
+        for name in ("relationships", "emotions", "memory"):
+            builder.add(name, sections.get(name))
+        return builder
+
+    def _finish_prompt(self, agent, builder: PromptBuilder, user_text: str) -> str:
+        builder.add("task", f"Пользователь: {user_text}\nОтвет:")
+        built = builder.build()
+        self._record_prompt_stats(agent, built)
+        return built.text
+
+    def _record_prompt_stats(self, agent, built: BuiltPrompt) -> None:
+        with self._prompt_stats_lock:
+            self.prompt_stats["calls"] += 1
+            self.prompt_stats["total_tokens"] += built.total_tokens
+            for name in built.truncated:
+                self.prompt_stats["truncated"][name] = self.prompt_stats["truncated"].get(name, 0) + 1
+        logger.info(
+            "YandexGPT prompt agent=%s tokens=%d sections=%s truncated=%s",
+            getattr(agent, "name", agent), built.total_tokens, built.section_tokens, ",".join(built.truncated) or "-",
+        )
+
+    def get_prompt_stats(self) -> dict:
+        with self._prompt_stats_lock:
+            calls = self.prompt_stats["calls"]
+            return {
+                "calls": calls,
+                "avgTokens": round(self.prompt_stats["total_tokens"] / calls, 1) if calls else 0.0,
+                "truncated": dict(self.prompt_stats["truncated"]),
+            }
 
-        conversation = ""
-        for role, message in history:
-            conversation += f"{role}: {message}\n"
+    def _build_prompt(self, agent, session_id: str, user_text: str, sections: Optional[Dict[str, str]] = None) -> str:
+        """
+        Промпт с историей сессии и воспоминаниями агента.
+        Каждая секция обрезается до своего бюджета (PromptBuilder), история — с конца.
+        """
+        builder = self._builder_for(agent, sections)
+        builder.add("memory", self._get_agent_memory(agent, session_id, user_text))
+        builder.add_lines("history", (f"{role}: {message}" for role, message in self.sessions.get(session_id)))
+        builder.add("history", (sections or {}).get("history"))
+        return self._finish_prompt(agent, builder, user_text)
+
+    def _build_stateless_prompt(self, agent, text: str, sections: Optional[Dict[str, str]] = None) -> str:
+        """Промпт без истории сессии и воспоминаний — одинаковый вход даёт одинаковый промпт."""
+        builder = self._builder_for(agent, sections)
+        builder.add("history", (sections or {}).get("history"))
+        return self._finish_prompt(agent, builder, text)
+
+    def _send_cached(self, agent, text: str, sections: Optional[Dict[str, str]] = None, session_id: str = "") -> str:
+        """Одноразовый запрос через кэш ответов: при попадании API не вызывается и лимит не тратится."""
+        from app.services.api_usage_limiter import check_can_call_api, record_api_call
+        from app.services.yandex_client.completion_cache import get_completion_cache, make_cache_key
+
+        prompt = self._build_stateless_prompt(agent, text, sections)
+        cache = get_completion_cache()
+        key = make_cache_key(MODEL_NAME, TEMPERATURE, prompt)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info("YandexGPT cache hit agent=%s", getattr(agent, 'name', agent))
+            return cached
+
+        check_can_call_api()
+        logger.info("YandexGPT запрос (cacheable) agent=%s", getattr(agent, 'name', agent))
+        model = self._get_model()
+        started = time.perf_counter()
+        result = get_llm_resilience().call(lambda: model.run(prompt), hedge=True, before_hedge=_reserve_hedge_call)
+        _record_llm_call(agent, session_id, "cacheable", started)
+        record_api_call()
+        answer = result.text.strip()
+        cache.put(key, answer)
+        return answer
+
+    def _run_streaming(self, model, prompt: str, on_delta: Callable[[str], None]) -> str:
+        """
+        model.run_stream: каждый частичный результат — накопленный текст, наружу отдаём только приращение.
+        Повтор при сбое возможен, только пока клиенту не ушёл ни один фрагмент.
+        """
+        emitted = []
 
-        memories = self._get_agent_memory(agent, session_id, user_text)
+        def emit(delta: str) -> None:
+            emitted.append(True)
+            on_delta(delta)
 
-        conversation += f"Пользователь: {user_text}\n"
-        conversation += "Ответ:"
+        return get_llm_resilience().call(
+            lambda: self._stream_once(model, prompt, emit), can_retry=lambda: not emitted
+        )
 
-        return f"""
-            {agent.prompt}
-            {memories}
-            Текущий диалог:
-            {conversation}
+    def _stream_once(self, model, prompt: str, on_delta: Callable[[str], None]) -> str:
+        text = ""
+        for partial in model.run_stream(prompt):
+            current = partial.text or ""
+            if current.startswith(text):
+                delta = current[len(text):]
+                text = current
+            else:
+                delta = current
+                text += current
+            if delta:
+                on_delta(delta)
+        return text
+
+    def send_message(
+        self,
+        agent,
+        session_id: str,
+        text: str,
+        cache: bool = False,
+        on_delta: Optional[Callable[[str], None]] = None,
+        sections: Optional[Dict[str, str]] = None,
+        fallback: bool = True,
+    ) -> str:
         """
+        Отправить сообщение агенту.
 
-    def send_message(self, agent, session_id: str, text: str) -> str:
+        cache=True — для детерминированных промптов (synthesizer, факты, суммаризация):
+        запрос идёт без истории сессии и памяти, ответ берётся из кэша при совпадении промпта.
+        on_delta — потоковый режим: вызывается с каждым новым фрагментом ответа (из потока LLM-пула).
+        sections — дополнительные секции промпта (relationships, emotions, memory, history),
+        обрезаются по бюджетам PromptBuilder; в историю сессии сохраняется только text.
+
+        Транзиентные ошибки повторяются (см. resilience), при открытом circuit breaker отказ мгновенный.
+        fallback=False — вместо текста-заглушки пробрасывать LLMUnavailableError (оркестрация не
+        должна сохранять заглушку как реплику агента и передавать её в синтез).
+        """
         try:
             from app.services.api_usage_limiter import check_can_call_api, record_api_call, ApiLimitExceededError
 
+            if cache:
+                return self._send_cached(agent, text, sections, session_id=session_id)
+
             check_can_call_api()
 
             logger.info("YandexGPT запрос agent=%s session=%s", getattr(agent, 'name', agent), session_id)
-            model = self.sdk.models.completions("yandexgpt").configure(
-                temperature=TEMPERATURE
-            )
-
-            prompt = self._build_prompt(agent, session_id, text)
-
-            result = model.run(prompt)
+            model = self._get_model()
+
+            prompt = self._build_prompt(agent, session_id, text, sections)
+
+            started = time.perf_counter()
+            if on_delta is not None:
+                answer = self._run_streaming(model, prompt, on_delta).strip()
+            else:
+                answer = get_llm_resilience().call(
+                    lambda: model.run(prompt), hedge=True, before_hedge=_reserve_hedge_call
+                ).text.strip()
+            _record_llm_call(agent, session_id, "stream" if on_delta is not None else "sync", started)
             record_api_call()
-            answer = result.text.strip()
-
-            if session_id not in self.sessions:
-                self.sessions[session_id] = []
 
-            self.sessions[session_id].append(("Пользователь", text))
-            self.sessions[session_id].append((agent.name, answer))
+            # Клиент общий на процесс — SessionStore потокобезопасен
+            self.sessions.append(session_id, [("Пользователь", text), (agent.name, answer)])
             self._store_agent_memory(agent, session_id, text, answer)
 
-            if len(self.sessions[session_id]) > 20:
-                self.sessions[session_id] = self.sessions[session_id][-20:]
-
             logger.info("YandexGPT ответ agent=%s len=%d", getattr(agent, 'name', agent), len(answer))
             return answer
 
         except Exception as e:
             from app.services.api_usage_limiter import ApiLimitExceededError
 
+            LLM_ERRORS.inc(getattr(agent, "name", str(agent)), _room_label(session_id), type(e).__name__)
             if isinstance(e, ApiLimitExceededError):
                 logger.warning("YandexGPT лимит исчерпан: %s (сегодня %d из %d)", e.window, e.current, e.limit)
                 return "Лимит обращений к AI исчерпан на сегодня. Попробуйте завтра или обратитесь к администратору."
+            if isinstance(e, LLMUnavailableError):
+                logger.warning("YandexGPT недоступен agent=%s: %s", getattr(agent, 'name', agent), e)
+                if not fallback:
+                    raise
+                return UNAVAILABLE_REPLY
             logger.exception("YandexGPT error: %s", e)
-            return "Ой-ой, связь пропала! Попробуй позже."
+            if not fallback:
+                raise
+            return UNAVAILABLE_REPLY
+
+    async def send_message_async(
+        self,
+        agent,
+        session_id: str,
+        text: str,
+        cache: bool = False,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+        sections: Optional[Dict[str, str]] = None,
+        fallback: bool = True,
+    ) -> str:
+        """
+        Асинхронная версия send_message: запрос выполняется в LLM-пуле, event loop свободен.
+
+        on_delta — корутина для фрагментов ответа (стриминг); вызывается в event loop по порядку.
+        Одновременные вызовы с тем же агентом, сессией и текстом объединяются (single-flight):
+        один запрос к YandexGPT и один record_api_call; фрагменты получает только первый вызов.
+        """
+        from app.services.yandex_client.singleflight import get_llm_singleflight, make_flight_key
+
+        key = make_flight_key(
+            id(self), getattr(agent, "name", agent), getattr(agent, "prompt", ""), session_id, text, cache,
+            sorted((sections or {}).items()), fallback,
+        )
+        return await get_llm_singleflight().do(
+            key,
+            lambda: self._send_message_async(
+                agent, session_id, text, cache=cache, on_delta=on_delta, sections=sections, fallback=fallback
+            ),
+        )
+
+    async def _send_message_async(
+        self,
+        agent,
+        session_id: str,
+        text: str,
+        cache: bool = False,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+        sections: Optional[Dict[str, str]] = None,
+        fallback: bool = True,
+    ) -> str:
+        from app.services.yandex_client.llm_executor import run_in_llm_executor
+
+        if on_delta is None or cache:
+            return await run_in_llm_executor(
+                self.send_message, agent, session_id, text, cache=cache, sections=sections, fallback=fallback
+            )
+
+        loop = asyncio.get_running_loop()
+        deltas: asyncio.Queue = asyncio.Queue()
+
+        def push(delta: str) -> None:
+            loop.call_soon_threadsafe(deltas.put_nowait, delta)
+
+        # Результат future выставляется через call_soon_threadsafe после всех push — порядок сохраняется
+        future = asyncio.ensure_future(
+            run_in_llm_executor(
+                self.send_message, agent, session_id, text, on_delta=push, sections=sections, fallback=fallback
+            )
+        )
+        future.add_done_callback(lambda _: deltas.put_nowait(None))
+        while True:
+            delta = await deltas.get()
+            if delta is None:
+                break
+            try:
+                await on_delta(delta)
+            except Exception as e:
+                logger.warning("YandexGPT stream on_delta failed: %s", e)
+        return await future
+
 
 class Agent:
     def __init__(self, name: str, prompt: str):
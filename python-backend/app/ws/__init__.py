@@ -1,5 +1,6 @@
 """WebSocket: менеджер подключений и рассылка."""
 from app.ws.broadcast import (
+    broadcast_chat_delta,
     broadcast_chat_event,
     broadcast_chat_message,
     broadcast_graph_edge,
@@ -10,6 +11,7 @@ __all__ = [
     "chat_manager",
     "graph_manager",
     "broadcast_chat_message",
+    "broadcast_chat_delta",
     "broadcast_chat_event",
     "broadcast_graph_edge",
 ]
@@ -23,6 +23,20 @@ async def broadcast_chat_message(room_id: int, payload: dict) -> None:
     await chat_manager.broadcast(room_id, full_payload)
 
 
+async def broadcast_chat_delta(room_id: int, payload: dict) -> None:
+    """
+    Рассылает фрагмент ответа агента, пока он генерируется (стриминг).
+    payload: { streamId, delta, sender, agentId?, aborted? }
+    Итоговый текст придёт отдельным type=message с тем же streamId и id из БД;
+    aborted=true — генерация оборвалась, итогового message не будет.
+    """
+    logger.debug(
+        "broadcast_chat_delta room_id=%s streamId=%s sender=%s delta_len=%d",
+        room_id, payload.get("streamId"), payload.get("sender"), len(str(payload.get("delta", ""))),
+    )
+    await chat_manager.broadcast(room_id, {"type": "message_delta", "payload": payload}, quiet=True)
+
+
 async def broadcast_chat_event(room_id: int, payload: dict) -> None:
     """
     Рассылает событие в комнату всем подключённым клиентам.
@@ -6,11 +6,14 @@
 """
 import asyncio
 import logging
+import time
 from collections import defaultdict
 from typing import Any
 
 from fastapi import WebSocket
 
+from app.services.metrics import WS_BROADCAST_FANOUT, WS_SEND_ERRORS, WS_SEND_SECONDS
+
 logger = logging.getLogger("aigod.ws.manager")
 
 
@@ -55,16 +58,18 @@ class ConnectionManager:
             else:
                 logger.info("WS [%s] disconnect room_id=%s (уже отключён)", self.name, room_id)
 
-    async def broadcast(self, room_id: int, message: dict[str, Any]) -> None:
+    async def broadcast(self, room_id: int, message: dict[str, Any], quiet: bool = False) -> None:
         """
         Рассылает сообщение всем подключённым клиентам в комнате.
         Отключившиеся исключаются из пула.
+        quiet=True — частые сообщения (стриминг): логирование только на уровне debug.
         """
         async with self._lock:
             conns = set(self._connections.get(room_id, []))  # copy
 
+        WS_BROADCAST_FANOUT.observe(len(conns), self.name)
         if not conns:
-            logger.warning(
+            (logger.debug if quiet else logger.warning)(
                 "WS [%s] broadcast room_id=%s type=%s — 0 подключений, сообщение не доставлено",
                 self.name, room_id, message.get("type"),
             )
@@ -76,16 +81,19 @@ class ConnectionManager:
             p = message["payload"]
             if isinstance(p, dict):
                 payload_preview = " id=%s sender=%s" % (str(p.get("id", "")), str(p.get("sender", "")))
-        logger.info(
+        (logger.debug if quiet else logger.info)(
             "WS [%s] broadcast room_id=%s type=%s → %d клиентов%s",
             self.name, room_id, msg_type, len(conns), payload_preview,
         )
         dead: set[WebSocket] = set()
         for ws in conns:
+            started = time.perf_counter()
             try:
                 await ws.send_json(message)
+                WS_SEND_SECONDS.observe(time.perf_counter() - started, self.name)
                 logger.debug("WS [%s] send_json OK room_id=%s type=%s", self.name, room_id, msg_type)
             except Exception as e:
+                WS_SEND_ERRORS.inc(self.name)
                 logger.warning("WS [%s] send_json FAIL room_id=%s: %s", self.name, room_id, e)
                 dead.add(ws)
 
@@ -15,6 +15,15 @@ class ChatMessagePayload(BaseModel):
     agentId: Optional[str] = None
     timestamp: str
     agentResponse: Optional[str] = None
+    streamId: Optional[str] = None  # если ответ стримился — id потока из message_delta
+
+
+class ChatMessageDeltaPayload(BaseModel):
+    """Фрагмент ответа агента во время генерации (стриминг)."""
+    streamId: str
+    delta: str
+    sender: str
+    agentId: Optional[str] = None
 
 
 class ChatEventPayload(BaseModel):
@@ -29,7 +38,7 @@ class ChatEventPayload(BaseModel):
 
 class ChatWsMessage(BaseModel):
     """Обёртка исходящего сообщения чата."""
-    type: Literal["message", "event", "error", "pong"]
+    type: Literal["message", "message_delta", "event", "error", "pong"]
     payload: dict
 
 
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Запись прогона pipeline в кассету и офлайн-бенчмарк его воспроизведения.
+
+Запись (нужны ключи YandexGPT и комната в aigod.db):
+    python bench_pipeline_replay.py record ROOM_ID "сообщение" cassette.json
+
+Воспроизведение без сети, в in-memory SQLite — замер накладных расходов оркестрации
+(запись сообщений, граф отношений, рассылки), а не времени ответа LLM:
+    python bench_pipeline_replay.py replay cassette.json [прогонов] [--latency 0.05 | --recorded-latency] [--stream]
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+def _room_meta(room) -> dict:
+    return {
+        "name": room.name,
+        "description": room.description,
+        "orchestration_type": room.orchestration_type,
+        "agents": [{"name": a.name, "personality": a.personality or ""} for a in room.agents],
+    }
+
+
+async def record(room_id: int, text: str, path: str) -> None:
+    from app.services.agents_orchestration.context import ConversationContext
+    from app.services.orchestration.cassette import RecordingChatService
+    from app.services.orchestration.executor import PipelineExecutor
+    from app.services.orchestration_background import (
+        _load_new_room_messages,
+        _load_room,
+        _make_message_callback,
+        reset_message_writer,
+    )
+    from app.services.orchestration_service import create_pipeline_adapter, create_pipeline_strategy
+
+    room = _load_room(room_id)
+    if room is None or not room.agents:
+        raise SystemExit(f"Комната {room_id} не найдена или без агентов")
+    adapter = create_pipeline_adapter(room)
+    if adapter is None:
+        raise SystemExit("YandexAgentClient недоступен: проверьте YANDEX_CLOUD_FOLDER_ID и YANDEX_CLOUD_API_KEY")
+    recorder = RecordingChatService(adapter)
+    context = ConversationContext(participants=[a.name for a in room.agents])
+    for _, message in _load_new_room_messages(room_id, None):
+        context.add_message(message)
+    strategy = create_pipeline_strategy(room, context, recorder)
+    if strategy is None:
+        raise SystemExit(f"Тип оркестрации {room.orchestration_type!r} не поддерживает pipeline")
+
+    executor = PipelineExecutor(
+        room=room,
+        chat_service=recorder,
+        strategy=strategy,
+        agents=[a.name for a in room.agents],
+        on_message=_make_message_callback(room_id, list(room.agents)),
+        max_discuss_rounds=50,
+        fast_forward=True,
+    )
+    state = await executor.run(text)
+    await reset_message_writer()
+    recorder.cassette.meta = {"room": _room_meta(room), "user_message": text, "sender": "user"}
+    recorder.cassette.save(path)
+    print(f"Записано вызовов: {len(recorder.cassette.calls)}; этапы: {state.stage_durations}")
+
+
+def _create_room(meta: dict):
+    from app.database.sqlite_setup import Base, SessionLocal, engine
+    import app.models  # noqa: F401 — регистрирует таблицы
+    from app.models.agent import Agent
+    from app.models.room import Room
+    from app.models.user import User
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    user = User(email="bench@example.com", username="bench", hashed_password="-")
+    session.add(user)
+    session.flush()
+    room = Room(
+        name=meta.get("name") or "bench",
+        description=meta.get("description"),
+        orchestration_type=meta.get("orchestration_type") or "circular",
+        user_id=user.id,
+    )
+    room.agents = [Agent(name=a["name"], personality=a.get("personality") or "") for a in meta.get("agents", [])]
+    session.add(room)
+    session.commit()
+    session.refresh(room)
+    return session, room
+
+
+async def replay(path: str, runs: int, latency: float, recorded_latency: bool, stream: bool) -> None:
+    from app.services.agents_orchestration.context import ConversationContext
+    from app.services.metrics import DB_COMMITS
+    from app.services.orchestration.cassette import Cassette, ReplayChatService
+    from app.services.orchestration.executor import PipelineExecutor
+    from app.services.orchestration_background import (
+        _make_delta_callback,
+        _make_message_callback,
+        get_message_writer,
+        reset_message_writer,
+    )
+    from app.services.orchestration_service import create_pipeline_strategy
+
+    cassette = Cassette.load(path)
+    session, room = _create_room(cassette.meta["room"])
+    agents = list(room.agents)
+    stage_totals: dict[str, float] = defaultdict(float)
+    commits = DB_COMMITS.value()
+    started = time.perf_counter()
+    for _ in range(runs):
+        service = ReplayChatService(cassette, latency=latency, recorded_latency=recorded_latency)
+        context = ConversationContext(participants=[a.name for a in agents])
+        executor = PipelineExecutor(
+            room=room,
+            chat_service=service,
+            strategy=create_pipeline_strategy(room, context, service),
+            agents=[a.name for a in agents],
+            on_message=_make_message_callback(room.id, agents),
+            max_discuss_rounds=50,
+            on_delta=_make_delta_callback(room.id, agents) if stream else None,
+            fast_forward=True,
+        )
+        state = await executor.run(cassette.meta.get("user_message", ""), cassette.meta.get("sender", "user"))
+        for stage, seconds in state.stage_durations.items():
+            stage_totals[stage] += seconds
+    writer_stats = get_message_writer().get_stats()
+    await reset_message_writer()
+    elapsed = time.perf_counter() - started
+    session.close()
+
+    print(f"Кассета: {path}; вызовов: {len(cassette.calls)}; прогонов: {runs}")
+    print(f"Всего: {elapsed:.3f} с, {1000 * elapsed / runs:.1f} мс на прогон")
+    for stage, seconds in stage_totals.items():
+        print(f"  {stage:<16} {1000 * seconds / runs:8.2f} мс")
+    print(f"Последний прогон: {service.get_stats()}")
+    print(f"Коммиты БД: {DB_COMMITS.value() - commits}; запись сообщений: {writer_stats}")
+
+
+def main(argv: list[str]) -> None:
+    if len(argv) >= 4 and argv[0] == "record":
+        asyncio.run(record(int(argv[1]), argv[2], argv[3]))
+        return
+    if len(argv) >= 2 and argv[0] == "replay":
+        # Воспроизведение не трогает aigod.db
+        os.environ["SQLITE_DB_PATH"] = ":memory:"
+        args = [a for a in argv[2:] if not a.startswith("--")]
+        latency = float(argv[argv.index("--latency") + 1]) if "--latency" in argv else 0.0
+        if "--latency" in argv:
+            args.remove(argv[argv.index("--latency") + 1])
+        asyncio.run(replay(
+            argv[1],
+            runs=int(args[0]) if args else 10,
+            latency=latency,
+            recorded_latency="--recorded-latency" in argv,
+            stream="--stream" in argv,
+        ))
+        return
+    print(__doc__)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
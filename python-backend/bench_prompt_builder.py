@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Сравнение размера промпта: прежняя конкатенация vs PromptBuilder с бюджетами секций.
+
+Синтетическая «долгая» комната: 20 сообщений истории сессии, 5 последних реплик контекста,
+обогащение отношениями, эмоциями и памятью. Запуск: python bench_prompt_builder.py [turns]
+"""
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.services.prompts.builder import count_tokens, load_budgets
+from app.services.yandex_client.yandex_agent_client import Agent, YandexAgentClient
+
+
+def _legacy_prompt(agent: Agent, history: list, memory: str, relationships: str, emotions: str,
+                   recent: str, task: str) -> str:
+    """Как собирался промпт до PromptBuilder: три слоя конкатенации без ограничений."""
+    enriched = f"{emotions}\n\n{relationships}\n\nКонтекст из памяти:\n{memory}\n\nТекущее сообщение: {task}"
+    adapted = f"Контекст разговора (последние сообщения):\n{recent}\n\nТекущая задача/запрос:\n{enriched}"
+    conversation = "".join(f"{role}: {message}\n" for role, message in history)
+    return f"{agent.prompt}\n\nТекущий диалог:\n{conversation}Пользователь: {adapted}\nОтвет:"
+
+
+def main(turns: int = 50) -> None:
+    with patch("app.services.yandex_client.yandex_agent_client.AIStudio"):
+        client = YandexAgentClient(folder_id="bench", api_key="bench")
+    client._get_agent_memory = lambda *args, **kwargs: ""
+
+    agent = Agent("Копатыч", "Ты участник чата.\n\n---\n\n" + "Ты Копатыч, медведь-огородник. " * 30)
+    line = "Нюша: а я считаю, что весной надо сажать морковку и поливать её каждое утро, иначе не вырастет"
+    legacy_total = built_total = 0
+    for turn in range(turns):
+        session_id = "room_1:bench"
+        history = client.sessions.get(session_id)
+        memory = "\n".join(f"Факт {i}: {line}" for i in range(15 + turn))
+        relationships = "Твои отношения: " + "; ".join(f"Агент{i} — дружба 0.{i}" for i in range(12))
+        emotions = "Твоё эмоциональное состояние: радость 0.7, интерес 0.5"
+        recent = "\n".join(f"Агент{i}: {line}" for i in range(5))
+        task = f"Ход {turn}: что скажешь остальным?"
+
+        legacy = _legacy_prompt(agent, history, memory, relationships, emotions, recent, task)
+        prompt = client._build_prompt(agent, session_id, task, {
+            "memory": memory, "relationships": relationships, "emotions": emotions, "history": recent,
+        })
+        legacy_total += count_tokens(legacy)
+        built_total += count_tokens(prompt)
+        client.sessions.append(session_id, [("Пользователь", task), (agent.name, line * 3)])
+
+    budgets = load_budgets()
+    print(f"Ходов: {turns}; бюджеты: {budgets} (сумма {sum(budgets.values())})")
+    print(f"Конкатенация:  {legacy_total / turns:8.0f} токенов на вызов")
+    print(f"PromptBuilder: {built_total / turns:8.0f} токенов на вызов")
+    print(f"Сокращение:    {100 * (1 - built_total / legacy_total):7.1f}%")
+    print(f"Обрезанные секции: {client.get_prompt_stats()['truncated']}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
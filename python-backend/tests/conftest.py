@@ -5,6 +5,10 @@
 # Важно: до импорта app задать in-memory БД
 import os
 os.environ["SQLITE_DB_PATH"] = ":memory:"
+# Векторная память комнат — только в памяти процесса, без файлов в рабочем каталоге
+os.environ["VECTOR_STORE_DIR"] = ""
+# Эмбеддинги — хэширование: без загрузки sentence-transformers, даже если он установлен
+os.environ["EMBEDDING_BACKEND"] = "hashing"
 
 from typing import Generator
 
@@ -0,0 +1,96 @@
+"""
+Тесты async-доступа к векторной памяти: операции хранилища уходят в пул памяти,
+event loop остаётся отзывчивым при массовой записи.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app.services.context_memory.async_store import AsyncVectorStore, get_memory_executor_stats
+from app.services.context_memory.embeddings import HashingEmbedder
+from app.services.context_memory.memory_manager import MemoryManager
+from app.services.context_memory.models import ImportanceLevel, MemoryItem, MemoryType
+from app.services.context_memory.numpy_store import NumpyVectorStore
+
+
+class _SlowEmbedder:
+    """Эмбеддинг «тяжёлой» модели: блокирует поток на delay секунд за вызов."""
+
+    def __init__(self, delay):
+        self.inner = HashingEmbedder(64)
+        self.dim = 64
+        self.delay = delay
+        self.threads = set()
+
+    def __call__(self, texts):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        return self.inner(texts)
+
+
+def _memory(mid, content):
+    return MemoryItem(
+        id=mid, content=content, type=MemoryType.LONG_TERM,
+        importance=ImportanceLevel.MEDIUM, timestamp=datetime.now(),
+    )
+
+
+async def _max_stall(coro, tick=0.005):
+    """Выполнить coro и измерить наибольшую задержку тика event loop."""
+    stall = 0.0
+
+    async def heartbeat():
+        nonlocal stall
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(tick)
+            now = time.perf_counter()
+            stall = max(stall, now - last - tick)
+            last = now
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    try:
+        result = await coro
+    finally:
+        beat.cancel()
+    return result, stall
+
+
+@pytest.mark.asyncio
+async def test_bulk_inserts_keep_event_loop_responsive():
+    embed = _SlowEmbedder(delay=0.03)
+    manager = MemoryManager(vector_store=NumpyVectorStore(embed=embed))
+
+    async def bulk():
+        for i in range(15):
+            await manager.add_message(f"Копатыч посадил грядку номер {i}", "Копатыч", importance=ImportanceLevel.HIGH)
+        return await manager.search_memory("грядку номер 7", include_short_term=False, n_results=1)
+
+    found, stall = await _max_stall(bulk())
+
+    assert manager.stats["long_term_items"] == 15
+    assert found[0].content == "Копатыч посадил грядку номер 7"
+    assert stall < 0.025  # синхронно каждая вставка остановила бы loop на 30 мс
+    assert all(name.startswith("memory") for name in embed.threads)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_operations_on_one_store_are_serialized():
+    store = NumpyVectorStore(embed=_SlowEmbedder(delay=0.001))
+    async_store = AsyncVectorStore(store)
+    calls_before = get_memory_executor_stats()["calls"]
+
+    await asyncio.gather(*(
+        async_store.add_memory(_memory(f"m{i}", f"заметка {i} про морковку")) for i in range(40)
+    ))
+    results = await async_store.search_memory("заметка 5 про морковку", n_results=3)
+
+    assert await async_store.count() == 40
+    assert results[0]["id"] == "m5"
+    stats = get_memory_executor_stats()
+    assert stats["calls"] - calls_before == 42
+    assert stats["inflight"] == 0
@@ -0,0 +1,188 @@
+"""
+Тесты пакетного анализа: EmotionAnalyzer и RelationshipAnalyzer — один LLM-запрос на батч.
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.services.emotional_intelligence.analyzer import EmotionAnalyzer
+from app.services.emotional_intelligence.models import EmotionType
+from app.services.relationship_model.analyzer import RelationshipAnalyzer
+
+
+class _ChatService:
+    """chat_service с фиксированным ответом; запоминает промпты."""
+    def __init__(self, response=None, error: Exception = None):
+        self.response = response
+        self.error = error
+        self.prompts = []
+
+    async def __call__(self, agent_name, session_id, prompt, **kwargs):
+        self.prompts.append(prompt)
+        if self.error:
+            raise self.error
+        return self.response
+
+
+def _items(loop, messages, participants=("Нюша", "Копатыч", "Крош")):
+    return [
+        {
+            "message": text,
+            "sender": sender,
+            "participants": list(participants),
+            "context": [],
+            "message_id": f"m{i}",
+            "future": loop.create_future(),
+        }
+        for i, (sender, text) in enumerate(messages)
+    ]
+
+
+def _emotion(index, primary, sentiment):
+    return {"index": index, "emotions": {primary: 0.9}, "primary_emotion": primary,
+            "intensity": 0.9, "sentiment": sentiment, "reason": "тест"}
+
+
+class TestEmotionBatch:
+    """EmotionAnalyzer: N сообщений — один запрос."""
+
+    @pytest.mark.asyncio
+    async def test_batch_is_one_call_with_per_item_fallback(self):
+        response = "Вот анализ:\n" + json.dumps([
+            _emotion(0, "joy", 0.8),
+            {"index": 1, "emotions": "сломано", "primary_emotion": None},
+            _emotion(2, "anger", -0.7),
+        ])
+        chat = _ChatService(response)
+        analyzer = EmotionAnalyzer(chat_service=chat)
+        batch = _items(asyncio.get_running_loop(), [
+            ("Нюша", "Ура, всё отлично!"), ("Копатыч", "Мне грустно и жаль"), ("Крош", "Бесит!"),
+        ])
+
+        await analyzer._process_batch(batch)
+
+        assert len(chat.prompts) == 1
+        results = [item["future"].result() for item in batch]
+        assert results[0].primary_emotion == EmotionType.JOY
+        assert results[2].primary_emotion == EmotionType.ANGER
+        assert results[1].reason == "Быстрый анализ по ключевым словам"
+        assert results[1].primary_emotion == EmotionType.SADNESS
+        stats = analyzer.get_stats()
+        assert stats["api_calls"] == 1
+        assert stats["batch_fallbacks"] == 1
+        assert stats["total_analyzed"] == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_call_falls_back_for_every_item(self):
+        analyzer = EmotionAnalyzer(chat_service=_ChatService(error=RuntimeError("upstream")))
+        batch = _items(asyncio.get_running_loop(), [("Нюша", "Я рад"), ("Крош", "Боюсь")])
+
+        await analyzer._process_batch(batch)
+
+        assert all(item["future"].result() is not None for item in batch)
+        assert analyzer.get_stats()["batch_fallbacks"] == 2
+
+    @pytest.mark.asyncio
+    async def test_one_based_or_missing_indices_cost_one_call(self):
+        one_based = [_emotion(1, "anger", -0.7), _emotion(2, "joy", 0.8)]
+        no_index = [{k: v for k, v in entry.items() if k != "index"} for entry in one_based]
+        for reply in (one_based, no_index):
+            chat = _ChatService(json.dumps(reply))
+            analyzer = EmotionAnalyzer(chat_service=chat)
+            batch = _items(asyncio.get_running_loop(), [("Крош", "Бесит!"), ("Нюша", "Ура!")])
+
+            await analyzer._process_batch(batch)
+
+            assert len(chat.prompts) == 1
+            assert batch[0]["future"].result().primary_emotion == EmotionType.ANGER
+            assert batch[1]["future"].result().primary_emotion == EmotionType.JOY
+            assert analyzer.get_stats()["batch_fallbacks"] == 0
+
+    @pytest.mark.asyncio
+    async def test_wrong_length_reply_falls_back_without_extra_calls(self):
+        chat = _ChatService(json.dumps([_emotion(0, "joy", 0.8)]))
+        analyzer = EmotionAnalyzer(chat_service=chat)
+        batch = _items(asyncio.get_running_loop(), [("Нюша", "Ура!"), ("Крош", "Бесит!")])
+
+        await analyzer._process_batch(batch)
+
+        assert len(chat.prompts) == 1
+        assert all(item["future"].result().reason == "Быстрый анализ по ключевым словам" for item in batch)
+        stats = analyzer.get_stats()
+        assert stats["batch_rejected"] == 1
+        assert stats["batch_fallbacks"] == 2
+
+    @pytest.mark.asyncio
+    async def test_worker_sends_queued_messages_in_one_prompt(self):
+        response = json.dumps([_emotion(i, "trust", 0.3) for i in range(4)])
+        chat = _ChatService(response)
+        analyzer = EmotionAnalyzer(chat_service=chat, batch_size=5)
+        await analyzer.start()
+        try:
+            results = await asyncio.gather(*(
+                analyzer.analyze_message(f"сообщение {i}", "Нюша", ["Нюша", "Крош"]) for i in range(4)
+            ))
+        finally:
+            await analyzer.stop()
+
+        assert len(chat.prompts) == 1
+        assert all(r.primary_emotion == EmotionType.TRUST for r in results)
+
+    @pytest.mark.asyncio
+    async def test_batch_prompts_can_be_disabled(self):
+        chat = _ChatService(json.dumps(_emotion(0, "joy", 0.5)))
+        analyzer = EmotionAnalyzer(chat_service=chat, batch_prompts=False)
+        batch = _items(asyncio.get_running_loop(), [("Нюша", "a"), ("Крош", "b")])
+
+        await analyzer._process_batch(batch)
+
+        assert len(chat.prompts) == 2
+
+
+class TestRelationshipBatch:
+    """RelationshipAnalyzer: пакетный промпт, сопоставление по позиции, эвристика при сбое."""
+
+    @pytest.mark.asyncio
+    async def test_results_are_matched_by_position(self):
+        response = json.dumps([
+            {"index": 1, "impacts": {"Копатыч": 0.6}, "sentiment": 0.7, "reason": "согласие"},
+            {"impacts": {"Нюша": -0.4}, "sentiment": -0.5, "reason": "спор"},
+        ])
+        chat = _ChatService(response)
+        analyzer = RelationshipAnalyzer(chat_service=chat)
+        batch = _items(asyncio.get_running_loop(), [("Нюша", "Согласен с Копатычем"), ("Крош", "Абсурд")])
+
+        await analyzer._process_batch(batch)
+
+        assert len(chat.prompts) == 1
+        assert batch[0]["future"].result().impacts == {"Копатыч": 0.6}
+        assert batch[1]["future"].result().impacts == {"Нюша": -0.4}
+        assert analyzer.get_stats()["batch_fallbacks"] == 0
+
+    @pytest.mark.asyncio
+    async def test_unparseable_response_uses_heuristic(self):
+        analyzer = RelationshipAnalyzer(chat_service=_ChatService("Не могу ответить"))
+        batch = _items(asyncio.get_running_loop(), [("Нюша", "Согласен!"), ("Крош", "Спорно")])
+
+        await analyzer._process_batch(batch)
+
+        results = [item["future"].result() for item in batch]
+        assert all(r is not None and r.metadata["source"] == "heuristic" for r in results)
+        assert analyzer.get_stats()["batch_fallbacks"] == 2
+
+    @pytest.mark.asyncio
+    async def test_wrong_length_reply_uses_heuristic_without_extra_calls(self):
+        chat = _ChatService(json.dumps([
+            {"index": 1, "impacts": {"Копатыч": 0.6}, "sentiment": 0.7, "reason": "согласие"},
+        ]))
+        analyzer = RelationshipAnalyzer(chat_service=chat)
+        batch = _items(asyncio.get_running_loop(), [("Нюша", "Согласен!"), ("Крош", "Спорно")])
+
+        await analyzer._process_batch(batch)
+
+        assert len(chat.prompts) == 1
+        assert all(item["future"].result().metadata["source"] == "heuristic" for item in batch)
+        stats = analyzer.get_stats()
+        assert stats["batch_rejected"] == 1
+        assert stats["batch_fallbacks"] == 2
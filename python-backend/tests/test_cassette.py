@@ -0,0 +1,114 @@
+"""
+Тесты кассет pipeline: запись вызовов chat_service и детерминированное воспроизведение
+через PipelineExecutor без сети.
+"""
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.orchestration.cassette import (
+    Cassette,
+    CassetteExhaustedError,
+    RecordingChatService,
+    ReplayChatService,
+)
+
+
+class _FakeLLM:
+    """Настоящий chat_service в миниатюре: ответ зависит от номера вызова."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, agent_name, session_id, prompt, context=None, cache=False, sections=None):
+        self.calls += 1
+        if cache:
+            return f"Итог {self.calls}: сажаем морковку."
+        return f"{agent_name} говорит ({self.calls}): надо подумать о грядках."
+
+
+@pytest.mark.asyncio
+async def test_recording_roundtrip(tmp_path):
+    inner = _FakeLLM()
+    recorder = RecordingChatService(inner)
+
+    first = await recorder("Крош", "s1", "промпт 1")
+    await recorder("Ёжик", "s1", "промпт 2", cache=True)
+    recorder.cassette.meta = {"user_message": "привет"}
+    path = tmp_path / "run.json"
+    recorder.cassette.save(path)
+    loaded = Cassette.load(path)
+
+    assert recorder.calls == 2
+    assert loaded.meta == {"user_message": "привет"}
+    assert [c["agent"] for c in loaded.calls] == ["Крош", "Ёжик"]
+    assert loaded.calls[0]["response"] == first
+    assert loaded.calls[1]["cache"] is True
+
+
+@pytest.mark.asyncio
+async def test_replay_prefers_exact_prompt_then_agent_order():
+    cassette = Cassette()
+    cassette.record("Крош", "s", "a", "ответ на a", 0.0)
+    cassette.record("Крош", "s", "b", "ответ на b", 0.0)
+    replay = ReplayChatService(cassette)
+
+    assert await replay("Крош", "s", "b") == "ответ на b"
+    assert await replay("Крош", "s", "промпт изменился") == "ответ на a"
+    with pytest.raises(CassetteExhaustedError):
+        await replay("Крош", "s", "a")
+    assert replay.get_stats() == {"calls": 3, "exact": 1, "sequential": 1, "remaining": 0}
+
+
+@pytest.mark.asyncio
+async def test_replay_synthetic_latency():
+    cassette = Cassette()
+    cassette.record("Крош", "s", "a", "ответ", latency=2.0)
+
+    replay = ReplayChatService(cassette, recorded_latency=True, latency_scale=0.01)
+    started = time.perf_counter()
+    await replay("Крош", "s", "a")
+
+    assert time.perf_counter() - started >= 0.02
+
+
+async def _run(room, chat_service, max_rounds=3):
+    from app.services.agents_orchestration.context import ConversationContext
+    from app.services.orchestration.executor import PipelineExecutor
+    from app.services.orchestration_service import create_pipeline_strategy
+
+    context = ConversationContext(participants=[a.name for a in room.agents])
+    executor = PipelineExecutor(
+        room=room,
+        chat_service=chat_service,
+        strategy=create_pipeline_strategy(room, context, chat_service),
+        agents=[a.name for a in room.agents],
+        max_discuss_rounds=max_rounds,
+        fast_forward=True,
+    )
+    with patch.object(PipelineExecutor, "_stage_retrieve_memory", new=AsyncMock()), \
+            patch.object(PipelineExecutor, "_stage_store_memory", new=AsyncMock()), \
+            patch("app.services.relationship_model_service.sync_graph_to_db_and_broadcast", new=AsyncMock()):
+        return await executor.run("Что посадим весной?")
+
+
+@pytest.mark.asyncio
+async def test_pipeline_replays_recorded_run(db_session, room_with_agent):
+    from app.models.agent import Agent
+
+    room, _ = room_with_agent
+    room.orchestration_type = "circular"
+    room.agents.append(Agent(name="Нюша", personality="Ты Нюша."))
+    db_session.commit()
+
+    recorder = RecordingChatService(_FakeLLM())
+    recorded = await _run(room, recorder)
+    replay = ReplayChatService(recorder.cassette)
+    replayed = await _run(room, replay)
+
+    assert replayed.error is None
+    assert replayed.synthesized_answer == recorded.synthesized_answer
+    assert [m.content for m in replayed.discussion_messages] == [m.content for m in recorded.discussion_messages]
+    assert replay.remaining() == 0
+    assert replay.get_stats()["exact"] == len(recorder.cassette.calls)
@@ -0,0 +1,136 @@
+"""
+Тесты кэша ответов LLM: LRU, TTL, SQLite-уровень и opt-in на местах вызова.
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.yandex_client.completion_cache import CompletionCache, make_cache_key
+
+
+class TestCompletionCache:
+    """Проверка CompletionCache."""
+
+    def test_key_depends_on_model_temperature_and_prompt(self):
+        base = make_cache_key("yandexgpt", 0.5, "промпт")
+        assert base == make_cache_key("yandexgpt", 0.5, "промпт")
+        assert base != make_cache_key("yandexgpt-lite", 0.5, "промпт")
+        assert base != make_cache_key("yandexgpt", 0.7, "промпт")
+        assert base != make_cache_key("yandexgpt", 0.5, "промпт ")
+
+    def test_hit_miss_counters_and_lru_eviction(self):
+        cache = CompletionCache(max_entries=2, ttl_seconds=60)
+        assert cache.get("a") is None
+        cache.put("a", "1")
+        cache.put("b", "2")
+        assert cache.get("a") == "1"  # a — самый свежий
+        cache.put("c", "3")  # вытесняет b
+
+        assert cache.get("b") is None
+        assert cache.get("c") == "3"
+        stats = cache.get_stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 2
+        assert stats["evictions"] == 1
+        assert stats["entries"] == 2
+
+    def test_ttl_expiry(self):
+        cache = CompletionCache(max_entries=10, ttl_seconds=10)
+        with patch("app.services.yandex_client.completion_cache.time.time", return_value=1000.0):
+            cache.put("k", "v")
+            assert cache.get("k") == "v"
+        with patch("app.services.yandex_client.completion_cache.time.time", return_value=1011.0):
+            assert cache.get("k") is None
+
+    def test_sqlite_tier_survives_restart(self, tmp_path):
+        db_path = str(tmp_path / "llm_cache.db")
+        first = CompletionCache(max_entries=10, ttl_seconds=60, db_path=db_path)
+        first.put("k", "сохранено")
+        first.close()
+
+        second = CompletionCache(max_entries=10, ttl_seconds=60, db_path=db_path)
+        assert second.get("k") == "сохранено"
+        assert second.get_stats()["sqlite_hits"] == 1
+        assert second.get("k") == "сохранено"
+        assert second.get_stats()["memory_hits"] == 1
+        second.close()
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = CompletionCache(max_entries=0)
+        cache.put("k", "v")
+        assert cache.get("k") is None
+        assert not cache.enabled
+
+
+class TestClientCache:
+    """YandexAgentClient: cache=True не вызывает API повторно и не тратит лимит."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self):
+        from app.services.yandex_client import completion_cache
+
+        completion_cache.reset_completion_cache()
+        yield
+        completion_cache.reset_completion_cache()
+
+    def _client(self):
+        from app.services.yandex_client.yandex_agent_client import YandexAgentClient
+
+        sdk = MagicMock()
+        sdk.models.completions.return_value.configure.return_value.run.return_value = MagicMock(text="решение")
+        with patch("app.services.yandex_client.yandex_agent_client.AIStudio", return_value=sdk):
+            client = YandexAgentClient(folder_id="folder", api_key="key")
+        return client, sdk.models.completions.return_value.configure.return_value
+
+    def test_identical_cacheable_prompt_hits_cache(self):
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        client, model = self._client()
+        agent = Agent("Синтезатор", "Ты принимаешь решение.")
+        with patch("app.services.api_usage_limiter.check_can_call_api"), \
+                patch("app.services.api_usage_limiter.record_api_call") as mock_record:
+            first = client.send_message(agent, "synthesizer_session", "обсуждение", cache=True)
+            second = client.send_message(agent, "synthesizer_session", "обсуждение", cache=True)
+            client.send_message(agent, "synthesizer_session", "другое обсуждение", cache=True)
+
+        assert first == second == "решение"
+        assert model.run.call_count == 2
+        assert mock_record.call_count == 2
+        assert "synthesizer_session" not in client.sessions
+
+    def test_uncached_calls_always_reach_api(self):
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        client, model = self._client()
+        agent = Agent("Копатыч", "Ты медведь.")
+        with patch("app.services.api_usage_limiter.check_can_call_api"), \
+                patch("app.services.api_usage_limiter.record_api_call"):
+            client.send_message(agent, "s", "привет")
+            client.send_message(agent, "s", "привет")
+
+        assert model.run.call_count == 2
+
+
+class TestCallSiteOptIn:
+    """Места вызова передают cache=True только при use_cache."""
+
+    @pytest.mark.asyncio
+    async def test_synthesizer_and_fact_extractor_opt_in(self):
+        from app.services.agents_orchestration.message import Message
+        from app.services.agents_orchestration.message_type import MessageType
+        from app.services.orchestration.fact_extractor import FactExtractor
+        from app.services.orchestration.solution_synthesizer import SolutionSynthesizer
+        from app.services.orchestration.stages import TaskState
+
+        state = TaskState(user_message="Как дела?", room_id=1, agent_names=["Копатыч"])
+        state.discussion_messages.append(Message(content="Хорошо", type=MessageType.AGENT, sender="Копатыч"))
+        chat = AsyncMock(return_value="Копатыч | said | хорошо")
+
+        await SolutionSynthesizer(chat, agent_name="Копатыч", use_cache=True).synthesize(state)
+        await FactExtractor(chat, use_cache=True).extract(state)
+        await SolutionSynthesizer(chat, agent_name="Копатыч").synthesize(state)
+
+        calls = chat.call_args_list
+        assert calls[0].kwargs.get("cache") is True
+        assert calls[1].kwargs.get("cache") is True
+        assert "cache" not in calls[2].kwargs
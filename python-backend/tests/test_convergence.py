@@ -0,0 +1,121 @@
+"""
+Тесты детекции сходимости: лексический повтор, эмбеддинги, консенсус, ранняя остановка DISCUSS.
+"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.agents_orchestration.message import Message
+from app.services.agents_orchestration.message_type import MessageType
+from app.services.orchestration.convergence import (
+    CompositeConvergenceDetector,
+    ConsensusDetector,
+    EmbeddingSimilarityDetector,
+    LexicalRepetitionDetector,
+    create_convergence_detector,
+)
+
+
+def _observe_all(detector, texts, participants=2):
+    detector.reset(participants=participants)
+    return [detector.observe([t]) for t in texts]
+
+
+class TestDetectors:
+    def test_lexical_fires_on_repetition_only(self):
+        repeating = [
+            "Нужно посадить морковку и полить грядки утром",
+            "Да, нужно посадить морковку и полить грядки утром",
+            "Нужно посадить морковку и полить грядки утром, верно",
+        ]
+        assert _observe_all(LexicalRepetitionDetector(), repeating)[-1] == "lexical"
+
+        varied = ["Пойдём на рыбалку", "Лучше построим ракету", "А я испеку пирог с вареньем"]
+        assert _observe_all(LexicalRepetitionDetector(), varied) == [None, None, None]
+
+    def test_consensus_needs_every_participant_to_agree(self):
+        detector = ConsensusDetector()
+        results = _observe_all(detector, ["Согласен, отличный план", "Поддерживаю!", "Полностью согласен"], participants=3)
+        assert results == [None, None, "consensus"]
+
+        results = _observe_all(detector, ["Согласен", "Не согласен, это спорно", "Согласен"], participants=2)
+        assert results == [None, None, None]
+
+    def test_polite_disagreement_is_not_consensus(self):
+        detector = ConsensusDetector()
+        polite = [
+            "Хорошо, но я бы сажал лук",
+            "Интересно, однако морковь не взойдёт",
+            "Спасибо, точно подумаю",
+            "Согласен, но есть нюанс",
+            "Я против, хотя идея интересная",
+        ]
+        assert not any(detector.is_agreement(text) for text in polite)
+        assert _observe_all(detector, polite, participants=2) == [None] * len(polite)
+        assert detector.is_agreement("Да, верно — сажаем морковь")
+        assert detector.is_agreement("Полностью согласна")
+
+    def test_embedding_similarity(self):
+        vectors = {"a": [1.0, 0.0], "a2": [0.99, 0.05], "a3": [0.98, 0.1], "b": [0.0, 1.0]}
+        detector = EmbeddingSimilarityDetector(lambda texts: [vectors[t] for t in texts], threshold=0.95)
+        assert _observe_all(detector, ["b", "a", "a2", "a3"])[-1] == "embedding"
+        assert _observe_all(detector, ["a", "b", "a", "b"]) == [None] * 4
+
+    def test_factory(self):
+        assert create_convergence_detector("off") is None
+        assert isinstance(create_convergence_detector("lexical"), LexicalRepetitionDetector)
+        composite = create_convergence_detector("lexical, consensus, embedding", embed=lambda t: [[1.0]] * len(t))
+        assert isinstance(composite, CompositeConvergenceDetector)
+        assert len(composite.detectors) == 3 and composite.blocking
+
+
+def _executor(replies, convergence, max_rounds=50):
+    from app.services.orchestration.executor import PipelineExecutor
+
+    strategy = MagicMock()
+    strategy.handle_user_message = AsyncMock(return_value=[])
+    strategy.should_stop.return_value = False
+    strategy.context = MagicMock()
+    chat = MagicMock(calls=0)
+    turns = iter(replies)
+
+    async def tick(agents):
+        chat.calls += 1
+        return [Message(content=next(turns), type=MessageType.AGENT, sender="A")]
+
+    strategy.tick = tick
+    return PipelineExecutor(
+        room=MagicMock(id=1, speed=1.0), chat_service=chat, strategy=strategy, agents=["A", "B"],
+        max_discuss_rounds=max_rounds, fast_forward=True, convergence=convergence,
+    )
+
+
+@pytest.mark.asyncio
+async def test_discuss_stops_early_and_records_reason():
+    from app.services.orchestration.stages import TaskState
+
+    replies = ["Предлагаю сажать морковь", "Согласен, отличная идея", "Поддерживаю, правильно"] + ["x"] * 47
+    executor = _executor(replies, ConsensusDetector())
+    state = TaskState(user_message="Что сажать?", room_id=1, agent_names=["A", "B"])
+
+    await executor._stage_discuss(state)
+
+    assert state.stop_reason == "converged:consensus"
+    assert state.discuss_rounds == 3
+    assert state.calls_saved == 47
+    assert len(state.discussion_messages) == 3
+
+
+@pytest.mark.asyncio
+async def test_discuss_without_detector_runs_to_limit():
+    from app.services.orchestration.stages import TaskState
+
+    executor = _executor(["Согласен"] * 5, None, max_rounds=5)
+    executor.convergence = None
+    state = TaskState(user_message="?", room_id=1, agent_names=["A", "B"])
+
+    await executor._stage_discuss(state)
+
+    assert state.stop_reason == "max_rounds"
+    assert state.discuss_rounds == 5
+    assert state.calls_saved == 0
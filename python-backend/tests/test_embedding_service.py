@@ -0,0 +1,218 @@
+"""
+Тесты общего сервиса эмбеддингов: LRU-кэш по содержимому, микро-батчинг одновременных
+запросов и одна модель на процесс для всех комнат.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.services.context_memory.embedding_service import (
+    EmbeddingService,
+    get_embedding_service,
+    reset_embedding_service,
+)
+from app.services.context_memory.embeddings import HashingEmbedder
+from app.services.context_memory.models import ImportanceLevel, MemoryItem, MemoryType
+
+
+class _SlowEncoder:
+    """Модель в миниатюре: считает вызовы и размеры батчей, каждый вызов «дорогой»."""
+
+    def __init__(self, delay=0.0):
+        self.inner = HashingEmbedder(32)
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        time.sleep(self.delay)
+        return self.inner(texts)
+
+
+def test_cache_hits_skip_the_model_and_match_direct_embedding():
+    encoder = _SlowEncoder()
+    service = EmbeddingService(encoder=encoder, dim=32, cache_size=2)
+
+    first = service.embed(["морковка", "грядка", "морковка"])
+    again = service.embed(["грядка"])
+    service.embed(["ракета"])  # вытесняет «морковку» из LRU на 2 записи
+    service.embed(["морковка"])
+
+    assert np.array_equal(first, encoder.inner(["морковка", "грядка", "морковка"]))
+    assert np.array_equal(again[0], first[1])
+    assert encoder.batches == [["морковка", "грядка"], ["ракета"], ["морковка"]]
+    stats = service.get_stats()
+    assert stats["cacheHits"] == 1
+    assert stats["cacheSize"] == 2
+    first[0][:] = 0  # результат — копия, кэш не портится
+    assert service.embed(["грядка"])[0].any()
+
+
+def test_concurrent_threads_share_batches():
+    encoder = _SlowEncoder(delay=0.05)
+    service = EmbeddingService(encoder=encoder, dim=32, batch_window=0.02)
+    results = {}
+
+    def worker(i):
+        results[i] = service.embed([f"комната {i} сажает морковку", "общая реплика"])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    encoded = [text for batch in encoder.batches for text in batch]
+    assert len(encoded) == len(set(encoded)) == 9  # «общая реплика» посчитана один раз
+    assert len(encoder.batches) < 8
+    for i, matrix in results.items():
+        assert np.array_equal(matrix, encoder.inner([f"комната {i} сажает морковку", "общая реплика"]))
+
+
+@pytest.mark.asyncio
+async def test_embed_async_batches_rooms_without_blocking_loop():
+    encoder = _SlowEncoder(delay=0.05)
+    service = EmbeddingService(encoder=encoder, dim=32, batch_window=0.01)
+
+    ticks = 0
+
+    async def heartbeat():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    beat = asyncio.create_task(heartbeat())
+    matrices = await asyncio.gather(*(service.embed_async([f"комната {i}"]) for i in range(6)))
+    beat.cancel()
+
+    assert [m.shape for m in matrices] == [(1, 32)] * 6
+    assert len(encoder.batches) < 6
+    assert ticks >= 5
+    assert service.get_stats()["maxBatch"] > 1
+
+
+def test_encoder_error_reaches_all_waiters_and_is_not_cached():
+    calls = []
+
+    def flaky(texts):
+        calls.append(list(texts))
+        if len(calls) == 1:
+            raise RuntimeError("модель упала")
+        return HashingEmbedder(8)(texts)
+
+    service = EmbeddingService(encoder=flaky, dim=8)
+    with pytest.raises(RuntimeError):
+        service.embed(["морковка"])
+
+    assert service.embed(["морковка"]).shape == (1, 8)
+    assert service.get_stats()["errors"] == 1
+
+
+def test_rooms_share_one_process_service(monkeypatch, test_room):
+    from app.config import config
+    from app.services import room_services_registry
+    from app.services.context_memory import vector_store
+
+    monkeypatch.setattr(vector_store, "CHROMA_AVAILABLE", False)
+    monkeypatch.setattr(config, "VECTOR_STORE_BACKEND", "numpy")
+    reset_embedding_service()
+    try:
+        first = room_services_registry._create_vector_store(test_room.id)
+        second = room_services_registry._create_vector_store(test_room.id + 1)
+        service = get_embedding_service()
+
+        assert first.embed is service and second.embed is service
+        assert service.backend == "hashing" and first.dim == config.VECTOR_EMBED_DIM
+        for store in (first, second):
+            store.add_memory(MemoryItem(
+                id="m", content="Копатыч посадил морковку", type=MemoryType.LONG_TERM,
+                importance=ImportanceLevel.MEDIUM, timestamp=datetime.now(),
+            ))
+            assert store.search_memory("морковка")[0]["id"] == "m"
+        assert service.get_stats()["cacheHits"] == 2
+        assert service.get_stats()["encoded"] == 2
+    finally:
+        reset_embedding_service()
+
+
+def test_chroma_function_only_for_semantic_model():
+    assert EmbeddingService(backend="hashing").chroma_function() is None
+
+    semantic = EmbeddingService(encoder=_SlowEncoder(), dim=32)
+    function = semantic.chroma_function()
+    # Имя как у SentenceTransformerEmbeddingFunction: chromadb откроет сохранённые коллекции
+    assert function.name() == "sentence_transformer"
+    assert function.get_config()["model_name"] == semantic.model_name
+    assert len(function(["морковка"])[0]) == 32
+
+
+class _FakeChromaClient:
+    """Клиент ChromaDB, который, как chromadb >= 0.5.3, не открывает коллекцию чужой функцией."""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.created = []
+
+    def list_collections(self):
+        return list(self.stored)
+
+    def get_collection(self, name, embedding_function=None):
+        if name not in self.stored:
+            raise ValueError(f"Collection {name} does not exist")
+        if embedding_function is not None and embedding_function.name() != self.stored[name]:
+            raise ValueError("Embedding function name mismatch")
+        if self.stored[name] == "broken":
+            raise ValueError("Unknown embedding function")
+        return type("Collection", (), {"name": name, "_embedding_function": None})()
+
+    def create_collection(self, name, embedding_function=None):
+        self.created.append(name)
+        return type("Collection", (), {"name": name})()
+
+
+class _NamedFunction:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    @staticmethod
+    def name():
+        return "other"
+
+
+def _patch_chroma(monkeypatch, client):
+    from app.services.context_memory import vector_store
+
+    class _Chroma:
+        @staticmethod
+        def Client():
+            return client
+
+    class _Functions:
+        SentenceTransformerEmbeddingFunction = _NamedFunction
+
+    monkeypatch.setattr(vector_store, "CHROMA_AVAILABLE", True)
+    monkeypatch.setattr(vector_store, "chromadb", _Chroma, raising=False)
+    monkeypatch.setattr(vector_store, "embedding_functions", _Functions, raising=False)
+    return vector_store
+
+
+def test_vector_store_existing_collection_mismatch_is_not_replaced(monkeypatch):
+    client = _FakeChromaClient({"room_1": "sentence_transformer", "room_2": "broken"})
+    vector_store = _patch_chroma(monkeypatch, client)
+
+    # Коллекция другой функции открывается с сохранённой, новая не создаётся
+    store = vector_store.VectorMemoryStore(collection_name="room_1")
+    assert store.collection.name == "room_1"
+    assert client.created == []
+
+    # Не открывается вовсе — явная ошибка, а не пустое хранилище
+    with pytest.raises(vector_store.EmbeddingMismatchError):
+        vector_store.VectorMemoryStore(collection_name="room_2")
+
+    vector_store.VectorMemoryStore(collection_name="room_3")
+    assert client.created == ["room_3"]
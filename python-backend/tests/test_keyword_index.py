@@ -0,0 +1,76 @@
+"""
+Тесты инвертированного индекса BM25 и поиска по краткосрочной памяти MemoryManager.
+"""
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from app.services.context_memory import memory_manager
+from app.services.context_memory.keyword_index import KeywordIndex, tokenize
+from app.services.context_memory.memory_manager import MemoryManager
+
+
+def test_tokenize_drops_punctuation_and_case():
+    assert tokenize("Морковка, грядка! МОРКОВКА?") == ["морковка", "грядка", "морковка"]
+
+
+def test_bm25_prefers_rare_terms_and_short_documents():
+    index = KeywordIndex()
+    index.add("a", "морковка грядка лопата")
+    index.add("b", "морковка грядка")
+    index.add("c", "морковка ракета")
+    index.add("d", "морковка " * 3 + "лук чеснок укроп петрушка салат огурец")
+
+    ranked = index.search("морковка ракета")
+    scores = dict(ranked)
+
+    assert ranked[0][0] == "c"  # редкое «ракета» весит больше общего «морковка»
+    assert scores["b"] > scores["a"]  # при равной частоте короче документ — выше
+    assert set(scores) == {"a", "b", "c", "d"}
+    assert index.search("морковка ракета", limit=1) == ranked[:1]
+    assert index.search("самолёт") == []
+
+
+def test_remove_and_readd_keep_postings_consistent():
+    index = KeywordIndex()
+    index.add("a", "морковка грядка")
+    index.add("b", "ракета")
+    index.add("a", "ракета на грядке")  # замена текста
+    index.remove("b")
+    index.remove("missing")
+
+    assert len(index) == 1
+    assert index.search("морковка") == []
+    assert [doc for doc, _ in index.search("ракета")] == ["a"]
+    assert set(index._postings) == {"ракета", "на", "грядке"}
+    index.remove("a")
+    assert index._postings == {} and index._total_length == 0
+
+
+class _TwoHoursAgo(datetime):
+    """datetime, у которого «сейчас» на два часа раньше: элемент создаётся с истёкшим сроком."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.now(tz) - timedelta(hours=2)
+
+
+@pytest.mark.asyncio
+async def test_manager_search_uses_index_and_forgets_expired():
+    manager = MemoryManager()
+    await manager.add_message("Крош строит ракету", "Крош")
+    await manager.add_message("Ёжик поливает морковку и лук", "Ёжик")
+    with patch.object(memory_manager, "datetime", _TwoHoursAgo):
+        old = await manager.add_message("Копатыч посадил морковку.", "Копатыч")
+    assert old.expires_at() < datetime.now()
+
+    found = await manager.search_memory("морковку", include_long_term=False, n_results=5)
+    assert {m.participants[0] for m in found} == {"Копатыч", "Ёжик"}
+
+    await manager.compress_context()  # истёкший срок снимается с вершины кучи
+    found = await manager.search_memory("морковку", include_long_term=False)
+
+    assert [m.participants[0] for m in found] == ["Ёжик"]
+    assert old.id not in manager._keyword_index
+    assert manager.stats["short_term_items"] == 2
@@ -0,0 +1,161 @@
+"""
+Тесты планировщика LLM-вызовов: лимиты параллельности, ограниченная очередь, 429 на эндпоинтах.
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.yandex_client.llm_scheduler import LLMQueueFullError, LLMScheduler
+
+
+async def _run_calls(scheduler: LLMScheduler, keys: list[str], duration: float = 0.05) -> dict:
+    """Запустить вызовы под слотами, вернуть пиковую параллельность (всего и по ключам)."""
+    peak = {"total": 0}
+    active = {"total": 0}
+
+    async def call(key):
+        async with scheduler.slot(key):
+            active["total"] += 1
+            active[key] = active.get(key, 0) + 1
+            peak["total"] = max(peak["total"], active["total"])
+            peak[key] = max(peak.get(key, 0), active[key])
+            await asyncio.sleep(duration)
+            active["total"] -= 1
+            active[key] -= 1
+
+    await asyncio.gather(*(call(k) for k in keys))
+    return peak
+
+
+class TestLLMScheduler:
+    """Проверка LLMScheduler."""
+
+    @pytest.mark.asyncio
+    async def test_per_room_and_global_caps(self):
+        scheduler = LLMScheduler(max_concurrency=3, per_room_concurrency=2, max_queue=100)
+        peak = await _run_calls(scheduler, ["room_1"] * 5 + ["room_2"] * 5)
+
+        assert peak["total"] == 3
+        assert peak["room_1"] <= 2
+        assert peak["room_2"] <= 2
+        stats = scheduler.get_stats()
+        assert stats["completed"] == 10
+        assert stats["running"] == 0
+        assert stats["queueDepth"] == 0
+        assert stats["maxWaitMs"] > 0
+
+    @pytest.mark.asyncio
+    async def test_busy_room_does_not_block_other_rooms(self):
+        scheduler = LLMScheduler(max_concurrency=4, per_room_concurrency=1, max_queue=100)
+        order = []
+
+        async def call(key, tag):
+            async with scheduler.slot(key):
+                order.append(tag)
+                await asyncio.sleep(0.05)
+
+        await asyncio.gather(call("room_1", "a1"), call("room_1", "a2"), call("room_2", "b1"))
+
+        # room_2 стартует сразу, не дожидаясь второго вызова room_1
+        assert order.index("b1") < order.index("a2")
+
+    def test_reserve_rejects_when_queue_full(self):
+        scheduler = LLMScheduler(max_concurrency=2, per_room_concurrency=2, max_queue=3)
+        scheduler.reserve(5)  # 2 сразу в работу + 3 в очереди
+        with pytest.raises(LLMQueueFullError):
+            scheduler.reserve(1)
+        assert scheduler.get_stats()["rejected"] == 1
+
+        scheduler.release_reservation(2)
+        scheduler.reserve(1)
+        assert scheduler.get_stats()["reserved"] == 4
+
+    @pytest.mark.asyncio
+    async def test_reserved_slot_consumes_reservation(self):
+        scheduler = LLMScheduler(max_concurrency=1, per_room_concurrency=1, max_queue=1)
+        scheduler.reserve(2)
+        assert scheduler.queue_depth == 2
+
+        async def call():
+            async with scheduler.slot("room_1", reserved=True):
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(call(), call())
+        assert scheduler.queue_depth == 0
+        assert scheduler.get_stats()["completed"] == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = LLMScheduler(max_concurrency=1, per_room_concurrency=1, max_queue=10)
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("room_1"):
+                await release.wait()
+
+        async def waiter():
+            async with scheduler.slot("room_1"):
+                pass
+
+        h = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        w = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        assert scheduler.get_stats()["waiting"] == 1
+        w.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await w
+        assert scheduler.get_stats()["waiting"] == 0
+        release.set()
+        await h
+
+
+def test_room_messages_returns_429_when_queue_full(client: TestClient, auth_headers: dict, room_with_agent, db_session):
+    """POST /messages в single-режиме при переполненной очереди сразу отвечает 429 и не сохраняет сообщение."""
+    from app.models.message import Message
+
+    room, _ = room_with_agent
+    full = LLMScheduler(max_concurrency=1, per_room_concurrency=1, max_queue=0)
+    full.reserve(1)
+
+    with patch("app.routers.room_agents.get_llm_scheduler", return_value=full), \
+            patch("app.routers.room_agents.get_agent_response_async") as mock_llm:
+        response = client.post(
+            f"/api/rooms/{room.id}/messages",
+            json={"text": "Привет всем", "sender": "user"},
+            headers=auth_headers,
+        )
+
+    assert response.status_code == 429
+    assert response.headers.get("Retry-After") == "5"
+    mock_llm.assert_not_called()
+    assert db_session.query(Message).filter(Message.room_id == room.id).count() == 0
+
+
+@pytest.mark.parametrize("path_suffix", ["messages", "agents/{agent_id}/messages", "events/broadcast"])
+def test_orchestrated_room_returns_429_before_queueing(
+    path_suffix, client: TestClient, auth_headers: dict, room_with_agent, db_session,
+):
+    """Оркестрация (circular) тоже отклоняется при переполненной очереди — до сохранения и enqueue."""
+    from app.models.message import Message
+
+    room, agent = room_with_agent
+    room.orchestration_type = "circular"
+    db_session.commit()
+    full = LLMScheduler(max_concurrency=1, per_room_concurrency=1, max_queue=0)
+    full.reserve(1)
+    body = {"type": "chat", "description": "Привет всем"} if path_suffix == "events/broadcast" else {"text": "Привет всем", "sender": "user"}
+
+    with patch("app.routers.room_agents.get_llm_scheduler", return_value=full), \
+            patch("app.routers.room_agents.enqueue_room_run") as mock_enqueue:
+        response = client.post(
+            f"/api/rooms/{room.id}/" + path_suffix.format(agent_id=agent.id),
+            json=body,
+            headers=auth_headers,
+        )
+
+    assert response.status_code == 429
+    mock_enqueue.assert_not_called()
+    assert db_session.query(Message).filter(Message.room_id == room.id).count() == 0
@@ -2,11 +2,11 @@
 Тесты для app.services.llm_service.
 Проверяют: AgentPromptAdapter, fallback при отсутствии ключей, вызов ChatService.
 """
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, patch, MagicMock
 
 import pytest
 
-from app.services.llm_service import AgentPromptAdapter, get_agent_response
+from app.services.llm_service import AgentPromptAdapter, get_agent_response, get_agent_response_async
 
 
 class FakeAgent:
@@ -91,3 +91,34 @@ class TestGetAgentResponse:
         result = get_agent_response(agent, "session_1", "Привет")
 
         assert "связь пропала" in result or "позже" in result
+
+
+class TestGetAgentResponseAsync:
+    """get_agent_response_async использует асинхронный путь ChatService."""
+
+    @pytest.mark.asyncio
+    @patch("app.services.llm_service.config")
+    async def test_returns_fallback_when_no_api_keys(self, mock_config):
+        mock_config.YANDEX_CLOUD_FOLDER = ""
+        mock_config.YANDEX_CLOUD_API_KEY = ""
+        result = await get_agent_response_async(FakeAgent("Копатыч", "Персонаж"), "s", "Привет!")
+        assert "YANDEX_CLOUD" in result
+
+    @pytest.mark.asyncio
+    @patch("app.services.yandex_client.chat_service.ChatService")
+    @patch("app.services.llm_service.config")
+    async def test_awaits_process_message_async(self, mock_config, mock_chat_cls):
+        mock_config.YANDEX_CLOUD_FOLDER = "folder"
+        mock_config.YANDEX_CLOUD_API_KEY = "key"
+        mock_chat = MagicMock()
+        mock_chat.process_message_async = AsyncMock(return_value="Привет, дружище!")
+        mock_chat_cls.return_value = mock_chat
+
+        result = await get_agent_response_async(FakeAgent("Копатыч", "Ты медведь."), "room_1_agent_5", "Как дела?")
+
+        assert result == "Привет, дружище!"
+        mock_chat.process_message.assert_not_called()
+        adapter, session_id, text = mock_chat.process_message_async.call_args[0]
+        assert "Ты медведь." in adapter.prompt
+        assert session_id == "room_1_agent_5"
+        assert text == "Как дела?"
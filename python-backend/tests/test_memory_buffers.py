@@ -0,0 +1,76 @@
+"""
+Тесты ограниченной памяти комнаты: кольцевые буферы краткосрочной памяти и контекстного
+окна, истечение сроков по куче и срок жизни старше суток.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.context_memory.compression import ContextCompressor
+from app.services.context_memory.memory_manager import MemoryManager
+from app.services.context_memory.models import ContextWindow, ImportanceLevel, MemoryItem, MemoryType
+
+
+def test_item_older_than_a_day_is_expired():
+    memory = MemoryItem(
+        id="m", content="старое", type=MemoryType.SHORT_TERM, importance=ImportanceLevel.LOW,
+        timestamp=datetime.now() - timedelta(days=2), ttl=3600,
+    )
+
+    # timedelta.seconds двух суток — 0: раньше такой элемент не истекал никогда
+    assert memory.is_expired()
+    assert memory.expires_at() == memory.timestamp + timedelta(hours=1)
+
+
+def test_context_window_ring_buffer_keeps_running_tokens():
+    window = ContextWindow(max_tokens=100, max_messages=3)
+    for i in range(5):
+        window.add_message({"sender": "Крош", "content": f"реплика {i}"}, tokens=10 + i)
+
+    assert [m["content"] for m in window.messages] == ["реплика 2", "реплика 3", "реплика 4"]
+    assert window.current_tokens == 12 + 13 + 14
+    assert [m["content"] for m in window.recent(2)] == ["реплика 3", "реплика 4"]
+    assert window.recent(10) == list(window.messages)
+
+
+def test_compression_keeps_chronological_order_and_recounts_tokens():
+    window = ContextWindow(max_tokens=16)
+    contents = ["привет", "важно: решение нужно принять сегодня?", "ок", "согласны, обязательно сажаем?"]
+    for content in contents:
+        window.add_message({"sender": "Ёжик", "content": content, "timestamp": datetime.now()}, tokens=6)
+
+    ContextCompressor().compress_context(window, force=True)
+
+    assert [m["content"] for m in window.messages] == [contents[1], contents[3]]
+    assert window.current_tokens == 12
+
+
+@pytest.mark.asyncio
+async def test_short_term_is_bounded_and_evicted_items_leave_the_index():
+    manager = MemoryManager(max_short_term=3, max_context_messages=4)
+    for i in range(6):
+        await manager.add_message(f"грядка номер {i}", "Копатыч")
+
+    assert [m.content for m in manager.short_term] == ["грядка номер 3", "грядка номер 4", "грядка номер 5"]
+    assert len(manager.context_window.messages) == 4
+    assert len(manager._keyword_index) == 3
+    found = await manager.search_memory("грядка номер 1", include_long_term=False, n_results=10)
+    assert {m.content for m in found} == {"грядка номер 3", "грядка номер 4", "грядка номер 5"}
+
+
+@pytest.mark.asyncio
+async def test_expiry_follows_heap_deadlines():
+    manager = MemoryManager()
+    first = await manager.add_message("Копатыч посадил морковку", "Копатыч")
+    second = await manager.add_message("Крош строит ракету", "Крош")
+    lasting = await manager.add_message("Решение: сажаем лук", "Нюша", memory_type=MemoryType.EPISODIC)
+    second.ttl = 7200  # срок продлён после добавления — элемент переставляется в куче
+
+    manager._prune_expired(now=first.expires_at() + timedelta(seconds=1))
+    assert list(manager.short_term) == [second, lasting]
+
+    manager._prune_expired(now=datetime.now() + timedelta(days=3))
+    assert list(manager.short_term) == [lasting]  # без ttl не истекает
+    assert manager._expiry_heap == []
+    assert manager.stats["short_term_items"] == 1
+    assert await manager.search_memory("ракету морковку", include_long_term=False) == []
@@ -204,7 +204,7 @@ class TestMemoryWritePath:
 
         # Отправляем сообщение в чат (без реального LLM — мокаем)
         with mock.patch(
-            "app.routers.room_agents.get_agent_response",
+            "app.routers.room_agents.get_agent_response_async",
             return_value="Привет! Я Копатыч, рад тебя видеть.",
         ):
             r = app_client.post(
@@ -8,14 +8,14 @@ import pytest
 from fastapi.testclient import TestClient
 
 
-@patch("app.routers.room_agents.get_agent_response")
+@patch("app.routers.room_agents.get_agent_response_async")
 def test_send_message_returns_agent_response(
     mock_get_response,
     client: TestClient,
     auth_headers: dict,
     room_with_agent,
 ):
-    """Эндпоинт вызывает get_agent_response и возвращает agentResponse в ответе."""
+    """Эндпоинт вызывает get_agent_response_async и возвращает agentResponse в ответе."""
     room, agent = room_with_agent
     mock_get_response.return_value = "Ребяты, вы чего? Честное слово, привет!"
 
@@ -37,7 +37,7 @@ def test_send_message_returns_agent_response(
     assert call_args[2] == "Привет, Копатыч!"
 
 
-@patch("app.routers.room_agents.get_agent_response")
+@patch("app.routers.room_agents.get_agent_response_async")
 def test_send_message_saves_both_messages_to_db(
     mock_get_response,
     client: TestClient,
@@ -65,7 +65,7 @@ def test_send_message_saves_both_messages_to_db(
     assert messages[1].sender == agent.name
 
 
-@patch("app.routers.room_agents.get_agent_response")
+@patch("app.routers.room_agents.get_agent_response_async")
 def test_send_message_404_if_agent_not_in_room(
     mock_get_response,
     client: TestClient,
@@ -144,7 +144,7 @@ def test_get_messages_lazy_loading(
 
 
 @patch("app.routers.room_agents.broadcast_chat_message")
-@patch("app.routers.room_agents.get_agent_response")
+@patch("app.routers.room_agents.get_agent_response_async")
 def test_send_room_message_triggers_all_agents(
     mock_get_response,
     mock_broadcast,
@@ -197,7 +197,7 @@ def test_send_room_message_400_if_no_agents(
 
 
 @patch("app.routers.room_agents.broadcast_chat_message")
-@patch("app.routers.room_agents.get_agent_response")
+@patch("app.routers.room_agents.get_agent_response_async")
 def test_send_message_triggers_websocket_broadcast(
     mock_get_response,
     mock_broadcast,
@@ -0,0 +1,147 @@
+"""
+Тесты отложенной записи сообщений pipeline: id без обращения к БД, пакетная запись,
+гарантии strict, повтор и отбрасывание пачки.
+"""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.orchestration.message_writer import MessageWriteBehind
+
+
+@pytest.fixture
+def writer(db_session):
+    created = []
+
+    def make(**kwargs):
+        created.append(MessageWriteBehind(**kwargs))
+        return created[-1]
+
+    yield make
+    for w in created:
+        w._buffers.clear()
+        w.allocator.uninstall()
+
+
+def _texts(db_session, room_id):
+    from app.models.message import Message as DBMessage
+    db_session.expire_all()
+    return [m.text for m in db_session.query(DBMessage).filter(DBMessage.room_id == room_id).order_by(DBMessage.id)]
+
+
+@pytest.mark.asyncio
+async def test_batched_messages_are_written_in_one_transaction(writer, db_session, room_with_agent):
+    from app.models.memory import Memory
+    from app.models.plan import Plan
+    from app.services.metrics import DB_COMMITS
+
+    room, agent = room_with_agent
+    w = writer(flush_interval=60)
+    pending = [w.submit(room.id, agent.id, f"реплика {i}", agent.name, with_memory=True) for i in range(3)]
+
+    assert [p.id for p in pending] == list(range(pending[0].id, pending[0].id + 3))
+    assert _texts(db_session, room.id) == []
+
+    commits = DB_COMMITS.value()
+    assert w.flush(room.id) == 3
+    assert DB_COMMITS.value() == commits + 1
+    assert _texts(db_session, room.id) == ["реплика 0", "реплика 1", "реплика 2"]
+    assert db_session.query(Memory).filter(Memory.agent_id == agent.id).count() == 3
+    assert db_session.query(Plan).filter(Plan.agent_id == agent.id).count() == 3
+    assert w.get_stats()["avgBatch"] == 3
+
+
+@pytest.mark.asyncio
+async def test_router_inserts_do_not_take_pending_ids(writer, db_session, test_room):
+    from app.models.message import Message as DBMessage
+
+    w = writer(flush_interval=60)
+    pending = w.submit(test_room.id, None, "от агента", "Система")
+    user_msg = DBMessage(room_id=test_room.id, text="от пользователя", sender="user")
+    db_session.add(user_msg)
+    db_session.commit()
+
+    assert user_msg.id > pending.id
+    assert w.flush() == 1
+    assert _texts(db_session, test_room.id) == ["от агента", "от пользователя"]
+
+
+@pytest.mark.asyncio
+async def test_batch_is_flushed_after_interval(writer, db_session, test_room):
+    w = writer(flush_interval=0.01)
+    w.submit(test_room.id, None, "одна", "Система")
+    w.submit(test_room.id, None, "две", "Система")
+
+    await asyncio.sleep(0.05)
+
+    assert _texts(db_session, test_room.id) == ["одна", "две"]
+    assert w.get_stats()["flushes"] == 1
+
+
+def test_strict_writes_before_returning(writer, db_session, test_room):
+    w = writer(durability="strict")
+    w.submit(test_room.id, None, "сразу", "Система")
+
+    assert _texts(db_session, test_room.id) == ["сразу"]
+    assert w.pending() == 0
+
+
+def test_failed_batch_is_retried_then_dropped(writer, db_session):
+    w = writer(flush_interval=60)
+    w.submit(999_999, None, "комнаты нет", "Система")
+
+    for _ in range(3):
+        assert w.flush() == 0
+
+    stats = w.get_stats()
+    assert stats["errors"] == 3
+    assert stats["dropped"] == 1
+    assert w.pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_failure_keeps_messages(writer, db_session, room_with_agent):
+    from app.models.memory import Memory
+
+    room, agent = room_with_agent
+    w = writer(flush_interval=60)
+    w.submit(room.id, agent.id, "реплика", agent.name, with_memory=True)
+
+    with patch("app.models.plan.Plan", side_effect=RuntimeError("plan")):
+        assert w.flush(room.id) == 1
+
+    assert _texts(db_session, room.id) == ["реплика"]
+    assert db_session.query(Memory).filter(Memory.agent_id == agent.id).count() == 0
+    stats = w.get_stats()
+    assert stats["memoryErrors"] == 1
+    assert stats["errors"] == 0 and stats["dropped"] == 0
+
+
+@pytest.mark.asyncio
+async def test_callback_broadcasts_before_write(db_session, room_with_agent):
+    from app.services import orchestration_background
+    from app.services.agents_orchestration.message import Message
+    from app.services.agents_orchestration.message_type import MessageType
+
+    room, agent = room_with_agent
+    saved = []
+    await orchestration_background.reset_message_writer()
+    try:
+        with patch.object(orchestration_background, "broadcast_chat_message", new=AsyncMock()) as broadcast:
+            callback = orchestration_background._make_message_callback(
+                room.id, [agent], on_saved=lambda mid, msg: saved.append(mid),
+            )
+            await callback(Message(content="Привет!", type=MessageType.AGENT, sender=agent.name))
+
+            payload = broadcast.await_args.args[1]
+            assert payload["id"] == str(saved[0])
+            assert payload["agentId"] == str(agent.id)
+            assert orchestration_background.get_message_writer().pending(room.id) == 1
+    finally:
+        await orchestration_background.reset_message_writer()
+
+    from app.models.message import Message as DBMessage
+    db_session.expire_all()
+    row = db_session.get(DBMessage, saved[0])
+    assert row is not None and row.text == "Привет!"
@@ -0,0 +1,119 @@
+"""
+Тесты метрик: формат Prometheus, инструментирование pipeline/LLM/WebSocket, стоимость записи.
+"""
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+class TestExposition:
+    def test_counter_and_histogram_format(self):
+        registry = MetricsRegistry()
+        calls = registry.register(Counter("t_calls_total", "Вызовы", ("agent",)))
+        latency = registry.register(Histogram("t_latency_seconds", "Время", ("agent",), buckets=(0.1, 1.0)))
+        registry.register(Gauge("t_active", "Активные", source=lambda: 3))
+
+        calls.inc('Кро"ш')
+        calls.inc('Кро"ш', amount=2)
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, "A")
+
+        text = registry.render()
+        assert "# TYPE t_calls_total counter" in text
+        assert 't_calls_total{agent="Кро\\"ш"} 3' in text
+        assert 't_latency_seconds_bucket{agent="A",le="0.1"} 1' in text
+        assert 't_latency_seconds_bucket{agent="A",le="1"} 2' in text
+        assert 't_latency_seconds_bucket{agent="A",le="+Inf"} 3' in text
+        assert 't_latency_seconds_sum{agent="A"} 5.55' in text
+        assert 't_latency_seconds_count{agent="A"} 3' in text
+        assert "t_active 3" in text
+
+    def test_recording_costs_microseconds(self):
+        counter = Counter("t_fast_total", "", ("a", "b"))
+        histogram = Histogram("t_fast_seconds", "", ("a",))
+        n = 20000
+        started = time.perf_counter()
+        for _ in range(n):
+            counter.inc("x", "y")
+            histogram.observe(0.03, "x")
+        per_pair = (time.perf_counter() - started) / n
+
+        assert per_pair < 20e-6
+        assert counter.value("x", "y") == n
+
+
+@pytest.mark.asyncio
+async def test_pipeline_stages_are_timed():
+    from app.services.metrics import PIPELINE_RUN_SECONDS, PIPELINE_STAGE_SECONDS
+    from app.services.orchestration.executor import PipelineExecutor
+
+    executor = PipelineExecutor(room=MagicMock(id=1), chat_service=AsyncMock(), strategy=MagicMock(), agents=["A"])
+    for attr in ("_stage_retrieve_memory", "_stage_plan", "_stage_discuss", "_stage_synthesize",
+                 "_stage_store_memory", "_stage_extract_facts", "_stage_update_graph"):
+        setattr(executor, attr, AsyncMock())
+    before = PIPELINE_STAGE_SECONDS.count("DISCUSS"), PIPELINE_RUN_SECONDS.count("ok")
+
+    await executor.run("Привет")
+
+    assert PIPELINE_STAGE_SECONDS.count("DISCUSS") == before[0] + 1
+    assert PIPELINE_RUN_SECONDS.count("ok") == before[1] + 1
+
+
+def test_llm_calls_are_counted_per_agent_and_room():
+    from app.services.metrics import LLM_CALLS, LLM_ERRORS, LLM_LATENCY_SECONDS
+    from app.services.yandex_client.yandex_agent_client import Agent, YandexAgentClient
+
+    with patch("app.services.yandex_client.yandex_agent_client.AIStudio"):
+        client = YandexAgentClient(folder_id="folder", api_key="key")
+    client._get_agent_memory = MagicMock(return_value="")
+    model = MagicMock()
+    model.run.return_value = MagicMock(text="Привет!")
+    client._get_model = MagicMock(return_value=model)
+    agent = Agent("Метрикатыч", "Ты медведь.")
+
+    with patch("app.services.api_usage_limiter.check_can_call_api"), \
+            patch("app.services.api_usage_limiter.record_api_call"):
+        client.send_message(agent, "room_42:abc", "Привет")
+        model.run.side_effect = ValueError("bad request")
+        client.send_message(agent, "room_42:abc", "Привет")
+
+    assert LLM_CALLS.value("Метрикатыч", "42", "sync") == 1
+    assert LLM_LATENCY_SECONDS.count("Метрикатыч", "42") == 1
+    assert LLM_ERRORS.value("Метрикатыч", "42", "ValueError") == 1
+
+
+@pytest.mark.asyncio
+async def test_ws_broadcast_records_fanout_and_send_latency():
+    from app.services.metrics import WS_BROADCAST_FANOUT, WS_SEND_ERRORS, WS_SEND_SECONDS
+    from app.ws.manager import ConnectionManager
+
+    manager = ConnectionManager("metrics-test")
+    ok, broken = AsyncMock(), AsyncMock()
+    broken.send_json.side_effect = RuntimeError("closed")
+    await manager.connect(ok, 1)
+    await manager.connect(broken, 1)
+
+    await manager.broadcast(1, {"type": "message"})
+
+    assert WS_BROADCAST_FANOUT.count("metrics-test") == 1
+    assert WS_SEND_SECONDS.count("metrics-test") == 1
+    assert WS_SEND_ERRORS.value("metrics-test") == 1
+
+
+def test_metrics_endpoint(client, db_session, test_room):
+    from app.services.metrics import DB_COMMITS
+
+    commits = DB_COMMITS.value()
+    test_room.description = "обновлено"
+    db_session.commit()
+    assert DB_COMMITS.value() == commits + 1
+
+    response = client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in ("aigod_db_commits_total", "aigod_pipeline_active", "aigod_llm_calls_total"):
+        assert f"# TYPE {name}" in response.text
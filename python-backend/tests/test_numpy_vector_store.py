@@ -0,0 +1,166 @@
+"""
+Тесты NumPy-хранилища векторной памяти: косинусный поиск, фильтры, memmap-персистентность.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.context_memory.embeddings import HashingEmbedder
+from app.services.context_memory.models import ImportanceLevel, MemoryItem, MemoryType
+from app.services.context_memory.numpy_store import NumpyVectorStore
+
+
+def _memory(mid, content, importance=ImportanceLevel.MEDIUM, memory_type=MemoryType.LONG_TERM, age_days=0):
+    return MemoryItem(
+        id=mid,
+        content=content,
+        type=memory_type,
+        importance=importance,
+        timestamp=datetime.now() - timedelta(days=age_days),
+        participants=["Копатыч"],
+    )
+
+
+MEMORIES = [
+    _memory("m1", "Копатыч посадил морковку на грядке у дома", ImportanceLevel.HIGH),
+    _memory("m2", "Совунья лечит Лосяша от простуды", ImportanceLevel.LOW),
+    _memory("m3", "Крош и Ёжик строят ракету для полёта на луну", ImportanceLevel.MEDIUM, age_days=40),
+    _memory("m4", "На грядке выросла огромная морковка", ImportanceLevel.CRITICAL, MemoryType.SEMANTIC),
+]
+
+
+def test_hashing_embedder_is_normalized_and_stable():
+    embed = HashingEmbedder(64)
+    first, second = embed(["морковка на грядке", "морковка на грядке"])
+
+    assert first.dtype == np.float32
+    assert np.linalg.norm(first) == pytest.approx(1.0, abs=1e-5)
+    assert np.array_equal(first, second)
+
+
+def test_search_ranks_by_cosine_and_matches_brute_force():
+    store = NumpyVectorStore()
+    store.add_memories(MEMORIES)
+
+    results = store.search_memory("морковка на грядке", n_results=4)
+    vectors = store.embed([f"{m.content} " for m in MEMORIES])
+    query = store.embed(["морковка на грядке"])[0]
+    expected = [MEMORIES[i].id for i in np.argsort(-(vectors @ query))]
+
+    assert [r["id"] for r in results] == expected
+    assert results[0]["id"] in ("m1", "m4")
+    assert results[0]["distance"] <= results[-1]["distance"]
+    assert results[0]["metadata"]["participants"] == '["Копатыч"]'
+
+
+def test_filters_on_type_importance_and_time():
+    store = NumpyVectorStore()
+    store.add_memories(MEMORIES)
+
+    semantic = store.search_memory("морковка", memory_type=MemoryType.SEMANTIC)
+    important = store.search_memory("морковка", n_results=10, min_importance="high")
+    recent = store.search_memory(
+        "ракета", n_results=10, time_range=(datetime.now() - timedelta(days=7), datetime.now()),
+    )
+
+    assert [r["id"] for r in semantic] == ["m4"]
+    assert {r["id"] for r in important} == {"m1", "m4"}
+    assert "m3" not in {r["id"] for r in recent}
+
+
+def test_delete_and_relevant_context():
+    store = NumpyVectorStore()
+    store.add_memories(MEMORIES)
+    store.delete_memory("m1")
+    store.delete_old_memories(days=30)
+
+    context = store.get_relevant_context("морковка", importance_threshold="medium")
+
+    assert store.count() == 2
+    assert [m.id for m in context] == ["m4"]
+    assert context[0].importance == ImportanceLevel.CRITICAL
+
+
+def test_memmap_persistence_growth_and_compaction(tmp_path):
+    directory = tmp_path / "room_memory_1"
+    store = NumpyVectorStore(directory=str(directory), dim=32)
+    store.add_memories([_memory(f"n{i}", f"заметка номер {i} про грядку {i % 7}") for i in range(300)])
+    store.add_memory(_memory("carrot", "Копатыч любит морковку"))
+    assert store.get_stats()["capacity"] == 512
+    assert isinstance(store._vectors, np.memmap)
+    for i in range(200):
+        store.delete_memory(f"n{i}")
+    del store
+
+    reopened = NumpyVectorStore(directory=str(directory), dim=32)
+
+    assert reopened.count() == 101
+    assert reopened._size == 101  # удалённых больше половины — уплотнено при загрузке
+    assert reopened.search_memory("Копатыч любит морковку", n_results=1)[0]["id"] == "carrot"
+    remaining = {r["id"] for r in reopened.search_memory("заметка", n_results=500)}
+    assert remaining == {f"n{i}" for i in range(200, 300)} | {"carrot"}
+
+
+def test_embedder_change_reembeds_from_journal(tmp_path):
+    import json
+
+    directory = tmp_path / "room_memory_2"
+    store = NumpyVectorStore(directory=str(directory), dim=32)
+    store.add_memories(MEMORIES)
+    store.delete_memory("m2")
+    del store
+    assert json.loads((directory / "meta.json").read_text()) == {"dim": 32, "backend": "hashing", "model": None}
+
+    reopened = NumpyVectorStore(directory=str(directory), dim=64)
+
+    assert reopened.dim == 64 and reopened._vectors.shape[1] == 64
+    assert reopened.get_stats()["reembedded"] == 3
+    assert reopened.count() == 3
+    assert reopened.search_memory("морковка на грядке", n_results=1)[0]["id"] in {"m1", "m4"}
+    assert {r["id"] for r in reopened.search_memory("морковка ракета", n_results=10)} == {"m1", "m3", "m4"}
+    assert json.loads((directory / "meta.json").read_text())["dim"] == 64
+
+    # Эмбеддер тот же — повторного пересчёта нет
+    again = NumpyVectorStore(directory=str(directory), dim=64)
+    assert again.get_stats()["reembedded"] == 0
+    assert again.count() == 3
+
+
+def test_legacy_index_without_meta_is_reembedded(tmp_path):
+    directory = tmp_path / "room_memory_3"
+    store = NumpyVectorStore(directory=str(directory), dim=32)
+    store.add_memories(MEMORIES)
+    del store
+    (directory / "meta.json").unlink()
+
+    reopened = NumpyVectorStore(directory=str(directory), dim=32)
+
+    assert reopened.get_stats()["reembedded"] == 4
+    assert (directory / "meta.json").exists()
+    assert reopened.search_memory("Совунья лечит Лосяша", n_results=1)[0]["id"] == "m2"
+
+
+@pytest.mark.asyncio
+async def test_memory_integration_uses_numpy_store_without_chroma(monkeypatch, test_room):
+    from app.config import config
+    from app.services import room_services_registry
+    from app.services.context_memory import vector_store
+
+    monkeypatch.setattr(vector_store, "CHROMA_AVAILABLE", False)
+    monkeypatch.setattr(config, "VECTOR_STORE_BACKEND", "auto")
+    room_services_registry.cleanup_room(test_room.id)
+    try:
+        integration = room_services_registry.get_memory_integration(test_room)
+        manager = integration.memory_manager
+        assert isinstance(manager.vector_store, NumpyVectorStore)
+
+        await manager.add_message("Копатыч посадил морковку", "Копатыч", importance=ImportanceLevel.HIGH)
+        found = await manager.search_memory("морковку", include_short_term=False)
+
+        assert [m.content for m in found] == ["Копатыч посадил морковку"]
+        assert manager.stats["long_term_items"] == 1
+        context = await manager.get_relevant_context_async("морковку", max_tokens=800)
+        assert "[Воспоминание] Копатыч посадил морковку" in context
+    finally:
+        room_services_registry.cleanup_room(test_room.id)
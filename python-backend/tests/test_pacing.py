@@ -0,0 +1,125 @@
+"""
+Тесты темпа обсуждения: вычитание времени раунда, fast-forward, смена скорости на лету.
+"""
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.orchestration.pacing import PacingController
+
+
+class TestPacingController:
+    """Проверка PacingController."""
+
+    @pytest.mark.asyncio
+    async def test_round_time_is_subtracted_from_pause(self):
+        pacing = PacingController(speed=1.0, base_interval=0.2)
+        pacing.start_round()
+        await asyncio.sleep(0.15)  # «вызов LLM»
+
+        slept = await pacing.wait()
+
+        assert slept < 0.1
+        assert pacing.get_stats()["savedSeconds"] >= 0.14
+
+    @pytest.mark.asyncio
+    async def test_slow_round_does_not_wait(self):
+        pacing = PacingController(speed=2.0, base_interval=0.1)  # интервал 0.05 с
+        pacing.start_round()
+        await asyncio.sleep(0.08)
+
+        assert await pacing.wait() < 0.01
+
+    @pytest.mark.asyncio
+    async def test_fast_forward_has_no_delay(self):
+        pacing = PacingController(speed=0.1, fast_forward=True)
+        pacing.start_round()
+
+        assert pacing.interval == 0
+        assert await pacing.wait() < 0.01
+
+    @pytest.mark.asyncio
+    async def test_speed_change_applies_to_current_pause(self):
+        pacing = PacingController(speed=1.0, base_interval=2.0)
+        pacing.start_round()
+        waiter = asyncio.create_task(pacing.wait())
+        await asyncio.sleep(0.05)
+
+        started = time.monotonic()
+        pacing.set_speed(10.0)  # интервал 0.2 с, из них ~0.05 уже прошло
+        await waiter
+
+        assert time.monotonic() - started < 0.3
+        assert pacing.speed == 10.0
+
+
+@pytest.mark.asyncio
+async def test_discuss_rounds_run_without_delay_in_fast_forward():
+    from app.services.orchestration.executor import PipelineExecutor
+    from app.services.orchestration.stages import TaskState
+
+    strategy = MagicMock()
+    strategy.handle_user_message = AsyncMock(return_value=[])
+    strategy.should_stop.return_value = False
+    ticks = []
+
+    async def tick(agents):
+        ticks.append(1)
+        return []
+
+    strategy.tick = tick
+    executor = PipelineExecutor(
+        room=MagicMock(id=1, speed=0.1), chat_service=MagicMock(), strategy=strategy, agents=["A"],
+        max_discuss_rounds=5, fast_forward=True,
+    )
+    started = time.monotonic()
+    await executor._stage_discuss(TaskState(user_message="x", room_id=1, agent_names=["A"]))
+
+    assert len(ticks) == 5
+    assert time.monotonic() - started < 0.5
+
+
+def test_patch_speed_updates_running_pipeline(client: TestClient, auth_headers: dict, test_room):
+    from app.services import orchestration_background
+
+    executor = MagicMock()
+    queue = MagicMock()
+    queue.running_executor.return_value = executor
+    queue.loop = None
+    with patch.object(orchestration_background, "get_pipeline_queue", return_value=queue):
+        response = client.patch(f"/api/rooms/{test_room.id}/speed", json={"speed": 4.0}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"speed": 4.0}
+    executor.pacing.set_speed.assert_called_once_with(4.0)
+
+
+def test_speed_change_from_worker_thread_hops_to_pipeline_loop():
+    import threading
+
+    from app.services import orchestration_background
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        pacing = PacingController(speed=0.1)  # пауза 20 с
+        queue = MagicMock(loop=loop)
+        queue.running_executor.return_value = MagicMock(pacing=pacing)
+        waiting = asyncio.run_coroutine_threadsafe(pacing.wait(), loop)
+        while pacing._changed is None:
+            time.sleep(0.01)
+
+        # Как sync-эндпоинт: вызов из потока, не из event loop прогона
+        with patch.object(orchestration_background, "get_pipeline_queue", return_value=queue):
+            assert orchestration_background.apply_room_speed(1, 100.0) is True
+
+        assert waiting.result(timeout=2) < 1.0
+        assert pacing.speed == 100.0
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=2)
+        loop.close()
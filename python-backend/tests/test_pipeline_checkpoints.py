@@ -0,0 +1,151 @@
+"""
+Тесты контрольных точек pipeline: запись этапов в SQLite, продолжение с последнего этапа.
+"""
+import asyncio
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.agents_orchestration.message import Message
+from app.services.agents_orchestration.message_type import MessageType
+from app.services.orchestration.checkpoints import CheckpointStore
+from app.services.orchestration.executor import PipelineExecutor
+from app.services.orchestration.fact_extractor import Fact
+from app.services.orchestration.stages import PipelineStage as S
+
+
+def _executor(room_id: int, calls: list, block_discuss: asyncio.Event = None):
+    """Executor с подменёнными этапами: записывают свои выходы и имя этапа в calls."""
+    executor = PipelineExecutor(
+        room=MagicMock(id=room_id), chat_service=AsyncMock(), strategy=MagicMock(), agents=["A"],
+        checkpoints=CheckpointStore(),
+    )
+
+    async def retrieve(state):
+        calls.append(S.RETRIEVE_MEMORY)
+        state.memory_context = "помнит про морковь"
+
+    async def plan(state):
+        calls.append(S.PLAN)
+        state.plan = "план"
+
+    async def discuss(state):
+        calls.append(S.DISCUSS)
+        if block_discuss is not None:
+            await block_discuss.wait()
+        state.discussion_messages = [Message(content="сажаем", type=MessageType.AGENT, sender="A")]
+
+    async def synthesize(state):
+        calls.append(S.SYNTHESIZE)
+        state.synthesized_answer = f"итог: {state.memory_context} / {state.discussion_messages[0].content}"
+
+    async def facts(state):
+        calls.append(S.FACT_EXTRACTION)
+        state.extracted_facts = [Fact("A", "likes", "морковь")]
+
+    async def noop(state):
+        pass
+
+    for attr, handler in [
+        ("_stage_retrieve_memory", retrieve), ("_stage_plan", plan), ("_stage_discuss", discuss),
+        ("_stage_synthesize", synthesize), ("_stage_extract_facts", facts),
+        ("_stage_store_memory", noop), ("_stage_update_graph", noop),
+    ]:
+        setattr(executor, attr, handler)
+    return executor
+
+
+@pytest.mark.asyncio
+async def test_cancelled_run_resumes_from_last_completed_stage(db_session, test_room):
+    from app.models.pipeline_checkpoint import PipelineCheckpoint
+
+    calls: list = []
+    task = asyncio.create_task(_executor(test_room.id, calls, block_discuss=asyncio.Event()).run("Что сажать?"))
+    while S.DISCUSS not in calls:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    row = db_session.query(PipelineCheckpoint).one()
+    assert row.status == "cancelled"
+    assert set(row.completed_stages) == {"RETRIEVE_MEMORY", "PLAN"}
+    assert row.outputs["memory_context"] == "помнит про морковь"
+
+    resumed_calls: list = []
+    state = await _executor(test_room.id, resumed_calls).run("", resume_from=row.id)
+
+    assert S.RETRIEVE_MEMORY not in resumed_calls and S.PLAN not in resumed_calls
+    assert state.user_message == "Что сажать?"
+    assert state.synthesized_answer == "итог: помнит про морковь / сажаем"
+    assert set(state.resumed_stages) == {S.RETRIEVE_MEMORY, S.PLAN}
+    db_session.expire_all()
+    assert db_session.query(PipelineCheckpoint).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_discussion_and_facts_survive_serialization(db_session, test_room):
+    store = CheckpointStore()
+    calls: list = []
+    executor = _executor(test_room.id, calls)
+    executor.checkpoints = store
+
+    async def failing_synthesize(state):
+        raise RuntimeError("LLM недоступен")
+
+    executor._stage_synthesize = failing_synthesize
+    state = await executor.run("Что сажать?")
+    assert state.error == "LLM недоступен"
+
+    checkpoint = store.latest_resumable(test_room.id)
+    assert checkpoint["status"] == "failed"
+    from app.services.orchestration.stages import TaskState
+    restored = TaskState(user_message="", room_id=test_room.id, agent_names=["A"])
+    stages = store.restore(checkpoint["id"], restored)
+
+    assert S.DISCUSS in stages and S.FACT_EXTRACTION in stages
+    assert restored.discussion_messages[0].content == "сажаем"
+    assert restored.discussion_messages[0].type == MessageType.AGENT
+    assert restored.extracted_facts == [Fact("A", "likes", "морковь")]
+
+
+def test_interrupted_returns_latest_per_room_and_drops_stale(db_session, test_room):
+    from app.models.pipeline_checkpoint import PipelineCheckpoint
+    from datetime import datetime, timezone
+
+    old = datetime.now(timezone.utc) - timedelta(hours=3)
+    db_session.add_all([
+        PipelineCheckpoint(room_id=test_room.id, user_message="давно", status="running", created_at=old, updated_at=old),
+        PipelineCheckpoint(room_id=test_room.id, user_message="первое", status="running"),
+        PipelineCheckpoint(room_id=test_room.id, user_message="второе", status="running"),
+        PipelineCheckpoint(room_id=test_room.id, user_message="отменено", status="cancelled"),
+    ])
+    db_session.commit()
+
+    interrupted = CheckpointStore().interrupted(timedelta(hours=1))
+
+    assert [c["user_message"] for c in interrupted] == ["второе"]
+    db_session.expire_all()
+    assert db_session.query(PipelineCheckpoint).count() == 3
+
+
+def test_resume_endpoint(client, auth_headers, db_session, test_room):
+    from app.models.pipeline_checkpoint import PipelineCheckpoint
+    from app.services import orchestration_background
+
+    assert client.post(f"/api/rooms/{test_room.id}/orchestration/resume", headers=auth_headers).status_code == 404
+
+    row = PipelineCheckpoint(
+        room_id=test_room.id, user_message="Что сажать?", status="cancelled", completed_stages=["RETRIEVE_MEMORY"],
+    )
+    db_session.add(row)
+    db_session.commit()
+    queue = MagicMock(submit=AsyncMock())
+    queue.running_executor.return_value = None
+    with patch.object(orchestration_background, "get_pipeline_queue", return_value=queue):
+        response = client.post(f"/api/rooms/{test_room.id}/orchestration/resume", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.json()["checkpointId"] == row.id
+    queue.submit.assert_awaited_once_with(test_room.id, "Что сажать?", "user", resume_from=row.id)
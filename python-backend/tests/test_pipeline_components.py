@@ -0,0 +1,141 @@
+"""
+Тесты кэша компонентов pipeline: тёплый ConversationContext, дозагрузка новых сообщений, инвалидация.
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.constants import SUMMARIZER_AGENT_NAME
+from app.services.agents_orchestration.context import ConversationContext
+from app.services.agents_orchestration.message import Message
+from app.services.agents_orchestration.message_type import MessageType
+from app.services.orchestration.component_cache import PipelineComponentCache
+
+
+def _room(room_id=1, agents=(("Крош", "весёлый"),), orchestration_type="circular", description="Тема"):
+    room = MagicMock(id=room_id, orchestration_type=orchestration_type, description=description)
+    room.agents = [MagicMock(id=i, personality=p) for i, (_, p) in enumerate(agents)]
+    for agent, (name, _) in zip(room.agents, agents):
+        agent.name = name
+    return room
+
+
+def _msg(text, sender="user", msg_type=MessageType.USER):
+    return Message(content=text, type=msg_type, sender=sender)
+
+
+def _cache():
+    builds = []
+
+    def build_adapter(room):
+        builds.append(room.id)
+        return MagicMock()
+
+    return PipelineComponentCache(build_adapter, lambda p: ConversationContext(participants=p)), builds
+
+
+class TestComponentCache:
+    def test_components_are_reused_until_room_changes(self):
+        cache, builds = _cache()
+        first = cache.acquire(_room())
+        assert cache.acquire(_room()) is first
+        assert first.agents == ["Крош", SUMMARIZER_AGENT_NAME]
+
+        changed = cache.acquire(_room(agents=(("Крош", "весёлый"), ("Ёжик", "робкий"))))
+        assert changed is not first
+        assert cache.acquire(_room(orchestration_type="narrator")) is not changed
+        assert len(builds) == 3
+        assert cache.get_stats()["hits"] == 1
+
+    def test_sync_appends_only_new_and_foreign_messages(self):
+        cache, _ = _cache()
+        entry = cache.acquire(_room())
+        assert cache.sync(entry, [(1, _msg("привет")), (2, _msg("как дела"))]) == 2
+
+        # Прогон: ответ агента уже в context, итог synthesize — нет
+        reply = _msg("отлично", "Крош", MessageType.AGENT)
+        entry.context.add_message(reply)
+        entry.record_saved(3, reply)
+        summary = _msg("итог", "Суммаризатор", MessageType.SUMMARIZED)
+        entry.record_saved(4, summary)
+
+        rows = [(2, _msg("как дела")), (3, _msg("отлично")), (4, _msg("итог")), (5, _msg("ещё вопрос"))]
+        assert cache.sync(entry, rows) == 1
+        assert [m.content for m in entry.context.history] == ["привет", "как дела", "отлично", "итог", "ещё вопрос"]
+        assert entry.last_message_id == 5
+        assert cache.get_stats()["messagesLoaded"] == 3
+
+    def test_history_is_trimmed_to_limit(self):
+        cache, _ = _cache()
+        entry = cache.acquire(_room())
+        entry.sync([(i, _msg(str(i))) for i in range(1, 31)], history_limit=20)
+
+        assert len(entry.context.history) == 20
+        assert entry.context.history[0].content == "11"
+
+    def test_invalidate(self):
+        cache, builds = _cache()
+        cache.acquire(_room())
+        assert cache.invalidate(1) is True
+        assert cache.invalidate(1) is False
+        cache.acquire(_room())
+        assert len(builds) == 2
+
+
+@pytest.fixture
+def fresh_cache():
+    from app.services import orchestration_background
+    orchestration_background._component_cache = None
+    with patch("app.services.orchestration_service.create_pipeline_adapter", side_effect=lambda room: MagicMock()), \
+            patch.object(orchestration_background, "broadcast_chat_message", new=AsyncMock()):
+        yield orchestration_background
+    orchestration_background._component_cache = None
+
+
+@pytest.mark.asyncio
+async def test_executor_reuses_warm_context_between_messages(fresh_cache, db_session, room_with_agent):
+    from app.models.message import Message as DBMessage
+
+    room, _ = room_with_agent
+    room.orchestration_type = "circular"
+    db_session.add_all([DBMessage(room_id=room.id, text="первое", sender="user")])
+    db_session.commit()
+
+    first = await fresh_cache._create_pipeline_executor(room.id, "первое", "user")
+    assert [m.content for m in first.strategy.context.history] == ["первое"]
+
+    reply = _msg("ответ агента", "Копатыч", MessageType.AGENT)
+    first.strategy.context.add_message(reply)
+    await first.on_message(reply)
+    db_session.add(DBMessage(room_id=room.id, text="второе", sender="user"))
+    db_session.commit()
+
+    second = await fresh_cache._create_pipeline_executor(room.id, "второе", "user")
+    assert second.chat_service is first.chat_service
+    assert second.strategy is not first.strategy
+    assert [m.content for m in second.strategy.context.history] == ["первое", "ответ агента", "второе"]
+
+
+def test_registry_history_takes_latest_messages(db_session, test_room):
+    from app.models.message import Message as DBMessage
+    from app.services.orchestration_background import _load_room_history
+
+    db_session.add_all([DBMessage(room_id=test_room.id, text=f"сообщение {i}", sender="user") for i in range(25)])
+    db_session.commit()
+
+    history = _load_room_history(test_room.id, [], limit=20)
+    assert [m.content for m in history] == [f"сообщение {i}" for i in range(5, 25)]
+
+
+def test_adding_agent_invalidates_components(fresh_cache, client, auth_headers, room_with_agent):
+    room, _ = room_with_agent
+    cache = fresh_cache.get_pipeline_component_cache()
+    room.orchestration_type = "circular"
+    cache.acquire(room)
+
+    response = client.post(
+        f"/api/rooms/{room.id}/agents", json={"name": "Нюша", "character": "мечтательница"}, headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert cache.get(room.id) is None
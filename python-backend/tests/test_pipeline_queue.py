@@ -0,0 +1,152 @@
+"""
+Тесты очереди входящих сообщений pipeline: политики cancel / queue / merge и метрики.
+"""
+import asyncio
+
+import pytest
+
+from app.services.orchestration.input_queue import PipelineInputQueue, merge_inputs
+
+
+class _FakeExecutor:
+    """Executor-заглушка: прогон делает calls «вызовов LLM» по одному за шаг."""
+    def __init__(self, runs: list, text: str, calls: int = 4, step: float = 0.02):
+        self.runs = runs
+        self.text = text
+        self.calls_total = calls
+        self.step = step
+        self.llm_calls = 0
+
+    async def run(self, text, sender="user", resume_from=None):
+        for _ in range(self.calls_total):
+            await asyncio.sleep(self.step)
+            self.llm_calls += 1
+        self.runs.append(text if resume_from is None else f"resume:{resume_from}")
+
+
+def _queue(policy: str, debounce: float = 0.05, **kwargs):
+    runs: list = []
+    started: list = []
+
+    async def factory(room_id, text, sender):
+        started.append(text)
+        return _FakeExecutor(runs, text, **kwargs)
+
+    return PipelineInputQueue(factory, policy=policy, debounce_seconds=debounce), runs, started
+
+
+async def _drain(queue: PipelineInputQueue, timeout: float = 2.0):
+    async def wait():
+        while queue._rooms:
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(wait(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_merge_combines_burst_into_one_run():
+    queue, runs, _ = _queue("merge")
+    for text in ("раз", "два", "три"):
+        await queue.submit(1, text)
+        await asyncio.sleep(0.01)
+    await _drain(queue)
+
+    assert runs == ["раз\nдва\nтри"]
+    stats = queue.get_stats()
+    assert stats["runsStarted"] == 1
+    assert stats["runsSaved"] == 2
+    assert stats["avgLlmCallsPerRun"] == 4
+    assert stats["llmCallsSavedEstimate"] == 8
+
+
+@pytest.mark.asyncio
+async def test_merge_does_not_cancel_running_pipeline():
+    queue, runs, _ = _queue("merge", debounce=0.0, calls=3, step=0.03)
+    await queue.submit(1, "первое")
+    await asyncio.sleep(0.02)
+    await queue.submit(1, "второе")
+    await queue.submit(1, "третье")
+    await _drain(queue)
+
+    assert runs == ["первое", "второе\nтретье"]
+    assert queue.get_stats()["runsCancelled"] == 0
+
+
+@pytest.mark.asyncio
+async def test_resume_is_never_merged_with_new_messages():
+    queue, runs, _ = _queue("merge", calls=1)
+    await queue.submit(1, "старый вопрос", resume_from=7)
+    await queue.submit(1, "раз")
+    await queue.submit(1, "два")
+    await _drain(queue)
+
+    assert runs == ["resume:7", "раз\nдва"]
+
+
+@pytest.mark.asyncio
+async def test_queue_runs_every_message_in_order():
+    queue, runs, _ = _queue("queue", calls=1)
+    for text in ("a", "b", "c"):
+        await queue.submit(1, text)
+    await _drain(queue)
+
+    assert runs == ["a", "b", "c"]
+    assert queue.get_stats()["runsSaved"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancel_policy_counts_wasted_calls():
+    queue, runs, _ = _queue("cancel", calls=5, step=0.02)
+    await queue.submit(1, "старое")
+    await asyncio.sleep(0.07)
+    await queue.submit(1, "новое")
+    await _drain(queue)
+
+    assert runs == ["новое"]
+    stats = queue.get_stats()
+    assert stats["runsCancelled"] == 1
+    assert stats["llmCallsWasted"] >= 2
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_run_and_pending_messages():
+    queue, runs, _ = _queue("queue", calls=10)
+    await queue.submit(1, "a")
+    await queue.submit(1, "b")
+    await asyncio.sleep(0.03)
+
+    assert queue.running_executor(1) is not None
+    assert await queue.cancel(1) is True
+    assert queue.running_executor(1) is None
+    await asyncio.sleep(0.05)
+    assert runs == []
+    assert await queue.cancel(1) is False
+
+
+def test_merge_inputs_and_policy_validation():
+    assert merge_inputs([("x", "user")]) == ("x", "user")
+    assert merge_inputs([("x", "user"), ("y", "Крош")]) == ("x\ny", "Крош")
+    with pytest.raises(ValueError):
+        PipelineInputQueue(lambda *a: None, policy="drop")
+
+
+@pytest.mark.asyncio
+async def test_unbuildable_run_is_reported_not_dropped():
+    notified = []
+
+    async def factory(room_id, text, sender):
+        if text == "сбой":
+            raise RuntimeError("YandexGPT недоступен")
+        return None
+
+    async def on_unavailable(room_id, text, sender):
+        notified.append((room_id, text, sender))
+
+    queue = PipelineInputQueue(factory, debounce_seconds=0, on_unavailable=on_unavailable)
+    assert queue.policy == "queue"
+    await queue.submit(1, "нет агентов")
+    await queue.submit(1, "сбой", "Нюша")
+    await _drain(queue)
+
+    assert notified == [(1, "нет агентов", "user"), (1, "сбой", "Нюша")]
+    assert queue.get_stats()["unavailable"] == 2
+    assert queue.get_stats()["runsStarted"] == 0
@@ -0,0 +1,96 @@
+"""
+Тесты графа этапов PipelineExecutor: зависимости, параллельное выполнение, время этапов.
+"""
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.orchestration.executor import PipelineExecutor
+from app.services.orchestration.stages import (
+    STAGE_GRAPH,
+    PipelineStage,
+    StageSpec,
+    stage_dependencies,
+)
+
+S = PipelineStage
+
+
+def _executor(delay: float = 0.05, fail: PipelineStage = None):
+    """Executor с подменёнными этапами: каждый спит delay и записывает интервал выполнения."""
+    executor = PipelineExecutor(room=MagicMock(id=1), chat_service=AsyncMock(), strategy=MagicMock(), agents=["A"])
+    spans = {}
+
+    def make(stage):
+        async def handler(state):
+            start = time.monotonic()
+            await asyncio.sleep(delay)
+            if stage == fail:
+                raise RuntimeError(f"{stage.name} failed")
+            spans[stage] = (start, time.monotonic())
+        return handler
+
+    for attr, stage in [
+        ("_stage_retrieve_memory", S.RETRIEVE_MEMORY), ("_stage_plan", S.PLAN), ("_stage_discuss", S.DISCUSS),
+        ("_stage_synthesize", S.SYNTHESIZE), ("_stage_store_memory", S.STORE_MEMORY),
+        ("_stage_extract_facts", S.FACT_EXTRACTION), ("_stage_update_graph", S.UPDATE_GRAPH),
+    ]:
+        setattr(executor, attr, make(stage))
+    return executor, spans
+
+
+class TestStageGraph:
+    """Зависимости выводятся из входов/выходов этапов."""
+
+    def test_dependencies(self):
+        deps = stage_dependencies()
+        assert deps[S.DISCUSS] == {S.RETRIEVE_MEMORY, S.PLAN}
+        assert deps[S.FACT_EXTRACTION] == {S.DISCUSS}
+        assert deps[S.STORE_MEMORY] == {S.SYNTHESIZE}
+        assert deps[S.UPDATE_GRAPH] == {S.DISCUSS, S.FACT_EXTRACTION}
+        assert S.SYNTHESIZE not in deps[S.FACT_EXTRACTION]
+
+    def test_cycle_is_rejected(self):
+        graph = (
+            StageSpec(S.PLAN, inputs=("b",), outputs=("a",)),
+            StageSpec(S.DISCUSS, inputs=("a",), outputs=("b",)),
+        )
+        with pytest.raises(ValueError):
+            stage_dependencies(graph)
+
+    def test_every_stage_has_a_spec(self):
+        assert {spec.stage for spec in STAGE_GRAPH} == set(PipelineStage) - {S.NEW_TASK, S.DONE}
+
+
+class TestExecutorScheduling:
+    """PipelineExecutor.run выполняет независимые этапы параллельно."""
+
+    @pytest.mark.asyncio
+    async def test_independent_stages_overlap_and_order_is_respected(self):
+        executor, spans = _executor(delay=0.05)
+        state = await executor.run("Привет")
+
+        assert state.error is None
+        assert state.stage == S.DONE
+        # Критический путь — 4 этапа (memory|plan → discuss → synth|facts → store|graph) вместо 7
+        assert state.total_duration < 0.05 * 6
+        assert spans[S.SYNTHESIZE][0] < spans[S.FACT_EXTRACTION][1]
+        assert spans[S.FACT_EXTRACTION][0] < spans[S.SYNTHESIZE][1]
+        for stage, needs in stage_dependencies().items():
+            for dep in needs:
+                assert spans[dep][1] <= spans[stage][0]
+        assert set(state.stage_durations) == {spec.stage.name for spec in STAGE_GRAPH}
+        assert all(d >= 0.04 for d in state.stage_durations.values())
+
+    @pytest.mark.asyncio
+    async def test_failed_stage_stops_dependents(self):
+        executor, spans = _executor(delay=0.01, fail=S.SYNTHESIZE)
+        state = await executor.run("Привет")
+
+        assert state.error == "SYNTHESIZE failed"
+        assert S.STORE_MEMORY not in spans
+        assert S.SYNTHESIZE not in state.completed_stages
+        assert "SYNTHESIZE" in state.stage_durations
+        assert state.stage == S.DONE
@@ -0,0 +1,148 @@
+"""
+Тесты PromptBuilder: бюджеты секций, обрезка истории с конца, детерминированность, сборка в клиенте.
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.prompts.builder import PromptBuilder, count_tokens, load_budgets, truncate_to_budget
+
+
+def _long_history(n: int) -> list[str]:
+    return [f"Агент{i % 4}: реплика номер {i} про урожай мёд и погоду в лесу" for i in range(n)]
+
+
+class TestPromptBuilder:
+    """Проверка сборки промпта по секциям."""
+
+    def test_sections_respect_budgets(self):
+        budgets = {"memory": 50, "history": 80, "task": 40}
+        builder = PromptBuilder(budgets)
+        builder.add("personality", "Ты Копатыч, медведь-огородник.")
+        builder.add("memory", "\n".join(f"факт {i}: пчёлы любят липу и клевер" for i in range(50)))
+        builder.add_lines("history", _long_history(100))
+        builder.add("task", "Пользователь: Как урожай?")
+        built = builder.build()
+
+        assert built.section_tokens["memory"] <= 50
+        assert built.section_tokens["history"] <= 80
+        assert set(built.truncated) == {"memory", "history"}
+        assert "personality" not in built.truncated
+
+    def test_history_keeps_latest_lines(self):
+        built = PromptBuilder({"history": 60}).add_lines("history", _long_history(100)).build()
+
+        assert "реплика номер 99 " in built.text
+        assert "реплика номер 0 " not in built.text
+
+    def test_memory_keeps_first_lines(self):
+        text = "\n".join(f"воспоминание {i} о весне" for i in range(100))
+        kept = truncate_to_budget(text, 30)
+        assert kept.startswith("воспоминание 0 ")
+        assert count_tokens(kept) <= 30
+
+    def test_build_is_deterministic(self):
+        def build():
+            return (
+                PromptBuilder({"history": 100})
+                .add("system", "Системный промпт")
+                .add("relationships", "Ты дружишь с Нюшей.")
+                .add_lines("history", _long_history(60))
+                .add("task", "Пользователь: Привет")
+                .build()
+            )
+
+        assert build().text == build().text
+
+    def test_unknown_section_rejected(self):
+        with pytest.raises(ValueError):
+            PromptBuilder().add("unknown", "текст")
+
+    def test_budgets_from_env_string(self):
+        budgets = load_budgets("history=300, memory=abc, unknown=5")
+        assert budgets["history"] == 300
+        assert budgets["memory"] == 500
+        assert "unknown" not in budgets
+
+
+class TestClientPromptAssembly:
+    """YandexAgentClient собирает промпт через PromptBuilder."""
+
+    def _client(self):
+        from app.services.yandex_client.yandex_agent_client import YandexAgentClient
+
+        with patch("app.services.yandex_client.yandex_agent_client.AIStudio"):
+            client = YandexAgentClient(folder_id="folder", api_key="key")
+        client._get_agent_memory = MagicMock(return_value="")
+        return client
+
+    def test_long_room_prompt_is_bounded(self):
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        client = self._client()
+        agent = Agent("Копатыч", "Системные правила\n\n---\n\nТы Копатыч.")
+        for i in range(10):
+            client.sessions.append("room_1:s", [("Пользователь", f"вопрос {i} " * 40), ("Копатыч", f"ответ {i} " * 40)])
+        sections = {
+            "memory": "\n".join(f"факт {i} " * 20 for i in range(100)),
+            "history": "\n".join(_long_history(200)),
+            "relationships": "Ты дружишь с Нюшей.",
+        }
+
+        prompt = client._build_prompt(agent, "room_1:s", "Как урожай?", sections)
+        legacy = "\n".join([agent.prompt, *sections.values(), *(f"{r}: {m}" for r, m in client.sessions.get("room_1:s"))])
+
+        budgets = load_budgets()
+        assert count_tokens(prompt) <= sum(budgets.values()) + 50  # + заголовки секций
+        assert count_tokens(prompt) < count_tokens(legacy) / 2
+        assert prompt.index("Системные правила") < prompt.index("Ты Копатыч.") < prompt.index("Ты дружишь с Нюшей.")
+        assert prompt.rstrip().endswith("Пользователь: Как урожай?\nОтвет:")
+        assert "реплика номер 199 " in prompt
+
+        stats = client.get_prompt_stats()
+        assert stats["calls"] == 1
+        assert stats["truncated"]["history"] == 1
+        assert stats["truncated"]["memory"] == 1
+
+    def test_session_stores_raw_text(self):
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        client = self._client()
+        model = MagicMock()
+        model.run.return_value.text = "Хорошо!"
+        client._get_model = MagicMock(return_value=model)
+
+        with patch("app.services.api_usage_limiter.check_can_call_api"), \
+                patch("app.services.api_usage_limiter.record_api_call"):
+            client.send_message(Agent("Копатыч", "Ты медведь."), "s", "Как дела?", sections={"history": "Нюша: привет"})
+
+        assert client.sessions.get("s") == [("Пользователь", "Как дела?"), ("Копатыч", "Хорошо!")]
+        assert "Нюша: привет" in model.run.call_args[0][0]
+
+    @pytest.mark.asyncio
+    async def test_synthesizer_prompt_keeps_instructions_and_latest_discussion(self):
+        from app.services.agents_orchestration.message import Message
+        from app.services.agents_orchestration.message_type import MessageType
+        from app.services.orchestration.solution_synthesizer import SolutionSynthesizer
+        from app.services.orchestration.stages import TaskState
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        client = self._client()
+        state = TaskState(user_message="Что посадим весной?", room_id=1, agent_names=["Копатыч"])
+        for line in _long_history(300):
+            sender, _, content = line.partition(": ")
+            state.discussion_messages.append(Message(content=content, type=MessageType.AGENT, sender=sender))
+        prompts = []
+
+        async def chat(agent_name, session_id, prompt, context=None, cache=False, sections=None):
+            prompts.append(client._build_stateless_prompt(Agent(agent_name, "Ты медведь."), prompt, sections))
+            return "Сажаем морковку."
+
+        assert await SolutionSynthesizer(chat, agent_name="Копатыч").synthesize(state) == "Сажаем морковку."
+
+        prompt = prompts[0]
+        assert prompt.rstrip().endswith("This is the FINAL message.\n\nОтвет:")
+        assert "3. Stop the discussion" in prompt
+        assert "реплика номер 299 " in prompt
+        assert "реплика номер 0 " not in prompt
+        assert count_tokens(prompt) <= sum(load_budgets().values()) + 200
@@ -0,0 +1,110 @@
+"""
+Тесты пакетного анализа отношений на этапе UPDATE_GRAPH: один проход по обсуждению,
+одно обновление графа, синхронизация с БД без запроса на каждую пару.
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.relationship_model import RelationshipManager
+from app.services.relationship_model.heuristic_analyzer import HeuristicRelationshipAnalyzer
+
+AGENTS = ["Крош", "Ёжик", "Нюша"]
+DISCUSSION = [
+    ("Крош", "Давайте строить ракету!"),
+    ("Ёжик", "Согласен с Крошем, это интересно"),
+    ("Нюша", "Не согласен, это абсурд"),
+    ("Крош", "Нюша, спасибо за мнение"),
+    ("Ёжик", "Хорошо, давайте обсудим"),
+]
+
+
+async def _sequential(manager: RelationshipManager) -> None:
+    """Прежний путь: process_message на каждое сообщение с контекстом из предыдущих."""
+    prev: list[str] = []
+    for sender, text in DISCUSSION:
+        await manager.process_message(text, sender, AGENTS, context=prev.copy() or None)
+        prev.append(f"{sender}: {text}")
+
+
+@pytest.mark.asyncio
+async def test_batch_matches_per_message_analysis():
+    sequential = RelationshipManager(analyzer=HeuristicRelationshipAnalyzer(influence_coefficient=0.3))
+    batched = RelationshipManager(analyzer=HeuristicRelationshipAnalyzer(influence_coefficient=0.3))
+    await _sequential(sequential)
+
+    deltas = await batched.process_discussion(DISCUSSION, AGENTS)
+
+    for a in AGENTS:
+        for b in AGENTS:
+            if a != b:
+                assert batched.get_relationship_value(a, b) == pytest.approx(sequential.get_relationship_value(a, b))
+    # Одно обновление на пару вместо одного на пару в каждой реплике
+    assert len(batched.history) == len(deltas) < len(sequential.history)
+
+
+@pytest.mark.asyncio
+async def test_fallback_for_analyzer_without_batch_api():
+    analyzer = MagicMock(spec=["analyze_message", "on_analysis"])
+    analyzer.analyze_message = AsyncMock(return_value=MagicMock(impacts={"Ёжик": 0.1, "Чужой": 0.5}))
+    manager = RelationshipManager(analyzer=analyzer)
+
+    deltas = await manager.process_discussion([("Крош", "раз"), ("Крош", "два")], AGENTS)
+
+    assert deltas == {("Крош", "Ёжик"): pytest.approx(0.2)}
+    assert analyzer.analyze_message.await_args_list[1].kwargs["context"] == ["Крош: раз"]
+
+
+@pytest.mark.asyncio
+async def test_update_graph_stage_makes_one_pass(room_with_agent):
+    from app.services.orchestration.executor import PipelineExecutor
+    from app.services.orchestration.stages import TaskState
+    from app.services.agents_orchestration.message import Message
+    from app.services.agents_orchestration.message_type import MessageType
+
+    room, _ = room_with_agent
+    executor = PipelineExecutor(room=room, chat_service=AsyncMock(), strategy=MagicMock(), agents=AGENTS)
+    state = TaskState(user_message="тема", room_id=room.id, agent_names=AGENTS)
+    state.discussion_messages = [
+        Message(content=text, type=MessageType.AGENT, sender=sender) for sender, text in DISCUSSION * 10
+    ]
+
+    with patch.object(RelationshipManager, "process_message", new=AsyncMock()) as per_message, \
+            patch("app.services.relationship_model_service.sync_graph_to_db_and_broadcast", new=AsyncMock()):
+        await executor._stage_update_graph(state)
+
+    per_message.assert_not_awaited()
+    assert state.graph_updated is True
+
+
+@pytest.mark.asyncio
+async def test_graph_sync_reads_room_relationships_once(db_session, test_room):
+    from sqlalchemy import event
+
+    from app.database.sqlite_setup import engine
+    from app.models.agent import Agent
+    from app.models.relationship import Relationship as DBRelationship
+    from app.services.relationship_model_service import sync_graph_to_db_and_broadcast
+
+    agents = [Agent(name=name, personality="") for name in AGENTS + ["Бараш", "Лосяш"]]
+    test_room.agents.extend(agents)
+    db_session.commit()
+    manager = RelationshipManager(analyzer=HeuristicRelationshipAnalyzer())
+    await manager.process_discussion(DISCUSSION, AGENTS)
+
+    selects = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM relationships" in statement:
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        with patch("app.ws.broadcast_graph_edge", new=AsyncMock()) as broadcast:
+            await sync_graph_to_db_and_broadcast(test_room, manager)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len(selects) == 1
+    assert db_session.query(DBRelationship).filter(DBRelationship.room_id == test_room.id).count() == 10
+    assert broadcast.await_count == 3
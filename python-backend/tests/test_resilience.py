@@ -0,0 +1,248 @@
+"""
+Тесты устойчивости вызовов YandexGPT: повторы, circuit breaker, hedged-запросы, отказ без заглушки.
+"""
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.yandex_client.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMUnavailableError,
+    ResilientCaller,
+    is_transient_error,
+    reset_llm_resilience,
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Flaky:
+    """Падает ConnectionError первые failures раз, затем отвечает."""
+    def __init__(self, failures: int, exc: Exception = None):
+        self.failures = failures
+        self.exc = exc or ConnectionError("reset by peer")
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.exc
+        return "ok"
+
+
+class TestResilientCaller:
+    """Проверка повторов и breaker."""
+
+    def test_transient_errors_are_retried_with_backoff(self):
+        sleeps = []
+        caller = ResilientCaller(max_retries=3, base_delay=0.1, max_delay=1.0, sleep=sleeps.append)
+        fn = _Flaky(2)
+
+        assert caller.call(fn) == "ok"
+        assert fn.calls == 3
+        assert len(sleeps) == 2
+        assert 0.05 <= sleeps[0] <= 0.1 and 0.1 <= sleeps[1] <= 0.2
+        assert caller.get_stats()["retries"] == 2
+        assert caller.breaker.state == CircuitBreaker.CLOSED
+
+    def test_non_transient_error_is_not_retried(self):
+        caller = ResilientCaller(max_retries=3, sleep=lambda _: None)
+        fn = _Flaky(5, exc=ValueError("bad request"))
+
+        with pytest.raises(ValueError):
+            caller.call(fn)
+        assert fn.calls == 1
+
+    def test_exhausted_retries_raise_unavailable(self):
+        caller = ResilientCaller(max_retries=1, sleep=lambda _: None)
+        with pytest.raises(LLMUnavailableError):
+            caller.call(_Flaky(10))
+        assert caller.get_stats()["failures"] == 1
+
+    def test_breaker_fails_fast_then_recovers(self):
+        clock = _Clock()
+        caller = ResilientCaller(
+            max_retries=0, sleep=lambda _: None,
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock),
+        )
+        down = _Flaky(100)
+        for _ in range(2):
+            with pytest.raises(LLMUnavailableError):
+                caller.call(down)
+        assert caller.breaker.state == CircuitBreaker.OPEN
+
+        # Пока breaker открыт, upstream не вызывается
+        with pytest.raises(CircuitOpenError) as exc_info:
+            caller.call(down)
+        assert down.calls == 2
+        assert exc_info.value.retry_after == pytest.approx(30)
+
+        clock.now = 31
+        assert caller.breaker.state == CircuitBreaker.HALF_OPEN
+        assert caller.call(lambda: "ok") == "ok"
+        stats = caller.get_stats()["breaker"]
+        assert stats["state"] == CircuitBreaker.CLOSED
+        assert stats["opened"] == 1
+        assert stats["shortCircuited"] == 1
+
+    def test_failed_probe_reopens_breaker(self):
+        clock = _Clock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        caller = ResilientCaller(max_retries=3, sleep=lambda _: None, breaker=breaker)
+        with pytest.raises(LLMUnavailableError):
+            caller.call(_Flaky(100))
+        clock.now = 11
+        probe = _Flaky(100)
+        with pytest.raises(LLMUnavailableError):
+            caller.call(probe)
+        assert probe.calls == 1  # в half-open без повторов
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_hedge_sends_duplicate_above_p95(self):
+        caller = ResilientCaller(hedge_enabled=True, hedge_min_samples=5)
+        for _ in range(5):
+            caller.call(lambda: "fast", hedge=True)
+        calls = []
+        lock = threading.Lock()
+
+        def slow_first():
+            with lock:
+                calls.append(1)
+                n = len(calls)
+            if n == 1:
+                time.sleep(0.5)
+                return "slow"
+            return "hedged"
+
+        started = time.monotonic()
+        assert caller.call(slow_first, hedge=True) == "hedged"
+        assert time.monotonic() - started < 0.4
+        stats = caller.get_stats()
+        assert stats["hedges"] == 1
+        assert stats["hedgeWins"] == 1
+        caller.shutdown()
+
+    def test_hedge_waits_for_primary_when_limit_denies_duplicate(self):
+        caller = ResilientCaller(hedge_enabled=True, hedge_min_samples=5)
+        for _ in range(5):
+            caller.call(lambda: "fast", hedge=True)
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return "slow"
+
+        assert caller.call(slow, hedge=True, before_hedge=lambda: False) == "slow"
+        assert len(calls) == 1
+        stats = caller.get_stats()
+        assert stats["hedges"] == 0
+        assert stats["hedgesDenied"] == 1
+        caller.shutdown()
+
+    def test_transient_classification(self):
+        import grpc
+
+        class _RpcError(grpc.RpcError):
+            def __init__(self, code):
+                self._code = code
+
+            def code(self):
+                return self._code
+
+        assert is_transient_error(_RpcError(grpc.StatusCode.UNAVAILABLE))
+        assert not is_transient_error(_RpcError(grpc.StatusCode.UNAUTHENTICATED))
+        assert is_transient_error(TimeoutError())
+        assert not is_transient_error(KeyError("x"))
+
+
+class TestClientResilience:
+    """YandexAgentClient: отказ при недоступности upstream."""
+
+    @pytest.fixture(autouse=True)
+    def _reset(self):
+        reset_llm_resilience()
+        yield
+        reset_llm_resilience()
+
+    def _client(self, model):
+        from app.services.yandex_client.yandex_agent_client import YandexAgentClient
+
+        with patch("app.services.yandex_client.yandex_agent_client.AIStudio"):
+            client = YandexAgentClient(folder_id="folder", api_key="key")
+        client._get_agent_memory = MagicMock(return_value="")
+        client._get_model = MagicMock(return_value=model)
+        return client
+
+    def test_open_breaker_fails_fast_without_upstream_call(self):
+        from app.services.yandex_client.resilience import get_llm_resilience
+        from app.services.yandex_client.yandex_agent_client import UNAVAILABLE_REPLY, Agent
+
+        model = MagicMock()
+        client = self._client(model)
+        breaker = get_llm_resilience().breaker
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        with patch("app.services.api_usage_limiter.check_can_call_api"), \
+                patch("app.services.api_usage_limiter.record_api_call") as record:
+            agent = Agent("Копатыч", "Ты медведь.")
+            assert client.send_message(agent, "s", "Привет") == UNAVAILABLE_REPLY
+            with pytest.raises(LLMUnavailableError):
+                client.send_message(agent, "s", "Привет", fallback=False)
+
+        model.run.assert_not_called()
+        record.assert_not_called()
+        assert client.sessions.get("s") == []
+
+    def test_transient_failure_is_retried_by_client(self):
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        model = MagicMock()
+        model.run.side_effect = [ConnectionError("reset"), MagicMock(text="Хорошо!")]
+        client = self._client(model)
+
+        with patch("app.services.api_usage_limiter.check_can_call_api"), \
+                patch("app.services.api_usage_limiter.record_api_call"), \
+                patch("app.services.yandex_client.resilience.ResilientCaller.backoff_delay", return_value=0):
+            assert client.send_message(Agent("Копатыч", "Ты медведь."), "s", "Привет") == "Хорошо!"
+        assert model.run.call_count == 2
+
+    def test_non_transient_error_raises_without_fallback(self):
+        from app.services.yandex_client.yandex_agent_client import UNAVAILABLE_REPLY, Agent
+
+        model = MagicMock()
+        model.run.side_effect = ValueError("bad request")
+        client = self._client(model)
+
+        with patch("app.services.api_usage_limiter.check_can_call_api"), \
+                patch("app.services.api_usage_limiter.record_api_call"):
+            agent = Agent("Копатыч", "Ты медведь.")
+            assert client.send_message(agent, "s", "Привет") == UNAVAILABLE_REPLY
+            with pytest.raises(ValueError):
+                client.send_message(agent, "s", "Привет", fallback=False)
+        assert client.sessions.get("s") == []
+
+    def test_hedge_is_counted_against_api_limit(self):
+        from app.services.api_usage_limiter import ApiLimitExceededError
+        from app.services.yandex_client.yandex_agent_client import _reserve_hedge_call
+
+        with patch("app.services.api_usage_limiter.check_can_call_api"), \
+                patch("app.services.api_usage_limiter.record_api_call") as record:
+            assert _reserve_hedge_call() is True
+        record.assert_called_once()
+
+        denied = ApiLimitExceededError("limit", limit=1, current=1, window="day")
+        with patch("app.services.api_usage_limiter.check_can_call_api", side_effect=denied), \
+                patch("app.services.api_usage_limiter.record_api_call") as record:
+            assert _reserve_hedge_call() is False
+        record.assert_not_called()
@@ -79,14 +79,14 @@ def test_update_room_only_speed(client: TestClient, auth_headers: dict, test_roo
     assert response.json()["speed"] == 0.5
 
 
-@patch("app.routers.room_agents.get_agent_response")
+@patch("app.routers.room_agents.get_agent_response_async")
 def test_send_message_calls_llm_for_single_mode(
     mock_get_response,
     client: TestClient,
     auth_headers: dict,
     room_with_agent,
 ):
-    """В режиме single POST message вызывает get_agent_response (ChatService)."""
+    """В режиме single POST message вызывает get_agent_response_async (ChatService)."""
     room, agent = room_with_agent
     mock_get_response.return_value = "Ответ"
 
@@ -112,11 +112,11 @@ def test_send_message_uses_orchestration_for_circular_mode(
     auth_headers: dict,
     room_with_agent_circular,
 ):
-    """В режиме circular POST message запускает pipeline executor, не вызывает get_agent_response."""
+    """В режиме circular POST message запускает pipeline executor, не вызывает get_agent_response_async."""
     room, agent = room_with_agent_circular
     mock_run_pipeline.return_value = True
 
-    with patch("app.routers.room_agents.get_agent_response", return_value="Ответ агента") as mock_llm:
+    with patch("app.routers.room_agents.get_agent_response_async", return_value="Ответ агента") as mock_llm:
         response = client.post(
             f"/api/rooms/{room.id}/agents/{agent.id}/messages",
             json={"text": "Обсудим тему", "sender": "user"},
@@ -131,3 +131,31 @@ def test_send_message_uses_orchestration_for_circular_mode(
     assert call_args[2] == "user"
     mock_llm.assert_not_called()
     assert response.json().get("agentResponse") is None
+
+
+def test_send_message_falls_back_to_single_when_pipeline_cannot_be_built(
+    client: TestClient,
+    auth_headers: dict,
+    room_with_agent_circular,
+):
+    """Компоненты оркестрации не собираются (YandexGPT недоступен) — ответ в режиме single, а не тишина."""
+    from app.services import orchestration_background
+
+    room, agent = room_with_agent_circular
+    orchestration_background._component_cache = None
+    try:
+        with patch("app.services.orchestration_service.create_pipeline_adapter", return_value=None), \
+                patch.object(orchestration_background.PipelineInputQueue, "submit", new_callable=AsyncMock) as submit, \
+                patch("app.routers.room_agents.get_agent_response_async", return_value="Ответ агента") as mock_llm:
+            response = client.post(
+                f"/api/rooms/{room.id}/agents/{agent.id}/messages",
+                json={"text": "Обсудим тему", "sender": "user"},
+                headers=auth_headers,
+            )
+    finally:
+        orchestration_background._component_cache = None
+
+    assert response.status_code == 200
+    submit.assert_not_called()
+    mock_llm.assert_called_once()
+    assert response.json().get("agentResponse") == "Ответ агента"
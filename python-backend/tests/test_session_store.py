@@ -0,0 +1,101 @@
+"""
+Тесты SessionStore: лимит сообщений на сессию, общий бюджет байт с LRU, SQLite.
+"""
+import pytest
+
+from app.services.yandex_client.session_store import SessionStore
+
+
+class TestSessionStore:
+    """Проверка SessionStore."""
+
+    def test_per_session_cap_keeps_latest(self):
+        store = SessionStore(max_messages=4, max_bytes=0)
+        for i in range(5):
+            store.append("s", [("Пользователь", f"q{i}"), ("Агент", f"a{i}")])
+
+        history = store.get("s")
+        assert history == [("Пользователь", "q3"), ("Агент", "a3"), ("Пользователь", "q4"), ("Агент", "a4")]
+        assert store.get_stats()["bytes"] == sum(len(r.encode()) + len(m.encode()) for r, m in history)
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        entry = ("Агент", "x" * 100)
+        size = len(entry[0].encode()) + len(entry[1].encode())
+        store = SessionStore(max_messages=10, max_bytes=size * 2)
+        store.append("a", [entry])
+        store.append("b", [entry])
+        store.get("a")  # a — недавно использована
+        store.append("c", [entry])
+
+        assert "a" in store
+        assert "c" in store
+        assert "b" not in store
+        assert store.get_stats()["evicted_sessions"] == 1
+        assert store.get_stats()["bytes"] <= size * 2
+
+    def test_missing_session(self):
+        store = SessionStore()
+        assert store.get("nope") == []
+        assert "nope" not in store
+        with pytest.raises(KeyError):
+            store["nope"]
+
+    def test_sqlite_spill_survives_restart_and_eviction(self, tmp_path):
+        db_path = str(tmp_path / "sessions.db")
+        entry = ("Агент", "y" * 50)
+        size = len(entry[0].encode()) + len(entry[1].encode())
+
+        store = SessionStore(max_messages=3, max_bytes=size, db_path=db_path)
+        store.append("a", [("Пользователь", "1"), ("Агент", "2"), ("Пользователь", "3"), ("Агент", "4")])
+        store.append("b", [entry])  # вытесняет a из памяти
+        assert store.get_stats()["sessions"] == 1
+        assert store.get("a") == [("Агент", "2"), ("Пользователь", "3"), ("Агент", "4")]
+        store.close()
+
+        restarted = SessionStore(max_messages=3, max_bytes=0, db_path=db_path)
+        assert restarted["b"] == [entry]
+        assert restarted.get_stats()["loaded_from_db"] == 1
+        restarted.close()
+
+    def test_sqlite_sweep_caps_sessions_and_age(self, tmp_path):
+        import sqlite3
+        import time
+
+        db_path = str(tmp_path / "sessions.db")
+        store = SessionStore(max_messages=3, max_bytes=0, db_path=db_path, db_max_sessions=2, sweep_every=1)
+        for i in range(5):
+            store.append(f"room_1:{i}", [("Пользователь", f"вопрос {i}")])
+        store.close()
+
+        db = sqlite3.connect(db_path)
+        sessions = {r[0] for r in db.execute("SELECT DISTINCT session_id FROM llm_session_history")}
+        assert sessions == {"room_1:3", "room_1:4"}
+        db.execute("UPDATE llm_session_history SET created_at = ? WHERE session_id = 'room_1:3'", (time.time() - 7200,))
+        db.commit()
+        db.close()
+
+        reopened = SessionStore(max_messages=3, max_bytes=0, db_path=db_path, db_ttl_seconds=3600)
+        assert reopened.get("room_1:3") == []
+        assert reopened.get("room_1:4") == [("Пользователь", "вопрос 4")]
+        assert reopened.get_stats()["swept_rows"] == 1
+        reopened.close()
+
+    def test_legacy_table_without_created_at_is_migrated(self, tmp_path):
+        import sqlite3
+
+        db_path = str(tmp_path / "legacy.db")
+        db = sqlite3.connect(db_path)
+        db.execute(
+            "CREATE TABLE llm_session_history (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+            "role TEXT NOT NULL, message TEXT NOT NULL)"
+        )
+        db.execute("INSERT INTO llm_session_history (session_id, role, message) VALUES ('old', 'Агент', 'давно')")
+        db.commit()
+        db.close()
+
+        store = SessionStore(db_path=db_path)
+        store.append("new", [("Агент", "сейчас")])
+
+        assert store.get("old") == []  # строка без времени записи — старше любого TTL
+        assert store.get("new") == [("Агент", "сейчас")]
+        store.close()
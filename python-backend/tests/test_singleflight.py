@@ -0,0 +1,101 @@
+"""
+Тесты single-flight: одновременные одинаковые запросы к YandexGPT объединяются.
+"""
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.yandex_client.singleflight import SingleFlight
+
+
+def _slow_client(delay: float = 0.1):
+    from app.services.yandex_client.yandex_agent_client import YandexAgentClient
+
+    def run(prompt):
+        time.sleep(delay)
+        return MagicMock(text="ответ")
+
+    sdk = MagicMock()
+    model = sdk.models.completions.return_value.configure.return_value
+    model.run.side_effect = run
+    with patch("app.services.yandex_client.yandex_agent_client.AIStudio", return_value=sdk):
+        client = YandexAgentClient(folder_id="folder", api_key="key")
+    return client, model
+
+
+class TestSingleFlight:
+    """Проверка SingleFlight."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_same_key_runs_once(self):
+        group = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        results = await asyncio.gather(*(group.do("k", work) for _ in range(4)))
+
+        assert results == ["ok"] * 4
+        assert len(calls) == 1
+        assert group.get_stats()["deduplicated"] == 3
+        assert group.get_stats()["inflight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_sequential_calls_are_not_coalesced(self):
+        group = SingleFlight()
+
+        async def work():
+            return "ok"
+
+        await group.do("k", work)
+        await group.do("k", work)
+        assert group.get_stats()["executed"] == 2
+
+    @pytest.mark.asyncio
+    async def test_error_is_shared_and_cancel_of_one_waiter_keeps_others(self):
+        group = SingleFlight()
+        gate = asyncio.Event()
+
+        async def work():
+            await gate.wait()
+            raise RuntimeError("upstream")
+
+        first = asyncio.create_task(group.do("k", work))
+        second = asyncio.create_task(group.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        gate.set()
+        with pytest.raises(RuntimeError):
+            await second
+
+
+class TestClientSingleFlight:
+    """YandexAgentClient.send_message_async: дубликаты — один upstream-запрос и один record_api_call."""
+
+    @pytest.mark.asyncio
+    async def test_duplicate_requests_share_api_call(self):
+        from app.services.yandex_client.singleflight import get_llm_singleflight
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        client, model = _slow_client()
+        agent = Agent("Копатыч", "Ты медведь.")
+        before = get_llm_singleflight().get_stats()["deduplicated"]
+        with patch("app.services.api_usage_limiter.check_can_call_api"), \
+                patch("app.services.api_usage_limiter.record_api_call") as mock_record:
+            results = await asyncio.gather(
+                client.send_message_async(agent, "room_1:s", "Привет"),
+                client.send_message_async(agent, "room_1:s", "Привет"),
+                client.send_message_async(agent, "room_1:s", "Пока"),
+            )
+
+        assert results == ["ответ"] * 3
+        assert model.run.call_count == 2
+        assert mock_record.call_count == 2
+        assert get_llm_singleflight().get_stats()["deduplicated"] - before == 1
+        # История сессии пополнилась один раз на уникальный запрос
+        assert len(client.sessions["room_1:s"]) == 4
@@ -0,0 +1,183 @@
+"""
+Тесты стриминга ответов: YandexAgentClient.run_stream → message_delta → итоговый message со streamId.
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+
+def _stream_client(chunks):
+    """YandexAgentClient с подменённым SDK: run_stream отдаёт накопленный текст по кускам."""
+    from app.services.yandex_client.yandex_agent_client import YandexAgentClient
+
+    def run_stream(prompt):
+        text = ""
+        for chunk in chunks:
+            text += chunk
+            yield MagicMock(text=text)
+
+    sdk = MagicMock()
+    model = sdk.models.completions.return_value.configure.return_value
+    model.run_stream.side_effect = run_stream
+    with patch("app.services.yandex_client.yandex_agent_client.AIStudio", return_value=sdk):
+        client = YandexAgentClient(folder_id="folder", api_key="key")
+    return client, model
+
+
+@pytest.fixture(autouse=True)
+def no_api_usage_db():
+    with patch("app.services.api_usage_limiter.check_can_call_api"), \
+            patch("app.services.api_usage_limiter.record_api_call"):
+        yield
+
+
+class TestClientStreaming:
+    """send_message_async(on_delta=...) отдаёт приращения по порядку и возвращает полный ответ."""
+
+    @pytest.mark.asyncio
+    async def test_deltas_in_order_and_full_answer(self):
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        client, model = _stream_client(["Ребяты, ", "вы ", "чего?"])
+        deltas = []
+
+        async def on_delta(delta):
+            deltas.append(delta)
+
+        answer = await client.send_message_async(Agent("Копатыч", "Ты медведь."), "s1", "Привет", on_delta=on_delta)
+
+        assert deltas == ["Ребяты, ", "вы ", "чего?"]
+        assert answer == "Ребяты, вы чего?"
+        assert model.run.call_count == 0
+        assert client.sessions["s1"][-1] == ("Копатыч", "Ребяты, вы чего?")
+
+
+class TestPipelineStreaming:
+    """Этап discuss: адаптер стримит через StreamRouter, итоговый Message получает stream_id."""
+
+    @pytest.mark.asyncio
+    async def test_discuss_stage_streams_and_links_final_message(self):
+        from app.services.agents_orchestration.context import ConversationContext
+        from app.services.agents_orchestration.strategies import CircularStrategy
+        from app.services.agents_orchestration.yandex_adapter import YandexAgentAdapter
+        from app.services.orchestration.executor import PipelineExecutor
+        from app.services.orchestration.stages import TaskState
+
+        client = MagicMock()
+
+        async def send_message_async(agent, session_id, text, cache=False, on_delta=None, sections=None, fallback=True):
+            assert on_delta is not None
+            for part in ("Привет", ", друзья"):
+                await on_delta(part)
+            return "Привет, друзья"
+
+        client.send_message_async.side_effect = send_message_async
+        adapter = YandexAgentAdapter(client, session_namespace="room_1")
+        adapter.register_agent("Копатыч", "Ты медведь.")
+        context = ConversationContext(participants=["Копатыч"])
+        strategy = CircularStrategy(context, max_rounds=1)
+        strategy.chat_service = adapter
+
+        deltas = []
+        published = []
+
+        async def on_delta(stream_id, agent_name, delta):
+            deltas.append((stream_id, agent_name, delta))
+
+        async def on_message(msg):
+            published.append(msg)
+
+        room = MagicMock(id=1, speed=1.0)
+        executor = PipelineExecutor(
+            room=room, chat_service=adapter, strategy=strategy, agents=["Копатыч"],
+            on_message=on_message, max_discuss_rounds=1, on_delta=on_delta, fast_forward=True,
+        )
+        state = TaskState(user_message="Привет всем", room_id=1, agent_names=["Копатыч"], room=room)
+        with patch("app.services.room_services_registry.get_emotional_integration", return_value=None):
+            await executor._stage_discuss(state)
+
+        assert deltas, "ожидались message_delta"
+        assert [d[2] for d in deltas[:2]] == ["Привет", ", друзья"]
+        agent_msgs = [m for m in published if m.sender == "Копатыч"]
+        assert agent_msgs
+        stream_ids = {d[0] for d in deltas}
+        assert all(m.metadata.get("stream_id") in stream_ids for m in agent_msgs)
+
+    @pytest.mark.asyncio
+    async def test_failed_call_aborts_open_stream(self):
+        from app.services.agents_orchestration.streaming import (
+            StreamRouter,
+            activate_stream_router,
+            deactivate_stream_router,
+        )
+        from app.services.agents_orchestration.yandex_adapter import YandexAgentAdapter
+        from app.services.yandex_client.resilience import LLMUnavailableError
+
+        client = MagicMock()
+
+        async def send_message_async(agent, session_id, text, cache=False, on_delta=None, sections=None, fallback=True):
+            await on_delta("Приве")
+            raise LLMUnavailableError("обрыв")
+
+        client.send_message_async.side_effect = send_message_async
+        adapter = YandexAgentAdapter(client, session_namespace="room_1")
+        adapter.register_agent("Копатыч", "Ты медведь.")
+        deltas = []
+
+        async def on_delta(stream_id, agent_name, delta):
+            deltas.append((stream_id, agent_name, delta))
+
+        router = StreamRouter(on_delta)
+        token = activate_stream_router(router)
+        try:
+            with pytest.raises(LLMUnavailableError):
+                await adapter("Копатыч", "s", "Привет")
+        finally:
+            deactivate_stream_router(token)
+
+        assert [d[2] for d in deltas] == ["Приве", None]
+        assert deltas[0][0] == deltas[1][0]
+        assert router._open == {} and router.claim("Копатыч", "Приве") is None
+
+    @pytest.mark.asyncio
+    async def test_no_streaming_without_on_delta(self):
+        from app.services.agents_orchestration.streaming import get_stream_router
+        from app.services.orchestration.executor import PipelineExecutor
+        from app.services.orchestration.stages import TaskState
+
+        seen = []
+        strategy = MagicMock()
+        strategy.handle_user_message = AsyncMock(side_effect=lambda _: seen.append(get_stream_router()) or [])
+        strategy.should_stop.return_value = True
+        executor = PipelineExecutor(room=MagicMock(id=1, speed=1.0), chat_service=AsyncMock(), strategy=strategy, agents=["A"])
+        await executor._stage_discuss(TaskState(user_message="x", room_id=1, agent_names=["A"]))
+
+        assert seen == [None]
+
+
+class TestSingleModeStreaming:
+    """_generate_agent_reply_async: message_delta во время генерации, затем message с id из БД и streamId."""
+
+    @pytest.mark.asyncio
+    async def test_reply_broadcasts_deltas_then_final_message(self, room_with_agent):
+        from app.routers import room_agents
+
+        room, agent = room_with_agent
+
+        async def fake_response(agent_obj, session_id, text, *, room=None, on_delta=None):
+            await on_delta("Укуси ")
+            await on_delta("меня пчела!")
+            return "Укуси меня пчела!"
+
+        with patch.object(room_agents, "get_agent_response_async", side_effect=fake_response), \
+                patch.object(room_agents, "broadcast_chat_delta", new_callable=AsyncMock) as mock_delta, \
+                patch.object(room_agents, "broadcast_chat_message", new_callable=AsyncMock) as mock_msg, \
+                patch.object(room_agents, "_update_room_services_on_message"):
+            await room_agents._generate_agent_reply_async(room.id, agent.id, agent.name, "Привет", "user")
+
+        deltas = [c.args[1] for c in mock_delta.call_args_list]
+        assert [d["delta"] for d in deltas] == ["Укуси ", "меня пчела!"]
+        final = mock_msg.call_args.args[1]
+        assert final["text"] == "Укуси меня пчела!"
+        assert final["id"]
+        assert final["streamId"] == deltas[0]["streamId"]
@@ -17,7 +17,7 @@ class TestChatServiceChain:
         mock_client = MagicMock()
         mock_client.send_message.return_value = "Ответ от агента"
 
-        with patch("app.services.yandex_client.chat_service.YandexAgentClient", return_value=mock_client):
+        with patch("app.services.yandex_client.chat_service.get_yandex_client", return_value=mock_client):
             service = ChatService()
             # Агент с .name и .prompt (как ожидает YandexAgentClient)
             agent = MagicMock()
@@ -88,3 +88,167 @@ class TestAgentFactory:
         ca_b = factory.get_agent(agent_b)
 
         assert ca_a is not ca_b
+
+
+def _make_slow_client(delay: float):
+    """YandexAgentClient с подменённым SDK: model.run спит delay секунд (имитация YandexGPT)."""
+    import time
+    from app.services.yandex_client.yandex_agent_client import YandexAgentClient
+
+    def run(prompt):
+        time.sleep(delay)
+        return MagicMock(text="ответ")
+
+    sdk = MagicMock()
+    sdk.models.completions.return_value.configure.return_value.run.side_effect = run
+    with patch("app.services.yandex_client.yandex_agent_client.AIStudio", return_value=sdk):
+        client = YandexAgentClient(folder_id="folder", api_key="key")
+    return client
+
+
+class TestClientPool:
+    """Клиент и тяжёлые ресурсы создаются один раз на процесс."""
+
+    def test_get_yandex_client_reuses_instance(self):
+        from app.services.yandex_client import client_pool
+
+        client_pool.reset_client_pool()
+        with patch.object(client_pool, "YandexAgentClient") as mock_cls:
+            c1 = client_pool.get_yandex_client(folder_id="folder", api_key="key")
+            c2 = client_pool.get_yandex_client(folder_id="folder", api_key="key")
+            c3 = client_pool.get_yandex_client(folder_id="folder", api_key="other")
+        client_pool.reset_client_pool()
+
+        assert c1 is c2
+        assert mock_cls.call_count == 2
+        assert c3 is not None
+
+    def test_client_construction_does_not_load_memory(self):
+        with patch("app.services.yandex_client.yandex_agent_client.get_agent_memory_collection") as mock_mem:
+            client = _make_slow_client(0)
+            assert mock_mem.call_count == 0
+            client._get_agent_memory(MagicMock(name="a"), "s", "q")
+            client._get_agent_memory(MagicMock(name="a"), "s", "q")
+        assert mock_mem.call_count == 1
+
+    def test_agent_memory_recall_spans_room_sessions(self):
+        """Память агента находится в следующем вызове той же комнаты, но не в другой комнате."""
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        class _Collection:
+            def __init__(self):
+                self.rows = []
+
+            def add(self, documents, metadatas, ids):
+                self.rows.extend(zip(documents, metadatas))
+
+            def query(self, query_texts, n_results, where):
+                match = lambda meta: all(meta.get(k) == v for cond in where["$and"] for k, v in cond.items())
+                return {"documents": [[doc for doc, meta in self.rows if match(meta)][:n_results]]}
+
+        collection = _Collection()
+        with patch("app.services.yandex_client.yandex_agent_client.get_agent_memory_collection", return_value=collection):
+            client = _make_slow_client(0)
+            agent = Agent("Копатыч", "Ты медведь.")
+            client._store_agent_memory(agent, "room_1:aaa", "Что посадим?", "Морковку")
+
+            assert "Морковку" in client._get_agent_memory(agent, "room_1:bbb", "посадим")
+            assert client._get_agent_memory(agent, "room_2:ccc", "посадим") == ""
+            assert client._get_agent_memory(Agent("Крош", "Ты заяц."), "room_1:ddd", "посадим") == ""
+
+    def test_chat_service_uses_pooled_client(self):
+        from app.services.yandex_client.chat_service import ChatService
+
+        shared = MagicMock()
+        with patch("app.services.yandex_client.chat_service.get_yandex_client", return_value=shared):
+            assert ChatService().agent_client is shared
+            assert ChatService().agent_client is shared
+
+    @pytest.mark.asyncio
+    async def test_adapter_namespaces_sessions_per_room(self):
+        from app.services.agents_orchestration.yandex_adapter import YandexAgentAdapter
+
+        client = MagicMock()
+        seen = []
+
+        async def send_message_async(agent, session_id, text, cache=False, sections=None, fallback=True):
+            seen.append(session_id)
+            return "ok"
+
+        client.send_message_async.side_effect = send_message_async
+        for room_id in (1, 2):
+            adapter = YandexAgentAdapter(client, session_namespace=f"room_{room_id}")
+            adapter.register_agent("Копатыч", "Ты медведь.")
+            await adapter("Копатыч", "circular_session", "Привет")
+
+        assert seen == ["room_1:circular_session", "room_2:circular_session"]
+
+
+class TestAsyncTransport:
+    """send_message_async не блокирует event loop, запросы разных комнат идут параллельно."""
+
+    @pytest.fixture(autouse=True)
+    def _no_usage_limit(self):
+        with patch("app.services.api_usage_limiter.check_can_call_api"), \
+                patch("app.services.api_usage_limiter.record_api_call"):
+            yield
+
+    @pytest.mark.asyncio
+    async def test_concurrent_rooms_overlap_llm_latency(self):
+        import asyncio
+        import time
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        delay = 0.3
+        clients = [_make_slow_client(delay) for _ in range(3)]
+        agent = Agent("Копатыч", "Ты медведь.")
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            c.send_message_async(agent, f"room_{i}", "Привет") for i, c in enumerate(clients)
+        ))
+        elapsed = time.perf_counter() - started
+
+        assert results == ["ответ"] * 3
+        # Последовательно было бы 0.9 с; параллельно — около одного вызова
+        assert elapsed < delay * 2
+
+    @pytest.mark.asyncio
+    async def test_event_loop_stays_responsive_during_call(self):
+        import asyncio
+        from app.services.yandex_client.yandex_agent_client import Agent
+
+        client = _make_slow_client(0.3)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        try:
+            await client.send_message_async(Agent("Копатыч", "Ты медведь."), "s", "Привет")
+        finally:
+            tick_task.cancel()
+
+        assert ticks >= 10
+
+    @pytest.mark.asyncio
+    async def test_adapter_uses_async_transport(self):
+        from app.services.agents_orchestration.yandex_adapter import YandexAgentAdapter
+
+        client = MagicMock()
+
+        async def send_message_async(agent, session_id, text, cache=False, sections=None, fallback=True):
+            return f"{agent.name}: ok"
+
+        client.send_message_async.side_effect = send_message_async
+        adapter = YandexAgentAdapter(client)
+        adapter.register_agent("Копатыч", "Ты медведь.")
+
+        result = await adapter("Копатыч", "s1", "Привет")
+
+        assert result == "Копатыч: ok"
+        client.send_message.assert_not_called()